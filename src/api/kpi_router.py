@@ -1,52 +1,77 @@
 """
 KPI Router untuk dashboard endpoints
 """
-from fastapi import APIRouter, HTTPException, Request
-from typing import List, Dict, Any
-from pydantic import BaseModel, Field
+import asyncio
+import base64
+import json
+import time
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field, ValidationError
 from core.logging import logger
+from core.cache import cache
+from core.http_cache import cache_headers, etag_matches
+from core.compression import negotiate_encoding
+from core.responses import FastJSONResponse
+from core.admission import admit_kpi_refresh, require_admin_token
+from core.deadline import DeadlineExceeded, request_deadline
+from config import settings
+from schemas.responses import AssessmentSummaryResponse, KPIListResponse
+from schemas.requests import KPIFilter
+from services.kpi_broadcaster import kpi_event
 
 router = APIRouter(prefix="/api/kpi", tags=["kpi"])
 
 
-class KPIListResponse(BaseModel):
-    """Response untuk list semua KPI"""
-    success: bool = Field(..., description="Status keberhasilan")
-    data: List[Dict[str, Any]] = Field(..., description="List of all KPI metrics")
-    total_kpis: int = Field(..., description="Total jumlah KPI")
-    
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "success": True,
-                "data": [
-                    {
-                        "kpi_id": 1,
-                        "name": "Login Frequency",
-                        "definition": "Jumlah login dalam periode tertentu",
-                        "value": 1500,
-                        "unit": "logins",
-                        "category": "engagement"
-                    }
-                ],
-                "total_kpis": 12
-            }
-        }
-
-
 class ErrorResponse(BaseModel):
     """Response untuk error"""
     success: bool = Field(default=False)
     error: str = Field(..., description="Pesan error")
 
 
-@router.get("/metrics", response_model=KPIListResponse, responses={500: {"model": ErrorResponse}})
-async def get_all_kpi_metrics(request: Request, refresh: bool = False):
+def get_kpi_filter(
+    code_module: List[str] = Query([], description="Kode modul, boleh diulang atau dipisah koma"),
+    code_presentation: List[str] = Query([], description="Kode presentasi, boleh diulang atau dipisah koma"),
+    date_from: Optional[int] = Query(None, description="Hari awal (inklusif)"),
+    date_to: Optional[int] = Query(None, description="Hari akhir (inklusif)"),
+) -> KPIFilter:
+    """Dependency: query parameters slice KPI -> KPIFilter kanonik"""
+    try:
+        return KPIFilter(
+            code_module=code_module,
+            code_presentation=code_presentation,
+            date_from=date_from,
+            date_to=date_to,
+        )
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+
+
+@router.get(
+    "/metrics",
+    response_model=KPIListResponse,
+    responses={304: {"description": "Not Modified"}, 429: {"description": "Refresh rate limit"}, 503: {"description": "Server busy"}, 504: {"description": "Deadline exceeded"}, 500: {"model": ErrorResponse}},
+    dependencies=[Depends(admit_kpi_refresh), Depends(request_deadline(settings.REQUEST_DEADLINE_KPI_SECONDS))],
+)
+async def get_all_kpi_metrics(
+    request: Request,
+    refresh: bool = False,
+    kpi_filter: KPIFilter = Depends(get_kpi_filter),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+):
     """
     Get all KPI metrics with caching support
     
     Query Parameters:
         - refresh: Force refresh cache (default: False)
+        - code_module: Filter modul, boleh diulang atau dipisah koma (?code_module=AAA,BBB)
+        - code_presentation: Filter presentasi (?code_presentation=2013J)
+        - date_from / date_to: Rentang hari (studentvle.date, studentassessment.date_submitted)
+    
+    Setiap kombinasi filter punya cache key sendiri (dinormalisasi, urutan dan huruf besar/kecil tidak berpengaruh)
     
     Returns list of 6 active KPIs grouped by category:
     - engagement: Forum Participation Score
@@ -58,21 +83,184 @@ async def get_all_kpi_metrics(request: Request, refresh: bool = False):
     Frontend can iterate through the list with foreach and group by category
     
     Cache is automatically refreshed every 5 minutes (configurable), or can be manually refreshed with ?refresh=true
+    (?refresh=true dibatasi token bucket per client (429) dan slot concurrency kpi_refresh (503 kalau antrian penuh))
+    
+    Response membawa ETag (versi konten KPI) dan Cache-Control max-age = sisa TTL cache.
+    Kirim If-None-Match dengan ETag terakhir untuk dapat 304 Not Modified tanpa body.
+    
+    Cache hit menyajikan body JSON yang sudah dirender saat refresh apa adanya (tanpa decode/validate/encode),
+    termasuk varian gzip/br yang dikompres sekali per refresh sesuai Accept-Encoding.
+    
+    Miss/refresh dibatasi REQUEST_DEADLINE_KPI_SECONDS: query dihentikan dan dijawab 504 (atau cache lama kalau ada).
     """
     try:
         kpi_service = request.app.state.kpi_service
-        kpis = kpi_service.get_all_kpis(force_refresh=refresh)
+        async_cache = request.app.state.async_cache
+        cache_key = kpi_service.cache_key(kpi_filter)
+        meta_key, body_key = kpi_service.meta_key(cache_key), kpi_service.body_key(cache_key)
+        if not refresh:
+            # Fast path: body final (+ varian terkompresi) + metadata dalam satu MGET, tidak lewat response_model
+            encoding = negotiate_encoding(accept_encoding)
+            encoded_key = kpi_service.body_key(cache_key, encoding) if encoding else None
+            cached = await async_cache.mget_raw([key for key in (body_key, meta_key, encoded_key) if key])
+            if body_key in cached and meta_key in cached:
+                meta = json.loads(cached[meta_key])
+                headers = cache_headers(meta["etag"], meta["expires_at"] - time.time())
+                if etag_matches(if_none_match, meta["etag"]):
+                    return Response(status_code=304, headers=headers)
+                async_cache.remember(body_key, cached[body_key])
+                async_cache.remember(meta_key, meta)
+                if encoded_key in cached:
+                    async_cache.remember(encoded_key, cached[encoded_key])
+                    headers.update({"Content-Encoding": encoding, "Vary": "Accept-Encoding"})
+                    return Response(content=base64.b64decode(cached[encoded_key]), media_type="application/json", headers=headers)
+                # Body kecil (tanpa varian): CompressionMiddleware yang memutuskan
+                return Response(content=cached[body_key], media_type="application/json", headers=headers)
         
-        return KPIListResponse(
+        # Miss/refresh dihitung di thread pool
+        kpis, meta = await run_in_threadpool(kpi_service.get_kpis_with_meta, refresh, kpi_filter)
+        headers = cache_headers(meta["etag"], meta["expires_at"] - time.time())
+        if etag_matches(if_none_match, meta["etag"]):
+            return Response(status_code=304, headers=headers)
+        return FastJSONResponse(KPIListResponse(
             success=True,
             data=kpis,
-            total_kpis=len(kpis)
-        )
+            total_kpis=len(kpis),
+            filters=None if kpi_filter.is_empty else kpi_filter.model_dump()
+        ), headers=headers)
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         logger.exception(f"Error getting KPI metrics: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/stream", responses={503: {"description": "Too many stream clients"}})
+async def stream_kpi_metrics(
+    request: Request,
+    kpi_filter: KPIFilter = Depends(get_kpi_filter),
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Server-Sent Events: push KPI setiap kali refresh menghasilkan nilai baru
+    
+    Query Parameters sama seperti /metrics (code_module, code_presentation, date_from, date_to)
+    
+    Event "kpis": {"etag", "changed_kpis": [kpi_id...], "data": [KPI lengkap]}, id event = ETag.
+    Event pertama berisi KPI saat ini (dilewati kalau Last-Event-ID masih sama dengan ETag terbaru).
+    Komentar ": ping" dikirim berkala supaya proxy tidak menutup koneksi idle.
+    """
+    kpi_service = request.app.state.kpi_service
+    broadcaster = request.app.state.kpi_broadcaster
+    cache_key = kpi_service.cache_key(kpi_filter)
+    # Subscribe sebelum membaca KPI saat ini supaya refresh di antaranya tidak terlewat
+    queue = broadcaster.subscribe(cache_key, None if kpi_filter.is_empty else kpi_filter)
+    if queue is None:
+        raise HTTPException(status_code=503, detail="Too many KPI stream clients", headers={"Retry-After": str(settings.KPI_STREAM_HEARTBEAT_SECONDS)})
+    try:
+        kpis, meta = await run_in_threadpool(kpi_service.get_kpis_with_meta, False, kpi_filter)
+    except Exception as e:
+        broadcaster.unsubscribe(queue)
+        logger.exception(f"Error getting KPI metrics for stream: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def events():
+        try:
+            yield f"retry: {settings.KPI_STREAM_HEARTBEAT_SECONDS * 1000}\n\n"
+            if last_event_id != meta["etag"]:
+                yield kpi_event(meta["etag"], kpis, [kpi.get("kpi_id") for kpi in kpis])
+            while not await request.is_disconnected():
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=settings.KPI_STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+        finally:
+            broadcaster.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get(
+    "/metrics/{kpi_id}/timeseries",
+    responses={504: {"description": "Deadline exceeded"}, 500: {"model": ErrorResponse}},
+    dependencies=[Depends(request_deadline(settings.REQUEST_DEADLINE_KPI_SECONDS))],
+)
+async def get_kpi_timeseries(
+    request: Request,
+    kpi_id: int,
+    bucket: str = Query("week", pattern="^(day|week)$", description="Lebar bucket: day atau week"),
+    refresh: bool = False,
+    kpi_filter: KPIFilter = Depends(get_kpi_filter),
+):
+    """
+    Timeseries KPI 1-5 per bucket hari/minggu untuk satu presentation
+    
+    Query Parameters:
+        - code_presentation: Wajib (?code_presentation=2013J)
+        - code_module / date_from / date_to: Filter tambahan, sama seperti /metrics
+        - bucket: day atau week (default: week)
+        - refresh: Hitung ulang bucket terbuka (bucket tertutup tetap dari cache)
+    
+    Bucket tertutup (historis) di-cache dan tidak dihitung ulang, hanya bucket terakhir (terbuka) yang di-refresh
+    """
+    kpi_timeseries = request.app.state.kpi_timeseries
+    if not kpi_timeseries.supports(kpi_id):
+        raise HTTPException(status_code=404, detail=f"Timeseries not available for KPI {kpi_id}")
+    if not kpi_filter.code_presentation:
+        raise HTTPException(status_code=422, detail="code_presentation is required for KPI timeseries")
+    try:
+        data = await run_in_threadpool(kpi_timeseries.get_timeseries, kpi_id, kpi_filter, bucket, refresh)
+        return FastJSONResponse({"success": True, "data": data, "filters": kpi_filter.model_dump()})
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.exception(f"Error getting KPI {kpi_id} timeseries: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get(
+    "/at-risk",
+    responses={429: {"description": "Refresh rate limit"}, 503: {"description": "Server busy"}, 504: {"description": "Deadline exceeded"}, 500: {"model": ErrorResponse}},
+    dependencies=[Depends(admit_kpi_refresh), Depends(request_deadline(settings.REQUEST_DEADLINE_KPI_SECONDS))],
+)
+async def get_at_risk_students(
+    request: Request,
+    top: int = Query(settings.AT_RISK_DEFAULT_TOP, ge=1, le=settings.AT_RISK_MAX_TOP, description="Jumlah mahasiswa (K)"),
+    refresh: bool = False,
+    kpi_filter: KPIFilter = Depends(get_kpi_filter),
+):
+    """
+    Top-K mahasiswa dengan probabilitas dropout tertinggi
+    
+    Query Parameters:
+        - top: Jumlah mahasiswa (default AT_RISK_DEFAULT_TOP, maksimal AT_RISK_MAX_TOP)
+        - code_module / code_presentation: Filter cohort (date_from/date_to diabaikan)
+        - refresh: Hitung ulang list (dibatasi seperti ?refresh=true di /metrics)
+    
+    Probabilitas dari scoring job tersimpan (source=stored_predictions), atau dihitung per chunk kalau belum ada
+    (source=computed). Top AT_RISK_MAX_TOP dipilih dengan seleksi parsial (bukan sort penuh) dan di-cache per filter;
+    setiap request hanya mengambil K teratas dari list tersebut. Cache miss dihitung di dalam slot kpi_refresh
+    (sama dengan ?refresh=true), jadi filter baru yang beruntun tidak bisa men-score cohort tanpa batas.
+    """
+    at_risk = request.app.state.at_risk
+    try:
+        data = None if refresh else await run_in_threadpool(at_risk.get_cached, kpi_filter, top)
+        if data is None and refresh:
+            # Slot kpi_refresh sudah dipegang admit_kpi_refresh
+            data = await run_in_threadpool(at_risk.get_at_risk, kpi_filter, top, True)
+        elif data is None:
+            async with request.app.state.admission.slot("kpi_refresh"):
+                data = await run_in_threadpool(at_risk.get_at_risk, kpi_filter, top, False)
+        return FastJSONResponse({"success": True, "data": data})
+    except DeadlineExceeded:
+        raise
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error getting at-risk students: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/cache/info")
 async def get_cache_info(request: Request):
     """
@@ -82,7 +270,9 @@ async def get_cache_info(request: Request):
     """
     try:
         kpi_service = request.app.state.kpi_service
-        cache_info = kpi_service.get_cache_info()
+        cache_info = await run_in_threadpool(kpi_service.get_cache_info)
+        cache_info["async_cache"] = request.app.state.async_cache.get_stats()
+        cache_info["stream"] = request.app.state.kpi_broadcaster.get_stats()
         return {"success": True, "data": cache_info}
     except Exception as e:
         logger.exception(f"Error getting cache info: {e}")
@@ -98,8 +288,89 @@ async def clear_cache(request: Request):
     """
     try:
         kpi_service = request.app.state.kpi_service
-        kpi_service.clear_cache()
+        await run_in_threadpool(kpi_service.clear_cache)
+        await run_in_threadpool(request.app.state.kpi_timeseries.clear_cache)
+        await run_in_threadpool(request.app.state.at_risk.clear_cache)
+        # Salinan in-process tier async cache juga dibuang
+        request.app.state.async_cache.clear_local()
         return {"success": True, "message": "Cache cleared successfully"}
     except Exception as e:
         logger.exception(f"Error clearing cache: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/cache/flush", dependencies=[Depends(require_admin_token)])
+async def flush_cache(request: Request):
+    """
+    Admin: flush semua key kpi:* di Redis (shared oleh semua worker dan replica)
+    
+    Berbeda dengan /cache/clear (hanya metrics KPI), ini juga menghapus timeseries dan key per-instance.
+    Header X-Admin-Token wajib sama dengan CACHE_ADMIN_TOKEN; kalau token tidak di-set endpoint ditolak (403).
+    """
+    try:
+        request.app.state.async_cache.clear_local()
+        if not cache.clear():
+            raise HTTPException(status_code=500, detail="Failed to flush cache")
+        logger.warning("KPI cache flushed by admin request")
+        return {"success": True, "message": "Cache flushed successfully"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error flushing cache: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/engine")
+async def get_engine_status(request: Request):
+    """
+    Status incremental KPI engine (mode, high-water mark, refresh terakhir)
+    """
+    try:
+        kpi_engine = request.app.state.kpi_engine
+        return {"success": True, "data": kpi_engine.get_status()}
+    except Exception as e:
+        logger.exception(f"Error getting KPI engine status: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/engine/recompute", dependencies=[Depends(require_admin_token)])
+async def recompute_engine_state(request: Request):
+    """
+    Admin: full recompute state KPI 1-5 dari tabel fakta (rekonsiliasi incremental state)
+    
+    KPI cache di-clear supaya request berikutnya memakai state baru. Header X-Admin-Token wajib (seperti /cache/flush).
+    """
+    try:
+        kpi_engine = request.app.state.kpi_engine
+        if not kpi_engine.enabled or not kpi_engine.ready:
+            raise HTTPException(status_code=409, detail="Incremental KPI engine is not enabled")
+        result = await run_in_threadpool(kpi_engine.recompute)
+        await run_in_threadpool(request.app.state.kpi_service.clear_cache)
+        await run_in_threadpool(request.app.state.kpi_timeseries.clear_cache)
+        return {"success": True, "data": result}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error recomputing KPI engine state: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/modules/assessment-summary", response_model=AssessmentSummaryResponse, responses={500: {"model": ErrorResponse}})
+async def get_assessment_summary(request: Request):
+    """
+    Ringkasan nilai assessment per module/presentation dari rollup tables
+    
+    Membutuhkan KPI_ENGINE=incremental (rollup di-refresh sebelum dibaca)
+    """
+    try:
+        kpi_engine = request.app.state.kpi_engine
+        if not kpi_engine.enabled or not kpi_engine.ready:
+            raise HTTPException(status_code=409, detail="Incremental KPI engine is not enabled")
+        await run_in_threadpool(kpi_engine.refresh)
+        summary = await run_in_threadpool(kpi_engine.get_assessment_summary)
+        return FastJSONResponse(AssessmentSummaryResponse(success=True, data=summary))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error getting assessment summary: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,18 +1,34 @@
-from fastapi import APIRouter, HTTPException, Request
-from typing import Optional, Any
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from typing import Optional, Any, Dict, List
 
-from schemas.requests import FinalResultRequest, DropoutRequest
-from schemas.responses import PredictionResponse, ErrorResponse, ModelStatusResponse
+from schemas.requests import FinalResultRequest, DropoutRequest, BulkPredictionRequest, KPIFilter
+from schemas.responses import PredictionResponse, BulkPredictionResponse, ErrorResponse, ModelStatusResponse
 from core.logging import logger
-from core.database import db
+from core.responses import FastJSONResponse
+from core.admission import admission_dependency, require_admin_token
+from core.deadline import DeadlineExceeded, request_deadline
+from config import settings
+from services.predictor_service import DROPOUT_MODEL, FINAL_GRADE_MODEL
+from services.scoring_export import MEDIA_TYPES
 
 
 # Create router
 router = APIRouter(prefix="/api", tags=["predictions"])
 
+# Deadline prediksi (query fitur + inference), habis = 504
+predict_deadline = Depends(request_deadline(settings.REQUEST_DEADLINE_PREDICT_SECONDS))
 
 
-@router.post("/predict/final-result", response_model=PredictionResponse, responses={500: {"model": ErrorResponse}})
+
+@router.post(
+    "/predict/final-result",
+    response_model=PredictionResponse,
+    responses={504: {"description": "Deadline exceeded"}, 500: {"model": ErrorResponse}},
+    dependencies=[predict_deadline],
+)
 async def predict_final_result(body: FinalResultRequest, request: Request):
     """
     Predict final result mahasiswa
@@ -33,22 +49,27 @@ async def predict_final_result(body: FinalResultRequest, request: Request):
         encoded_features = request.app.state.encoder_service.encode_finalgrade(features)
         
         # Predict
-        prediction = request.app.state.predictor_service.predict_final_grade(encoded_features)
+        prediction = await request.app.state.prediction_batcher.predict_final_grade(encoded_features)
         
-        return PredictionResponse(
+        return FastJSONResponse(PredictionResponse(
             success=True,
             prediction=prediction,
             message="Final result predicted successfully"
-        )
+        ))
         
-    except HTTPException:
+    except (HTTPException, DeadlineExceeded):
         raise
     except Exception as e:
         logger.exception(f"Error predicting final result: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/predict/dropout", response_model=PredictionResponse, responses={500: {"model": ErrorResponse}})
+@router.post(
+    "/predict/dropout",
+    response_model=PredictionResponse,
+    responses={504: {"description": "Deadline exceeded"}, 500: {"model": ErrorResponse}},
+    dependencies=[predict_deadline],
+)
 async def predict_dropout(body: DropoutRequest, request: Request):
     """
     Predict apakah mahasiswa akan dropout
@@ -72,15 +93,15 @@ async def predict_dropout(body: DropoutRequest, request: Request):
         encoded_features = request.app.state.encoder_service.encode_dropout(features)
         
         # Predict
-        prediction = request.app.state.predictor_service.predict_dropout(encoded_features)
+        prediction = await request.app.state.prediction_batcher.predict_dropout(encoded_features)
         
-        return PredictionResponse(
+        return FastJSONResponse(PredictionResponse(
             success=True,
             prediction=prediction,
             message="Dropout predicted successfully"
-        )
+        ))
         
-    except HTTPException:
+    except (HTTPException, DeadlineExceeded):
         raise
     except Exception as e:
         logger.exception(f"Error predicting dropout: {e}")
@@ -101,7 +122,176 @@ async def get_models_status(request: Request):
     )
 
 
-@router.post("/predict/dropout/{id}", response_model=PredictionResponse, responses={404: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
+@router.get("/models/batching")
+async def get_batching_stats(request: Request):
+    """Get metrics micro-batching (ukuran batch yang tercapai per model) dan inference executor"""
+    return {
+        "success": True,
+        "data": {
+            **request.app.state.prediction_batcher.get_stats(),
+            "executor": request.app.state.inference_executor.get_stats(),
+        },
+    }
+
+
+@router.get("/admission")
+async def get_admission_stats(request: Request):
+    """Metrics admission control: slot terpakai (worker ini dan cluster), antrian, request yang ditolak"""
+    return {"success": True, "data": await request.app.state.admission.get_stats()}
+
+
+def _get_stored_prediction(request: Request, id: int) -> Optional[Dict[str, Any]]:
+    """Prediksi tersimpan dari scoring job, None kalau belum ada atau tabel belum tersedia"""
+    try:
+        return request.app.state.scoring_job.get_stored_prediction(id)
+    except Exception as e:
+        logger.warning(f"Stored prediction lookup failed for student ID {id}: {e}")
+        return None
+
+
+async def _get_student_features(request: Request, id: int) -> Dict[str, Any]:
+    """Fitur enrollment terbaru dari query yang sama dengan prediksi bulk dan scoring job, 404 kalau tidak ada"""
+    features = await run_in_threadpool(request.app.state.bulk_prediction.get_student_features, id)
+    if not features:
+        raise HTTPException(
+            status_code=404, 
+            detail=f"Student with ID {id} not found in database"
+        )
+    logger.info(f"Fetched student features for ID {id}: {features}")
+    return features
+
+
+@router.post(
+    "/predict/scoring-job",
+    status_code=202,
+    responses={403: {"description": "Invalid admin token"}, 409: {"model": ErrorResponse}},
+    dependencies=[Depends(require_admin_token)],
+)
+async def run_scoring_job(request: Request, background_tasks: BackgroundTasks):
+    """
+    Jalankan scoring job seluruh populasi di background
+    
+    Hasil disimpan di tabel student_predictions dan dipakai oleh KPI 6 serta endpoint prediksi by ID.
+    Header X-Admin-Token wajib (seperti /api/kpi/cache/flush); satu run per proses dan per database (409 kalau sedang jalan).
+    """
+    scoring_job = request.app.state.scoring_job
+    if scoring_job.is_running:
+        raise HTTPException(status_code=409, detail="Scoring job is already running")
+    background_tasks.add_task(scoring_job.run)
+    return {"success": True, "message": "Scoring job started"}
+
+
+@router.get("/predict/scoring-job")
+async def get_scoring_job_status(request: Request):
+    """Get status scoring job dan run terakhir yang selesai"""
+    try:
+        return {"success": True, "data": request.app.state.scoring_job.get_status()}
+    except Exception as e:
+        logger.exception(f"Error getting scoring job status: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get(
+    "/predict/export",
+    responses={200: {"content": {"application/x-ndjson": {}, "text/csv": {}}}, 503: {"description": "Models not loaded or server busy"}},
+    # Slot dipegang sampai body selesai di-stream (dependency yield keluar setelah response terkirim)
+    dependencies=[Depends(admission_dependency("predict_export"))],
+)
+async def export_predictions(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Format file: ndjson atau csv"),
+    code_module: List[str] = Query([], description="Kode modul, boleh diulang atau dipisah koma"),
+    code_presentation: List[str] = Query([], description="Kode presentasi, boleh diulang atau dipisah koma"),
+):
+    """
+    Download prediksi dropout dan final result untuk seluruh mahasiswa satu cohort
+    
+    - **format**: ndjson (default) atau csv
+    - **code_module** / **code_presentation**: Cohort, kosong = seluruh mahasiswa
+    
+    Baris di-stream per chunk (server-side cursor, di-score vectorized), memory tetap konstan berapapun jumlah mahasiswa.
+    Mahasiswa dengan fitur yang tidak bisa di-encode tetap ada dengan prediksi kosong.
+    """
+    try:
+        kpi_filter = KPIFilter(code_module=code_module, code_presentation=code_presentation)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    if not request.app.state.model_service.is_ready():
+        raise HTTPException(status_code=503, detail="Models are not loaded")
+    
+    cohort = "-".join("".join(ch for ch in code if ch.isalnum()) for code in (*kpi_filter.code_module, *kpi_filter.code_presentation))
+    filename = f"predictions-{cohort or 'all'}.{format}"
+    return StreamingResponse(
+        request.app.state.scoring_export.iter_export(kpi_filter, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+async def _predict_by_ids(request: Request, model_name: str, ids: List[int], label: str) -> FastJSONResponse:
+    """Prediksi banyak id_student lewat BulkPredictionService (blocking, dijalankan di thread pool)"""
+    try:
+        predictions, not_found, invalid, stored = await run_in_threadpool(
+            request.app.state.bulk_prediction.predict, model_name, ids
+        )
+        return FastJSONResponse(BulkPredictionResponse(
+            success=True,
+            predictions=predictions,
+            not_found=not_found,
+            invalid=invalid,
+            message=f"{label} predicted for {len(predictions)} of {len(predictions) + len(not_found) + len(invalid)} students ({stored} from stored scores)"
+        ))
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.exception(f"Error predicting {label.lower()} for {len(ids)} student IDs: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Route by-ids harus dideklarasikan sebelum /{id}, kalau tidak "by-ids" ditangkap sebagai id (422)
+@router.post(
+    "/predict/dropout/by-ids",
+    response_model=BulkPredictionResponse,
+    responses={503: {"description": "Server busy"}, 504: {"description": "Deadline exceeded"}, 500: {"model": ErrorResponse}},
+    dependencies=[Depends(admission_dependency("predict_by_id")), predict_deadline],
+)
+async def predict_dropout_by_student_ids(body: BulkPredictionRequest, request: Request):
+    """
+    Predict dropout untuk banyak mahasiswa sekaligus (maks PREDICT_BULK_MAX_IDS id)
+    
+    - **ids**: Daftar id_student
+    
+    Fitur diambil dengan satu query IN (...) per chunk, bukan satu query per mahasiswa.
+    Hasil per id_student; id yang tidak ada di database ada di not_found.
+    """
+    return await _predict_by_ids(request, DROPOUT_MODEL, body.ids, "Dropout")
+
+
+@router.post(
+    "/predict/final-result/by-ids",
+    response_model=BulkPredictionResponse,
+    responses={503: {"description": "Server busy"}, 504: {"description": "Deadline exceeded"}, 500: {"model": ErrorResponse}},
+    dependencies=[Depends(admission_dependency("predict_by_id")), predict_deadline],
+)
+async def predict_final_result_by_student_ids(body: BulkPredictionRequest, request: Request):
+    """
+    Predict final result untuk banyak mahasiswa sekaligus (maks PREDICT_BULK_MAX_IDS id)
+    
+    - **ids**: Daftar id_student
+    
+    Fitur diambil dengan satu query IN (...) per chunk, bukan satu query per mahasiswa.
+    Hasil per id_student; id yang tidak ada di database ada di not_found.
+    """
+    return await _predict_by_ids(request, FINAL_GRADE_MODEL, body.ids, "Final result")
+
+
+@router.post(
+    "/predict/dropout/{id}",
+    response_model=PredictionResponse,
+    responses={404: {"model": ErrorResponse}, 503: {"description": "Server busy"}, 504: {"description": "Deadline exceeded"}, 500: {"model": ErrorResponse}},
+    # Deadline dihitung setelah dapat slot, waktu antri dibatasi ADMISSION_QUEUE_TIMEOUT_SECONDS
+    dependencies=[Depends(admission_dependency("predict_by_id")), predict_deadline],
+)
 async def predict_dropout_by_student_id(id: int, request: Request):
     """
     Predict dropout berdasarkan ID mahasiswa dari database
@@ -109,71 +299,43 @@ async def predict_dropout_by_student_id(id: int, request: Request):
     - **id**: ID mahasiswa (id_student) di database
     """
     try:
-        # Query student data dari database
-        query = """
-            SELECT 
-                si.code_module,
-                si.code_presentation,
-                si.gender,
-                si.region,
-                si.highest_education,
-                si.imd_band,
-                si.age_band,
-                si.num_of_prev_attempts,
-                si.studied_credits,
-                si.disability
-            FROM studentinfo si
-            WHERE si.id_student = %s
-            LIMIT 1
-        """
-        
-        student_data = db.execute_one(query, (id,))
-        
-        if not student_data:
-            raise HTTPException(
-                status_code=404, 
-                detail=f"Student with ID {id} not found in database"
-            )
-        
-        logger.info(f"Fetched student data for ID {id}: {student_data}")
-        
-        # Convert disability dari integer ke string (N/Y)
-        disability = 'Y' if student_data['disability'] == 1 else 'N'
-        
-        # Prepare features untuk prediction
-        features = {
-            "code_module": student_data['code_module'],
-            "code_presentation": student_data['code_presentation'],
-            "gender": student_data['gender'],
-            "region": student_data['region'],
-            "highest_education": student_data['highest_education'],
-            "imd_band": student_data['imd_band'],
-            "age_band": student_data['age_band'],
-            "num_of_prev_attempts": int(student_data['num_of_prev_attempts']),
-            "studied_credits": int(student_data['studied_credits']),
-            "disability": disability
-        }
+        # Pakai prediksi tersimpan dari scoring job kalau ada
+        stored = _get_stored_prediction(request, id)
+        if stored:
+            return FastJSONResponse(PredictionResponse(
+                success=True,
+                prediction=int(stored['dropout_prediction']),
+                message=f"Dropout prediction for student ID {id} served from stored scores (model version {stored['model_version']})"
+            ))
+        
+        features = await _get_student_features(request, id)
         
         # Encode features
         encoded_features = request.app.state.encoder_service.encode_dropout(features)
         
         # Predict
-        prediction = request.app.state.predictor_service.predict_dropout(encoded_features)
+        prediction = await request.app.state.prediction_batcher.predict_dropout(encoded_features)
         
-        return PredictionResponse(
+        return FastJSONResponse(PredictionResponse(
             success=True,
             prediction=prediction,
             message=f"Dropout prediction for student ID {id} completed successfully"
-        )
+        ))
         
-    except HTTPException:
+    except (HTTPException, DeadlineExceeded):
         raise
     except Exception as e:
         logger.exception(f"Error predicting dropout for student ID {id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/predict/final-result/{id}", response_model=PredictionResponse, responses={404: {"model": ErrorResponse}, 500: {"model": ErrorResponse}})
+@router.post(
+    "/predict/final-result/{id}",
+    response_model=PredictionResponse,
+    responses={404: {"model": ErrorResponse}, 503: {"description": "Server busy"}, 504: {"description": "Deadline exceeded"}, 500: {"model": ErrorResponse}},
+    # Deadline dihitung setelah dapat slot, waktu antri dibatasi ADMISSION_QUEUE_TIMEOUT_SECONDS
+    dependencies=[Depends(admission_dependency("predict_by_id")), predict_deadline],
+)
 async def predict_final_result_by_student_id(id: int, request: Request):
     """
     Predict final result berdasarkan ID mahasiswa dari database
@@ -181,58 +343,30 @@ async def predict_final_result_by_student_id(id: int, request: Request):
     - **id**: ID mahasiswa (id_student) di database
     """
     try:
-        # Query student data dan agregasi dari database
-        query = """
-            SELECT 
-                si.gender,
-                si.age_band,
-                si.studied_credits,
-                si.num_of_prev_attempts,
-                COALESCE(SUM(sv.sum_click), 0) as total_clicks,
-                COALESCE(AVG(sa.score), 0) as avg_assessment_score
-            FROM studentinfo si
-            LEFT JOIN studentvle sv ON si.id_student = sv.id_student 
-                AND si.code_module = sv.code_module 
-                AND si.code_presentation = sv.code_presentation
-            LEFT JOIN studentassessment sa ON si.id_student = sa.id_student
-            WHERE si.id_student = %s
-            GROUP BY si.id_student, si.gender, si.age_band, si.studied_credits, si.num_of_prev_attempts
-            LIMIT 1
-        """
-        
-        student_data = db.execute_one(query, (id,))
-        
-        if not student_data:
-            raise HTTPException(
-                status_code=404, 
-                detail=f"Student with ID {id} not found in database"
-            )
-        
-        logger.info(f"Fetched student data for ID {id}: {student_data}")
-        
-        # Prepare features untuk prediction
-        features = {
-            "gender": student_data['gender'],
-            "age_band": student_data['age_band'],
-            "studied_credits": int(student_data['studied_credits']),
-            "num_of_prev_attempts": int(student_data['num_of_prev_attempts']),
-            "total_clicks": int(student_data['total_clicks']),
-            "avg_assessment_score": float(student_data['avg_assessment_score'])
-        }
+        # Pakai prediksi tersimpan dari scoring job kalau ada
+        stored = _get_stored_prediction(request, id)
+        if stored:
+            return FastJSONResponse(PredictionResponse(
+                success=True,
+                prediction=stored['final_result_prediction'],
+                message=f"Final result prediction for student ID {id} served from stored scores (model version {stored['model_version']})"
+            ))
+        
+        features = await _get_student_features(request, id)
         
         # Encode features
         encoded_features = request.app.state.encoder_service.encode_finalgrade(features)
         
         # Predict
-        prediction = request.app.state.predictor_service.predict_final_grade(encoded_features)
+        prediction = await request.app.state.prediction_batcher.predict_final_grade(encoded_features)
         
-        return PredictionResponse(
+        return FastJSONResponse(PredictionResponse(
             success=True,
             prediction=prediction,
             message=f"Final result prediction for student ID {id} completed successfully"
-        )
+        ))
         
-    except HTTPException:
+    except (HTTPException, DeadlineExceeded):
         raise
     except Exception as e:
         logger.exception(f"Error predicting final result for student ID {id}: {e}")
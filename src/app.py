@@ -1,14 +1,31 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 from services.model_service import model_service
 from services.encoder_service import EncoderService
 from services.predictor_service import PredictorService
 from services.kpi_service import KPIService
+from services.inference_executor import InferenceExecutor
+from services.prediction_batcher import PredictionBatcher
+from services.scoring_job import StudentScoringJob
+from services.bulk_prediction import BulkPredictionService
+from services.scoring_export import ScoringExportService
+from services.at_risk import AtRiskService
+from services.kpi_engine import KPIAggregationEngine
+from services.kpi_timeseries import KPITimeseriesService
+from services.kpi_snapshot import KPISnapshotStore
+from services.kpi_broadcaster import KPIBroadcaster
 from api import router
 from api import kpi_router
 from core.database import db
 from core.cache import cache
+from core.async_cache import async_cache
+from core.compression import CompressionMiddleware
+from core.responses import FastJSONResponse
+from core.admission import AdmissionController
+from core.deadline import DeadlineExceeded, deadline_exceeded_handler
+from core.threads import to_thread_joined
 from core.logging import logger
 from datetime import datetime
 from config import settings
@@ -58,11 +75,42 @@ async def lifespan(app: FastAPI):
     logger.info("Initializing services...")
     encoder_service = EncoderService()
     predictor_service = PredictorService()
+    inference_executor = InferenceExecutor(predictor_service)
+    inference_executor.start()
+    scoring_job = StudentScoringJob(encoder_service, inference_executor)
+    try:
+        scoring_job.ensure_schema()
+    except Exception as e:
+        logger.warning(f"Failed to ensure student_predictions schema: {e}")
+    kpi_engine = KPIAggregationEngine()
+    if kpi_engine.enabled:
+        try:
+            kpi_engine.ensure_schema()
+        except Exception as e:
+            logger.warning(f"Failed to prepare incremental KPI engine, using full queries: {e}")
+    snapshot_store = KPISnapshotStore()
+    try:
+        snapshot_store.ensure_schema()
+    except Exception as e:
+        logger.warning(f"Failed to ensure kpi_snapshots schema, snapshots disabled: {e}")
+        snapshot_store.enabled = False
+    kpi_broadcaster = KPIBroadcaster(redis_client=async_cache.redis_client, sync_cache=cache)
+    await kpi_broadcaster.start()
     kpi_service = KPIService(
         cache_ttl_seconds=settings.KPI_CACHE_TTL_SECONDS, 
         encoder_service=encoder_service, 
-        predictor_service=predictor_service
+        predictor_service=predictor_service,
+        inference_executor=inference_executor,
+        scoring_job=scoring_job,
+        kpi_engine=kpi_engine,
+        snapshot_store=snapshot_store,
+        broadcaster=kpi_broadcaster
     )
+    kpi_timeseries = KPITimeseriesService(cache_ttl_seconds=settings.KPI_CACHE_TTL_SECONDS, kpi_engine=kpi_engine)
+    prediction_batcher = PredictionBatcher(inference_executor)
+    bulk_prediction = BulkPredictionService(encoder_service, inference_executor, scoring_job)
+    scoring_export = ScoringExportService(scoring_job)
+    at_risk = AtRiskService(scoring_job, scoring_export, cache_ttl_seconds=settings.KPI_CACHE_TTL_SECONDS)
     logger.success(f"Services initialized. KPI cache TTL: {settings.KPI_CACHE_TTL_SECONDS}s")
 
     import api.router as router_module
@@ -70,29 +118,93 @@ async def lifespan(app: FastAPI):
     app.state.model_service = model_service
     app.state.encoder_service = encoder_service
     app.state.predictor_service = predictor_service
+    app.state.inference_executor = inference_executor
     app.state.kpi_service = kpi_service
+    app.state.prediction_batcher = prediction_batcher
+    app.state.bulk_prediction = bulk_prediction
+    app.state.scoring_export = scoring_export
+    app.state.at_risk = at_risk
+    app.state.scoring_job = scoring_job
+    app.state.kpi_engine = kpi_engine
+    app.state.kpi_timeseries = kpi_timeseries
+    app.state.kpi_broadcaster = kpi_broadcaster
     app.state.cache = cache
+    app.state.async_cache = async_cache
+    # Slot dan token bucket di Redis yang sama dengan async cache (circuit breaker dipakai bersama)
+    app.state.admission = AdmissionController(redis_client=async_cache.redis_client, breaker=async_cache.breaker)
     logger.success("All services registered to app state.")
     
-    # Preload KPI cache on startup
-    logger.info("Preloading KPI cache...")
-    try:
-        kpis = kpi_service.get_all_kpis()
-        logger.success(f"KPI cache preloaded with {len(kpis)} KPIs")
-    except Exception as e:
-        logger.error(f"Failed to preload KPI cache: {e}")
-        # Continue startup even if cache preload fails
+    # Preload KPI cache on startup: snapshot langsung disajikan, refresh validasi jalan di background
+    refresh_task = None
+    if kpi_service.restore_snapshot():
+        refresh_task = asyncio.create_task(to_thread_joined(kpi_service.get_all_kpis, True))
+        logger.info("KPI snapshot served, refreshing in background")
+    else:
+        logger.info("Preloading KPI cache...")
+        try:
+            kpis = kpi_service.get_all_kpis()
+            logger.success(f"KPI cache preloaded with {len(kpis)} KPIs")
+        except Exception as e:
+            logger.error(f"Failed to preload KPI cache: {e}")
+            # Continue startup even if cache preload fails
+
+    # Heartbeat key per-instance (kpi:instance:<id>:info), dihapus lagi saat shutdown
+    async def instance_heartbeat():
+        while True:
+            # SET/EXPIRE Redis sync (bisa menunggu socket timeout saat Redis lambat), jangan di event loop
+            await to_thread_joined(cache.register_instance, settings.CACHE_INSTANCE_TTL_SECONDS)
+            await asyncio.sleep(max(1, settings.CACHE_INSTANCE_TTL_SECONDS // 2))
+
+    heartbeat_task = asyncio.create_task(instance_heartbeat())
+
+    # Refresh periodik slice KPI yang punya client /api/kpi/stream; hasil baru di-push lewat pub/sub
+    async def stream_refresh():
+        while True:
+            await asyncio.sleep(settings.KPI_STREAM_REFRESH_SECONDS)
+            try:
+                await to_thread_joined(kpi_broadcaster.refresh_active, kpi_service, settings.KPI_STREAM_REFRESH_SECONDS)
+            except Exception as e:
+                logger.warning(f"KPI stream refresh failed: {e}")
+
+    stream_refresh_task = asyncio.create_task(stream_refresh())
+
+    # Scoring job seluruh populasi di background
+    scoring_task = None
+    if settings.SCORING_JOB_INTERVAL_SECONDS > 0:
+        def on_scoring_complete():
+            kpi_service.clear_cache()
+            at_risk.clear_cache()
+
+        scoring_task = asyncio.create_task(
+            scoring_job.run_periodically(settings.SCORING_JOB_INTERVAL_SECONDS, on_complete=on_scoring_complete)
+        )
+        logger.info(f"Scoring job scheduled every {settings.SCORING_JOB_INTERVAL_SECONDS}s")
 
     yield
 
     # Shutdown
     logger.info("Shutting down the application...")
-    logger.info("Clearing cache on shutdown...")
+    # Sinyal stop ke thread background, lalu tunggu thread-nya selesai sebelum executor dan cache ditutup
+    scoring_job.stop()
+    kpi_broadcaster.stop_refresh()
+    # Heartbeat ikut ditunggu: register_instance yang masih jalan tidak boleh membuat ulang key setelah clear_instance
+    background_tasks = [
+        task for task in (scoring_task, refresh_task, stream_refresh_task, heartbeat_task) if task is not None
+    ]
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await prediction_batcher.stop()
+    inference_executor.shutdown()
+    await kpi_broadcaster.stop()
+    # Hanya key milik worker ini; key KPI shared tetap dipakai worker/replica lain (flush lewat /api/kpi/cache/flush)
+    logger.info(f"Clearing instance cache keys on shutdown ({cache.instance_id})...")
     try:
-        cache.clear()
-        logger.success("Cache cleared successfully")
+        cache.clear_instance()
+        logger.success("Instance cache keys cleared successfully")
     except Exception as e:
-        logger.warning(f"Failed to clear cache on shutdown: {e}")
+        logger.warning(f"Failed to clear instance cache keys on shutdown: {e}")
+    await async_cache.close()
 
 
 app = FastAPI(
@@ -100,6 +212,8 @@ app = FastAPI(
     description="Backend API for KPI dashboard and ML predictions",
     version="1.0.0",
     lifespan=lifespan,
+    # orjson (NumPy, Decimal); route dengan payload besar mengembalikan FastJSONResponse langsung
+    default_response_class=FastJSONResponse,
 )
 
 app.add_middleware(
@@ -109,6 +223,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# gzip/brotli sesuai Accept-Encoding, body di bawah COMPRESSION_MINIMUM_SIZE tidak dikompres
+app.add_middleware(CompressionMiddleware)
+# Deadline request habis (DB/inference dihentikan) = 504
+app.add_exception_handler(DeadlineExceeded, deadline_exceeded_handler)
 
 # Include routers
 app.include_router(router)
@@ -18,6 +18,26 @@ DROPOUT_MODEL_PATH = ML_DIR / os.getenv("DROPOUT_MODEL_PATH", "dropout_model.pkl
 LABEL_ENCODER_FINALGRADE_PATH = ML_DIR / os.getenv("LABEL_ENCODER_FINALGRADE_PATH", "label_encoder_finalgrade.pkl")
 LABEL_ENCODER_DROPOUT_PATH = ML_DIR / os.getenv("LABEL_ENCODER_DROPOUT_PATH", "label_encoder_dropout.pkl")
 
+# Inference backend: "sklearn" (default) atau "numpy" (compiled forest)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "sklearn").lower()
+# Batch lebih besar dari ini tetap pakai sklearn walaupun backend numpy
+INFERENCE_NUMPY_MAX_BATCH = int(os.getenv("INFERENCE_NUMPY_MAX_BATCH", "256"))
+
+# Inference executor: "inline" (event loop thread) atau "process" (process pool)
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "inline").lower()
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", str(os.cpu_count() or 1)))
+# Batch dengan jumlah baris >= ini dikirim ke worker lewat shared memory
+INFERENCE_SHM_MIN_ROWS = int(os.getenv("INFERENCE_SHM_MIN_ROWS", "2048"))
+
+# Micro-batching untuk single-item predictions
+PREDICT_BATCH_ENABLED = os.getenv("PREDICT_BATCH_ENABLED", "True").lower() == "true"
+PREDICT_BATCH_MAX_SIZE = int(os.getenv("PREDICT_BATCH_MAX_SIZE", "64"))
+PREDICT_BATCH_MAX_WAIT_MS = float(os.getenv("PREDICT_BATCH_MAX_WAIT_MS", "3"))
+
+# Prediksi banyak id_student sekaligus (/api/predict/*/by-ids): maksimum id per request dan id per query IN (...)
+PREDICT_BULK_MAX_IDS = int(os.getenv("PREDICT_BULK_MAX_IDS", "1000"))
+PREDICT_BULK_QUERY_CHUNK_SIZE = int(os.getenv("PREDICT_BULK_QUERY_CHUNK_SIZE", "500"))
+
 # API Settings
 API_VERSION = os.getenv("API_VERSION", "1.0.0")
 API_TITLE = os.getenv("API_TITLE", "Capstone KPI & ML API")
@@ -28,6 +48,12 @@ HOST = os.getenv("HOST", "0.0.0.0")
 PORT = int(os.getenv("PORT", "8000"))
 DEBUG = os.getenv("DEBUG", "True").lower() == "true"
 
+# Kompresi response (gzip, brotli kalau package brotli terpasang); body di bawah minimum dikirim apa adanya
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))  # bytes
+# Level per-request (body KPI di-cache sudah dikompres sekali per refresh dengan level maksimum)
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
 # Logging
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 LOG_FILE = BASE_DIR / "logs" / os.getenv("LOG_FILE", "app.log")
@@ -44,14 +70,83 @@ DB_POOL_MIN_CACHED = int(os.getenv("DB_POOL_MIN_CACHED", "2"))
 DB_POOL_MAX_CACHED = int(os.getenv("DB_POOL_MAX_CACHED", "5"))
 DB_POOL_MAX_CONNECTIONS = int(os.getenv("DB_POOL_MAX_CONNECTIONS", "10"))
 
+# Streaming query (server-side cursor): jumlah baris per chunk dan net_write_timeout session
+DB_STREAM_CHUNK_SIZE = int(os.getenv("DB_STREAM_CHUNK_SIZE", "5000"))
+DB_STREAM_NET_WRITE_TIMEOUT = int(os.getenv("DB_STREAM_NET_WRITE_TIMEOUT", "600"))
+
 # Redis Configuration
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 REDIS_DB = int(os.getenv("REDIS_DB", "0"))
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", "")
+# Async Redis client (redis.asyncio): pool, timeout fail-fast dan circuit breaker
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "20"))
+REDIS_SOCKET_TIMEOUT_SECONDS = float(os.getenv("REDIS_SOCKET_TIMEOUT_SECONDS", "0.5"))
+CACHE_BREAKER_FAILURE_THRESHOLD = int(os.getenv("CACHE_BREAKER_FAILURE_THRESHOLD", "3"))
+CACHE_BREAKER_RESET_SECONDS = float(os.getenv("CACHE_BREAKER_RESET_SECONDS", "10"))
+ASYNC_CACHE_LOCAL_MAX_ENTRIES = int(os.getenv("ASYNC_CACHE_LOCAL_MAX_ENTRIES", "1024"))
+# ID worker untuk key per-instance (default: hostname:pid), heartbeat di-refresh setiap setengah TTL
+CACHE_INSTANCE_ID = os.getenv("CACHE_INSTANCE_ID", "")
+CACHE_INSTANCE_TTL_SECONDS = int(os.getenv("CACHE_INSTANCE_TTL_SECONDS", "300"))
+# Token endpoint admin (header X-Admin-Token): /api/kpi/cache/flush, /api/kpi/engine/recompute, POST /api/predict/scoring-job; kosong = endpoint admin nonaktif
+CACHE_ADMIN_TOKEN = os.getenv("CACHE_ADMIN_TOKEN", "")
+
+# Admission control endpoint mahal: slot concurrency per route (seluruh worker lewat Redis) dan antrian per worker
+ADMISSION_KPI_REFRESH_CONCURRENCY = int(os.getenv("ADMISSION_KPI_REFRESH_CONCURRENCY", "2"))  # /api/kpi/metrics?refresh=true
+ADMISSION_KPI_REFRESH_QUEUE = int(os.getenv("ADMISSION_KPI_REFRESH_QUEUE", "10"))
+ADMISSION_PREDICT_BY_ID_CONCURRENCY = int(os.getenv("ADMISSION_PREDICT_BY_ID_CONCURRENCY", "8"))  # /api/predict/*/{id}
+ADMISSION_PREDICT_BY_ID_QUEUE = int(os.getenv("ADMISSION_PREDICT_BY_ID_QUEUE", "50"))
+ADMISSION_PREDICT_EXPORT_CONCURRENCY = int(os.getenv("ADMISSION_PREDICT_EXPORT_CONCURRENCY", "2"))  # /api/predict/export
+ADMISSION_PREDICT_EXPORT_QUEUE = int(os.getenv("ADMISSION_PREDICT_EXPORT_QUEUE", "5"))
+# Request di antrian lebih lama dari ini ditolak 503 (Retry-After)
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "10"))
+# Umur lease slot di Redis (slot worker yang mati dilepas otomatis), harus > durasi request terlama
+ADMISSION_LEASE_SECONDS = int(os.getenv("ADMISSION_LEASE_SECONDS", "120"))
+# Token bucket force-refresh per client (429 kalau habis)
+ADMISSION_REFRESH_RATE_PER_MINUTE = float(os.getenv("ADMISSION_REFRESH_RATE_PER_MINUTE", "2"))
+ADMISSION_REFRESH_BURST = int(os.getenv("ADMISSION_REFRESH_BURST", "3"))
+# Deadline per request (detik, 0 = tanpa deadline): dibawa ke MySQL (MAX_EXECUTION_TIME, read timeout) dan inference, habis = 504
+REQUEST_DEADLINE_KPI_SECONDS = float(os.getenv("REQUEST_DEADLINE_KPI_SECONDS", "30"))  # /api/kpi/metrics, timeseries
+REQUEST_DEADLINE_PREDICT_SECONDS = float(os.getenv("REQUEST_DEADLINE_PREDICT_SECONDS", "10"))  # /api/predict/*
 
 # KPI Cache Configuration
 KPI_CACHE_TTL_SECONDS = int(os.getenv("KPI_CACHE_TTL_SECONDS", "300"))  # Default: 5 menit
+# TTL bucket timeseries yang sudah tertutup (tidak berubah lagi), bucket terbuka pakai KPI_CACHE_TTL_SECONDS
+KPI_TIMESERIES_CLOSED_TTL_SECONDS = int(os.getenv("KPI_TIMESERIES_CLOSED_TTL_SECONDS", "604800"))  # Default: 7 hari
+# Maksimum kode per filter code_module / code_presentation (setiap kombinasi filter = satu cache key)
+KPI_FILTER_MAX_CODES = int(os.getenv("KPI_FILTER_MAX_CODES", "20"))
+
+# Snapshot KPI di tabel kpi_snapshots: ditulis setiap refresh, di-load saat startup (cold start tanpa query berat)
+KPI_SNAPSHOT_ENABLED = os.getenv("KPI_SNAPSHOT_ENABLED", "True").lower() == "true"
+KPI_SNAPSHOT_MAX_AGE_SECONDS = int(os.getenv("KPI_SNAPSHOT_MAX_AGE_SECONDS", "86400"))  # 0 = tanpa batas umur
+
+# Push KPI ke dashboard lewat SSE (/api/kpi/stream), fan-out antar worker lewat Redis pub/sub
+KPI_STREAM_CHANNEL = os.getenv("KPI_STREAM_CHANNEL", "kpi:updates")
+KPI_STREAM_MAX_CLIENTS = int(os.getenv("KPI_STREAM_MAX_CLIENTS", "1000"))  # Per worker
+KPI_STREAM_HEARTBEAT_SECONDS = int(os.getenv("KPI_STREAM_HEARTBEAT_SECONDS", "15"))
+# Interval refresh background slice yang punya client stream, 0 = ikut KPI_CACHE_TTL_SECONDS
+KPI_STREAM_REFRESH_SECONDS = int(os.getenv("KPI_STREAM_REFRESH_SECONDS", "0")) or KPI_CACHE_TTL_SECONDS
+
+# KPI 1-5 engine: "full" (query tabel fakta setiap refresh) atau "incremental" (rollup tables + high-water mark)
+# Mode incremental butuh kolom row_id di studentvle/studentassessment (scripts/migrate_kpi_engine.py)
+KPI_ENGINE = os.getenv("KPI_ENGINE", "full").lower()
+# Gap row_id di bawah watermark yang tidak terisi selama ini dianggap rollback (transaksi insert lebih lama tidak ter-rollup)
+KPI_ENGINE_GAP_SETTLE_SECONDS = int(os.getenv("KPI_ENGINE_GAP_SETTLE_SECONDS", "600"))
 
 # Sample Size buat dimasukin model
-SAMPLE_SIZE = float(os.getenv("SAMPLE_SIZE", "0.2"))  
\ No newline at end of file
+SAMPLE_SIZE = float(os.getenv("SAMPLE_SIZE", "0.2"))  
+# Metode sampling KPI 6: hash (deterministik per id_student), stratified (per module/presentation), random (ORDER BY RAND)
+SAMPLING_METHOD = os.getenv("SAMPLING_METHOD", "hash")
+# Seed hash sampling, sample sama selama seed tidak diganti
+SAMPLING_SEED = os.getenv("SAMPLING_SEED", "capstone")
+
+# Scoring job seluruh populasi (hasil disimpan di tabel student_predictions)
+SCORING_JOB_CHUNK_SIZE = int(os.getenv("SCORING_JOB_CHUNK_SIZE", "5000"))
+# Interval run otomatis dalam detik, 0 = hanya manual lewat endpoint
+SCORING_JOB_INTERVAL_SECONDS = int(os.getenv("SCORING_JOB_INTERVAL_SECONDS", "3600"))
+# Chunk pertama /api/predict/export (baris), lebih kecil dari SCORING_JOB_CHUNK_SIZE supaya byte pertama cepat keluar
+PREDICT_EXPORT_FIRST_CHUNK_SIZE = int(os.getenv("PREDICT_EXPORT_FIRST_CHUNK_SIZE", "200"))
+
+# Daftar top-K mahasiswa berisiko (/api/kpi/at-risk): panjang list yang dihitung + di-cache per filter
+AT_RISK_MAX_TOP = int(os.getenv("AT_RISK_MAX_TOP", "500"))
+AT_RISK_DEFAULT_TOP = int(os.getenv("AT_RISK_DEFAULT_TOP", "20"))
@@ -0,0 +1,275 @@
+"""
+Admission control untuk endpoint mahal (force refresh KPI, prediksi by ID)
+Slot concurrency per route dan token bucket per client disimpan di Redis (berlaku untuk semua worker),
+fallback ke state per worker selama Redis tidak tersedia
+"""
+import asyncio
+import hmac
+import math
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from fastapi import Header, HTTPException, Request
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from core.circuit_breaker import CircuitBreaker
+from core.logging import logger
+from config import settings
+
+# Lease slot: sorted set member = lease id, score = waktu expire (lease worker yang crash hilang sendiri)
+ACQUIRE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), ARGV[3])
+redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[2])) + 1)
+return 1
+"""
+
+# Token bucket: hash {tokens, ts}; return {allowed, retry_after detik (string, Lua number jadi integer)}
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+
+def client_id(request: Request) -> str:
+    """Identitas client untuk rate limit (alamat client; di belakang proxy jalankan uvicorn --proxy-headers)"""
+    return request.client.host if request.client else "unknown"
+
+
+class AdmissionController:
+    """Semaphore per route + antrian terbatas (load shedding) + token bucket per client"""
+
+    KEY_PREFIX = "admission"
+
+    def __init__(self, redis_client: Optional[Redis] = None, breaker: Optional[CircuitBreaker] = None,
+                 limits: Optional[Dict[str, Tuple[int, int]]] = None, queue_timeout: Optional[float] = None,
+                 lease_seconds: Optional[int] = None, refresh_rate_per_minute: Optional[float] = None,
+                 refresh_burst: Optional[int] = None, poll_interval: float = 0.05):
+        """
+        Args:
+            redis_client: Client redis.asyncio (None = hanya state per worker)
+            breaker: CircuitBreaker untuk Redis (default: breaker baru dari settings)
+            limits: route -> (max concurrent, max antrian per worker) (default dari settings)
+            queue_timeout: Lama maksimal menunggu slot sebelum 503 (default: settings.ADMISSION_QUEUE_TIMEOUT_SECONDS)
+            lease_seconds: Umur lease slot di Redis (default: settings.ADMISSION_LEASE_SECONDS)
+            refresh_rate_per_minute: Token force-refresh per client per menit (default dari settings)
+            refresh_burst: Kapasitas bucket force-refresh (default dari settings)
+            poll_interval: Interval cek slot selama menunggu di antrian (detik)
+        """
+        self.redis_client = redis_client
+        self.breaker = breaker or CircuitBreaker(
+            "redis-admission",
+            failure_threshold=settings.CACHE_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=settings.CACHE_BREAKER_RESET_SECONDS,
+        )
+        self.limits = limits or {
+            "kpi_refresh": (settings.ADMISSION_KPI_REFRESH_CONCURRENCY, settings.ADMISSION_KPI_REFRESH_QUEUE),
+            "predict_by_id": (settings.ADMISSION_PREDICT_BY_ID_CONCURRENCY, settings.ADMISSION_PREDICT_BY_ID_QUEUE),
+            "predict_export": (settings.ADMISSION_PREDICT_EXPORT_CONCURRENCY, settings.ADMISSION_PREDICT_EXPORT_QUEUE),
+        }
+        self.queue_timeout = settings.ADMISSION_QUEUE_TIMEOUT_SECONDS if queue_timeout is None else queue_timeout
+        self.lease_seconds = settings.ADMISSION_LEASE_SECONDS if lease_seconds is None else lease_seconds
+        self.refresh_rate = (settings.ADMISSION_REFRESH_RATE_PER_MINUTE if refresh_rate_per_minute is None else refresh_rate_per_minute) / 60
+        self.refresh_burst = settings.ADMISSION_REFRESH_BURST if refresh_burst is None else refresh_burst
+        self.poll_interval = poll_interval
+        self._in_flight = {route: 0 for route in self.limits}
+        self._local_in_flight = {route: 0 for route in self.limits}
+        self._waiting = {route: 0 for route in self.limits}
+        self._counters = {route: {"admitted": 0, "queued": 0, "shed": 0, "timed_out": 0} for route in self.limits}
+        self._rate_limited = 0
+        # Token bucket fallback per worker: client -> (tokens, monotonic ts), dibatasi supaya tidak tumbuh tanpa batas
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def _redis(self) -> Optional[Redis]:
+        if self.redis_client is not None and self.breaker.allow_request():
+            return self.redis_client
+        return None
+
+    def slot_key(self, route: str) -> str:
+        return f"{self.KEY_PREFIX}:slots:{route}"
+
+    async def _try_acquire(self, route: str, lease_id: str) -> Optional[str]:
+        """Ambil satu slot; return backend ("redis"/"local") atau None kalau penuh"""
+        max_concurrent = self.limits[route][0]
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                acquired = await redis_client.eval(ACQUIRE_SCRIPT, 1, self.slot_key(route), max_concurrent, self.lease_seconds, lease_id)
+                self.breaker.record_success()
+                return "redis" if acquired else None
+            except (RedisError, OSError) as e:
+                self.breaker.record_failure()
+                logger.warning(f"Admission slot via Redis failed: {e}. Using per-worker limit.")
+        if self._local_in_flight[route] < max_concurrent:
+            self._local_in_flight[route] += 1
+            return "local"
+        return None
+
+    async def _release(self, route: str, lease_id: str, backend: str) -> None:
+        if backend == "local":
+            self._local_in_flight[route] -= 1
+            return
+        try:
+            await self.redis_client.zrem(self.slot_key(route), lease_id)
+        except (RedisError, OSError) as e:
+            # Lease tetap hilang sendiri setelah lease_seconds
+            logger.warning(f"Admission slot release failed: {e}")
+
+    def _reject(self, status_code: int, detail: str, retry_after: float) -> HTTPException:
+        return HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+    @asynccontextmanager
+    async def slot(self, route: str) -> AsyncIterator[None]:
+        """
+        Tahan satu slot concurrency route selama blok berjalan
+
+        Slot penuh: tunggu di antrian (maks queue_timeout). Antrian worker ini penuh atau timeout: 503 + Retry-After.
+        """
+        counters = self._counters[route]
+        lease_id = uuid.uuid4().hex
+        backend = await self._try_acquire(route, lease_id)
+        if backend is None:
+            if self._waiting[route] >= self.limits[route][1]:
+                counters["shed"] += 1
+                raise self._reject(503, f"Server busy ({route}), try again later", self.queue_timeout)
+            counters["queued"] += 1
+            self._waiting[route] += 1
+            try:
+                deadline = time.monotonic() + self.queue_timeout
+                while backend is None:
+                    if time.monotonic() >= deadline:
+                        counters["timed_out"] += 1
+                        raise self._reject(503, f"Server busy ({route}), try again later", self.queue_timeout)
+                    await asyncio.sleep(self.poll_interval)
+                    backend = await self._try_acquire(route, lease_id)
+            finally:
+                self._waiting[route] -= 1
+        counters["admitted"] += 1
+        self._in_flight[route] += 1
+        try:
+            yield
+        finally:
+            self._in_flight[route] -= 1
+            await self._release(route, lease_id, backend)
+
+    async def check_rate(self, client: str) -> None:
+        """Token bucket force-refresh per client; habis = 429 + Retry-After"""
+        allowed, retry_after = await self._take_token(client)
+        if not allowed:
+            self._rate_limited += 1
+            raise self._reject(429, "Too many refresh requests, try again later", retry_after)
+
+    async def _take_token(self, client: str) -> Tuple[bool, float]:
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                allowed, retry_after = await redis_client.eval(
+                    TOKEN_BUCKET_SCRIPT, 1, f"{self.KEY_PREFIX}:refresh:{client}", self.refresh_rate, self.refresh_burst
+                )
+                self.breaker.record_success()
+                return bool(int(allowed)), float(retry_after)
+            except (RedisError, OSError) as e:
+                self.breaker.record_failure()
+                logger.warning(f"Admission rate limit via Redis failed: {e}. Using per-worker bucket.")
+        now = time.monotonic()
+        tokens, ts = self._buckets.pop(client, (float(self.refresh_burst), now))
+        tokens = min(self.refresh_burst, tokens + (now - ts) * self.refresh_rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[client] = (tokens, now)
+        while len(self._buckets) > 10000:
+            self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / self.refresh_rate
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """Metrics per route (worker ini) + slot terpakai di seluruh cluster (Redis)"""
+        routes = {}
+        for route, (max_concurrent, max_queue) in self.limits.items():
+            routes[route] = {
+                "max_concurrent": max_concurrent,
+                "max_queue": max_queue,
+                "in_flight": self._in_flight[route],
+                "waiting": self._waiting[route],
+                **self._counters[route],
+                "cluster_in_flight": await self._cluster_in_flight(route),
+            }
+        return {
+            "backend": "redis" if self._redis_closed() else "local",
+            "circuit": self.breaker.describe(),
+            "routes": routes,
+            "refresh_rate_per_minute": self.refresh_rate * 60,
+            "refresh_burst": self.refresh_burst,
+            "rate_limited": self._rate_limited,
+        }
+
+    def _redis_closed(self) -> bool:
+        """Redis dipakai tanpa mengambil slot probe half-open (untuk stats)"""
+        return self.redis_client is not None and self.breaker.state == CircuitBreaker.STATE_CLOSED
+
+    async def _cluster_in_flight(self, route: str) -> Optional[int]:
+        # Stats hanya baca Redis saat circuit closed: probe half-open milik request yang sebenarnya
+        if not self._redis_closed():
+            return None
+        try:
+            count = await self.redis_client.zcount(self.slot_key(route), time.time(), "+inf")
+            self.breaker.record_success()
+            return count
+        except (RedisError, OSError):
+            self.breaker.record_failure()
+            return None
+
+
+def admission_dependency(route: str):
+    """Dependency FastAPI: satu slot route selama request (Depends(admission_dependency("predict_by_id")))"""
+    async def dependency(request: Request):
+        async with request.app.state.admission.slot(route):
+            yield
+    return dependency
+
+
+async def admit_kpi_refresh(request: Request, refresh: bool = False):
+    """Dependency /api/kpi/metrics: ?refresh=true kena rate limit per client dan slot kpi_refresh, cache hit tidak dibatasi"""
+    if not refresh:
+        yield
+        return
+    admission = request.app.state.admission
+    await admission.check_rate(client_id(request))
+    async with admission.slot("kpi_refresh"):
+        yield
+
+
+async def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """
+    Dependency endpoint admin (flush cache, recompute engine, scoring job manual)
+
+    Header X-Admin-Token wajib sama dengan CACHE_ADMIN_TOKEN; kalau token tidak di-set endpoint ditolak (403).
+    """
+    if not settings.CACHE_ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoint disabled: CACHE_ADMIN_TOKEN is not configured")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), settings.CACHE_ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
@@ -0,0 +1,231 @@
+"""
+Async Redis cache untuk async route handlers (redis.asyncio, connection pool)
+Circuit breaker fail-fast ke in-process tier supaya Redis yang lambat tidak memblok event loop
+"""
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from redis.asyncio import ConnectionPool, Redis
+from redis.exceptions import RedisError
+from core.cache import DecimalEncoder
+from core.circuit_breaker import CircuitBreaker
+from core.logging import logger
+from config import settings
+
+
+class AsyncRedisCache:
+    """Cache async dengan key dan format JSON yang sama seperti RedisCache (sync)"""
+
+    def __init__(self, redis_client: Optional[Redis] = None, breaker: Optional[CircuitBreaker] = None,
+                 local_max_entries: Optional[int] = None, local_ttl: Optional[int] = None):
+        """
+        Args:
+            redis_client: Client redis.asyncio (optional, default pool dari settings, connect saat dipakai)
+            breaker: CircuitBreaker (optional, default dari settings)
+            local_max_entries: Kapasitas in-process tier (default: settings.ASYNC_CACHE_LOCAL_MAX_ENTRIES)
+            local_ttl: TTL salinan in-process untuk value yang dibaca dari Redis (default: settings.KPI_CACHE_TTL_SECONDS)
+        """
+        if redis_client is None:
+            pool = ConnectionPool(
+                host=settings.REDIS_HOST,
+                port=settings.REDIS_PORT,
+                db=settings.REDIS_DB,
+                password=settings.REDIS_PASSWORD if settings.REDIS_PASSWORD else None,
+                decode_responses=True,
+                max_connections=settings.REDIS_MAX_CONNECTIONS,
+                socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+                socket_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+            )
+            redis_client = Redis(connection_pool=pool)
+        self.redis_client = redis_client
+        self.breaker = breaker or CircuitBreaker(
+            "redis-async",
+            failure_threshold=settings.CACHE_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=settings.CACHE_BREAKER_RESET_SECONDS,
+        )
+        self._local_max_entries = settings.ASYNC_CACHE_LOCAL_MAX_ENTRIES if local_max_entries is None else local_max_entries
+        self._local_ttl = settings.KPI_CACHE_TTL_SECONDS if local_ttl is None else local_ttl
+        # In-process tier: key -> (value, expires_at monotonic), write-through, dipakai saat Redis tidak tersedia
+        self._local: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+
+    def _local_get(self, key: str) -> Optional[Any]:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            self._local.pop(key, None)
+            return None
+        return value
+
+    def _local_set(self, key: str, value: Any, ttl: int) -> None:
+        self._local[key] = (value, time.monotonic() + ttl)
+        self._local.move_to_end(key)
+        while len(self._local) > self._local_max_entries:
+            self._local.popitem(last=False)
+
+    def remember(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        """Simpan value hanya di in-process tier (misal hasil yang sudah ditulis ke Redis oleh cache sync)"""
+        self._local_set(key, value, self._local_ttl if ttl is None else ttl)
+
+    def clear_local(self) -> None:
+        """Kosongkan in-process tier worker ini"""
+        self._local.clear()
+
+    async def get(self, key: str) -> Optional[Any]:
+        """
+        Get value from cache (Redis, fallback in-process tier)
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Cached value or None
+        """
+        if self.breaker.allow_request():
+            try:
+                value = await self.redis_client.get(key)
+                self.breaker.record_success()
+                logger.debug(f"Async cache {'HIT' if value else 'MISS'} (Redis): {key}")
+                if not value:
+                    return None
+                value = json.loads(value)
+                self._local_set(key, value, self._local_ttl)
+                return value
+            except (RedisError, OSError) as e:
+                self.breaker.record_failure()
+                logger.warning(f"Async Redis GET error: {e}. Falling back to in-process tier.")
+        return self._local_get(key)
+
+    async def mget(self, keys: List[str]) -> Dict[str, Any]:
+        """
+        Get banyak key dalam satu MGET
+
+        Args:
+            keys: List cache key
+
+        Returns:
+            Dict key -> value untuk key yang ada di cache
+        """
+        if not keys:
+            return {}
+        if self.breaker.allow_request():
+            try:
+                values = await self.redis_client.mget(keys)
+                self.breaker.record_success()
+                return {key: json.loads(value) for key, value in zip(keys, values) if value}
+            except (RedisError, OSError) as e:
+                self.breaker.record_failure()
+                logger.warning(f"Async Redis MGET error: {e}. Falling back to in-process tier.")
+        local = {key: self._local_get(key) for key in keys}
+        return {key: value for key, value in local.items() if value is not None}
+
+    async def mget_raw(self, keys: List[str]) -> Dict[str, str]:
+        """
+        Seperti mget tapi tanpa JSON decoding: value dikembalikan sebagai teks JSON apa adanya
+
+        Args:
+            keys: List cache key
+
+        Returns:
+            Dict key -> string untuk key yang ada di cache
+        """
+        if not keys:
+            return {}
+        if self.breaker.allow_request():
+            try:
+                values = await self.redis_client.mget(keys)
+                self.breaker.record_success()
+                return {key: value for key, value in zip(keys, values) if value}
+            except (RedisError, OSError) as e:
+                self.breaker.record_failure()
+                logger.warning(f"Async Redis MGET error: {e}. Falling back to in-process tier.")
+        raw = {}
+        for key in keys:
+            value = self._local_get(key)
+            if value is not None:
+                raw[key] = value if isinstance(value, str) else json.dumps(value, cls=DecimalEncoder)
+        return raw
+
+    async def set(self, key: str, value: Any, ttl: int = 300) -> bool:
+        """
+        Set value with TTL (in-process tier selalu ditulis)
+
+        Args:
+            key: Cache key
+            value: Value to cache
+            ttl: Time to live in seconds
+
+        Returns:
+            True kalau tersimpan di Redis
+        """
+        return await self.set_many({key: value}, ttl)
+
+    async def set_many(self, items: Dict[str, Any], ttl: int = 300) -> bool:
+        """
+        Set banyak key dengan TTL yang sama dalam satu pipeline
+
+        Args:
+            items: Dict key -> value
+            ttl: Time to live in seconds
+
+        Returns:
+            True kalau tersimpan di Redis
+        """
+        for key, value in items.items():
+            self._local_set(key, value, ttl)
+        if not items or not self.breaker.allow_request():
+            return False
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipeline:
+                for key, value in items.items():
+                    pipeline.setex(key, ttl, json.dumps(value, cls=DecimalEncoder))
+                await pipeline.execute()
+            self.breaker.record_success()
+            logger.debug(f"Async cache SET (Redis): {len(items)} keys [TTL: {ttl}s]")
+            return True
+        except (RedisError, OSError) as e:
+            self.breaker.record_failure()
+            logger.warning(f"Async Redis SET error: {e}. Stored in in-process tier only.")
+            return False
+
+    async def delete(self, *keys: str) -> int:
+        """
+        Delete key dari Redis dan in-process tier
+
+        Returns:
+            Jumlah key yang dihapus di Redis (atau di in-process tier kalau Redis tidak tersedia)
+        """
+        local_deleted = sum(self._local.pop(key, None) is not None for key in keys)
+        if keys and self.breaker.allow_request():
+            try:
+                deleted = await self.redis_client.delete(*keys)
+                self.breaker.record_success()
+                return int(deleted)
+            except (RedisError, OSError) as e:
+                self.breaker.record_failure()
+                logger.warning(f"Async Redis DELETE error: {e}")
+        return local_deleted
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Stats async cache (state circuit breaker dan ukuran in-process tier)"""
+        return {
+            "backend": "redis-async",
+            "circuit": self.breaker.describe(),
+            "local_entries": len(self._local),
+        }
+
+    async def close(self) -> None:
+        """Tutup connection pool (dipanggil saat shutdown)"""
+        # aclose() baru ada sejak redis-py 5.0.1; versi 4.2-5.0.0 hanya punya close() (async)
+        close = getattr(self.redis_client, "aclose", None) or self.redis_client.close
+        try:
+            await close()
+            await self.redis_client.connection_pool.disconnect()
+        except (RedisError, OSError) as e:
+            logger.warning(f"Failed to close async Redis client: {e}")
+
+
+# Global async cache instance
+async_cache = AsyncRedisCache()
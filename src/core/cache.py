@@ -2,11 +2,18 @@
 Redis cache implementation untuk KPI caching
 Fallback ke in-memory cache jika Redis tidak tersedia
 """
+import fnmatch
 import json
-from typing import Optional, Any
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Sequence
 from decimal import Decimal
 from redis import Redis
 from redis.exceptions import RedisError, ConnectionError as RedisConnectionError
+from core.circuit_breaker import CircuitBreaker
 from core.logging import logger
 from config import settings
 
@@ -20,29 +27,86 @@ class DecimalEncoder(json.JSONEncoder):
 
 
 class RedisCache:
-    """Redis cache manager dengan fallback ke in-memory cache"""
+    """Redis cache manager dengan circuit breaker dan fallback ke in-memory cache selama circuit open"""
     
-    def __init__(self):
-        """Initialize Redis connection"""
-        self.redis_client: Optional[Redis] = None
+    # Key milik satu worker/proses (dihapus saat worker shutdown), key lain di kpi:* dipakai bersama
+    INSTANCE_KEY_PREFIX = "kpi:instance"
+    
+    def __init__(self, redis_client: Optional[Redis] = None, instance_id: Optional[str] = None,
+                 breaker: Optional[CircuitBreaker] = None):
+        """
+        Initialize Redis connection
+        
+        Args:
+            redis_client: Client Redis yang sudah ada (optional, default connect dari settings)
+            instance_id: ID worker ini (default: settings.CACHE_INSTANCE_ID atau hostname:pid)
+            breaker: CircuitBreaker (optional, default dari settings)
+        """
         self._in_memory_cache: dict = {}  # Fallback cache
+        self.instance_id = instance_id or settings.CACHE_INSTANCE_ID or f"{socket.gethostname()}:{os.getpid()}"
+        self.breaker = breaker or CircuitBreaker(
+            "redis",
+            failure_threshold=settings.CACHE_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=settings.CACHE_BREAKER_RESET_SECONDS,
+        )
+        self._probe_lock = threading.Lock()
+        self._probe_thread: Optional[threading.Thread] = None
         
+        if redis_client is not None:
+            self.redis_client: Redis = redis_client
+            return
+        # Timeout pendek: Redis yang lambat gagal cepat dan dihitung circuit breaker, bukan menahan request 5 detik
+        self.redis_client = Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            password=settings.REDIS_PASSWORD if settings.REDIS_PASSWORD else None,
+            decode_responses=True,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS
+        )
         try:
-            self.redis_client = Redis(
-                host=settings.REDIS_HOST,
-                port=settings.REDIS_PORT,
-                db=settings.REDIS_DB,
-                password=settings.REDIS_PASSWORD if settings.REDIS_PASSWORD else None,
-                decode_responses=True,
-                socket_connect_timeout=5,
-                socket_timeout=5
-            )
             # Test connection
             self.redis_client.ping()
             logger.success(f"Redis connected: {settings.REDIS_HOST}:{settings.REDIS_PORT}")
         except (RedisError, RedisConnectionError) as e:
-            logger.warning(f"Redis connection failed: {e}. Using in-memory cache fallback.")
-            self.redis_client = None
+            # Client tetap disimpan: circuit open dan probe background menyambung lagi saat Redis pulih
+            logger.warning(f"Redis connection failed: {e}. Using in-memory cache fallback until Redis recovers.")
+            self.breaker.trip()
+            self._start_probe()
+    
+    def _redis(self) -> Optional[Redis]:
+        """Client Redis kalau circuit mengizinkan, None = langsung pakai in-memory fallback (fail fast)"""
+        if self.breaker.allow_request():
+            return self.redis_client
+        return None
+    
+    def _redis_failed(self) -> None:
+        """Catat kegagalan Redis; kalau circuit jadi open, jalankan probe reconnect di background"""
+        self.breaker.record_failure()
+        if self.breaker.state == CircuitBreaker.STATE_OPEN:
+            self._start_probe()
+    
+    def _start_probe(self) -> None:
+        with self._probe_lock:
+            if self._probe_thread is not None and self._probe_thread.is_alive():
+                return
+            self._probe_thread = threading.Thread(target=self._probe_loop, name="redis-reconnect", daemon=True)
+            self._probe_thread.start()
+    
+    def _probe_loop(self) -> None:
+        """Ping Redis setiap reset timeout selama circuit belum closed (tanpa menunggu traffic)"""
+        while self.breaker.state != CircuitBreaker.STATE_CLOSED:
+            time.sleep(self.breaker.reset_timeout)
+            if not self.breaker.allow_request():
+                continue
+            try:
+                self.redis_client.ping()
+                self.breaker.record_success()
+                logger.success(f"Redis reconnected: {settings.REDIS_HOST}:{settings.REDIS_PORT}")
+            except (RedisError, OSError) as e:
+                self.breaker.record_failure()
+                logger.debug(f"Redis reconnect probe failed: {e}")
     
     def get(self, key: str) -> Optional[Any]:
         """
@@ -54,9 +118,11 @@ class RedisCache:
         Returns:
             Cached value or None
         """
-        if self.redis_client:
+        redis_client = self._redis()
+        if redis_client:
             try:
-                value = self.redis_client.get(key)
+                value = redis_client.get(key)
+                self.breaker.record_success()
                 if value:
                     logger.debug(f"Cache HIT (Redis): {key}")
                     # Ensure value is string before JSON parsing
@@ -70,6 +136,7 @@ class RedisCache:
                 logger.debug(f"Cache MISS (Redis): {key}")
                 return None
             except RedisError as e:
+                self._redis_failed()
                 logger.warning(f"Redis GET error: {e}. Falling back to in-memory.")
                 return self._in_memory_cache.get(key)
         else:
@@ -93,14 +160,18 @@ class RedisCache:
         Returns:
             True if successful, False otherwise
         """
-        if self.redis_client:
+        redis_client = self._redis()
+        if redis_client:
             try:
                 # Use custom encoder to handle Decimal types
                 serialized = json.dumps(value, cls=DecimalEncoder)
-                self.redis_client.setex(key, ttl, serialized)
+                redis_client.setex(key, ttl, serialized)
+                self.breaker.record_success()
                 logger.debug(f"Cache SET (Redis): {key} [TTL: {ttl}s]")
                 return True
             except (RedisError, TypeError, ValueError) as e:
+                if isinstance(e, RedisError):
+                    self._redis_failed()
                 logger.warning(f"Redis SET error: {e}. Falling back to in-memory.")
                 self._in_memory_cache[key] = value
                 return False
@@ -110,6 +181,165 @@ class RedisCache:
             logger.debug(f"Cache SET (Memory): {key}")
             return True
     
+    def set_raw(self, key: str, value: str, ttl: int = 300) -> bool:
+        """
+        Set string apa adanya tanpa JSON encoding (misal body response yang sudah diserialisasi)
+        
+        Args:
+            key: Cache key
+            value: String yang disimpan
+            ttl: Time to live in seconds
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        redis_client = self._redis()
+        if redis_client:
+            try:
+                redis_client.setex(key, ttl, value)
+                self.breaker.record_success()
+                logger.debug(f"Cache SET RAW (Redis): {key} [TTL: {ttl}s]")
+                return True
+            except RedisError as e:
+                self._redis_failed()
+                logger.warning(f"Redis SET RAW error: {e}. Falling back to in-memory.")
+                self._in_memory_cache[key] = value
+                return False
+        self._in_memory_cache[key] = value
+        logger.debug(f"Cache SET RAW (Memory): {key}")
+        return True
+    
+    def get_raw(self, key: str) -> Optional[str]:
+        """Get string yang disimpan dengan set_raw (tanpa JSON decoding)"""
+        redis_client = self._redis()
+        if redis_client:
+            try:
+                value = redis_client.get(key)
+                self.breaker.record_success()
+                return value
+            except RedisError as e:
+                self._redis_failed()
+                logger.warning(f"Redis GET RAW error: {e}. Falling back to in-memory.")
+        return self._in_memory_cache.get(key)
+    
+    def add(self, key: str, value: Any, ttl: int = 300) -> bool:
+        """
+        Set value hanya kalau key belum ada (SET NX EX), dipakai sebagai lock antar worker
+        
+        Args:
+            key: Cache key
+            value: Value (misal instance_id pemilik lock)
+            ttl: Time to live in seconds
+            
+        Returns:
+            True kalau key di-set oleh pemanggil ini. Tanpa Redis selalu True (tidak ada worker lain yang bisa dikoordinasikan)
+        """
+        redis_client = self._redis()
+        if redis_client:
+            try:
+                added = redis_client.set(key, json.dumps(value, cls=DecimalEncoder), ex=ttl, nx=True)
+                self.breaker.record_success()
+                return bool(added)
+            except RedisError as e:
+                self._redis_failed()
+                logger.warning(f"Redis SET NX error: {e}")
+        return True
+    
+    def publish(self, channel: str, message: str) -> bool:
+        """
+        Publish pesan ke channel Redis pub/sub (fan-out ke semua worker)
+        
+        Args:
+            channel: Nama channel
+            message: Pesan (string JSON)
+            
+        Returns:
+            True kalau terkirim ke Redis, False kalau Redis tidak tersedia (caller fan-out lokal)
+        """
+        redis_client = self._redis()
+        if redis_client:
+            try:
+                redis_client.publish(channel, message)
+                self.breaker.record_success()
+                return True
+            except RedisError as e:
+                self._redis_failed()
+                logger.warning(f"Redis PUBLISH error: {e}")
+        return False
+    
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """
+        Get banyak key sekaligus (satu round trip MGET)
+        
+        Args:
+            keys: List cache key
+            
+        Returns:
+            Dict key -> value untuk key yang ada di cache
+        """
+        if not keys:
+            return {}
+        redis_client = self._redis()
+        if redis_client:
+            try:
+                values = redis_client.mget(keys)
+                self.breaker.record_success()
+                logger.debug(f"Cache MGET (Redis): {len(keys)} keys")
+                return {key: json.loads(value) for key, value in zip(keys, values) if value}
+            except RedisError as e:
+                self._redis_failed()
+                logger.warning(f"Redis MGET error: {e}. Falling back to in-memory.")
+        return {key: self._in_memory_cache[key] for key in keys if key in self._in_memory_cache}
+    
+    def set_many(self, items: Dict[str, Any], ttl: int = 300, raw_items: Optional[Dict[str, str]] = None,
+                 delete_keys: Sequence[str] = ()) -> bool:
+        """
+        Set banyak key sekaligus dengan TTL yang sama (satu transaksi MULTI/EXEC)
+        
+        Pembaca MGET melihat semua key lama atau semua key baru, tidak pernah campuran.
+        
+        Args:
+            items: Dict key -> value (JSON encoded)
+            ttl: Time to live in seconds
+            raw_items: Dict key -> string yang disimpan apa adanya (seperti set_raw)
+            delete_keys: Key yang dihapus dalam transaksi yang sama
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        raw_items = raw_items or {}
+        if not items and not raw_items and not delete_keys:
+            return True
+        redis_client = self._redis()
+        if redis_client:
+            try:
+                pipeline = redis_client.pipeline(transaction=True)
+                for key, value in items.items():
+                    pipeline.setex(key, ttl, json.dumps(value, cls=DecimalEncoder))
+                for key, value in raw_items.items():
+                    pipeline.setex(key, ttl, value)
+                if delete_keys:
+                    pipeline.delete(*delete_keys)
+                pipeline.execute()
+                self.breaker.record_success()
+                logger.debug(f"Cache SET MANY (Redis): {len(items) + len(raw_items)} keys [TTL: {ttl}s]")
+                return True
+            except (RedisError, TypeError, ValueError) as e:
+                if isinstance(e, RedisError):
+                    self._redis_failed()
+                logger.warning(f"Redis SET MANY error: {e}. Falling back to in-memory.")
+                self._set_many_in_memory(items, raw_items, delete_keys)
+                return False
+        self._set_many_in_memory(items, raw_items, delete_keys)
+        logger.debug(f"Cache SET MANY (Memory): {len(items) + len(raw_items)} keys")
+        return True
+    
+    def _set_many_in_memory(self, items: Dict[str, Any], raw_items: Dict[str, str], delete_keys: Sequence[str]) -> None:
+        for key in delete_keys:
+            self._in_memory_cache.pop(key, None)
+        self._in_memory_cache.update(items)
+        self._in_memory_cache.update(raw_items)
+    
     def delete(self, key: str) -> bool:
         """
         Delete key from cache
@@ -120,12 +350,15 @@ class RedisCache:
         Returns:
             True if key existed, False otherwise
         """
-        if self.redis_client:
+        redis_client = self._redis()
+        if redis_client:
             try:
-                result = self.redis_client.delete(key)
+                result = redis_client.delete(key)
+                self.breaker.record_success()
                 logger.debug(f"Cache DELETE (Redis): {key}")
                 return int(result) > 0
             except RedisError as e:
+                self._redis_failed()
                 logger.warning(f"Redis DELETE error: {e}. Falling back to in-memory.")
                 return self._in_memory_cache.pop(key, None) is not None
         else:
@@ -134,26 +367,86 @@ class RedisCache:
             logger.debug(f"Cache DELETE (Memory): {key}")
             return existed
     
+    def delete_pattern(self, pattern: str) -> int:
+        """
+        Delete semua key yang match pattern (glob, misal "kpi:metrics:*")
+        
+        Args:
+            pattern: Pattern key
+            
+        Returns:
+            Jumlah key yang dihapus
+        """
+        redis_client = self._redis()
+        if redis_client:
+            try:
+                keys = list(redis_client.scan_iter(match=pattern, count=500))
+                if keys:
+                    redis_client.delete(*keys)
+                self.breaker.record_success()
+                logger.debug(f"Cache DELETE PATTERN (Redis): {pattern} [{len(keys)} keys]")
+                return len(keys)
+            except RedisError as e:
+                self._redis_failed()
+                logger.warning(f"Redis DELETE PATTERN error: {e}. Falling back to in-memory.")
+        keys = [key for key in self._in_memory_cache if fnmatch.fnmatchcase(key, pattern)]
+        for key in keys:
+            self._in_memory_cache.pop(key, None)
+        logger.debug(f"Cache DELETE PATTERN (Memory): {pattern} [{len(keys)} keys]")
+        return len(keys)
+    
+    def instance_key(self, name: str) -> str:
+        """Key milik worker ini, misal kpi:instance:host:1234:info"""
+        return f"{self.INSTANCE_KEY_PREFIX}:{self.instance_id}:{name}"
+    
+    def register_instance(self, ttl: int = 300) -> bool:
+        """
+        Tulis info worker ini (heartbeat), expire sendiri kalau worker mati tanpa shutdown
+        
+        Args:
+            ttl: Time to live in seconds, panggil ulang sebelum habis
+            
+        Returns:
+            True if successful
+        """
+        info = {"instance_id": self.instance_id, "pid": os.getpid(), "updated_at": datetime.now().isoformat()}
+        return self.set(self.instance_key("info"), info, ttl)
+    
+    def clear_instance(self) -> int:
+        """
+        Hapus hanya key milik worker ini (dipanggil saat shutdown), key shared tetap ada
+        
+        Returns:
+            Jumlah key yang dihapus
+        """
+        deleted = self.delete_pattern(f"{self.INSTANCE_KEY_PREFIX}:{self.instance_id}:*")
+        logger.info(f"Cache CLEAR INSTANCE: {self.instance_id} [{deleted} keys]")
+        return deleted
+    
     def clear(self) -> bool:
         """
-        Clear all cache keys with KPI prefix
+        Clear all cache keys with KPI prefix (shared oleh semua worker, hanya untuk flush admin)
         
         Returns:
             True if successful
         """
-        if self.redis_client:
+        redis_client = self._redis()
+        if redis_client:
             try:
                 # Delete all keys matching kpi:*
-                keys = self.redis_client.keys("kpi:*")
+                keys = redis_client.keys("kpi:*")
                 # Convert ResponseT to list to handle type properly
                 keys_list = list(keys) if keys else []
                 if keys_list:
-                    self.redis_client.delete(*keys_list)
+                    redis_client.delete(*keys_list)
                     logger.info(f"Cache CLEAR (Redis): Deleted {len(keys_list)} keys")
                 else:
                     logger.info("Cache CLEAR (Redis): No keys to delete")
+                self.breaker.record_success()
+                self._in_memory_cache.clear()
                 return True
             except RedisError as e:
+                self._redis_failed()
                 logger.error(f"Redis CLEAR error: {e}")
                 self._in_memory_cache.clear()
                 return False
@@ -169,35 +462,46 @@ class RedisCache:
         Returns:
             Dict with cache stats
         """
-        if self.redis_client:
+        redis_client = self._redis()
+        if redis_client:
             try:
-                info = self.redis_client.info()
-                keys = self.redis_client.keys("kpi:*")
+                info = redis_client.info()
+                keys = redis_client.keys("kpi:*")
                 # Convert ResponseT to proper types
                 keys_list = list(keys) if keys else []
                 info_dict = dict(info) if isinstance(info, dict) else {}
                 
+                instance_keys = list(redis_client.scan_iter(match=f"{self.INSTANCE_KEY_PREFIX}:*:info", count=500))
+                self.breaker.record_success()
                 return {
                     "backend": "redis",
                     "connected": True,
+                    "instance_id": self.instance_id,
+                    "active_instances": len(instance_keys),
                     "host": settings.REDIS_HOST,
                     "port": settings.REDIS_PORT,
                     "db": settings.REDIS_DB,
                     "kpi_keys_count": len(keys_list),
                     "memory_used": info_dict.get("used_memory_human", "N/A"),
-                    "total_keys": info_dict.get("db0", {}).get("keys", 0) if "db0" in info_dict else 0
+                    "total_keys": info_dict.get("db0", {}).get("keys", 0) if "db0" in info_dict else 0,
+                    "circuit": self.breaker.describe()
                 }
             except RedisError as e:
+                self._redis_failed()
                 logger.error(f"Redis STATS error: {e}")
                 return {
                     "backend": "redis",
                     "connected": False,
-                    "error": str(e)
+                    "error": str(e),
+                    "circuit": self.breaker.describe()
                 }
         else:
+            # Circuit open: Redis dilewati, data dari in-memory fallback
             return {
                 "backend": "memory",
                 "connected": True,
+                "circuit": self.breaker.describe(),
+                "instance_id": self.instance_id,
                 "kpi_keys_count": len([k for k in self._in_memory_cache.keys() if k.startswith("kpi:")]),
                 "total_keys": len(self._in_memory_cache)
             }
@@ -209,13 +513,16 @@ class RedisCache:
         Returns:
             True if healthy
         """
-        if self.redis_client:
+        redis_client = self._redis()
+        if redis_client:
             try:
-                self.redis_client.ping()
+                redis_client.ping()
+                self.breaker.record_success()
                 return True
             except RedisError:
+                self._redis_failed()
                 return False
-        return True  # In-memory is always healthy
+        return True  # Circuit open: in-memory fallback is always healthy
 
 
 # Global cache instance
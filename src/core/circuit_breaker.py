@@ -0,0 +1,114 @@
+"""
+Circuit breaker untuk dependency eksternal (Redis)
+closed -> open setelah beberapa kegagalan beruntun, open -> half-open setelah reset timeout (satu probe),
+half-open -> closed kalau probe berhasil atau kembali open kalau gagal
+(probe yang tidak pernah melapor, misal dibatalkan, kedaluwarsa setelah reset timeout dan probe baru diizinkan)
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from core.logging import logger
+
+
+class CircuitBreaker:
+    """State machine closed/open/half-open, thread-safe (dipakai dari thread pool dan event loop)"""
+
+    STATE_CLOSED = "closed"
+    STATE_OPEN = "open"
+    STATE_HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 10.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            name: Nama dependency (untuk log dan stats)
+            failure_threshold: Jumlah kegagalan beruntun sebelum circuit open
+            reset_timeout: Detik circuit tetap open sebelum probe half-open
+            clock: Sumber waktu monotonic (bisa diganti di test)
+        """
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.STATE_CLOSED
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._probe_started_at: Optional[float] = None
+        self.total_failures = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow_request(self) -> bool:
+        """
+        Cek apakah operasi boleh dicoba; saat open hanya satu probe yang lolos setelah reset_timeout
+
+        Returns:
+            True kalau operasi boleh ke dependency, False = fail fast
+        """
+        with self._lock:
+            if self._state == self.STATE_CLOSED:
+                return True
+            if self._state == self.STATE_OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self._state = self.STATE_HALF_OPEN
+                self._probe_in_flight = False
+                logger.info(f"Circuit {self.name}: half-open, probing")
+            if self._state == self.STATE_HALF_OPEN:
+                now = self._clock()
+                if self._probe_in_flight and now - self._probe_started_at < self.reset_timeout:
+                    return False
+                if self._probe_in_flight:
+                    logger.warning(f"Circuit {self.name}: probe did not report within {self.reset_timeout}s, probing again")
+                self._probe_in_flight = True
+                self._probe_started_at = now
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.STATE_CLOSED:
+                logger.success(f"Circuit {self.name}: closed")
+            self._state = self.STATE_CLOSED
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self.total_failures += 1
+            self._probe_in_flight = False
+            if self._state == self.STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.STATE_OPEN:
+                    self.times_opened += 1
+                    logger.warning(f"Circuit {self.name}: open for {self.reset_timeout}s after {self._failures} failures")
+                self._state = self.STATE_OPEN
+                self._opened_at = self._clock()
+
+    def trip(self) -> None:
+        """Paksa circuit open (misal koneksi awal gagal), probe setelah reset_timeout"""
+        with self._lock:
+            if self._state != self.STATE_OPEN:
+                self.times_opened += 1
+            self._state = self.STATE_OPEN
+            self._opened_at = self._clock()
+            self._probe_in_flight = False
+
+    def describe(self) -> Dict[str, Any]:
+        """State untuk stats/health endpoint"""
+        with self._lock:
+            retry_in = None
+            if self._state == self.STATE_OPEN:
+                retry_in = max(0.0, round(self.reset_timeout - (self._clock() - self._opened_at), 2))
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "total_failures": self.total_failures,
+                "times_opened": self.times_opened,
+                "retry_in_seconds": retry_in,
+            }
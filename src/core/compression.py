@@ -0,0 +1,170 @@
+"""
+Kompresi response (gzip/brotli) dengan negosiasi Accept-Encoding dan batas ukuran minimum
+brotli optional: tanpa package brotli hanya gzip yang ditawarkan
+"""
+import gzip
+import zlib
+from typing import Dict, Optional, Tuple
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - tergantung environment
+    brotli = None
+
+# Content type yang layak dikompresi (SSE tidak: event harus sampai ke client tanpa buffering)
+COMPRESSIBLE_TYPES: Tuple[str, ...] = ("application/json", "application/x-ndjson", "text/csv", "text/plain", "text/html")
+
+
+def supported_encodings() -> Tuple[str, ...]:
+    """Encoding yang didukung, urut dari yang paling disukai"""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Pilih encoding dari header Accept-Encoding (menghormati q=0 dan *)
+
+    Args:
+        accept_encoding: Nilai header Accept-Encoding
+
+    Returns:
+        "br", "gzip" atau None (kirim tanpa kompresi)
+    """
+    if not accept_encoding:
+        return None
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip().lower()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in supported_encodings():
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """Kompres body utuh; level default dari settings (per-request, cepat)"""
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY if level is None else level)
+    return gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL if level is None else level, mtime=0)
+
+
+def compressed_variants(body: bytes) -> Dict[str, bytes]:
+    """
+    Semua varian terkompresi untuk body yang di-cache (dibuat sekali per refresh, jadi level maksimum)
+
+    Returns:
+        Dict encoding -> bytes, kosong kalau body di bawah COMPRESSION_MINIMUM_SIZE
+    """
+    if len(body) < settings.COMPRESSION_MINIMUM_SIZE:
+        return {}
+    return {encoding: compress(body, encoding, 11 if encoding == "br" else 9) for encoding in supported_encodings()}
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.split(";")[0].strip().lower() in COMPRESSIBLE_TYPES
+
+
+class _StreamCompressor:
+    """Kompresi incremental untuk StreamingResponse; setiap chunk di-flush supaya client menerima data segera"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + (self._compressor.finish() if final else self._compressor.flush())
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware gzip/brotli
+
+    Response yang sudah punya Content-Encoding (misal body KPI pre-compressed dari cache),
+    content type non-teks dan body di bawah minimum_size dikirim apa adanya.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: Optional[int] = None):
+        self.app = app
+        self.minimum_size = settings.COMPRESSION_MINIMUM_SIZE if minimum_size is None else minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressionResponder(send, encoding, self.minimum_size).send)
+
+
+class _CompressionResponder:
+    """State kompresi satu response"""
+
+    def __init__(self, send: Send, encoding: str, minimum_size: int):
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self._start: Optional[Message] = None
+        self._compressor: Optional[_StreamCompressor] = None
+        self._passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self._start = message
+            return
+        if message["type"] != "http.response.body" or self._passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self._compressor is not None:
+            await self._send({"type": "http.response.body", "body": self._compressor.compress(body, not more_body), "more_body": more_body})
+            return
+
+        # Body pertama: tentukan kompresi atau tidak
+        headers = MutableHeaders(raw=list(self._start["headers"]))
+        self._start["headers"] = headers.raw
+        compressible = (
+            self._start["status"] not in (204, 304)
+            and "content-encoding" not in headers
+            and is_compressible(headers.get("content-type"))
+        )
+        if compressible:
+            headers.add_vary_header("Accept-Encoding")
+        if not compressible or (not more_body and len(body) < self.minimum_size):
+            self._passthrough = True
+            await self._send(self._start)
+            await self._send(message)
+            return
+
+        headers["Content-Encoding"] = self.encoding
+        if not more_body:
+            data = compress(body, self.encoding)
+            headers["Content-Length"] = str(len(data))
+            await self._send(self._start)
+            await self._send({"type": "http.response.body", "body": data})
+            return
+        # Streaming: panjang akhir tidak diketahui
+        if "content-length" in headers:
+            del headers["Content-Length"]
+        self._compressor = _StreamCompressor(self.encoding)
+        await self._send(self._start)
+        await self._send({"type": "http.response.body", "body": self._compressor.compress(body, False), "more_body": True})
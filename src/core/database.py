@@ -2,16 +2,33 @@
 Database connection management untuk MySQL
 Menggunakan PyMySQL tanpa ORM
 """
+import re
 import pymysql
 from contextlib import contextmanager
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterator, List, Any, Mapping, Optional, Sequence, Union
+import numpy as np
 from config import settings
+from core import deadline
+from core.deadline import DeadlineExceeded
 from core.logging import logger
 
+# MySQL: query dihentikan oleh MAX_EXECUTION_TIME / koneksi putus saat menunggu hasil (read timeout)
+ER_QUERY_TIMEOUT = 3024
+CR_SERVER_LOST = 2013
+# Socket timeout sedikit di atas sisa deadline, supaya server sempat menghentikan query lebih dulu
+DEADLINE_SOCKET_MARGIN = 0.5
+_SELECT_PREFIX = re.compile(r"^\s*SELECT\b", re.IGNORECASE)
+_WITH_PREFIX = re.compile(r"^\s*WITH\b", re.IGNORECASE)
+
 
 class DatabaseConnection:
     """Database connection manager untuk MySQL"""
     
+    # Format baris untuk streaming query
+    ROW_FORMAT_DICT = "dict"
+    ROW_FORMAT_TUPLE = "tuple"
+    ROW_FORMAT_COLUMNS = "columns"
+    
     def __init__(self):
         """Initialize database configuration"""
         self.config = {
@@ -34,13 +51,28 @@ class DatabaseConnection:
             with db.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute("SELECT * FROM table")
+        
+        Kalau request punya deadline (core.deadline), connect/read/write timeout dibatasi sisa waktunya
+        dan query yang kena timeout di-raise sebagai DeadlineExceeded.
         """
         connection = None
+        config = self.config
+        left = deadline.check("database")
+        if left is not None:
+            config = {
+                **self.config,
+                'connect_timeout': min(10.0, left),
+                'read_timeout': left + DEADLINE_SOCKET_MARGIN,
+                'write_timeout': left + DEADLINE_SOCKET_MARGIN,
+            }
         try:
-            connection = pymysql.connect(**self.config)
+            connection = pymysql.connect(**config)
             logger.debug("Database connection opened")
             yield connection
         except pymysql.Error as e:
+            if self._is_deadline_error(e):
+                logger.warning(f"Database query aborted by request deadline: {e}")
+                raise DeadlineExceeded(f"Database query exceeded request deadline: {e}") from e
             logger.exception(f"Database connection error: {e}")
             raise
         finally:
@@ -48,6 +80,58 @@ class DatabaseConnection:
                 connection.close()
                 logger.debug("Database connection closed")
     
+    @staticmethod
+    def _is_deadline_error(error: pymysql.Error) -> bool:
+        """Error karena deadline request: MAX_EXECUTION_TIME, atau koneksi putus setelah deadline lewat"""
+        code = error.args[0] if error.args else None
+        if code == ER_QUERY_TIMEOUT:
+            return True
+        left = deadline.remaining()
+        return code == CR_SERVER_LOST and left is not None and left <= 0
+    
+    @staticmethod
+    def _execute(cursor, query: str, params: Optional[tuple]) -> None:
+        """
+        cursor.execute untuk SELECT, dibatasi sisa deadline request (kalau ada)
+        
+        SELECT dapat optimizer hint MAX_EXECUTION_TIME; query WITH (CTE) memakai
+        session max_execution_time karena hint hanya berlaku di SELECT paling depan.
+        """
+        left = deadline.check("database query")
+        if left is not None:
+            timeout_ms = max(1, int(left * 1000))
+            if _SELECT_PREFIX.match(query):
+                query = _SELECT_PREFIX.sub(lambda m: f"{m.group(0)} /*+ MAX_EXECUTION_TIME({timeout_ms}) */", query, count=1)
+            elif _WITH_PREFIX.match(query):
+                cursor.execute("SET SESSION max_execution_time = %s", (timeout_ms,))
+        cursor.execute(query, params or ())
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Context manager untuk beberapa statement dalam satu transaksi
+        
+        Commit kalau block selesai tanpa error, rollback kalau ada exception.
+        
+        Usage:
+            with db.transaction() as cursor:
+                cursor.execute("UPDATE ...")
+                cursor.execute("INSERT ...")
+        """
+        with self.get_connection() as conn:
+            conn.begin()
+            try:
+                with conn.cursor() as cursor:
+                    yield cursor
+                conn.commit()
+            except Exception:
+                try:
+                    conn.rollback()
+                except pymysql.Error as rollback_error:
+                    # Koneksi sudah putus (misal read timeout dari deadline), server rollback sendiri
+                    logger.warning(f"Rollback failed: {rollback_error}")
+                raise
+    
     def execute_query(self, query: str, params: Optional[tuple] = None) -> List[Dict[str, Any]]:
         """
         Execute SELECT query dan return results
@@ -61,7 +145,7 @@ class DatabaseConnection:
         """
         with self.get_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute(query, params or ())
+                self._execute(cursor, query, params)
                 results = cursor.fetchall()
                 logger.debug(f"Query executed: {cursor.rowcount} rows returned")
                 return results
@@ -79,7 +163,7 @@ class DatabaseConnection:
         """
         with self.get_connection() as conn:
             with conn.cursor() as cursor:
-                cursor.execute(query, params or ())
+                self._execute(cursor, query, params)
                 result = cursor.fetchone()
                 logger.debug(f"Query executed: {'1 row' if result else 'no rows'} returned")
                 return result
@@ -103,6 +187,201 @@ class DatabaseConnection:
                 logger.debug(f"Write query executed: {affected_rows} rows affected")
                 return affected_rows
     
+    def execute_many(self, query: str, params_list: Sequence[tuple]) -> int:
+        """
+        Execute INSERT/UPDATE/DELETE query untuk banyak baris sekaligus
+        
+        Args:
+            query: SQL query string
+            params_list: List of query parameters (satu tuple per baris)
+            
+        Returns:
+            Number of affected rows
+        """
+        if not params_list:
+            return 0
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                affected_rows = cursor.executemany(query, params_list)
+                conn.commit()
+                logger.debug(f"Batch write executed: {affected_rows} rows affected")
+                return affected_rows
+    
+    def _stream(self, query: str, params: Optional[tuple], chunk_size: Optional[int], cursor_class,
+                first_chunk_size: Optional[int] = None) -> Iterator[Any]:
+        """
+        Execute query dengan server-side (unbuffered) cursor
+        
+        Yields:
+            Nama kolom (list) sebagai item pertama, lalu satu list baris per chunk
+        """
+        chunk_size = max(1, chunk_size or settings.DB_STREAM_CHUNK_SIZE)
+        size = max(1, min(first_chunk_size or chunk_size, chunk_size))
+        with self.get_connection() as conn:
+            cursor = conn.cursor(cursor_class)
+            completed = False
+            try:
+                # Consumer bisa lama memproses satu chunk, jangan sampai server memutus koneksi
+                cursor.execute("SET SESSION net_write_timeout = %s", (settings.DB_STREAM_NET_WRITE_TIMEOUT,))
+                self._execute(cursor, query, params)
+                yield [column[0] for column in cursor.description or ()]
+                total = 0
+                while True:
+                    rows = cursor.fetchmany(size)
+                    if not rows:
+                        break
+                    total += len(rows)
+                    size = chunk_size
+                    yield rows
+                completed = True
+                logger.debug(f"Streaming query executed: {total} rows returned")
+            finally:
+                # Cursor unbuffered membaca semua sisa baris saat close, skip kalau berhenti di tengah
+                if completed:
+                    cursor.close()
+    
+    def iter_chunks(
+        self,
+        query: str,
+        params: Optional[tuple] = None,
+        chunk_size: Optional[int] = None,
+        row_format: str = ROW_FORMAT_DICT,
+        dtypes: Optional[Mapping[str, Any]] = None,
+        first_chunk_size: Optional[int] = None,
+    ) -> Iterator[Union[List[Dict[str, Any]], List[tuple], Dict[str, np.ndarray]]]:
+        """
+        Execute SELECT query dengan server-side (unbuffered) cursor dan yield hasil per chunk
+        
+        Result set tidak pernah di-load penuh ke memory, jadi aman untuk tabel besar.
+        Connection tetap terbuka selama generator dikonsumsi; kalau generator ditutup
+        sebelum habis, connection langsung ditutup tanpa membaca sisa baris.
+        
+        Args:
+            query: SQL query string
+            params: Query parameters (optional)
+            chunk_size: Jumlah baris per chunk (default: settings.DB_STREAM_CHUNK_SIZE)
+            row_format: "dict" (list of dict), "tuple" (list of tuple) atau
+                "columns" (dict nama kolom -> NumPy array)
+            dtypes: Dtype per kolom untuk format "columns" (kolom lain tetap object)
+            first_chunk_size: Ukuran chunk pertama saja (lebih kecil = consumer dapat baris lebih cepat),
+                default sama dengan chunk_size
+            
+        Yields:
+            Satu chunk baris sesuai row_format
+        """
+        if row_format not in (self.ROW_FORMAT_DICT, self.ROW_FORMAT_TUPLE, self.ROW_FORMAT_COLUMNS):
+            raise ValueError(f"Unknown row format: {row_format}")
+        cursor_class = pymysql.cursors.SSDictCursor if row_format == self.ROW_FORMAT_DICT else pymysql.cursors.SSCursor
+        
+        stream = self._stream(query, params, chunk_size, cursor_class, first_chunk_size)
+        try:
+            names = next(stream)
+            for rows in stream:
+                if row_format == self.ROW_FORMAT_COLUMNS:
+                    yield self._rows_to_columns(rows, names, dtypes)
+                else:
+                    yield rows
+        finally:
+            stream.close()
+    
+    def iter_query(
+        self,
+        query: str,
+        params: Optional[tuple] = None,
+        chunk_size: Optional[int] = None,
+        row_format: str = ROW_FORMAT_DICT,
+    ) -> Iterator[Union[Dict[str, Any], tuple]]:
+        """
+        Execute SELECT query dengan server-side cursor dan yield satu baris per iterasi
+        
+        Args:
+            query: SQL query string
+            params: Query parameters (optional)
+            chunk_size: Jumlah baris yang di-fetch per round trip
+            row_format: "dict" atau "tuple"
+            
+        Yields:
+            Satu baris
+        """
+        if row_format == self.ROW_FORMAT_COLUMNS:
+            raise ValueError("iter_query yields rows, use iter_chunks for columns")
+        for rows in self.iter_chunks(query, params, chunk_size, row_format):
+            yield from rows
+    
+    def fetch_columns(
+        self,
+        query: str,
+        params: Optional[tuple] = None,
+        dtypes: Optional[Mapping[str, Any]] = None,
+        chunk_size: Optional[int] = None,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Execute SELECT query dan baca hasilnya langsung ke array per kolom
+        
+        Tidak ada dict per baris; Decimal dan NULL dikonversi sekali per kolom
+        (NULL jadi NaN untuk dtype float).
+        
+        Args:
+            query: SQL query string
+            params: Query parameters (optional)
+            dtypes: Dtype per kolom, misal {"total_clicks": np.float64} (kolom lain object)
+            chunk_size: Jumlah baris yang di-fetch per round trip
+            
+        Returns:
+            Dict nama kolom -> NumPy array (panjang 0 kalau tidak ada baris)
+        """
+        stream = self._stream(query, params, chunk_size, pymysql.cursors.SSCursor)
+        try:
+            names = next(stream)
+            chunks = [self._rows_to_columns(rows, names, dtypes) for rows in stream]
+        finally:
+            stream.close()
+        if not chunks:
+            return self._rows_to_columns([], names, dtypes)
+        if len(chunks) == 1:
+            return chunks[0]
+        return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in names}
+    
+    def fetch_frame(
+        self,
+        query: str,
+        params: Optional[tuple] = None,
+        dtypes: Optional[Mapping[str, Any]] = None,
+        chunk_size: Optional[int] = None,
+    ):
+        """
+        Execute SELECT query dan return pandas DataFrame (dibangun dari fetch_columns)
+        
+        Args:
+            query: SQL query string
+            params: Query parameters (optional)
+            dtypes: Dtype per kolom (kolom lain object)
+            chunk_size: Jumlah baris yang di-fetch per round trip
+            
+        Returns:
+            pandas.DataFrame dengan urutan kolom sesuai query
+        """
+        import pandas as pd
+        
+        return pd.DataFrame(self.fetch_columns(query, params, dtypes, chunk_size), copy=False)
+    
+    @staticmethod
+    def _rows_to_columns(
+        rows: Sequence[tuple], names: Sequence[str], dtypes: Optional[Mapping[str, Any]] = None
+    ) -> Dict[str, np.ndarray]:
+        """Transpose list of tuple ke dict nama kolom -> NumPy array dengan dtype yang diminta"""
+        columns = {}
+        for index, name in enumerate(names):
+            values = np.empty(len(rows), dtype=object)
+            values[:] = [row[index] for row in rows]
+            dtype = np.dtype(dtypes[name]) if dtypes and name in dtypes else None
+            if dtype is not None and dtype != object:
+                if dtype.kind == "f":
+                    values[np.equal(values, None)] = np.nan
+                values = values.astype(dtype)
+            columns[name] = values
+        return columns
+    
     def test_connection(self) -> bool:
         """
         Test database connection
@@ -0,0 +1,85 @@
+"""
+Deadline per request (contextvars)
+Sisa waktu request diturunkan ke query MySQL (MAX_EXECUTION_TIME, read timeout) dan inference (cancel),
+jadi request yang sudah ditinggal client tidak terus menahan koneksi DB atau worker model
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Iterator, Optional
+from fastapi import Request
+from core.logging import logger
+from core.responses import FastJSONResponse
+
+# Waktu monotonic saat deadline habis; ikut ke thread pool (run_in_threadpool / asyncio.to_thread menyalin context)
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Deadline request habis; route mengembalikan 504"""
+
+
+def remaining() -> Optional[float]:
+    """Sisa waktu dalam detik (bisa <= 0), None kalau tidak ada deadline"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check(stage: str = "request") -> Optional[float]:
+    """
+    Raise DeadlineExceeded kalau deadline sudah lewat
+
+    Args:
+        stage: Nama tahap untuk pesan error (misal "database", "inference")
+
+    Returns:
+        Sisa waktu dalam detik, None kalau tidak ada deadline
+    """
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"Request deadline exceeded before {stage}")
+    return left
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    """Pasang deadline untuk blok ini; deadline luar yang lebih ketat tetap berlaku. None/0 = tanpa deadline baru"""
+    if not seconds or seconds <= 0:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    previous = _deadline.get()
+    _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.set(previous)
+
+
+async def wait_for(awaitable: Awaitable[Any], stage: str) -> Any:
+    """await dengan batas sisa deadline; kalau habis, awaitable di-cancel dan DeadlineExceeded di-raise"""
+    left = check(stage)
+    try:
+        return await asyncio.wait_for(awaitable, left)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"Request deadline exceeded during {stage}") from None
+
+
+def request_deadline(seconds: float):
+    """Dependency FastAPI: deadline untuk satu route (dependencies=[Depends(request_deadline(10))])"""
+    async def dependency():
+        with deadline_scope(seconds):
+            yield
+    return dependency
+
+
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded) -> FastJSONResponse:
+    """Exception handler: DeadlineExceeded dari route mana pun jadi 504 Gateway Timeout"""
+    logger.warning(f"{request.method} {request.url.path}: {exc}")
+    return FastJSONResponse({"detail": str(exc)}, status_code=504)
@@ -0,0 +1,36 @@
+"""
+Helper HTTP conditional caching (ETag, If-None-Match, Cache-Control)
+"""
+import hashlib
+import json
+from typing import Any, Dict, Optional
+from core.cache import DecimalEncoder
+
+
+def compute_etag(payload: Any) -> str:
+    """
+    ETag kuat dari isi payload (JSON kanonik, urutan key tidak berpengaruh)
+
+    Args:
+        payload: Data yang menentukan isi response
+
+    Returns:
+        ETag dalam tanda kutip, misal "3f2a9c0d1b7e4a65"
+    """
+    canonical = json.dumps(payload, cls=DecimalEncoder, sort_keys=True, separators=(",", ":"))
+    return f'"{hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Cek header If-None-Match (boleh list, weak W/"..." atau *) terhadap ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+def cache_headers(etag: str, max_age: int) -> Dict[str, str]:
+    """Header ETag dan Cache-Control (max-age = sisa TTL cache server)"""
+    return {"ETag": etag, "Cache-Control": f"max-age={max(0, int(max_age))}"}
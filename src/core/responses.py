@@ -0,0 +1,35 @@
+"""
+Response class JSON berbasis orjson (default untuk semua router)
+NumPy (scalar dan array) dan Decimal diserialisasi langsung tanpa konversi manual di route
+"""
+from decimal import Decimal
+from typing import Any
+import numpy as np
+import orjson
+from fastapi.responses import JSONResponse
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj: Any) -> Any:
+    """Tipe yang tidak ditangani orjson secara native"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, np.generic):
+        # Scalar NumPy yang tidak didukung OPT_SERIALIZE_NUMPY (misal np.str_, np.datetime64)
+        return obj.item()
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialisasi ke JSON bytes dengan opsi yang sama seperti FastJSONResponse"""
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse dengan orjson: lebih cepat, dan tidak gagal untuk hasil model (np.int64, np.float32, ndarray) atau Decimal dari MySQL"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,31 @@
+"""
+Kerja blocking di thread dari background task
+asyncio.to_thread yang di-cancel hanya berhenti menunggu; thread-nya tetap jalan. Saat shutdown, task
+harus menunggu thread selesai supaya executor, pool DB dan Redis tidak ditutup di bawah thread yang masih jalan
+"""
+import asyncio
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+async def to_thread_joined(func: Callable[..., T], *args: Any) -> T:
+    """
+    Seperti asyncio.to_thread, tetapi kalau task di-cancel tetap menunggu thread selesai sebelum CancelledError
+
+    Thread tidak bisa dihentikan paksa: caller memberi sinyal stop (misal event) sebelum cancel supaya
+    tunggu ini singkat.
+
+    Args:
+        func: Fungsi blocking
+        *args: Argumen func
+
+    Returns:
+        Hasil func
+    """
+    future = asyncio.ensure_future(asyncio.to_thread(func, *args))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        await asyncio.gather(future, return_exceptions=True)
+        raise
@@ -1,3 +1,4 @@
-from .predict_requests import FinalResultRequest, DropoutRequest
+from .predict_requests import FinalResultRequest, DropoutRequest, BulkPredictionRequest
+from .kpi_requests import KPIFilter
 
-__all__ = ["FinalResultRequest", "DropoutRequest"]
+__all__ = ["FinalResultRequest", "DropoutRequest", "BulkPredictionRequest", "KPIFilter"]
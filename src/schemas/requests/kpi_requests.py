@@ -0,0 +1,117 @@
+"""
+Request schemas untuk KPI endpoints
+"""
+import re
+from typing import List, Optional, Tuple
+from pydantic import BaseModel, Field, ValidationInfo, field_validator, model_validator
+from config import settings
+
+# Format kode OULAD: modul 3 huruf (AAA), presentasi tahun + B/J (2013J)
+CODE_PATTERNS = {
+    "code_module": re.compile(r"[A-Z]{3}"),
+    "code_presentation": re.compile(r"\d{4}[BJ]"),
+}
+
+
+class KPIFilter(BaseModel):
+    """Filter slice KPI per module, presentation dan rentang tanggal (hari relatif terhadap awal presentasi)"""
+    code_module: List[str] = Field(default_factory=list, description="Kode modul, boleh lebih dari satu (AAA,BBB)")
+    code_presentation: List[str] = Field(default_factory=list, description="Kode presentasi, boleh lebih dari satu (2013J,2014B)")
+    date_from: Optional[int] = Field(None, description="Hari awal (inklusif) untuk studentvle.date / studentassessment.date_submitted")
+    date_to: Optional[int] = Field(None, description="Hari akhir (inklusif)")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "code_module": ["AAA"],
+                "code_presentation": ["2013J"],
+                "date_from": 0,
+                "date_to": 100
+            }
+        }
+
+    @field_validator("code_module", "code_presentation", mode="before")
+    @classmethod
+    def _normalize_codes(cls, value, info: ValidationInfo):
+        """
+        Terima list atau string dipisah koma; hasil unik, uppercase dan terurut (bentuk kanonik)
+
+        Kode harus sesuai format OULAD dan jumlahnya dibatasi KPI_FILTER_MAX_CODES, supaya input bebas
+        tidak membuat cache key dan klausa IN (...) tanpa batas.
+        """
+        if value is None:
+            return []
+        if isinstance(value, str):
+            value = [value]
+        codes = {code.strip().upper() for item in value for code in str(item).split(",") if code.strip()}
+        if len(codes) > settings.KPI_FILTER_MAX_CODES:
+            raise ValueError(f"at most {settings.KPI_FILTER_MAX_CODES} codes allowed, got {len(codes)}")
+        invalid = sorted(code for code in codes if not CODE_PATTERNS[info.field_name].fullmatch(code))
+        if invalid:
+            raise ValueError(f"invalid {info.field_name}: {', '.join(code[:16] for code in invalid[:5])}")
+        return sorted(codes)
+
+    @model_validator(mode="after")
+    def _check_date_range(self):
+        if self.date_from is not None and self.date_to is not None and self.date_from > self.date_to:
+            raise ValueError("date_from must be less than or equal to date_to")
+        return self
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.code_module or self.code_presentation or self.has_date_range)
+
+    @property
+    def has_date_range(self) -> bool:
+        return self.date_from is not None or self.date_to is not None
+
+    def cache_key(self, prefix: str) -> str:
+        """Cache key kanonik: filter yang sama (urutan/duplikat/huruf beda) dapat key yang sama"""
+        parts = []
+        if self.code_module:
+            parts.append("module=" + ",".join(self.code_module))
+        if self.code_presentation:
+            parts.append("presentation=" + ",".join(self.code_presentation))
+        if self.has_date_range:
+            parts.append(f"date={'' if self.date_from is None else self.date_from}:{'' if self.date_to is None else self.date_to}")
+        return f"{prefix}:{';'.join(parts)}" if parts else prefix
+
+    def sql_conditions(
+        self,
+        module_column: Optional[str] = None,
+        presentation_column: Optional[str] = None,
+        date_column: Optional[str] = None,
+    ) -> Tuple[str, tuple]:
+        """
+        Kondisi SQL terparameterisasi untuk filter ini
+
+        Args:
+            module_column: Kolom code_module (None = filter modul tidak dipakai)
+            presentation_column: Kolom code_presentation
+            date_column: Kolom hari (None = rentang tanggal tidak dipakai)
+
+        Returns:
+            Tuple (" AND ..." atau "", params)
+        """
+        clauses, params = [], []
+        if module_column and self.code_module:
+            clauses.append(f"{module_column} IN ({', '.join(['%s'] * len(self.code_module))})")
+            params.extend(self.code_module)
+        if presentation_column and self.code_presentation:
+            clauses.append(f"{presentation_column} IN ({', '.join(['%s'] * len(self.code_presentation))})")
+            params.extend(self.code_presentation)
+        if date_column and self.date_from is not None:
+            clauses.append(f"{date_column} >= %s")
+            params.append(self.date_from)
+        if date_column and self.date_to is not None:
+            clauses.append(f"{date_column} <= %s")
+            params.append(self.date_to)
+        return "".join(f" AND {clause}" for clause in clauses), tuple(params)
+
+    def assessment_conditions(self, alias: str = "sa") -> Tuple[str, tuple]:
+        """Kondisi untuk studentassessment (modul/presentasi lewat tabel assessments, tanggal = date_submitted)"""
+        module_sql, module_params = self.sql_conditions("code_module", "code_presentation")
+        date_sql, date_params = self.sql_conditions(date_column=f"{alias}.date_submitted")
+        if module_sql:
+            module_sql = f" AND {alias}.id_assessment IN (SELECT id_assessment FROM assessments WHERE 1 = 1{module_sql})"
+        return module_sql + date_sql, module_params + date_params
@@ -1,7 +1,9 @@
 """
 Request schemas untuk prediction endpoints
 """
+from typing import List
 from pydantic import BaseModel, Field
+from config import settings
 
 
 class FinalResultRequest(BaseModel):
@@ -46,3 +48,17 @@ class DropoutRequest(BaseModel):
                 "avg_assessment_score": 65.0
             }
         }
+
+
+class BulkPredictionRequest(BaseModel):
+    """Request body untuk prediksi banyak mahasiswa berdasarkan id_student"""
+    ids: List[int] = Field(
+        ..., min_length=1, max_length=settings.PREDICT_BULK_MAX_IDS, description="Daftar id_student (duplikat diabaikan)"
+    )
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "ids": [11391, 28400, 30268]
+            }
+        }
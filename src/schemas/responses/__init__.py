@@ -1,4 +1,4 @@
-from .predict_responses import PredictionResponse, ErrorResponse, ModelStatusResponse
+from .predict_responses import PredictionResponse, BulkPredictionResponse, ErrorResponse, ModelStatusResponse
 from .kpi_responses import (
     StudentPerformanceResponse,
     ModuleStatisticsResponse,
@@ -7,11 +7,13 @@ from .kpi_responses import (
     AssessmentSummaryResponse,
     AssessmentSummaryItem,
     DashboardOverviewResponse,
-    KPIResponse
+    KPIResponse,
+    KPIListResponse
 )
 
 __all__ = [
     "PredictionResponse", 
+    "BulkPredictionResponse",
     "ErrorResponse", 
     "ModelStatusResponse",
     "StudentPerformanceResponse",
@@ -21,5 +23,6 @@ __all__ = [
     "AssessmentSummaryResponse",
     "AssessmentSummaryItem",
     "DashboardOverviewResponse",
-    "KPIResponse"
+    "KPIResponse",
+    "KPIListResponse"
 ]
@@ -178,3 +178,29 @@ class KPIResponse(BaseModel):
                 "data": {}
             }
         }
+
+
+class KPIListResponse(BaseModel):
+    """Response untuk list semua KPI"""
+    success: bool = Field(..., description="Status keberhasilan")
+    data: List[Dict[str, Any]] = Field(..., description="List of all KPI metrics")
+    total_kpis: int = Field(..., description="Total jumlah KPI")
+    filters: Optional[Dict[str, Any]] = Field(None, description="Filter slice yang dipakai (kanonik), null kalau tanpa filter")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "success": True,
+                "data": [
+                    {
+                        "kpi_id": 1,
+                        "name": "Login Frequency",
+                        "definition": "Jumlah login dalam periode tertentu",
+                        "value": 1500,
+                        "unit": "logins",
+                        "category": "engagement"
+                    }
+                ],
+                "total_kpis": 12
+            }
+        }
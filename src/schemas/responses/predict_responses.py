@@ -2,7 +2,7 @@
 Response schemas untuk prediction endpoints
 """
 from pydantic import BaseModel, Field
-from typing import Any, Optional, Dict
+from typing import Any, Optional, Dict, List
 
 
 class PredictionResponse(BaseModel):
@@ -21,6 +21,26 @@ class PredictionResponse(BaseModel):
         }
 
 
+class BulkPredictionResponse(BaseModel):
+    """Response untuk prediksi banyak mahasiswa (by-ids)"""
+    success: bool = Field(..., description="Status keberhasilan prediksi")
+    predictions: Dict[int, Any] = Field(..., description="Hasil prediksi per id_student")
+    not_found: List[int] = Field(default_factory=list, description="id_student yang tidak ada di database")
+    invalid: List[int] = Field(default_factory=list, description="id_student dengan fitur yang tidak bisa di-encode")
+    message: str = Field(default="", description="Pesan tambahan")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "success": True,
+                "predictions": {"11391": "Pass", "28400": "Fail"},
+                "not_found": [99999],
+                "invalid": [],
+                "message": "Final result predicted for 2 of 3 students"
+            }
+        }
+
+
 class ErrorResponse(BaseModel):
     """Response untuk error"""
     success: bool = Field(default=False, description="Status keberhasilan (selalu false untuk error)")
@@ -0,0 +1,35 @@
+"""
+Migrasi satu kali untuk query fitur per enrollment (services/student_features.py)
+
+Scoring job, export, at-risk dan prediksi by ID menghitung clicks dan score lewat subquery berkorelasi per baris
+studentinfo. Tanpa index di studentvle(id_student, code_module, code_presentation) dan studentassessment(id_student)
+setiap baris men-scan tabel fakta. CREATE INDEX memakan waktu di tabel besar, jadi jalankan sekali dari satu proses:
+
+    python src/scripts/migrate_feature_indexes.py
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+from core.logging import logger
+from services.student_features import ensure_feature_indexes
+
+
+def main() -> int:
+    try:
+        created = ensure_feature_indexes()
+    except Exception as e:
+        logger.error(f"Feature index migration failed: {e}")
+        return 1
+    if created:
+        logger.success(f"Created {', '.join(created)}")
+    else:
+        logger.info("Feature indexes already present")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
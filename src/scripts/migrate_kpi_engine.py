@@ -0,0 +1,36 @@
+"""
+Migrasi satu kali untuk KPI_ENGINE=incremental
+
+Menambah kolom row_id (AUTO_INCREMENT + UNIQUE KEY) ke studentvle dan studentassessment, lalu membuat
+rollup tables (rollup per mahasiswa lama tanpa click_rows di-ALTER dan di-recompute). ALTER me-rebuild tabel fakta, jadi jalankan sekali dari satu proses (misal saat maintenance),
+bukan dari startup setiap worker:
+
+    python src/scripts/migrate_kpi_engine.py
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+from core.logging import logger
+from services.kpi_engine import KPIAggregationEngine
+
+
+def main() -> int:
+    engine = KPIAggregationEngine(mode=KPIAggregationEngine.ENGINE_INCREMENTAL)
+    try:
+        altered = engine.migrate()
+    except Exception as e:
+        logger.error(f"KPI engine migration failed: {e}")
+        return 1
+    if altered:
+        logger.success(f"Altered {', '.join(altered)} for the incremental KPI engine")
+    else:
+        logger.info("row_id and click_rows already present, rollup tables ensured")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
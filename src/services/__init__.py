@@ -1,4 +1,11 @@
 from .model_service import ModelService
 from .predictor_service import PredictorService
 from .encoder_service import EncoderService
-from .kpi_service import KPIService
\ No newline at end of file
+from .kpi_service import KPIService
+from .inference_executor import InferenceExecutor
+from .prediction_batcher import PredictionBatcher
+from .scoring_job import StudentScoringJob
+from .kpi_engine import KPIAggregationEngine
+from .kpi_timeseries import KPITimeseriesService
+from .kpi_snapshot import KPISnapshotStore
+from .kpi_broadcaster import KPIBroadcaster
@@ -0,0 +1,205 @@
+"""
+Daftar top-K mahasiswa dengan probabilitas dropout tertinggi (per module/presentation)
+Seleksi parsial (argpartition) atas probabilitas tersimpan scoring job, atau dihitung per chunk tanpa sort penuh
+"""
+from datetime import datetime
+from typing import Any, Dict, Optional
+import numpy as np
+from core import deadline
+from core.cache import cache
+from core.database import db
+from core.deadline import DeadlineExceeded
+from core.logging import logger
+from config import settings
+from services.predictor_service import RAW_FEATURE_DTYPES
+from services.scoring_export import ScoringExportService
+from services.scoring_job import StudentScoringJob
+from schemas.requests.kpi_requests import KPIFilter
+
+SOURCE_STORED = "stored_predictions"
+SOURCE_COMPUTED = "computed"
+# Kolom kandidat yang dibawa saat seleksi
+CANDIDATE_COLUMNS = ("id_student", "code_module", "code_presentation", "dropout_probability")
+
+
+def top_k(scores: np.ndarray, k: int, ids: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Index K skor tertinggi, urut skor turun (seri: id naik), tanpa sort seluruh array
+
+    argpartition O(n) memilih ambang skor ke-K, hanya kandidat >= ambang yang di-sort.
+
+    Args:
+        scores: Skor per baris
+        k: Jumlah baris yang diambil
+        ids: Tie-breaker deterministik (default: index baris)
+
+    Returns:
+        Array index (panjang min(k, len(scores)))
+    """
+    n = len(scores)
+    k = min(int(k), n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if ids is None:
+        ids = np.arange(n)
+    if k < n:
+        threshold = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        candidates = np.flatnonzero(scores >= threshold)
+    else:
+        candidates = np.arange(n)
+    order = np.lexsort((ids[candidates], -scores[candidates]))
+    return candidates[order[:k]]
+
+
+def _select(columns: Dict[str, np.ndarray], k: int) -> Dict[str, np.ndarray]:
+    """Potong kolom kandidat ke top-K berdasarkan dropout_probability"""
+    index = top_k(columns["dropout_probability"], k, columns["id_student"])
+    return {name: columns[name][index] for name in CANDIDATE_COLUMNS}
+
+
+class AtRiskService:
+    """Top-K at-risk list dengan cache per filter; setiap request hanya slice list yang sudah terurut"""
+
+    CACHE_KEY_PREFIX = "kpi:at_risk"
+
+    def __init__(self, scoring_job: StudentScoringJob, scoring_export: ScoringExportService,
+                 cache_ttl_seconds: int = 300, max_top: Optional[int] = None):
+        """
+        Args:
+            scoring_job: Sumber probabilitas tersimpan dan scoring per chunk
+            scoring_export: Query fitur cohort (dipakai kalau belum ada probabilitas tersimpan)
+            cache_ttl_seconds: TTL list per filter
+            max_top: Panjang list yang dihitung dan di-cache (default: settings.AT_RISK_MAX_TOP)
+        """
+        self.scoring_job = scoring_job
+        self.scoring_export = scoring_export
+        self.cache_ttl = cache_ttl_seconds
+        self.max_top = max_top or settings.AT_RISK_MAX_TOP
+
+    @staticmethod
+    def normalize_filter(kpi_filter: Optional[KPIFilter]) -> KPIFilter:
+        """Hanya code_module/code_presentation yang berlaku (prediksi tidak per rentang hari)"""
+        if kpi_filter is None:
+            return KPIFilter()
+        return KPIFilter(code_module=kpi_filter.code_module, code_presentation=kpi_filter.code_presentation)
+
+    def cache_key(self, kpi_filter: KPIFilter) -> str:
+        return kpi_filter.cache_key(self.CACHE_KEY_PREFIX)
+
+    def clear_cache(self) -> int:
+        """Hapus semua list at-risk (dipanggil setelah scoring job selesai / cache clear)"""
+        deleted = int(cache.delete(self.CACHE_KEY_PREFIX))
+        return deleted + cache.delete_pattern(f"{self.CACHE_KEY_PREFIX}:*")
+
+    def _from_stored(self, kpi_filter: KPIFilter) -> Optional[Dict[str, Any]]:
+        """Top-K dari probabilitas tersimpan, None kalau belum ada run selesai dengan probabilitas"""
+        try:
+            columns = self.scoring_job.get_dropout_probabilities(kpi_filter)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.warning(f"Stored dropout probabilities not available: {e}")
+            return None
+        if columns is None:
+            return None
+        return {
+            "source": SOURCE_STORED,
+            "total_students": len(columns["id_student"]),
+            "top": _select(columns, self.max_top),
+        }
+
+    def _computed(self, kpi_filter: KPIFilter) -> Dict[str, Any]:
+        """Score cohort per chunk dan gabungkan top-K berjalan (memory konstan, tanpa sort seluruh populasi)"""
+        query, params = self.scoring_export.build_query(kpi_filter)
+        chunks = db.iter_chunks(
+            query, params, chunk_size=self.scoring_export.chunk_size,
+            row_format=db.ROW_FORMAT_COLUMNS, dtypes=RAW_FEATURE_DTYPES,
+        )
+        best: Optional[Dict[str, np.ndarray]] = None
+        total = 0
+        try:
+            for columns in chunks:
+                deadline.check("at_risk")
+                valid, _, probability, _ = self.scoring_job.score_columns(columns)
+                if not valid.any():
+                    continue
+                scored = {name: columns[name][valid] for name in CANDIDATE_COLUMNS[:-1]}
+                scored["dropout_probability"] = probability
+                total += len(probability)
+                if best is not None:
+                    scored = {name: np.concatenate([best[name], scored[name]]) for name in CANDIDATE_COLUMNS}
+                best = _select(scored, self.max_top)
+        finally:
+            chunks.close()
+        if best is None:
+            best = {name: np.empty(0) for name in CANDIDATE_COLUMNS}
+        return {"source": SOURCE_COMPUTED, "total_students": total, "top": best}
+
+    def _build(self, kpi_filter: KPIFilter) -> Dict[str, Any]:
+        result = self._from_stored(kpi_filter) or self._computed(kpi_filter)
+        top = result.pop("top")
+        result["students"] = [
+            {
+                "rank": rank,
+                "id_student": int(id_student),
+                "code_module": code_module,
+                "code_presentation": code_presentation,
+                "dropout_probability": round(float(probability), 4),
+            }
+            for rank, (id_student, code_module, code_presentation, probability) in enumerate(
+                zip(*(top[name].tolist() for name in CANDIDATE_COLUMNS)), start=1
+            )
+        ]
+        result["model_version"] = self.scoring_job.model_version
+        result["generated_at"] = datetime.now().isoformat()
+        return result
+
+    def _slice(self, result: Dict[str, Any], kpi_filter: KPIFilter, top: int) -> Dict[str, Any]:
+        """Ambil K teratas dari list ter-cache"""
+        top = max(1, min(int(top), self.max_top))
+        return {
+            **result,
+            "students": result["students"][:top],
+            "top": top,
+            "filters": None if kpi_filter.is_empty else kpi_filter.model_dump(),
+        }
+
+    def get_cached(self, kpi_filter: Optional[KPIFilter] = None, top: int = 20) -> Optional[Dict[str, Any]]:
+        """
+        Top-K dari cache saja, tanpa query/scoring
+
+        Returns:
+            Sama dengan get_at_risk, None kalau list untuk filter ini belum di-cache
+        """
+        kpi_filter = self.normalize_filter(kpi_filter)
+        result = cache.get(self.cache_key(kpi_filter))
+        return None if result is None else self._slice(result, kpi_filter, top)
+
+    def get_at_risk(self, kpi_filter: Optional[KPIFilter] = None, top: int = 20, refresh: bool = False) -> Dict[str, Any]:
+        """
+        Top-K mahasiswa paling berisiko dropout
+
+        Cache miss bisa men-score seluruh cohort (kalau belum ada probabilitas tersimpan); caller HTTP
+        menjalankannya di dalam slot admission kpi_refresh.
+
+        Args:
+            kpi_filter: Filter module/presentation (date range diabaikan)
+            top: Jumlah mahasiswa (maksimal max_top)
+            refresh: Hitung ulang, abaikan cache
+
+        Returns:
+            Dict students (rank, id_student, module, presentation, dropout_probability), total_students,
+            source (stored_predictions / computed), model_version, top, filters
+        """
+        kpi_filter = self.normalize_filter(kpi_filter)
+        cache_key = self.cache_key(kpi_filter)
+
+        result = None if refresh else cache.get(cache_key)
+        if result is None:
+            result = self._build(kpi_filter)
+            cache.set(cache_key, result, ttl=self.cache_ttl)
+            logger.info(
+                f"At-risk list computed for {cache_key} from {result['source']} "
+                f"({result['total_students']} students, top {len(result['students'])})"
+            )
+        return self._slice(result, kpi_filter, top)
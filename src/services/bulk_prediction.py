@@ -0,0 +1,133 @@
+"""
+Prediksi untuk banyak id_student sekaligus
+Fitur diambil dengan satu query WHERE id_student IN (...) per chunk (query fitur bersama services.student_features),
+encode dan predict vectorized
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from core.database import db
+from core.logging import logger
+from config import settings
+from services.encoder_service import EncoderService
+from services.inference_executor import InferenceExecutor
+from services.predictor_service import DROPOUT_MODEL, FINAL_GRADE_MODEL, RAW_FEATURE_DTYPES
+from services.scoring_job import StudentScoringJob
+from services.student_features import LATEST_ENROLLMENT_ORDER, features_query
+
+# Kolom prediksi tersimpan (student_predictions) per model
+STORED_COLUMNS = {DROPOUT_MODEL: "dropout_prediction", FINAL_GRADE_MODEL: "final_result_prediction"}
+
+
+class BulkPredictionService:
+    """Prediksi dropout / final result untuk daftar id_student (set-based, tanpa query per mahasiswa)"""
+
+    # Enrollment terbaru satu mahasiswa untuk prediksi by ID, query fitur sama dengan bulk dan scoring job
+    STUDENT_FEATURES_QUERY = features_query(" AND si.id_student = %s", LATEST_ENROLLMENT_ORDER) + "    LIMIT 1\n"
+
+    def __init__(self, encoder_service: EncoderService, inference_executor: InferenceExecutor,
+                 scoring_job: Optional[StudentScoringJob] = None, chunk_size: Optional[int] = None):
+        """
+        Args:
+            encoder_service: EncoderService instance
+            inference_executor: InferenceExecutor untuk batch prediction
+            scoring_job: Sumber prediksi tersimpan (optional)
+            chunk_size: Jumlah id per query IN (...) (default: settings.PREDICT_BULK_QUERY_CHUNK_SIZE)
+        """
+        self.encoder_service = encoder_service
+        self.inference_executor = inference_executor
+        self.scoring_job = scoring_job
+        self.chunk_size = max(1, chunk_size or settings.PREDICT_BULK_QUERY_CHUNK_SIZE)
+
+    def _chunks(self, ids: Sequence[int]):
+        for start in range(0, len(ids), self.chunk_size):
+            yield ids[start:start + self.chunk_size]
+
+    def _stored(self, model_name: str, ids: Sequence[int]) -> Dict[int, Any]:
+        """Prediksi tersimpan scoring job, kosong kalau belum ada atau tabel belum tersedia"""
+        if self.scoring_job is None:
+            return {}
+        try:
+            rows = {}
+            for chunk in self._chunks(ids):
+                rows.update(self.scoring_job.get_stored_predictions(chunk))
+        except Exception as e:
+            logger.warning(f"Stored prediction lookup failed for {len(ids)} students: {e}")
+            return {}
+        column = STORED_COLUMNS[model_name]
+        return {id_student: row[column] for id_student, row in rows.items()}
+
+    def _fetch_features(self, ids: Sequence[int]) -> Dict[str, np.ndarray]:
+        """Fitur mentah satu baris per id_student (presentation terbaru), satu query per chunk"""
+        chunks = []
+        for chunk in self._chunks(ids):
+            placeholders = ", ".join(["%s"] * len(chunk))
+            query = features_query(f" AND si.id_student IN ({placeholders})", LATEST_ENROLLMENT_ORDER)
+            chunks.append(db.fetch_columns(query, tuple(chunk), dtypes={"id_student": np.int64, **RAW_FEATURE_DTYPES}))
+        columns = chunks[0] if len(chunks) == 1 else {name: np.concatenate([c[name] for c in chunks]) for name in chunks[0]}
+        # Query terurut per id_student lalu presentation terbaru: ambil baris pertama setiap id
+        _, first = np.unique(columns["id_student"], return_index=True)
+        if len(first) < len(columns["id_student"]):
+            columns = {name: values[first] for name, values in columns.items()}
+        return columns
+
+    def get_student_features(self, id_student: int) -> Optional[Dict[str, Any]]:
+        """
+        Fitur mentah enrollment terbaru satu mahasiswa (baris yang sama dengan yang dipilih prediksi bulk)
+
+        Args:
+            id_student: ID mahasiswa
+
+        Returns:
+            Dict fitur untuk encode_dropout / encode_finalgrade, None kalau mahasiswa tidak ada
+        """
+        row = db.execute_one(self.STUDENT_FEATURES_QUERY, (id_student,))
+        if not row:
+            return None
+        return {
+            "gender": row["gender"],
+            "age_band": row["age_band"],
+            "studied_credits": float(row["studied_credits"]),
+            "num_of_prev_attempts": float(row["num_of_prev_attempts"]),
+            "total_clicks": float(row["total_clicks"]),
+            "avg_assessment_score": float(row["avg_assessment_score"]),
+        }
+
+    def predict(self, model_name: str, ids: Sequence[int]) -> Tuple[Dict[int, Any], List[int], List[int], int]:
+        """
+        Predict untuk banyak mahasiswa
+
+        Args:
+            model_name: DROPOUT_MODEL atau FINAL_GRADE_MODEL
+            ids: Daftar id_student (duplikat diabaikan)
+
+        Returns:
+            Tuple (predictions id -> hasil sesuai urutan ids, not_found, invalid (fitur tidak bisa di-encode),
+            jumlah hasil dari prediksi tersimpan)
+        """
+        ids = list(dict.fromkeys(int(i) for i in ids))
+        found = self._stored(model_name, ids)
+        stored_count = len(found)
+        pending = [i for i in ids if i not in found]
+        invalid: List[int] = []
+
+        if pending:
+            columns = self._fetch_features(pending)
+            valid = self.encoder_service.valid_rows(columns)
+            invalid = [int(i) for i in columns["id_student"][~valid]]
+            columns = {name: values[valid] for name, values in columns.items()}
+            if len(columns["id_student"]):
+                encoded = self.encoder_service.encode_columns(columns)
+                predictor = self.inference_executor.predictor_service
+                predictions = self.inference_executor.run(model_name, predictor.feature_matrix(model_name, encoded))
+                found.update(zip(columns["id_student"].tolist(), predictions.tolist()))
+
+        if model_name == DROPOUT_MODEL:
+            found = {id_student: int(value) for id_student, value in found.items()}
+        invalid_set = set(invalid)
+        predictions = {i: found[i] for i in ids if i in found}
+        not_found = [i for i in ids if i not in found and i not in invalid_set]
+        logger.info(
+            f"Bulk {model_name} prediction: {len(predictions)} predicted ({stored_count} stored), "
+            f"{len(not_found)} not found, {len(invalid)} invalid"
+        )
+        return predictions, not_found, invalid, stored_count
@@ -0,0 +1,161 @@
+"""
+Compiled RandomForest inference engine
+Forest sklearn di-compile jadi flat NumPy arrays lalu dievaluasi vectorized per batch
+"""
+from typing import Any, List
+import numpy as np
+
+# sklearn melakukan traversal tree dengan input float32
+_TREE_DTYPE = np.float32
+
+
+class CompiledForest:
+    """
+    Representasi flat dari RandomForestClassifier
+
+    Semua node dari semua tree digabung ke satu array (feature, threshold,
+    left/right child, leaf value). Leaf menunjuk ke dirinya sendiri sehingga
+    traversal cukup diulang sebanyak max_depth untuk semua tree sekaligus.
+    """
+
+    def __init__(self, model: Any):
+        """
+        Compile fitted sklearn RandomForestClassifier
+
+        Args:
+            model: Fitted RandomForestClassifier
+
+        Raises:
+            TypeError: Jika model bukan forest classifier single-output
+        """
+        estimators = getattr(model, "estimators_", None)
+        if not estimators or not hasattr(model, "classes_"):
+            raise TypeError(f"Cannot compile {type(model).__name__}: not a fitted forest classifier")
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise TypeError("Cannot compile multi-output forest")
+
+        self.classes_ = model.classes_
+        self.n_features_in_ = model.n_features_in_
+        self.n_classes_ = len(self.classes_)
+        self.n_trees = len(estimators)
+
+        features: List[np.ndarray] = []
+        thresholds: List[np.ndarray] = []
+        lefts: List[np.ndarray] = []
+        rights: List[np.ndarray] = []
+        missing_left: List[np.ndarray] = []
+        values: List[np.ndarray] = []
+        roots = np.empty(self.n_trees, dtype=np.intp)
+        offset = 0
+        max_depth = 0
+
+        for i, estimator in enumerate(estimators):
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(n_nodes, dtype=np.intp) + offset
+            is_leaf = tree.children_left == -1
+
+            feature = np.where(is_leaf, 0, tree.feature).astype(np.intp)
+            left = np.where(is_leaf, node_ids, tree.children_left + offset).astype(np.intp)
+            right = np.where(is_leaf, node_ids, tree.children_right + offset).astype(np.intp)
+            mgl = getattr(tree, "missing_go_to_left", None)
+            mgl = np.zeros(n_nodes, dtype=bool) if mgl is None else np.asarray(mgl, dtype=bool)
+
+            # Sama seperti DecisionTreeClassifier.predict_proba: normalisasi per node
+            proba = np.array(tree.value[:, 0, :self.n_classes_], dtype=np.float64)
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            proba /= normalizer
+
+            features.append(feature)
+            thresholds.append(tree.threshold.astype(np.float64))
+            lefts.append(left)
+            rights.append(right)
+            missing_left.append(mgl)
+            values.append(proba)
+            roots[i] = offset
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        self.feature = np.concatenate(features)
+        self.threshold = np.concatenate(thresholds)
+        self.children_left = np.concatenate(lefts)
+        self.children_right = np.concatenate(rights)
+        self.missing_go_to_left = np.concatenate(missing_left)
+        self.value = np.concatenate(values)
+        self.roots = roots
+        self.is_leaf = self.children_left == np.arange(offset)
+        self.max_depth = max_depth
+
+    def apply(self, X: Any) -> np.ndarray:
+        """
+        Cari leaf index (global) untuk setiap tree dan sample
+
+        Args:
+            X: Feature matrix (n_samples, n_features)
+
+        Returns:
+            Array (n_trees, n_samples) berisi index leaf
+        """
+        X = self._validate(X)
+        has_nan = bool(np.isnan(X).any())
+        n_samples = X.shape[0]
+        # Flat (tree, sample) pairs, hanya pair yang belum sampai leaf yang diproses
+        nodes = np.repeat(self.roots, n_samples)
+        samples = np.tile(np.arange(n_samples), self.n_trees)
+        active = np.arange(nodes.size)
+
+        for _ in range(self.max_depth):
+            current = nodes[active]
+            x = X[samples[active], self.feature[current]]
+            go_left = x <= self.threshold[current]
+            if has_nan:
+                # Sama seperti sklearn: NaN dikirim sesuai missing_go_to_left
+                go_left |= np.isnan(x) & self.missing_go_to_left[current]
+            current = np.where(go_left, self.children_left[current], self.children_right[current])
+            nodes[active] = current
+            active = active[~self.is_leaf[current]]
+            if active.size == 0:
+                break
+        return nodes.reshape(self.n_trees, n_samples)
+
+    def predict_proba(self, X: Any) -> np.ndarray:
+        """
+        Predict class probabilities (identik dengan RandomForestClassifier.predict_proba)
+
+        Args:
+            X: Feature matrix (n_samples, n_features)
+
+        Returns:
+            Array (n_samples, n_classes)
+        """
+        leaves = self.apply(X)
+        proba = np.zeros((leaves.shape[1], self.n_classes_), dtype=np.float64)
+        # Akumulasi berurutan per tree supaya hasil floating point sama dengan sklearn
+        for tree_leaves in leaves:
+            proba += self.value[tree_leaves]
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X: Any) -> np.ndarray:
+        """
+        Predict class labels (identik dengan RandomForestClassifier.predict)
+
+        Args:
+            X: Feature matrix (n_samples, n_features)
+
+        Returns:
+            Array (n_samples,) berisi label dari classes_
+        """
+        proba = self.predict_proba(X)
+        return self.classes_.take(np.argmax(proba, axis=1), axis=0)
+
+    def _validate(self, X: Any) -> np.ndarray:
+        X = np.asarray(X, dtype=_TREE_DTYPE)
+        if X.ndim != 2:
+            raise ValueError(f"Expected 2D feature matrix, got {X.ndim}D")
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f"X has {X.shape[1]} features, but forest is expecting {self.n_features_in_} features"
+            )
+        return X
@@ -2,6 +2,8 @@
 Docstring for services.encoder_service
 encoder service untuk mengelola label encoders
 """
+from typing import Dict, Mapping
+import numpy as np
 from services.model_service import model_service
 from schemas.types import DropoutFeaturesEncoded, FinalResultFeaturesEncoded, DropoutFeatures, FinalResultFeatures
 from core.logging import logger
@@ -41,4 +43,37 @@ class EncoderService:
             "num_of_prev_attempts": data["num_of_prev_attempts"],
             "total_clicks": data["total_clicks"],
             "avg_assessment_score": data["avg_assessment_score"]
-        }
\ No newline at end of file
+        }
+    
+    def valid_rows(self, columns: Mapping[str, np.ndarray]) -> np.ndarray:
+        """Mask baris yang bisa di-encode (kategori dikenal encoder dan numerik tidak kosong)"""
+        if not self.label_encoder_finalgrade:
+            raise Exception("Final Result label encoder is not loaded")
+        mask = np.ones(len(columns["gender"]), dtype=bool)
+        for name in ("gender", "age_band"):
+            mask &= np.isin(columns[name], self.label_encoder_finalgrade[name].classes_)
+        for name in ("studied_credits", "num_of_prev_attempts", "total_clicks", "avg_assessment_score"):
+            mask &= ~np.isnan(np.asarray(columns[name], dtype=np.float64))
+        return mask
+    
+    def encode_columns(self, columns: Mapping[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """
+        Encode fitur dalam bentuk kolom (vectorized, satu transform per kolom)
+        
+        Args:
+            columns: Dict nama fitur -> array nilai mentah (semua baris harus valid, lihat valid_rows)
+            
+        Returns:
+            Dict nama fitur -> array numerik (encoding sama untuk final result dan dropout)
+        """
+        if not self.label_encoder_finalgrade:
+            logger.exception("Final Result label encoder is not loaded") 
+            raise Exception("Final Result label encoder is not loaded")
+        return {
+            "gender": self.label_encoder_finalgrade['gender'].transform(columns["gender"]),
+            "age_band": self.label_encoder_finalgrade['age_band'].transform(columns["age_band"]),
+            "studied_credits": np.asarray(columns["studied_credits"], dtype=np.float64),
+            "num_of_prev_attempts": np.asarray(columns["num_of_prev_attempts"], dtype=np.float64),
+            "total_clicks": np.asarray(columns["total_clicks"], dtype=np.float64),
+            "avg_assessment_score": np.asarray(columns["avg_assessment_score"], dtype=np.float64),
+        }
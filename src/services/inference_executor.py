@@ -0,0 +1,247 @@
+"""
+Inference executor untuk CPU-bound predictions
+Mode "inline" jalan di proses yang sama, mode "process" dispatch batch ke process pool
+"""
+import asyncio
+import multiprocessing
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from config import settings
+from core import deadline
+from core.deadline import DeadlineExceeded
+from core.logging import logger
+from services.predictor_service import PredictorService, DROPOUT_MODEL, FINAL_GRADE_MODEL
+from schemas.types import DropoutFeaturesEncoded, FinalResultFeaturesEncoded
+
+# PredictorService milik worker process (di-load sekali oleh initializer)
+_worker_predictor: Optional[PredictorService] = None
+
+
+def _init_worker(backend: str):
+    """Initializer worker process: load pickles sekali per proses"""
+    global _worker_predictor
+    from services.model_service import model_service
+
+    model_service.load_models()
+    _worker_predictor = PredictorService(backend=backend)
+
+
+def _worker_ping() -> int:
+    """No-op untuk warm up worker (memastikan initializer sudah jalan)"""
+    return multiprocessing.current_process().pid
+
+
+def _worker_predict(model_name: str, payload: Any, proba: bool = False) -> np.ndarray:
+    """
+    Predict di worker process
+
+    Args:
+        model_name: Nama model
+        payload: ndarray langsung, atau tuple (shm_name, shape, dtype) untuk batch besar
+        proba: Return probabilitas per kelas (predict_proba) alih-alih label
+    """
+    predict = _worker_predictor.predict_proba_matrix if proba else _worker_predictor.predict_matrix
+    if not isinstance(payload, tuple):
+        return predict(model_name, payload)
+
+    shm_name, shape, dtype = payload
+    # Segment dimiliki parent (close + unlink di sana); worker hanya attach dan close
+    if sys.version_info >= (3, 13):
+        shm = shared_memory.SharedMemory(name=shm_name, track=False)
+    else:
+        shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        X = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        predictions = predict(model_name, X)
+        del X
+        return predictions
+    finally:
+        shm.close()
+
+
+class InferenceExecutor:
+    """Dispatch batched predictions ke inline predictor atau process pool"""
+
+    MODE_INLINE = "inline"
+    MODE_PROCESS = "process"
+
+    def __init__(
+        self,
+        predictor_service: PredictorService,
+        mode: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        shm_min_rows: Optional[int] = None,
+    ):
+        """
+        Args:
+            predictor_service: PredictorService di proses utama (untuk mode inline dan feature matrix)
+            mode: "inline" atau "process" (default: settings.INFERENCE_EXECUTOR)
+            max_workers: Jumlah worker process (default: settings.INFERENCE_WORKERS)
+            shm_min_rows: Batch dengan baris >= ini dikirim lewat shared memory
+        """
+        self.predictor_service = predictor_service
+        self.mode = mode or settings.INFERENCE_EXECUTOR
+        if self.mode not in (self.MODE_INLINE, self.MODE_PROCESS):
+            logger.warning(f"Unknown inference executor '{self.mode}', using inline")
+            self.mode = self.MODE_INLINE
+        self.max_workers = max(1, max_workers or settings.INFERENCE_WORKERS)
+        self.shm_min_rows = settings.INFERENCE_SHM_MIN_ROWS if shm_min_rows is None else shm_min_rows
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+
+        # Metrics
+        self._batches = 0
+        self._rows = 0
+        self._shm_batches = 0
+
+    @property
+    def concurrency(self) -> int:
+        """Jumlah batch yang bisa jalan paralel"""
+        return self.max_workers if self.mode == self.MODE_PROCESS else 1
+
+    def start(self):
+        """Start process pool dan tunggu semua worker selesai load model"""
+        with self._start_lock:
+            if self.mode != self.MODE_PROCESS or self._pool is not None:
+                return
+            pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.predictor_service.backend,),
+            )
+            # Ping bisa dilayani worker yang sama, jadi pid unik tidak sama dengan jumlah worker
+            pids = {f.result() for f in [pool.submit(_worker_ping) for _ in range(self.max_workers)]}
+            self._pool = pool
+        logger.info(f"Inference process pool started: {self.max_workers} workers (warmed pids: {sorted(pids)})")
+
+    def shutdown(self):
+        """Stop process pool"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+            logger.info("Inference process pool stopped")
+
+    def _submit(self, model_name: str, X: np.ndarray, proba: bool = False):
+        """
+        Submit batch ke pool
+
+        Pool harus sudah di-start (start() memblok sampai worker load model, jadi dipanggil saat startup,
+        bukan dari event loop). Shared memory dilepas oleh done-callback future pool: setelah worker selesai,
+        atau langsung kalau future di-cancel sebelum worker mengambilnya.
+
+        Raises:
+            RuntimeError: Process pool belum di-start atau sudah di-shutdown
+        """
+        pool = self._pool
+        if pool is None:
+            raise RuntimeError("Inference process pool is not started")
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        with self._lock:
+            self._batches += 1
+            self._rows += len(X)
+
+        if len(X) < self.shm_min_rows:
+            return pool.submit(_worker_predict, model_name, X, proba)
+
+        shm = shared_memory.SharedMemory(create=True, size=max(1, X.nbytes))
+        np.ndarray(X.shape, dtype=X.dtype, buffer=shm.buf)[:] = X
+        with self._lock:
+            self._shm_batches += 1
+        try:
+            future = pool.submit(_worker_predict, model_name, (shm.name, X.shape, X.dtype.str), proba)
+        except Exception:
+            self._release(shm)
+            raise
+        # Bukan di finally pemanggil: deadline/cancel tidak menghentikan worker yang sedang attach ke segment
+        future.add_done_callback(lambda _: self._release(shm))
+        return future
+
+    @staticmethod
+    def _release(shm: Optional[shared_memory.SharedMemory]):
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+    def run(self, model_name: str, X: Any, proba: bool = False) -> np.ndarray:
+        """
+        Predict satu feature matrix (blocking)
+
+        Args:
+            model_name: FINAL_GRADE_MODEL atau DROPOUT_MODEL
+            X: Feature matrix
+            proba: Return probabilitas per kelas (n_samples, n_classes) alih-alih label
+
+        Returns:
+            Array hasil prediksi per baris
+
+        Raises:
+            DeadlineExceeded: Deadline request habis (batch yang belum jalan di pool di-cancel)
+        """
+        timeout = deadline.check("inference")
+        if self.mode == self.MODE_INLINE:
+            with self._lock:
+                self._batches += 1
+                self._rows += len(X)
+            if proba:
+                return self.predictor_service.predict_proba_matrix(model_name, X)
+            return self.predictor_service.predict_matrix(model_name, X)
+
+        future = self._submit(model_name, X, proba)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise DeadlineExceeded("Request deadline exceeded during inference") from None
+
+    async def run_async(self, model_name: str, X: Any, proba: bool = False) -> np.ndarray:
+        """
+        Predict satu feature matrix tanpa memblok event loop, dibatasi deadline request
+
+        Mode inline jalan di thread pool (context/deadline ikut), mode process menunggu future pool.
+        """
+        if self.mode == self.MODE_INLINE:
+            return await asyncio.to_thread(self.run, model_name, X, proba)
+
+        deadline.check("inference")
+        future = self._submit(model_name, X, proba)
+        if deadline.remaining() is None:
+            return await asyncio.wrap_future(future)
+        # Cancel wrapper ikut meng-cancel future pool (batch yang belum jalan tidak dikerjakan)
+        return await deadline.wait_for(asyncio.wrap_future(future), "inference")
+
+    def predict_dropout_batch(self, features: Sequence[DropoutFeaturesEncoded]) -> List[int]:
+        """Predict dropout untuk banyak mahasiswa (blocking)"""
+        predictions = self.run(DROPOUT_MODEL, self.predictor_service.dropout_matrix(features))
+        return [int(p) for p in predictions]
+
+    def predict_final_grade_batch(self, features: Sequence[FinalResultFeaturesEncoded]) -> List[Any]:
+        """Predict Final Result untuk banyak mahasiswa (blocking)"""
+        return list(self.run(FINAL_GRADE_MODEL, self.predictor_service.final_grade_matrix(features)))
+
+    async def predict_dropout_batch_async(self, features: Sequence[DropoutFeaturesEncoded]) -> List[int]:
+        """Predict dropout untuk banyak mahasiswa (async)"""
+        predictions = await self.run_async(DROPOUT_MODEL, self.predictor_service.dropout_matrix(features))
+        return [int(p) for p in predictions]
+
+    async def predict_final_grade_batch_async(self, features: Sequence[FinalResultFeaturesEncoded]) -> List[Any]:
+        """Predict Final Result untuk banyak mahasiswa (async)"""
+        return list(await self.run_async(FINAL_GRADE_MODEL, self.predictor_service.final_grade_matrix(features)))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Metrics executor"""
+        return {
+            "mode": self.mode,
+            "workers": self.max_workers if self.mode == self.MODE_PROCESS else 0,
+            "running": self._pool is not None,
+            "backend": self.predictor_service.backend,
+            "batches": self._batches,
+            "rows": self._rows,
+            "shared_memory_batches": self._shm_batches,
+            "shm_min_rows": self.shm_min_rows,
+        }
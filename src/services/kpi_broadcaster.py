@@ -0,0 +1,188 @@
+"""
+Push update KPI ke dashboard (Server-Sent Events)
+Refresh KPI di worker mana pun di-publish ke Redis pub/sub; setiap worker punya satu subscription
+dan fan-out ke client SSE lokal, jadi ribuan dashboard = satu recompute + satu push
+"""
+import asyncio
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from redis.asyncio import Redis
+from core.cache import DecimalEncoder, RedisCache, cache as default_cache
+from core.logging import logger
+from config import settings
+from schemas.requests.kpi_requests import KPIFilter
+
+
+def sse_frame(event: str, data: str, event_id: Optional[str] = None) -> str:
+    """Format satu event SSE (data multi-baris dipecah per baris)"""
+    lines = [f"event: {event}"]
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.extend(f"data: {line}" for line in data.splitlines() or [""])
+    return "\n".join(lines) + "\n\n"
+
+
+def kpi_event(etag: str, kpis: List[Dict[str, Any]], changed: List[Any]) -> str:
+    """Frame SSE event "kpis": payload KPI lengkap + daftar kpi_id yang berubah, id = ETag"""
+    data = json.dumps({"etag": etag, "changed_kpis": changed, "data": kpis}, cls=DecimalEncoder)
+    return sse_frame("kpis", data, etag)
+
+
+def changed_kpi_ids(previous: Optional[List[Dict[str, Any]]], current: List[Dict[str, Any]]) -> List[Any]:
+    """kpi_id yang nilainya berubah dibanding hasil sebelumnya (semua kalau tidak ada hasil sebelumnya)"""
+    before = {kpi.get("kpi_id"): kpi for kpi in previous or []}
+    return [kpi.get("kpi_id") for kpi in current if before.get(kpi.get("kpi_id")) != kpi]
+
+
+class KPIBroadcaster:
+    """Redis pub/sub listener per worker + fan-out ke queue client SSE"""
+    
+    # Lock refresh per slice: satu worker recompute, worker lain dapat hasilnya lewat pub/sub
+    REFRESH_LOCK_PREFIX = "kpi:stream:refresh"
+
+    def __init__(self, redis_client: Optional[Redis] = None, sync_cache: Optional[RedisCache] = None,
+                 channel: Optional[str] = None, max_clients: Optional[int] = None, queue_size: int = 8):
+        """
+        Args:
+            redis_client: Client redis.asyncio untuk subscription (None = hanya fan-out lokal)
+            sync_cache: RedisCache untuk publish dari thread refresh (default: cache global)
+            channel: Channel pub/sub (default: settings.KPI_STREAM_CHANNEL)
+            max_clients: Batas client SSE per worker (default: settings.KPI_STREAM_MAX_CLIENTS)
+            queue_size: Event tertunda per client; client lambat kehilangan event terlama
+        """
+        self.redis_client = redis_client
+        self.sync_cache = sync_cache or default_cache
+        self.channel = channel or settings.KPI_STREAM_CHANNEL
+        self.max_clients = settings.KPI_STREAM_MAX_CLIENTS if max_clients is None else max_clients
+        self.queue_size = queue_size
+        # queue client -> (cache key, filter) slice yang di-stream
+        self._subscribers: Dict[asyncio.Queue, Tuple[str, Optional[KPIFilter]]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._refresh_stopped = threading.Event()
+        self.published = 0
+        self.delivered = 0
+
+    async def start(self) -> None:
+        """Mulai listener pub/sub di event loop saat ini"""
+        self._loop = asyncio.get_running_loop()
+        if self.redis_client is not None and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self) -> None:
+        """Subscribe channel, reconnect dengan backoff kalau koneksi Redis putus"""
+        backoff = 1.0
+        while True:
+            pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                logger.info(f"KPI stream subscribed to Redis channel {self.channel}")
+                backoff = 1.0
+                while True:
+                    # Timeout eksplisit: socket_timeout pool (pendek) tidak berlaku untuk menunggu pesan
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is not None and message.get("type") == "message":
+                        self._dispatch(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"KPI stream subscription error: {e}. Retrying in {backoff:.0f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                try:
+                    await pubsub.reset()
+                except Exception:
+                    pass
+
+    def publish(self, cache_key: str, etag: str, kpis: List[Dict[str, Any]], changed: List[Any]) -> None:
+        """
+        Publish hasil refresh (dipanggil dari thread refresh KPIService)
+
+        Kalau Redis tidak tersedia, event dikirim langsung ke client di worker ini
+        """
+        message = json.dumps({"cache_key": cache_key, "etag": etag, "changed_kpis": changed, "data": kpis}, cls=DecimalEncoder)
+        self.published += 1
+        if self.redis_client is not None and self._listener is not None and self.sync_cache.publish(self.channel, message):
+            return
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._dispatch, message)
+
+    def _dispatch(self, message: str) -> None:
+        """Fan-out satu pesan ke semua client yang subscribe slice (cache key) yang sama"""
+        try:
+            payload = json.loads(message)
+            cache_key = payload["cache_key"]
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring malformed KPI stream message")
+            return
+        frame = None
+        for queue, (key, _) in list(self._subscribers.items()):
+            if key != cache_key:
+                continue
+            # Frame diformat sekali untuk semua client slice ini
+            if frame is None:
+                frame = kpi_event(payload.get("etag"), payload.get("data"), payload.get("changed_kpis"))
+            if queue.full():
+                queue.get_nowait()  # client lambat: buang event terlama, event terbaru yang penting
+            queue.put_nowait(frame)
+            self.delivered += 1
+
+    def subscribe(self, cache_key: str, kpi_filter: Optional[KPIFilter] = None) -> Optional[asyncio.Queue]:
+        """Queue event untuk satu client SSE, None kalau batas client worker ini tercapai"""
+        if len(self._subscribers) >= self.max_clients:
+            return None
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[queue] = (cache_key, kpi_filter)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.pop(queue, None)
+
+    def active_slices(self) -> Dict[str, Optional[KPIFilter]]:
+        """Slice KPI (cache key -> filter) yang sedang punya client di worker ini"""
+        return {key: kpi_filter for key, kpi_filter in self._subscribers.values()}
+
+    def stop_refresh(self) -> None:
+        """Minta refresh_active yang sedang jalan berhenti sebelum slice berikutnya (shutdown)"""
+        self._refresh_stopped.set()
+
+    def refresh_active(self, kpi_service, interval: int) -> int:
+        """
+        Recompute slice yang punya client (dipanggil periodik dari thread)
+
+        Hasil yang berubah di-publish oleh KPIService.get_all_kpis; slice yang sudah di-refresh
+        worker lain dalam interval ini dilewati.
+
+        Returns:
+            Jumlah slice yang di-refresh worker ini
+        """
+        refreshed = 0
+        for cache_key, kpi_filter in self.active_slices().items():
+            if self._refresh_stopped.is_set():
+                break
+            lock_key = f"{self.REFRESH_LOCK_PREFIX}:{cache_key}"
+            if not self.sync_cache.add(lock_key, self.sync_cache.instance_id, max(1, interval - 1)):
+                continue
+            kpi_service.get_all_kpis(force_refresh=True, kpi_filter=kpi_filter)
+            refreshed += 1
+        return refreshed
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "channel": self.channel,
+            "clients": len(self._subscribers),
+            "listening": self._listener is not None and not self._listener.done(),
+            "published": self.published,
+            "delivered": self.delivered,
+        }
@@ -0,0 +1,647 @@
+"""
+Incremental aggregation engine untuk KPI 1-5
+Rollup tables per (code_module, code_presentation, hari) dan per mahasiswa, di-update hanya
+dari baris baru (high-water mark di kolom row_id studentvle dan studentassessment).
+row_id yang sudah dialokasikan tapi belum commit saat refresh dicatat sebagai gap dan diterapkan saat muncul.
+"""
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from core.database import db
+from core.logging import logger
+from config import settings
+from schemas.requests.kpi_requests import KPIFilter
+
+
+class KPIAggregationEngine:
+    """Maintain rollup KPI 1-5 secara incremental dari tabel fakta append-only"""
+
+    ENGINE_FULL = "full"
+    ENGINE_INCREMENTAL = "incremental"
+
+    LOCK_NAME = "capstone_kpi_engine"
+
+    # Bucket untuk baris tanpa tanggal (day bagian dari primary key, tidak boleh NULL)
+    NO_DAY = -99999
+
+    # Tabel fakta yang di-track: source -> nama tabel
+    SOURCES = {
+        "studentvle": "studentvle",
+        "studentassessment": "studentassessment",
+    }
+
+    CREATE_WATERMARKS_TABLE = """
+        CREATE TABLE IF NOT EXISTS kpi_watermarks (
+            source VARCHAR(32) NOT NULL PRIMARY KEY,
+            last_row_id BIGINT NOT NULL DEFAULT 0,
+            updated_at DATETIME NOT NULL
+        )
+    """
+    # Rentang row_id di bawah watermark yang belum terlihat saat refresh (transaksi belum commit, atau rollback)
+    CREATE_GAPS_TABLE = """
+        CREATE TABLE IF NOT EXISTS kpi_watermark_gaps (
+            source VARCHAR(32) NOT NULL,
+            gap_start BIGINT NOT NULL,
+            gap_end BIGINT NOT NULL,
+            first_seen DATETIME NOT NULL,
+            PRIMARY KEY (source, gap_start)
+        )
+    """
+    # Rollup per module/presentation/hari: clicks, submissions, scores, on-time counts
+    CREATE_ACTIVITY_ROLLUP_TABLE = """
+        CREATE TABLE IF NOT EXISTS kpi_rollup_activity (
+            code_module VARCHAR(3) NOT NULL,
+            code_presentation VARCHAR(5) NOT NULL,
+            day INT NOT NULL,
+            clicks BIGINT NOT NULL DEFAULT 0,
+            vle_rows BIGINT NOT NULL DEFAULT 0,
+            forum_clicks BIGINT NOT NULL DEFAULT 0,
+            forum_click_rows BIGINT NOT NULL DEFAULT 0,
+            submissions BIGINT NOT NULL DEFAULT 0,
+            scored BIGINT NOT NULL DEFAULT 0,
+            score_sum DOUBLE NOT NULL DEFAULT 0,
+            score_min DOUBLE NULL,
+            score_max DOUBLE NULL,
+            completed BIGINT NOT NULL DEFAULT 0,
+            on_time BIGINT NOT NULL DEFAULT 0,
+            timed BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (code_module, code_presentation, day)
+        )
+    """
+    # Rollup per module/presentation/mahasiswa: untuk distinct count dan KPI 5 (tidak additive antar bucket)
+    CREATE_STUDENT_ROLLUP_TABLE = """
+        CREATE TABLE IF NOT EXISTS kpi_rollup_student (
+            code_module VARCHAR(3) NOT NULL,
+            code_presentation VARCHAR(5) NOT NULL,
+            id_student BIGINT NOT NULL,
+            clicks BIGINT NOT NULL DEFAULT 0,
+            click_rows BIGINT NOT NULL DEFAULT 0,
+            vle_rows BIGINT NOT NULL DEFAULT 0,
+            forum_rows BIGINT NOT NULL DEFAULT 0,
+            scored BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (code_module, code_presentation, id_student),
+            KEY idx_kpi_rollup_student_id (id_student)
+        )
+    """
+
+    # Seluruh state engine: watermark + gap per tabel fakta, rollup aktivitas dan rollup per mahasiswa
+    SCHEMA = (CREATE_WATERMARKS_TABLE, CREATE_GAPS_TABLE, CREATE_ACTIVITY_ROLLUP_TABLE, CREATE_STUDENT_ROLLUP_TABLE)
+
+    # Kolom row_id auto increment sebagai urutan insert (tabel fakta tidak punya primary key)
+    # ALTER me-rebuild tabel fakta terbesar: hanya lewat migrate() (scripts/migrate_kpi_engine.py), bukan saat startup
+    ROW_ID_COLUMN_EXISTS = """
+        SELECT COUNT(*) AS found
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = 'row_id'
+    """
+    ADD_ROW_ID_COLUMN = """
+        ALTER TABLE {table}
+        ADD COLUMN row_id BIGINT NOT NULL AUTO_INCREMENT,
+        ADD UNIQUE KEY uq_{table}_row_id (row_id)
+    """
+    # click_rows (jumlah sum_click non-NULL) ditambahkan setelah rollup per mahasiswa pertama kali dibuat
+    CLICK_ROWS_COLUMN_EXISTS = """
+        SELECT COUNT(*) AS found
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'kpi_rollup_student' AND COLUMN_NAME = 'click_rows'
+    """
+    ADD_CLICK_ROWS_COLUMN = """
+        ALTER TABLE kpi_rollup_student
+        ADD COLUMN click_rows BIGINT NOT NULL DEFAULT 0 AFTER clicks
+    """
+
+    FORUM_SITES = "(SELECT DISTINCT id_site FROM vle WHERE activity_type = 'forumng')"
+
+    # Delta studentvle per module/presentation/hari (KPI 1, total clicks)
+    VLE_ACTIVITY_DELTA = f"""
+        INSERT INTO kpi_rollup_activity
+            (code_module, code_presentation, day, clicks, vle_rows, forum_clicks, forum_click_rows)
+        SELECT
+            COALESCE(sv.code_module, ''),
+            COALESCE(sv.code_presentation, ''),
+            COALESCE(sv.date, {NO_DAY}),
+            COALESCE(SUM(sv.sum_click), 0),
+            COUNT(*),
+            COALESCE(SUM(CASE WHEN f.id_site IS NOT NULL THEN sv.sum_click END), 0),
+            COUNT(CASE WHEN f.id_site IS NOT NULL THEN sv.sum_click END)
+        FROM studentvle sv
+        LEFT JOIN {FORUM_SITES} f ON f.id_site = sv.id_site
+        WHERE {{rows}}
+        GROUP BY 1, 2, 3
+        ON DUPLICATE KEY UPDATE
+            clicks = clicks + VALUES(clicks),
+            vle_rows = vle_rows + VALUES(vle_rows),
+            forum_clicks = forum_clicks + VALUES(forum_clicks),
+            forum_click_rows = forum_click_rows + VALUES(forum_click_rows)
+    """
+    # Delta studentvle per module/presentation/mahasiswa (KPI 1 distinct, KPI 5). click_rows membedakan mahasiswa
+    # yang semua sum_click-nya NULL (total NULL di query full) dari total 0
+    VLE_STUDENT_DELTA = f"""
+        INSERT INTO kpi_rollup_student (code_module, code_presentation, id_student, clicks, click_rows, vle_rows, forum_rows)
+        SELECT
+            COALESCE(sv.code_module, ''),
+            COALESCE(sv.code_presentation, ''),
+            sv.id_student,
+            COALESCE(SUM(sv.sum_click), 0),
+            COUNT(sv.sum_click),
+            COUNT(*),
+            COUNT(f.id_site)
+        FROM studentvle sv
+        LEFT JOIN {FORUM_SITES} f ON f.id_site = sv.id_site
+        WHERE {{rows}} AND sv.id_student IS NOT NULL
+        GROUP BY 1, 2, 3
+        ON DUPLICATE KEY UPDATE
+            clicks = clicks + VALUES(clicks),
+            click_rows = click_rows + VALUES(click_rows),
+            vle_rows = vle_rows + VALUES(vle_rows),
+            forum_rows = forum_rows + VALUES(forum_rows)
+    """
+
+    # Delta studentassessment per module/presentation (dari assessments) dan hari submit (KPI 2-4)
+    ASSESSMENT_ACTIVITY_DELTA = f"""
+        INSERT INTO kpi_rollup_activity
+            (code_module, code_presentation, day, submissions, scored, score_sum, score_min, score_max,
+             completed, on_time, timed)
+        SELECT
+            COALESCE(a.code_module, ''),
+            COALESCE(a.code_presentation, ''),
+            COALESCE(sa.date_submitted, {NO_DAY}),
+            COUNT(*),
+            COUNT(sa.score),
+            COALESCE(SUM(sa.score), 0),
+            MIN(sa.score),
+            MAX(sa.score),
+            COUNT(CASE WHEN sa.score > 50 THEN 1 END),
+            COUNT(CASE WHEN sa.date_submitted <= a.date THEN 1 END),
+            COUNT(CASE WHEN sa.date_submitted IS NOT NULL AND a.date IS NOT NULL THEN 1 END)
+        FROM studentassessment sa
+        LEFT JOIN assessments a ON sa.id_assessment = a.id_assessment
+        WHERE {{rows}}
+        GROUP BY 1, 2, 3
+        ON DUPLICATE KEY UPDATE
+            submissions = submissions + VALUES(submissions),
+            scored = scored + VALUES(scored),
+            score_sum = score_sum + VALUES(score_sum),
+            score_min = LEAST(COALESCE(score_min, VALUES(score_min)), COALESCE(VALUES(score_min), score_min)),
+            score_max = GREATEST(COALESCE(score_max, VALUES(score_max)), COALESCE(VALUES(score_max), score_max)),
+            completed = completed + VALUES(completed),
+            on_time = on_time + VALUES(on_time),
+            timed = timed + VALUES(timed)
+    """
+    # Delta studentassessment per module/presentation/mahasiswa (KPI 2/4 distinct)
+    ASSESSMENT_STUDENT_DELTA = """
+        INSERT INTO kpi_rollup_student (code_module, code_presentation, id_student, scored)
+        SELECT
+            COALESCE(a.code_module, ''),
+            COALESCE(a.code_presentation, ''),
+            sa.id_student,
+            COUNT(*)
+        FROM studentassessment sa
+        LEFT JOIN assessments a ON sa.id_assessment = a.id_assessment
+        WHERE {rows} AND sa.score IS NOT NULL AND sa.id_student IS NOT NULL
+        GROUP BY 1, 2, 3
+        ON DUPLICATE KEY UPDATE scored = scored + VALUES(scored)
+    """
+
+    # source -> (alias tabel fakta di query delta, query delta dengan placeholder {rows})
+    DELTA_QUERIES = {
+        "studentvle": ("sv", (VLE_ACTIVITY_DELTA, VLE_STUDENT_DELTA)),
+        "studentassessment": ("sa", (ASSESSMENT_ACTIVITY_DELTA, ASSESSMENT_STUDENT_DELTA)),
+    }
+    # Jumlah row_id (baris pengisi gap) atau segmen row_id per query delta
+    DELTA_CHUNK_SIZE = 1000
+
+    SELECT_WATERMARKS = "SELECT source, last_row_id FROM kpi_watermarks"
+    MAX_ROW_ID = "SELECT COALESCE(MAX(row_id), 0) AS high FROM {table}"
+    UPSERT_WATERMARK = """
+        INSERT INTO kpi_watermarks (source, last_row_id, updated_at) VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE last_row_id = VALUES(last_row_id), updated_at = VALUES(updated_at)
+    """
+    # Hole di rentang (low, high]: row_id yang dilewati MAX(row_id) karena belum commit (atau rollback)
+    FIND_GAPS = """
+        SELECT prev_row_id + 1 AS gap_start, row_id - 1 AS gap_end
+        FROM (
+            SELECT row_id, LAG(row_id, 1, %s) OVER (ORDER BY row_id) AS prev_row_id
+            FROM {table}
+            WHERE row_id > %s AND row_id <= %s
+        ) ordered
+        WHERE row_id > prev_row_id + 1
+    """
+    EXPIRE_GAPS = "DELETE FROM kpi_watermark_gaps WHERE source = %s AND first_seen < %s"
+    SELECT_GAPS = "SELECT gap_start, gap_end, first_seen FROM kpi_watermark_gaps WHERE source = %s ORDER BY gap_start"
+    # Baris yang sudah commit di dalam gap (transaksi yang commit setelah watermark melewatinya)
+    LATE_ROWS = """
+        SELECT t.row_id
+        FROM kpi_watermark_gaps g
+        JOIN {table} t ON t.row_id BETWEEN g.gap_start AND g.gap_end
+        WHERE g.source = %s
+        ORDER BY t.row_id
+    """
+    DELETE_GAPS = "DELETE FROM kpi_watermark_gaps WHERE source = %s"
+    INSERT_GAP = "INSERT INTO kpi_watermark_gaps (source, gap_start, gap_end, first_seen) VALUES (%s, %s, %s, %s)"
+
+    # Pembacaan KPI dari rollup
+    ACTIVITY_TOTALS_QUERY = """
+        SELECT
+            COALESCE(SUM(clicks), 0) AS clicks,
+            COALESCE(SUM(forum_clicks), 0) AS forum_clicks,
+            COALESCE(SUM(forum_click_rows), 0) AS forum_click_rows,
+            COALESCE(SUM(scored), 0) AS scored,
+            COALESCE(SUM(score_sum), 0) AS score_sum,
+            MIN(score_min) AS score_min,
+            MAX(score_max) AS score_max,
+            COALESCE(SUM(completed), 0) AS completed,
+            COALESCE(SUM(on_time), 0) AS on_time,
+            COALESCE(SUM(timed), 0) AS timed
+        FROM kpi_rollup_activity
+        WHERE 1 = 1{conditions}
+    """
+    STUDENT_TOTALS_QUERY = """
+        SELECT
+            COUNT(DISTINCT CASE WHEN forum_rows > 0 THEN id_student END) AS forum_students,
+            COUNT(DISTINCT CASE WHEN scored > 0 THEN id_student END) AS scored_students
+        FROM kpi_rollup_student
+        WHERE 1 = 1{conditions}
+    """
+    # KPI 5: total clicks per mahasiswa lintas module, dibandingkan dengan rata-rata populasi.
+    # Seperti SUM(sum_click) di query full: total NULL kalau semua sum_click NULL (dihitung di active_students,
+    # tidak masuk rata-rata dan tidak dianggap low activity)
+    LOW_ACTIVITY_QUERY = """
+        SELECT
+            COUNT(CASE WHEN total_clicks < avg_clicks * 0.5 THEN 1 END) AS low_activity_students,
+            COUNT(*) AS active_students,
+            COALESCE(AVG(total_clicks), 0) AS avg_clicks
+        FROM (
+            SELECT
+                id_student,
+                CASE WHEN SUM(click_rows) > 0 THEN SUM(clicks) END AS total_clicks,
+                AVG(CASE WHEN SUM(click_rows) > 0 THEN SUM(clicks) END) OVER () AS avg_clicks
+            FROM kpi_rollup_student
+            WHERE vle_rows > 0{conditions}
+            GROUP BY id_student
+        ) student_activity
+    """
+    ASSESSMENT_SUMMARY_QUERY = """
+        SELECT
+            r.code_module,
+            r.code_presentation,
+            COALESCE(s.scored_students, 0) AS total_students,
+            SUM(r.score_sum) / NULLIF(SUM(r.scored), 0) AS avg_score,
+            MIN(r.score_min) AS min_score,
+            MAX(r.score_max) AS max_score
+        FROM kpi_rollup_activity r
+        LEFT JOIN (
+            SELECT code_module, code_presentation, COUNT(*) AS scored_students
+            FROM kpi_rollup_student
+            WHERE scored > 0
+            GROUP BY code_module, code_presentation
+        ) s ON s.code_module = r.code_module AND s.code_presentation = r.code_presentation
+        WHERE r.scored > 0
+        GROUP BY r.code_module, r.code_presentation, s.scored_students
+        ORDER BY r.code_module, r.code_presentation
+    """
+
+    def __init__(self, mode: Optional[str] = None, gap_settle_seconds: Optional[int] = None):
+        """
+        Args:
+            mode: "full" (query tabel fakta setiap refresh) atau "incremental" (default: settings.KPI_ENGINE)
+            gap_settle_seconds: Umur gap row_id sebelum dianggap rollback (default: settings.KPI_ENGINE_GAP_SETTLE_SECONDS)
+        """
+        self.gap_settle_seconds = settings.KPI_ENGINE_GAP_SETTLE_SECONDS if gap_settle_seconds is None else gap_settle_seconds
+        self.mode = (mode or settings.KPI_ENGINE).lower()
+        if self.mode not in (self.ENGINE_FULL, self.ENGINE_INCREMENTAL):
+            logger.warning(f"Unknown KPI engine '{self.mode}', using full")
+            self.mode = self.ENGINE_FULL
+        self.ready = False
+        self.last_refresh: Optional[Dict[str, Any]] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode == self.ENGINE_INCREMENTAL
+
+    def missing_row_id_tables(self) -> List[str]:
+        """Tabel fakta yang belum punya kolom row_id"""
+        missing = []
+        for table in self.SOURCES.values():
+            row = db.execute_one(self.ROW_ID_COLUMN_EXISTS, (table,))
+            if not row or not row.get("found"):
+                missing.append(table)
+        return missing
+
+    def has_click_rows(self) -> bool:
+        """Rollup per mahasiswa sudah punya kolom click_rows"""
+        row = db.execute_one(self.CLICK_ROWS_COLUMN_EXISTS)
+        return bool(row and row.get("found"))
+
+    def migrate(self) -> List[str]:
+        """
+        Migrasi satu kali (di luar startup app): tambah kolom row_id ke tabel fakta dan buat rollup tables
+
+        Rollup per mahasiswa yang dibuat sebelum ada click_rows di-ALTER lalu di-recompute (nilai lama tidak
+        bisa membedakan clicks NULL dari 0).
+
+        Returns:
+            Tabel yang di-ALTER
+        """
+        altered = self.missing_row_id_tables()
+        for table in altered:
+            logger.info(f"Adding row_id column to {table} for incremental KPI maintenance (rebuilds the table)")
+            db.execute_write(self.ADD_ROW_ID_COLUMN.format(table=table))
+        for statement in self.SCHEMA:
+            db.execute_write(statement)
+        rebuild = not self.has_click_rows()
+        if rebuild:
+            logger.info("Adding click_rows column to kpi_rollup_student, rollups are recomputed")
+            db.execute_write(self.ADD_CLICK_ROWS_COLUMN)
+            altered.append("kpi_rollup_student")
+        self.ensure_schema()
+        if rebuild:
+            self.recompute()
+        return altered
+
+    def ensure_schema(self) -> None:
+        """
+        Cek kolom row_id di tabel fakta dan buat rollup tables kalau belum ada
+
+        Raises:
+            Exception: Kolom row_id atau click_rows belum ada (jalankan scripts/migrate_kpi_engine.py)
+        """
+        missing = self.missing_row_id_tables()
+        if missing:
+            raise Exception(
+                f"row_id column missing on {', '.join(missing)}; run python src/scripts/migrate_kpi_engine.py first"
+            )
+        for statement in self.SCHEMA:
+            db.execute_write(statement)
+        if not self.has_click_rows():
+            raise Exception("kpi_rollup_student has no click_rows column; run python src/scripts/migrate_kpi_engine.py first")
+        self.ready = True
+
+    def refresh(self) -> Dict[str, Any]:
+        """
+        Terapkan baris baru sejak high-water mark terakhir ke rollup (O(delta))
+
+        Returns:
+            Ringkasan refresh (status, jumlah baris baru per source)
+        """
+        return self._apply(rebuild=False)
+
+    def recompute(self) -> Dict[str, Any]:
+        """
+        Full recompute: kosongkan rollup lalu agregasi ulang seluruh tabel fakta (rekonsiliasi)
+
+        Returns:
+            Ringkasan recompute
+        """
+        return self._apply(rebuild=True)
+
+    @staticmethod
+    def split_gaps(gaps: List[Tuple[int, int, Any]], filled: List[int]) -> List[Tuple[int, int, Any]]:
+        """
+        Potong rentang gap dengan row_id yang sudah diterapkan
+
+        Args:
+            gaps: (gap_start, gap_end, first_seen) terurut
+            filled: row_id yang sudah muncul dan diterapkan (terurut)
+
+        Returns:
+            Sisa rentang gap (first_seen tetap dari gap asal)
+        """
+        remaining = []
+        filled_iter = iter(filled)
+        row_id = next(filled_iter, None)
+        for gap_start, gap_end, first_seen in gaps:
+            start = gap_start
+            while row_id is not None and row_id <= gap_end:
+                if row_id >= start:
+                    if row_id > start:
+                        remaining.append((start, row_id - 1, first_seen))
+                    start = row_id + 1
+                row_id = next(filled_iter, None)
+            if start <= gap_end:
+                remaining.append((start, gap_end, first_seen))
+        return remaining
+
+    @staticmethod
+    def segments(low: int, high: int, gaps: List[Tuple[int, int, Any]]) -> List[Tuple[int, int]]:
+        """Rentang row_id di (low, high] di luar gap (terurut)"""
+        segments = []
+        start = low + 1
+        for gap_start, gap_end, _ in gaps:
+            if gap_start > start:
+                segments.append((start, gap_start - 1))
+            start = gap_end + 1
+        if start <= high:
+            segments.append((start, high))
+        return segments
+
+    def _apply_delta(self, cursor, source: str, rows: str, params: tuple) -> None:
+        """Jalankan query delta source untuk baris yang dipilih kondisi rows"""
+        alias, queries = self.DELTA_QUERIES[source]
+        for query in queries:
+            cursor.execute(query.format(rows=rows.format(alias=alias)), params)
+
+    def _apply_late_rows(self, cursor, source: str, table: str, now: datetime) -> Tuple[List[Tuple[int, int, Any]], int]:
+        """
+        Terapkan baris yang commit setelah watermark melewati row_id-nya
+
+        Returns:
+            Tuple (sisa gap, jumlah baris terlambat yang diterapkan)
+        """
+        cursor.execute(self.EXPIRE_GAPS, (source, now - timedelta(seconds=self.gap_settle_seconds)))
+        cursor.execute(self.SELECT_GAPS, (source,))
+        gaps = [(int(r["gap_start"]), int(r["gap_end"]), r["first_seen"]) for r in cursor.fetchall()]
+        if not gaps:
+            return gaps, 0
+        cursor.execute(self.LATE_ROWS.format(table=table), (source,))
+        late = [int(r["row_id"]) for r in cursor.fetchall()]
+        for start in range(0, len(late), self.DELTA_CHUNK_SIZE):
+            chunk = late[start:start + self.DELTA_CHUNK_SIZE]
+            self._apply_delta(cursor, source, "{alias}.row_id IN (" + ", ".join(["%s"] * len(chunk)) + ")", tuple(chunk))
+        return self.split_gaps(gaps, late), len(late)
+
+    def _apply(self, rebuild: bool) -> Dict[str, Any]:
+        started = time.perf_counter()
+        applied: Dict[str, int] = {}
+        late_applied: Dict[str, int] = {}
+        now = datetime.now()
+        with db.transaction() as cursor:
+            # Satu worker saja yang update state; worker lain baca state yang ada
+            cursor.execute("SELECT GET_LOCK(%s, 0) AS acquired", (self.LOCK_NAME,))
+            row = cursor.fetchone()
+            if not row or not row.get("acquired"):
+                logger.info("KPI engine state is being updated by another worker, skipping")
+                return {"status": "skipped", "reason": "running elsewhere"}
+            try:
+                if rebuild:
+                    cursor.execute("DELETE FROM kpi_rollup_activity")
+                    cursor.execute("DELETE FROM kpi_rollup_student")
+                    cursor.execute("DELETE FROM kpi_watermarks")
+                    cursor.execute("DELETE FROM kpi_watermark_gaps")
+
+                cursor.execute(self.SELECT_WATERMARKS)
+                watermarks = {r["source"]: int(r["last_row_id"]) for r in cursor.fetchall()}
+
+                for source, table in self.SOURCES.items():
+                    low = watermarks.get(source, 0)
+                    gaps, late_applied[source] = self._apply_late_rows(cursor, source, table, now)
+                    gaps_changed = late_applied[source] > 0
+
+                    # MAX(row_id) hanya melihat baris yang sudah commit; row_id lebih kecil yang belum
+                    # commit jadi gap dan diterapkan di refresh berikutnya (bukan hilang di bawah watermark)
+                    cursor.execute(self.MAX_ROW_ID.format(table=table))
+                    high = int(cursor.fetchone()["high"])
+                    applied[source] = max(0, high - low)
+                    if high > low:
+                        # Gap dicari dulu, delta hanya untuk segmen di antaranya: baris yang diterapkan persis
+                        # baris yang terlihat saat gap dicari (tidak tergantung isolation level INSERT ... SELECT)
+                        cursor.execute(self.FIND_GAPS.format(table=table), (low, low, high))
+                        new_gaps = [(int(r["gap_start"]), int(r["gap_end"]), now) for r in cursor.fetchall()]
+                        segments = self.segments(low, high, new_gaps)
+                        for start in range(0, len(segments), self.DELTA_CHUNK_SIZE):
+                            chunk = segments[start:start + self.DELTA_CHUNK_SIZE]
+                            rows = "(" + " OR ".join(["{alias}.row_id BETWEEN %s AND %s"] * len(chunk)) + ")"
+                            self._apply_delta(cursor, source, rows, tuple(bound for segment in chunk for bound in segment))
+                        gaps_changed = gaps_changed or bool(new_gaps)
+                        gaps += new_gaps
+                        cursor.execute(self.UPSERT_WATERMARK, (source, high, now))
+
+                    if gaps_changed:
+                        cursor.execute(self.DELETE_GAPS, (source,))
+                        if gaps:
+                            cursor.executemany(self.INSERT_GAP, [(source, *gap) for gap in gaps])
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (self.LOCK_NAME,))
+
+        duration = round(time.perf_counter() - started, 3)
+        self.last_refresh = {
+            "status": "recomputed" if rebuild else "refreshed",
+            "row_ids_applied": applied,
+            "late_rows_applied": late_applied,
+            "duration_seconds": duration,
+            "finished_at": datetime.now().isoformat(),
+        }
+        logger.info(f"KPI engine {self.last_refresh['status']}: {applied} (late rows: {late_applied}) in {duration}s")
+        return self.last_refresh
+
+    def compute_kpis(self, kpi_filter: Optional[KPIFilter] = None) -> List[Dict[str, Any]]:
+        """
+        KPI 1-5 dari rollup tables (tanpa scan tabel fakta)
+
+        Args:
+            kpi_filter: Slice module/presentation/tanggal (optional). Rentang tanggal hanya berlaku
+                untuk rollup aktivitas; distinct count dan KPI 5 butuh query full kalau ada rentang tanggal
+
+        Returns:
+            List KPI dengan format yang sama dengan query full di KPIService
+        """
+        kpi_filter = kpi_filter or KPIFilter()
+        activity_conditions, activity_params = kpi_filter.sql_conditions("code_module", "code_presentation", "day")
+        if kpi_filter.has_date_range:
+            activity_conditions += f" AND day <> {self.NO_DAY}"
+        student_conditions, student_params = kpi_filter.sql_conditions("code_module", "code_presentation")
+
+        activity = db.execute_one(self.ACTIVITY_TOTALS_QUERY.format(conditions=activity_conditions), activity_params) or {}
+        students = db.execute_one(self.STUDENT_TOTALS_QUERY.format(conditions=student_conditions), student_params) or {}
+        low_activity = db.execute_one(self.LOW_ACTIVITY_QUERY.format(conditions=student_conditions), student_params) or {}
+        return self.build_kpis(activity, students, low_activity)
+
+    @staticmethod
+    def build_kpis(activity: Dict[str, Any], students: Dict[str, Any], low_activity: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Susun output KPI 1-5 dari agregat rollup"""
+        forum_clicks = int(activity.get("forum_clicks") or 0)
+        forum_click_rows = int(activity.get("forum_click_rows") or 0)
+        scored = int(activity.get("scored") or 0)
+        score_sum = float(activity.get("score_sum") or 0)
+        completed = int(activity.get("completed") or 0)
+        on_time = int(activity.get("on_time") or 0)
+        timed = int(activity.get("timed") or 0)
+        scored_students = int(students.get("scored_students") or 0)
+        low_activity_students = int(low_activity.get("low_activity_students") or 0)
+        active_students = int(low_activity.get("active_students") or 0)
+
+        return [
+            {
+                "kpi_id": 1,
+                "name": "Forum Participation Score",
+                "definition": "Skor aktivitas diskusi",
+                "value": forum_clicks,
+                "active_students": int(students.get("forum_students") or 0),
+                "avg_clicks_per_activity": round(forum_clicks / forum_click_rows, 2) if forum_click_rows else 0,
+                "unit": "clicks",
+                "category": "engagement"
+            },
+            {
+                "kpi_id": 2,
+                "name": "Task Completion Ratio",
+                "definition": "Persentase assessment yang diselesaikan (>50)",
+                "value": round((completed / scored) * 100, 2) if scored else 0,
+                "completed_tasks": completed,
+                "total_submissions": scored,
+                "participating_students": scored_students,
+                "unit": "percent",
+                "category": "academic"
+            },
+            {
+                "kpi_id": 3,
+                "name": "Assignment Timeliness",
+                "definition": "Persentase tugas tepat waktu",
+                "value": round((on_time / timed) * 100, 2) if timed else 0,
+                "on_time_submissions": on_time,
+                "total_submissions": timed,
+                "unit": "percent",
+                "category": "academic"
+            },
+            {
+                "kpi_id": 4,
+                "name": "Grade Performance Index",
+                "definition": "Rata-rata nilai tugas & kuis",
+                "value": round(score_sum / scored, 2) if scored else 0,
+                "min_score": activity.get("score_min") if activity.get("score_min") is not None else 0,
+                "max_score": activity.get("score_max") if activity.get("score_max") is not None else 0,
+                "total_students": scored_students,
+                "total_assessments": scored,
+                "unit": "score",
+                "category": "academic"
+            },
+            {
+                "kpi_id": 5,
+                "name": "Low Activity Alert Index",
+                "definition": "Indeks risiko aktivitas rendah",
+                "value": round((low_activity_students / active_students) * 100, 2) if active_students else 0,
+                "low_activity_students": low_activity_students,
+                "total_students": active_students,
+                "avg_clicks_threshold": round(float(low_activity.get("avg_clicks") or 0), 2),
+                "unit": "percent",
+                "category": "risk"
+            },
+        ]
+
+    def get_assessment_summary(self) -> List[Dict[str, Any]]:
+        """Ringkasan nilai per module/presentation dari rollup (AssessmentSummaryItem)"""
+        return [
+            {
+                "code_module": row["code_module"],
+                "code_presentation": row["code_presentation"],
+                "total_students": int(row["total_students"]),
+                "avg_score": round(float(row["avg_score"] or 0), 2),
+                "min_score": float(row["min_score"] or 0),
+                "max_score": float(row["max_score"] or 0),
+            }
+            for row in db.execute_query(self.ASSESSMENT_SUMMARY_QUERY)
+        ]
+
+    def get_status(self) -> Dict[str, Any]:
+        """Status engine dan watermark untuk endpoint"""
+        status = {
+            "mode": self.mode,
+            "ready": self.ready,
+            "last_refresh": self.last_refresh,
+            "watermarks": None,
+        }
+        if self.ready:
+            try:
+                status["watermarks"] = db.execute_query("SELECT source, last_row_id, updated_at FROM kpi_watermarks")
+            except Exception as e:
+                logger.warning(f"Failed to read KPI watermarks: {e}")
+        return status
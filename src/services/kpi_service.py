@@ -2,23 +2,39 @@
 KPI Service untuk dashboard analytics
 OLAP queries untuk KPI metrics dengan Redis caching
 """
-from typing import List, Dict, Any, Optional
+import base64
+import time
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from core import deadline
 from core.database import db
+from core.deadline import DeadlineExceeded
 from core.logging import logger
 from core.cache import cache
+from core.http_cache import compute_etag
+from core.compression import compressed_variants, supported_encodings
 from config import settings
-from schemas.types import DropoutFeatures
 from fastapi import Request
-from services.predictor_service import PredictorService
+from services.predictor_service import PredictorService, DROPOUT_MODEL, RAW_FEATURE_DTYPES
 from services.encoder_service import EncoderService
+from services.inference_executor import InferenceExecutor
+from services.scoring_job import StudentScoringJob
+from services.sampling import StudentSampler
+from services.kpi_engine import KPIAggregationEngine
+from services.kpi_snapshot import KPISnapshotStore
+from services.kpi_broadcaster import KPIBroadcaster, changed_kpi_ids
+from schemas.requests.kpi_requests import KPIFilter
+from schemas.responses.kpi_responses import KPIListResponse
 
 
 class KPIService:
     """Service untuk KPI dashboard queries dengan Redis caching"""
     
     CACHE_KEY_ALL_KPIS = "kpi:all_metrics"
+    # Prefix cache per slice (module/presentation/tanggal), key kanonik dari KPIFilter.cache_key
+    CACHE_KEY_FILTERED_KPIS = "kpi:metrics"
     
-    def __init__(self, cache_ttl_seconds: int = 300, encoder_service: Optional[EncoderService] = None, predictor_service: Optional[PredictorService] = None):
+    def __init__(self, cache_ttl_seconds: int = 300, encoder_service: Optional[EncoderService] = None, predictor_service: Optional[PredictorService] = None, inference_executor: Optional[InferenceExecutor] = None, scoring_job: Optional[StudentScoringJob] = None, sampler: Optional[StudentSampler] = None, kpi_engine: Optional[KPIAggregationEngine] = None, snapshot_store: Optional[KPISnapshotStore] = None, broadcaster: Optional[KPIBroadcaster] = None):
         """
         Initialize KPI Service dengan cache configuration
         
@@ -26,10 +42,24 @@ class KPIService:
             cache_ttl_seconds: Cache Time To Live dalam detik (default: 300 = 5 menit)
             encoder_service: EncoderService instance (optional)
             predictor_service: PredictorService instance (optional)
+            inference_executor: InferenceExecutor untuk batch prediction (optional, default inline)
+            scoring_job: StudentScoringJob, KPI 6 pakai prediksi tersimpan kalau tersedia (optional)
+            sampler: StudentSampler untuk fallback sampling KPI 6 (optional, default dari settings)
+            kpi_engine: KPIAggregationEngine, KPI 1-5 dari state incremental kalau aktif (optional)
+            snapshot_store: KPISnapshotStore, KPI tanpa filter disimpan setelah refresh dan di-load saat startup (optional)
+            broadcaster: KPIBroadcaster, hasil refresh yang berubah di-push ke client /api/kpi/stream (optional)
         """
         self._cache_ttl = cache_ttl_seconds
         self._encoder_service = encoder_service
         self._predictor_service = predictor_service
+        self._inference_executor = inference_executor
+        self.scoring_job = scoring_job
+        self.sampler = sampler or StudentSampler()
+        self.kpi_engine = kpi_engine
+        self.snapshot_store = snapshot_store
+        self.broadcaster = broadcaster
+        # Status snapshot terakhir yang di-restore (None kalau startup tanpa snapshot)
+        self.snapshot_status: Optional[Dict[str, Any]] = None
         logger.info(f"KPIService initialized with cache TTL: {cache_ttl_seconds} seconds")
     
     @property
@@ -52,15 +82,80 @@ class KPIService:
         """Set predictor_service."""
         self._predictor_service = value
     
+    @property
+    def inference_executor(self) -> Optional[InferenceExecutor]:
+        """Executor untuk batch prediction, default inline di atas predictor_service."""
+        if self._inference_executor is None and self._predictor_service is not None:
+            self._inference_executor = InferenceExecutor(self._predictor_service, mode=InferenceExecutor.MODE_INLINE)
+        return self._inference_executor
+    
     def clear_cache(self) -> None:
-        """Manually clear cache (untuk force refresh)"""
+        """Manually clear cache (untuk force refresh), termasuk semua slice"""
         cache.delete(self.CACHE_KEY_ALL_KPIS)
+        cache.delete(self.meta_key(self.CACHE_KEY_ALL_KPIS))
+        cache.delete(self.body_key(self.CACHE_KEY_ALL_KPIS))
+        for encoding in supported_encodings():
+            cache.delete(self.body_key(self.CACHE_KEY_ALL_KPIS, encoding))
+        cache.delete_pattern(f"{self.CACHE_KEY_FILTERED_KPIS}:*")
         logger.info("KPI cache cleared manually")
     
-    def _calculate_forum_participation_score(self) -> Dict[str, Any]:
+    def cache_key(self, kpi_filter: Optional[KPIFilter] = None) -> str:
+        """Cache key untuk filter (tanpa filter = key lama kpi:all_metrics)"""
+        if kpi_filter is None or kpi_filter.is_empty:
+            return self.CACHE_KEY_ALL_KPIS
+        return kpi_filter.cache_key(self.CACHE_KEY_FILTERED_KPIS)
+    
+    @staticmethod
+    def meta_key(cache_key: str) -> str:
+        """Key metadata (ETag, waktu expire) untuk cache key KPI"""
+        return f"{cache_key}:meta"
+    
+    @staticmethod
+    def body_key(cache_key: str, encoding: Optional[str] = None) -> str:
+        """Key body response /api/kpi/metrics yang sudah diserialisasi (encoding: varian gzip/br, base64)"""
+        return f"{cache_key}:body:{encoding}" if encoding else f"{cache_key}:body"
+    
+    @staticmethod
+    def render_body(kpis: List[Dict[str, Any]], kpi_filter: Optional[KPIFilter] = None) -> str:
+        """Body JSON final /api/kpi/metrics, dirender sekali saat refresh dan disajikan apa adanya saat cache hit"""
+        return KPIListResponse(
+            success=True,
+            data=kpis,
+            total_kpis=len(kpis),
+            filters=None if kpi_filter is None or kpi_filter.is_empty else kpi_filter.model_dump()
+        ).model_dump_json()
+    
+    def _build_meta(self, cache_key: str, kpis: List[Dict[str, Any]], ttl: int) -> Dict[str, Any]:
+        """ETag (versi konten) dan waktu expire cache, disimpan bersama hasil KPI"""
+        return {"etag": compute_etag([cache_key, kpis]), "expires_at": time.time() + ttl}
+    
+    def _cache_kpis(self, cache_key: str, kpis: List[Dict[str, Any]], kpi_filter: Optional[KPIFilter] = None) -> Dict[str, Any]:
+        """
+        Simpan hasil KPI, metadata (ETag), body response dan varian terkompresinya dengan TTL yang sama
+
+        Semua key ditulis dalam satu transaksi (varian lama yang tidak dibuat ulang ikut dihapus), jadi MGET
+        body + meta di /api/kpi/metrics tidak pernah menyajikan ETag dari refresh lain.
+        """
+        meta = self._build_meta(cache_key, kpis, self._cache_ttl)
+        body = self.render_body(kpis, kpi_filter)
+        raw_items = {self.body_key(cache_key): body}
+        # Dikompres sekali per refresh; client Redis decode_responses=True, jadi bytes disimpan sebagai base64
+        for encoding, data in compressed_variants(body.encode("utf-8")).items():
+            raw_items[self.body_key(cache_key, encoding)] = base64.b64encode(data).decode("ascii")
+        stale_variants = [
+            key for key in (self.body_key(cache_key, encoding) for encoding in supported_encodings()) if key not in raw_items
+        ]
+        cache.set_many(
+            {cache_key: kpis, self.meta_key(cache_key): meta}, self._cache_ttl,
+            raw_items=raw_items, delete_keys=stale_variants,
+        )
+        return meta
+    
+    def _calculate_forum_participation_score(self, kpi_filter: Optional[KPIFilter] = None) -> Dict[str, Any]:
         """KPI 1: Forum Participation - Aktivitas diskusi"""
         logger.info("Total student engagement in forums")
-        query = """
+        conditions, params = (kpi_filter or KPIFilter()).sql_conditions("sv.code_module", "sv.code_presentation", "sv.date")
+        query = f"""
             SELECT 
                 SUM(sv.sum_click) as total_forum_clicks,
                 COUNT(DISTINCT sv.id_student) as active_students,
@@ -70,10 +165,10 @@ class KPIService:
                 SELECT id_site 
                 FROM vle 
                 WHERE activity_type = 'forumng'
-            )
+            ){conditions}
         """
         try:
-            result = db.execute_one(query)
+            result = db.execute_one(query, params)
             total_clicks = result.get('total_forum_clicks', 0) if result else 0
             active_students = result.get('active_students', 0) if result else 0
             
@@ -87,23 +182,26 @@ class KPIService:
                 "unit": "clicks",
                 "category": "engagement"
             }
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.exception(f"Error calculating forum participation score: {e}")
             return {"kpi_id": 1, "name": "Forum Participation Score", "value": 0, "unit": "clicks", "category": "engagement"}
     
-    def _calculate_task_completion_ratio(self) -> Dict[str, Any]:
+    def _calculate_task_completion_ratio(self, kpi_filter: Optional[KPIFilter] = None) -> Dict[str, Any]:
         logger.info("Calculating Task Completion Ratio KPI")
         """KPI 2: Task Completion Ratio - Persentase assessment yang diselesaikan (score > 50)"""
-        query = """
+        conditions, params = (kpi_filter or KPIFilter()).assessment_conditions("sa")
+        query = f"""
             SELECT 
                 COUNT(CASE WHEN sa.score > 50 THEN 1 END) as completed_tasks,
                 COUNT(*) as total_submissions,
                 COUNT(DISTINCT sa.id_student) as participating_students
             FROM studentassessment sa
-            WHERE sa.score IS NOT NULL
+            WHERE sa.score IS NOT NULL{conditions}
         """
         try:
-            result = db.execute_one(query)
+            result = db.execute_one(query, params)
             completed = result.get('completed_tasks', 0) if result else 0
             total = result.get('total_submissions', 1) if result else 1
             completion_rate = round((completed / total) * 100, 2) if total > 0 else 0
@@ -119,23 +217,26 @@ class KPIService:
                 "unit": "percent",
                 "category": "academic"
             }
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.exception(f"Error calculating task completion ratio: {e}")
             return {"kpi_id": 2, "name": "Task Completion Ratio", "value": 0, "unit": "percent", "category": "academic"}
     
-    def _calculate_assignment_timeliness(self) -> Dict[str, Any]:
+    def _calculate_assignment_timeliness(self, kpi_filter: Optional[KPIFilter] = None) -> Dict[str, Any]:
         """KPI 3: Assignment Timeliness - Persentase tugas tepat waktu"""
         logger.info("Calculating Assignment Timeliness KPI")
-        query = """
+        conditions, params = (kpi_filter or KPIFilter()).sql_conditions("a.code_module", "a.code_presentation", "sa.date_submitted")
+        query = f"""
             SELECT 
                 COUNT(CASE WHEN sa.date_submitted <= a.date THEN 1 END) as on_time_submissions,
                 COUNT(*) as total_submissions
             FROM studentassessment sa
             JOIN assessments a ON sa.id_assessment = a.id_assessment
-            WHERE sa.date_submitted IS NOT NULL AND a.date IS NOT NULL
+            WHERE sa.date_submitted IS NOT NULL AND a.date IS NOT NULL{conditions}
         """
         try:
-            result = db.execute_one(query)
+            result = db.execute_one(query, params)
             on_time = result.get('on_time_submissions', 0) if result else 0
             total = result.get('total_submissions', 1) if result else 1
             timeliness_rate = round((on_time / total) * 100, 2) if total > 0 else 0
@@ -150,14 +251,17 @@ class KPIService:
                 "unit": "percent",
                 "category": "academic"
             }
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.exception(f"Error calculating assignment timeliness: {e}")
             return {"kpi_id": 3, "name": "Assignment Timeliness", "value": 0, "unit": "percent", "category": "academic"}
     
-    def _calculate_grade_performance_index(self) -> Dict[str, Any]:
+    def _calculate_grade_performance_index(self, kpi_filter: Optional[KPIFilter] = None) -> Dict[str, Any]:
         """KPI 4: Grade Performance Index - Rata-rata nilai tugas & kuis"""
         logger.info("Calculating Grade Performance Index KPI")
-        query = """
+        conditions, params = (kpi_filter or KPIFilter()).assessment_conditions("sa")
+        query = f"""
             SELECT 
                 AVG(sa.score) as avg_score,
                 MIN(sa.score) as min_score,
@@ -165,10 +269,10 @@ class KPIService:
                 COUNT(DISTINCT sa.id_student) as total_students,
                 COUNT(*) as total_assessments
             FROM studentassessment sa
-            WHERE sa.score IS NOT NULL
+            WHERE sa.score IS NOT NULL{conditions}
         """
         try:
-            result = db.execute_one(query)
+            result = db.execute_one(query, params)
             avg_score = round(result.get('avg_score', 0), 2) if result else 0
             
             return {
@@ -183,14 +287,19 @@ class KPIService:
                 "unit": "score",
                 "category": "academic"
             }
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.exception(f"Error calculating grade performance index: {e}")
             return {"kpi_id": 4, "name": "Grade Performance Index", "value": 0, "unit": "score", "category": "academic"}
     
-    def _calculate_low_activity_alert_index(self) -> Dict[str, Any]:
+    def _calculate_low_activity_alert_index(self, kpi_filter: Optional[KPIFilter] = None) -> Dict[str, Any]:
         """KPI 5: Low Activity Alert Index - Indeks risiko aktivitas rendah"""
         logger.info("Calculating Low Activity Alert Index KPI") 
-        query = """
+        kpi_filter = kpi_filter or KPIFilter()
+        totals_conditions, totals_params = kpi_filter.sql_conditions("svt.code_module", "svt.code_presentation", "svt.date")
+        conditions, params = kpi_filter.sql_conditions("sv.code_module", "sv.code_presentation", "sv.date")
+        query = f"""
             SELECT 
                 COUNT(CASE WHEN total_clicks < avg_clicks * 0.5 THEN 1 END) as low_activity_students,
                 COUNT(*) as total_students,
@@ -200,16 +309,18 @@ class KPIService:
                     sv.id_student,
                     SUM(sv.sum_click) as total_clicks,
                     (SELECT AVG(sum_click_total) FROM (
-                        SELECT SUM(sum_click) as sum_click_total 
-                        FROM studentvle 
-                        GROUP BY id_student
+                        SELECT SUM(svt.sum_click) as sum_click_total 
+                        FROM studentvle svt
+                        WHERE 1 = 1{totals_conditions}
+                        GROUP BY svt.id_student
                     ) as student_totals) as avg_clicks
                 FROM studentvle sv
+                WHERE 1 = 1{conditions}
                 GROUP BY sv.id_student
             ) student_activity
         """
         try:
-            result = db.execute_one(query)
+            result = db.execute_one(query, totals_params + params)
             low_activity = result.get('low_activity_students', 0) if result else 0
             total = result.get('total_students', 1) if result else 1
             alert_index = round((low_activity / total) * 100, 2) if total > 0 else 0
@@ -225,18 +336,96 @@ class KPIService:
                 "unit": "percent",
                 "category": "risk"
             }
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.exception(f"Error calculating low activity alert index: {e}")
             return {"kpi_id": 5, "name": "Low Activity Alert Index", "value": 0, "unit": "percent", "category": "risk"}
     
-    def _calculate_predicted_dropout_risk(self) -> Dict[str, Any]:
-        """KPI 6: Predicted Dropout Risk - Prediksi risiko dropout menggunakan ML model"""
+    def _calculate_activity_kpis(self, kpi_filter: Optional[KPIFilter] = None) -> List[Dict[str, Any]]:
+        """KPI 1-5: dari rollup incremental engine kalau aktif, fallback ke query full"""
+        kpi_filter = kpi_filter or KPIFilter()
+        # Rollup per mahasiswa tidak punya bucket tanggal, slice dengan rentang tanggal pakai query full
+        if (self.kpi_engine is not None and self.kpi_engine.enabled and self.kpi_engine.ready
+                and not kpi_filter.has_date_range):
+            try:
+                self.kpi_engine.refresh()
+                return self.kpi_engine.compute_kpis(kpi_filter)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                logger.exception(f"Incremental KPI engine failed, falling back to full queries: {e}")
+        return [
+            self._calculate_forum_participation_score(kpi_filter),
+            self._calculate_task_completion_ratio(kpi_filter),
+            self._calculate_assignment_timeliness(kpi_filter),
+            self._calculate_grade_performance_index(kpi_filter),
+            self._calculate_low_activity_alert_index(kpi_filter),
+        ]
+    
+    def _stored_dropout_risk(self, kpi_filter: Optional[KPIFilter] = None) -> Optional[Dict[str, Any]]:
+        """KPI 6 dari prediksi tersimpan scoring job (seluruh populasi, tanpa ML di request path)"""
+        if self.scoring_job is None:
+            return None
+        try:
+            summary = self.scoring_job.get_dropout_summary(kpi_filter)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.warning(f"Stored predictions not available: {e}")
+            return None
+        if not summary:
+            return None
+        
+        scored = int(summary['scored_students'])
+        predicted_dropouts = int(summary['predicted_dropouts'])
+        scored_at = summary.get('scored_at')
+        avg_probability = summary.get('avg_dropout_probability')
+        return {
+            "kpi_id": 6,
+            "name": "Predicted Dropout Risk",
+            "definition": "Prediksi risiko dropout menggunakan ML",
+            "value": round((predicted_dropouts / scored) * 100, 2),
+            "predicted_dropouts": predicted_dropouts,
+            "avg_dropout_probability": round(float(avg_probability), 4) if avg_probability is not None else None,
+            "sampled_students": scored,
+            "total_students": scored,
+            "sample_percentage": 100.0,
+            "source": "stored_predictions",
+            "model_version": summary['model_version'],
+            "scored_at": scored_at.isoformat() if scored_at else None,
+            "unit": "percent",
+            "category": "risk"
+        }
+    
+    def _calculate_predicted_dropout_risk(self, kpi_filter: Optional[KPIFilter] = None) -> Dict[str, Any]:
+        """
+        KPI 6: Predicted Dropout Risk - Prediksi risiko dropout menggunakan ML model
+        
+        Filter module/presentation membatasi populasi mahasiswa; rentang tanggal tidak dipakai
+        karena fitur model adalah total per mahasiswa
+        """
         logger.info("Calculating Predicted Dropout Risk KPI using ML model")
+        kpi_filter = kpi_filter or KPIFilter()
+        
+        # Prediksi tersimpan dari scoring job lebih murah dan stabil daripada sampling
+        stored = self._stored_dropout_risk(kpi_filter)
+        if stored is not None:
+            logger.info(f"Using stored predictions for model version {stored['model_version']}")
+            return stored
+        
         try:
             # 1. Ambil total student untuk sampling
-            count_query = "SELECT COUNT(*) as total FROM studentinfo"
-            count_result = db.execute_one(count_query)
+            student_conditions, student_params = kpi_filter.sql_conditions("si.code_module", "si.code_presentation")
+            # Satuan KPI 6 = mahasiswa unik (sama dengan ringkasan prediksi tersimpan), baris enrollment
+            # hanya dipakai untuk ukuran sample metode random
+            count_query = f"""
+                SELECT COUNT(*) as total_rows, COUNT(DISTINCT si.id_student) as total
+                FROM studentinfo si WHERE 1 = 1{student_conditions}
+            """
+            count_result = db.execute_one(count_query, student_params)
             total_students = count_result.get('total', 0) if count_result else 0
+            total_rows = count_result.get('total_rows', 0) if count_result else 0
             
             if total_students == 0:
                 return {
@@ -250,41 +439,47 @@ class KPIService:
                     "category": "risk"
                 }
             
-            # 2. Hitung jumlah sampel berdasarkan SAMPLE_SIZE
-            sample_size = max(1, int(total_students * settings.SAMPLE_SIZE))
-            logger.info(f"Getting sample size for dropout prediction: {sample_size}")
+            # 2. Pilih sample di studentinfo dulu (hash/stratified, deterministik), lalu
+            #    agregasi clicks dan score hanya untuk mahasiswa yang masuk sample
+            sampled_sql, sampled_params = self.sampler.sample_cte(total_rows, student_conditions, student_params)
+            # CTE dengan RAND() bisa dievaluasi ulang per referensi, jadi filter hanya untuk sample deterministik
+            sampled_filter = "AND id_student IN (SELECT id_student FROM sampled)" if self.sampler.is_deterministic else ""
+            logger.info(f"Sampling students for dropout prediction: method={self.sampler.method}, fraction={self.sampler.fraction}")
             
             # 3. Query untuk mengambil sample data student dengan fitur yang diperlukan
             # Menggunakan subquery untuk menghindari cartesian product
             sample_query = f"""
+                WITH sampled AS ({sampled_sql})
                 SELECT 
-                    si.id_student,
-                    si.gender,
-                    si.age_band,
-                    si.studied_credits,
-                    si.num_of_prev_attempts,
+                    s.id_student,
+                    s.gender,
+                    s.age_band,
+                    s.studied_credits,
+                    s.num_of_prev_attempts,
                     COALESCE(vle.total_clicks, 0) as total_clicks,
                     COALESCE(assess.avg_score, 0) as avg_assessment_score
-                FROM studentinfo si
+                FROM sampled s
                 LEFT JOIN (
                     SELECT id_student, SUM(sum_click) as total_clicks
                     FROM studentvle
+                    WHERE 1 = 1 {sampled_filter}
                     GROUP BY id_student
-                ) vle ON si.id_student = vle.id_student
+                ) vle ON s.id_student = vle.id_student
                 LEFT JOIN (
                     SELECT id_student, AVG(score) as avg_score
                     FROM studentassessment
-                    WHERE score IS NOT NULL
+                    WHERE score IS NOT NULL {sampled_filter}
                     GROUP BY id_student
-                ) assess ON si.id_student = assess.id_student
-                ORDER BY RAND()
-                LIMIT {sample_size}
+                ) assess ON s.id_student = assess.id_student
             """
             
-            sample_data = db.execute_query(sample_query)
-            logger.info(f"Sample data retrieved for dropout prediction: {len(sample_data)} students")
+            # Dibaca langsung ke kolom NumPy bertipe (tanpa dict per baris / konversi Decimal per nilai)
+            sample_data = db.fetch_columns(sample_query, sampled_params, dtypes=RAW_FEATURE_DTYPES)
+            sampled_rows = len(sample_data['id_student'])
+            drawn_students = len(np.unique(sample_data['id_student']))
+            logger.info(f"Sample data retrieved for dropout prediction: {sampled_rows} enrollments, {drawn_students} students")
             
-            if not sample_data:
+            if sampled_rows == 0:
                 logger.warning("No sample data retrieved for dropout prediction")
                 return {
                     "kpi_id": 6,
@@ -298,9 +493,10 @@ class KPIService:
                 }
             
             
-            # 5. Prediksi untuk setiap student dalam sample
+            # 5. Prediksi untuk semua student dalam sample
             dropout_predictions = []
-            logger.info(f"Predicting dropout risk for {len(sample_data)} students")
+            dropout_probabilities = []
+            logger.info(f"Predicting dropout risk for {sampled_rows} students")
             
             # Check service availability
             if self.encoder_service is None or self.predictor_service is None:
@@ -317,36 +513,30 @@ class KPIService:
                     "error": "Services not available"
                 }
             
-            for student in sample_data:
-                try:
-                    # Prepare raw features (sama seperti di router.py)
-                    raw_features: DropoutFeatures = {
-                        'gender': student.get('gender', 'M'),
-                        'age_band': student.get('age_band', '0-35'),
-                        'studied_credits': int(student.get('studied_credits', 0)),
-                        'num_of_prev_attempts': int(student.get('num_of_prev_attempts', 0)),
-                        'total_clicks': int(student.get('total_clicks', 0)),
-                        'avg_assessment_score': float(student.get('avg_assessment_score', 0))
-                    }
-                    
-                    # Encode features (sama seperti di router.py)
-                    encoded_features = self.encoder_service.encode_dropout(raw_features)
-                    
-                    # Predict (sama seperti di router.py)
-                    prediction = self.predictor_service.predict_dropout(encoded_features)
-                    dropout_predictions.append(prediction)
-                    
-                except Exception as e:
-                    logger.warning(f"Error predicting for student {student.get('id_student')}: {e}")
-                    continue
+            # Baris dengan kategori yang tidak dikenal encoder atau fitur kosong di-skip
+            valid = self.encoder_service.valid_rows(sample_data)
+            if not valid.all():
+                logger.warning(f"Skipping {int((~valid).sum())} sampled students with unencodable features")
+                sample_data = {name: values[valid] for name, values in sample_data.items()}
             
-            # 6. Hitung persentase dropout (prediction = 1)
+            # Encode per kolom dan predict satu batch sekaligus lewat inference executor
+            if len(sample_data['id_student']):
+                encoded = self.encoder_service.encode_columns(sample_data)
+                X = self.predictor_service.feature_matrix(DROPOUT_MODEL, encoded)
+                # Satu pass predict_proba: label = argmax, probabilitas dipakai untuk rata-rata risiko
+                proba = self.inference_executor.run(DROPOUT_MODEL, X, proba=True)
+                dropout_predictions = [int(p) for p in self.predictor_service.labels_from_proba(DROPOUT_MODEL, proba)]
+                dropout_probabilities = self.predictor_service.dropout_probability(proba)
+            
+            # 6. Hitung persentase dropout per mahasiswa unik: dropout bila salah satu enrollment-nya diprediksi dropout
+            sampled_students = len(np.unique(sample_data['id_student']))
             if len(dropout_predictions) == 0:
                 dropout_percentage = 0
                 predicted_dropouts = 0
             else:
-                predicted_dropouts = sum(1 for pred in dropout_predictions if pred == 1)
-                dropout_percentage = round((predicted_dropouts / len(dropout_predictions)) * 100, 2)
+                dropout_ids = sample_data['id_student'][np.asarray(dropout_predictions) == 1]
+                predicted_dropouts = len(np.unique(dropout_ids))
+                dropout_percentage = round((predicted_dropouts / sampled_students) * 100, 2)
             
             return {
                 "kpi_id": 6,
@@ -354,13 +544,17 @@ class KPIService:
                 "definition": "Prediksi risiko dropout menggunakan ML",
                 "value": dropout_percentage,
                 "predicted_dropouts": predicted_dropouts,
-                "sampled_students": len(dropout_predictions),
+                "avg_dropout_probability": round(float(np.mean(dropout_probabilities)), 4) if len(dropout_probabilities) else None,
+                "sampled_students": sampled_students,
                 "total_students": total_students,
-                "sample_percentage": round((sample_size / total_students) * 100, 2),
+                "sample_percentage": round((drawn_students / total_students) * 100, 2),
+                **self.sampler.describe(),
                 "unit": "percent",
                 "category": "risk"
             }
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.exception(f"Error calculating predicted dropout risk: {e}")
             return {
@@ -411,53 +605,108 @@ class KPIService:
                 "unit": "score",
                 "category": "engagement"
             }
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.exception(f"Error calculating attendance consistency score: {e}")
             return {"kpi_id": 7, "name": "Attendance Consistency Score", "value": 0, "unit": "score", "category": "engagement"}
     
     
-    def get_all_kpis(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
+    def get_all_kpis(self, force_refresh: bool = False, kpi_filter: Optional[KPIFilter] = None) -> List[Dict[str, Any]]:
         """
         Get semua KPI metrics dengan Redis caching
         
         Args:
             force_refresh: Force refresh cache (ignore cache dan query database)
+            kpi_filter: Slice module/presentation/tanggal (optional), setiap slice punya cache key sendiri
         
         Returns:
             List of 6 active KPI metrics (KPI 6 uses ML prediction)
         """
+        cache_key = self.cache_key(kpi_filter)
+        
         # Check cache first (unless force_refresh)
         if not force_refresh:
-            cached_kpis = cache.get(self.CACHE_KEY_ALL_KPIS)
+            cached_kpis = cache.get(cache_key)
             if cached_kpis is not None:
-                logger.info("Returning KPIs from Redis cache")
+                logger.info(f"Returning KPIs from Redis cache ({cache_key})")
                 return cached_kpis
         
         # Cache miss atau force refresh - query database
         logger.info("Cache miss or force refresh - querying database for KPIs")
         try:
-            kpis = [
-                self._calculate_forum_participation_score(),
-                self._calculate_task_completion_ratio(),
-                self._calculate_assignment_timeliness(),
-                self._calculate_grade_performance_index(),
-                self._calculate_low_activity_alert_index(),
-                self._calculate_predicted_dropout_risk(),
-            ]
+            kpis = self._calculate_activity_kpis(kpi_filter)
+            # Prediksi dropout paling mahal, jangan dimulai kalau deadline request sudah habis
+            deadline.check("dropout risk KPI")
+            kpis = [*kpis, self._calculate_predicted_dropout_risk(kpi_filter)]
+            
+            # Hasil sebelumnya (kalau masih di cache) untuk menentukan KPI mana yang berubah
+            previous = cache.get(cache_key) if self.broadcaster is not None else None
             
-            # Store in Redis cache
-            cache.set(self.CACHE_KEY_ALL_KPIS, kpis, self._cache_ttl)
-            logger.info(f"Retrieved and cached {len(kpis)} KPIs with TTL {self._cache_ttl}s")
+            # Store in Redis cache (hasil + ETag dalam satu pipeline)
+            meta = self._cache_kpis(cache_key, kpis, kpi_filter)
+            logger.info(f"Retrieved and cached {len(kpis)} KPIs as {cache_key} with TTL {self._cache_ttl}s")
+            if self.snapshot_store is not None and cache_key == self.CACHE_KEY_ALL_KPIS:
+                self.snapshot_store.save(cache_key, kpis)
+                if self.snapshot_status is not None and not self.snapshot_status["validated"]:
+                    self.snapshot_status["validated"] = True
+            if self.broadcaster is not None:
+                changed = changed_kpi_ids(previous, kpis)
+                if changed:
+                    self.broadcaster.publish(cache_key, meta["etag"], kpis, changed)
             return kpis
         except Exception as e:
             logger.exception(f"Error getting all KPIs: {e}")
             # Try to return stale cache if available
-            cached_kpis = cache.get(self.CACHE_KEY_ALL_KPIS)
+            cached_kpis = cache.get(cache_key)
             if cached_kpis is not None:
                 logger.warning("Database error, returning stale cache")
                 return cached_kpis
+            if self.snapshot_store is not None and cache_key == self.CACHE_KEY_ALL_KPIS:
+                snapshot = self.snapshot_store.load(cache_key)
+                if snapshot is not None:
+                    logger.warning(f"Database error, returning KPI snapshot from {snapshot['created_at']}")
+                    return snapshot["data"]
+            if isinstance(e, DeadlineExceeded):
+                # Tidak ada hasil lama: biarkan route menjawab 504, jangan pura-pura KPI kosong
+                raise
             return []
     
+    def get_kpis_with_meta(self, force_refresh: bool = False, kpi_filter: Optional[KPIFilter] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        KPI beserta metadata cache untuk HTTP conditional caching
+        
+        Returns:
+            Tuple (kpis, meta) dengan meta berisi etag dan expires_at (epoch detik)
+        """
+        cache_key = self.cache_key(kpi_filter)
+        kpis = self.get_all_kpis(force_refresh=force_refresh, kpi_filter=kpi_filter)
+        meta = cache.get(self.meta_key(cache_key))
+        if meta is None:
+            # Hasil stale/snapshot fallback tanpa metadata: tetap punya ETag, tapi tidak boleh di-cache client
+            meta = self._build_meta(cache_key, kpis, 0)
+        return kpis, meta
+    
+    def restore_snapshot(self) -> bool:
+        """
+        Isi cache KPI (tanpa filter) dari snapshot tersimpan, dipanggil saat startup
+        
+        Snapshot langsung disajikan; refresh berikutnya (background) memvalidasi dan menimpanya.
+        
+        Returns:
+            True kalau snapshot valid ditemukan dan dimasukkan ke cache
+        """
+        if self.snapshot_store is None:
+            return False
+        snapshot = self.snapshot_store.load(self.CACHE_KEY_ALL_KPIS)
+        if snapshot is None:
+            return False
+        self._cache_kpis(self.CACHE_KEY_ALL_KPIS, snapshot["data"])
+        self.snapshot_status = {key: value for key, value in snapshot.items() if key != "data"}
+        self.snapshot_status["validated"] = False
+        logger.info(f"KPI cache restored from snapshot v{snapshot['version']} ({snapshot['created_at']})")
+        return True
+    
     def get_cache_info(self) -> Dict[str, Any]:
         """Get informasi tentang status cache"""
         stats = cache.get_stats()
@@ -465,4 +714,5 @@ class KPIService:
             **stats,
             "cache_ttl_seconds": self._cache_ttl,
             "cache_key": self.CACHE_KEY_ALL_KPIS,
+            "snapshot": self.snapshot_status,
         }
\ No newline at end of file
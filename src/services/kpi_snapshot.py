@@ -0,0 +1,121 @@
+"""
+Snapshot KPI persisten di MySQL
+Hasil KPI terakhir disimpan setelah setiap refresh supaya startup (atau Redis kosong) tidak mulai dari nol
+"""
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from core.database import db
+from core.logging import logger
+from core.cache import DecimalEncoder
+from config import settings
+from services.model_service import model_service
+
+
+class KPISnapshotStore:
+    """Simpan dan load snapshot KPI per cache key (tabel kpi_snapshots)"""
+
+    # Naikkan kalau struktur payload KPI berubah, snapshot format lama diabaikan
+    FORMAT_VERSION = 1
+
+    CREATE_TABLE = """
+        CREATE TABLE IF NOT EXISTS kpi_snapshots (
+            snapshot_key VARCHAR(255) NOT NULL PRIMARY KEY,
+            format_version INT NOT NULL,
+            version BIGINT NOT NULL DEFAULT 1,
+            model_version VARCHAR(16) NULL,
+            payload LONGTEXT NOT NULL,
+            created_at DATETIME NOT NULL
+        )
+    """
+    # version naik setiap kali snapshot ditulis ulang
+    UPSERT_SNAPSHOT = """
+        INSERT INTO kpi_snapshots (snapshot_key, format_version, version, model_version, payload, created_at)
+        VALUES (%s, %s, 1, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            version = version + 1,
+            format_version = VALUES(format_version),
+            model_version = VALUES(model_version),
+            payload = VALUES(payload),
+            created_at = VALUES(created_at)
+    """
+    SELECT_SNAPSHOT = """
+        SELECT format_version, version, model_version, payload, created_at
+        FROM kpi_snapshots
+        WHERE snapshot_key = %s
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, max_age_seconds: Optional[int] = None):
+        """
+        Args:
+            enabled: Aktifkan snapshot (default: settings.KPI_SNAPSHOT_ENABLED)
+            max_age_seconds: Snapshot lebih tua dari ini tidak di-load (default: settings.KPI_SNAPSHOT_MAX_AGE_SECONDS)
+        """
+        self.enabled = settings.KPI_SNAPSHOT_ENABLED if enabled is None else enabled
+        self.max_age_seconds = settings.KPI_SNAPSHOT_MAX_AGE_SECONDS if max_age_seconds is None else max_age_seconds
+
+    @property
+    def model_version(self) -> Optional[str]:
+        return model_service.model_version
+
+    def ensure_schema(self) -> None:
+        """Buat tabel kpi_snapshots kalau belum ada"""
+        if self.enabled:
+            db.execute_write(self.CREATE_TABLE)
+
+    def save(self, key: str, kpis: List[Dict[str, Any]]) -> bool:
+        """
+        Tulis snapshot untuk cache key (gagal tulis tidak menggagalkan request)
+
+        Args:
+            key: Cache key KPI
+            kpis: List KPI hasil refresh
+
+        Returns:
+            True kalau tersimpan
+        """
+        if not self.enabled:
+            return False
+        try:
+            payload = json.dumps(kpis, cls=DecimalEncoder)
+            db.execute_write(self.UPSERT_SNAPSHOT, (key, self.FORMAT_VERSION, self.model_version, payload, datetime.now()))
+            logger.debug(f"KPI snapshot saved: {key}")
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to save KPI snapshot {key}: {e}")
+            return False
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Load snapshot yang masih valid (format dan model version sama, belum melewati max age)
+
+        Args:
+            key: Cache key KPI
+
+        Returns:
+            Dict dengan data, version, model_version dan created_at, atau None
+        """
+        if not self.enabled:
+            return None
+        try:
+            row = db.execute_one(self.SELECT_SNAPSHOT, (key,))
+        except Exception as e:
+            logger.warning(f"Failed to load KPI snapshot {key}: {e}")
+            return None
+        if not row:
+            return None
+        if row["format_version"] != self.FORMAT_VERSION:
+            logger.info(f"Ignoring KPI snapshot {key}: format version {row['format_version']} != {self.FORMAT_VERSION}")
+            return None
+        if row["model_version"] != self.model_version:
+            logger.info(f"Ignoring KPI snapshot {key}: model version {row['model_version']} != {self.model_version}")
+            return None
+        if self.max_age_seconds > 0 and datetime.now() - row["created_at"] > timedelta(seconds=self.max_age_seconds):
+            logger.info(f"Ignoring KPI snapshot {key}: older than {self.max_age_seconds}s")
+            return None
+        return {
+            "data": json.loads(row["payload"]),
+            "version": row["version"],
+            "model_version": row["model_version"],
+            "created_at": row["created_at"].isoformat(),
+        }
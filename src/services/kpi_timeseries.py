@@ -0,0 +1,288 @@
+"""
+KPI timeseries per bucket hari/minggu untuk satu presentation
+Satu query GROUP BY bucket per KPI; bucket yang sudah tertutup di-cache permanen, hanya bucket terbuka yang di-refresh
+"""
+from typing import Any, Callable, Dict, Optional, Tuple
+from core.database import db
+from core.logging import logger
+from core.cache import cache
+from config import settings
+from services.kpi_engine import KPIAggregationEngine
+from schemas.requests.kpi_requests import KPIFilter
+
+BUCKET_DAY = "day"
+BUCKET_WEEK = "week"
+# Lebar bucket dalam hari (date di studentvle/studentassessment = hari relatif terhadap awal presentasi)
+BUCKET_SIZES = {BUCKET_DAY: 1, BUCKET_WEEK: 7}
+
+
+def _ratio(part, total) -> float:
+    return round((part / total) * 100, 2) if total else 0
+
+
+def _forum_point(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "value": row.get("total_forum_clicks") or 0,
+        "active_students": row.get("active_students") or 0,
+        "avg_clicks_per_activity": row.get("avg_clicks_per_activity") or 0,
+    }
+
+
+def _completion_point(row: Dict[str, Any]) -> Dict[str, Any]:
+    completed, total = row.get("completed_tasks") or 0, row.get("total_submissions") or 0
+    return {
+        "value": _ratio(completed, total),
+        "completed_tasks": completed,
+        "total_submissions": total,
+        "participating_students": row.get("participating_students"),
+    }
+
+
+def _timeliness_point(row: Dict[str, Any]) -> Dict[str, Any]:
+    on_time, total = row.get("on_time_submissions") or 0, row.get("timed_submissions") or 0
+    return {"value": _ratio(on_time, total), "on_time_submissions": on_time, "total_submissions": total}
+
+
+def _grade_point(row: Dict[str, Any]) -> Dict[str, Any]:
+    total = row.get("total_assessments") or 0
+    return {
+        "value": round(row["score_sum"] / total, 2) if total else 0,
+        "min_score": row.get("min_score"),
+        "max_score": row.get("max_score"),
+        "total_students": row.get("total_students"),
+        "total_assessments": total,
+    }
+
+
+def _low_activity_point(row: Dict[str, Any]) -> Dict[str, Any]:
+    low, total = row.get("low_activity_students") or 0, row.get("total_students") or 0
+    return {
+        "value": _ratio(low, total),
+        "low_activity_students": low,
+        "total_students": total,
+        "avg_clicks_threshold": row.get("avg_clicks") or 0,
+    }
+
+
+class KPITimeseriesService:
+    """Timeseries KPI 1-5 dengan cache per bucket"""
+
+    CACHE_KEY_PREFIX = "kpi:timeseries"
+
+    # Query raw per KPI: %s pertama = lebar bucket (hari), {conditions} = filter slice + batas bawah bucket
+    FORUM_QUERY = """
+        SELECT
+            FLOOR(sv.date / %s) AS bucket,
+            SUM(sv.sum_click) AS total_forum_clicks,
+            COUNT(DISTINCT sv.id_student) AS active_students,
+            ROUND(AVG(sv.sum_click), 2) AS avg_clicks_per_activity
+        FROM studentvle sv
+        WHERE sv.id_site IN (
+            SELECT id_site
+            FROM vle
+            WHERE activity_type = 'forumng'
+        ) AND sv.date IS NOT NULL{conditions}
+        GROUP BY bucket
+    """
+    COMPLETION_QUERY = """
+        SELECT
+            FLOOR(sa.date_submitted / %s) AS bucket,
+            COUNT(CASE WHEN sa.score > 50 THEN 1 END) AS completed_tasks,
+            COUNT(*) AS total_submissions,
+            COUNT(DISTINCT sa.id_student) AS participating_students
+        FROM studentassessment sa
+        WHERE sa.score IS NOT NULL AND sa.date_submitted IS NOT NULL{conditions}
+        GROUP BY bucket
+    """
+    TIMELINESS_QUERY = """
+        SELECT
+            FLOOR(sa.date_submitted / %s) AS bucket,
+            COUNT(CASE WHEN sa.date_submitted <= a.date THEN 1 END) AS on_time_submissions,
+            COUNT(*) AS timed_submissions
+        FROM studentassessment sa
+        JOIN assessments a ON sa.id_assessment = a.id_assessment
+        WHERE sa.date_submitted IS NOT NULL AND a.date IS NOT NULL{conditions}
+        GROUP BY bucket
+    """
+    GRADE_QUERY = """
+        SELECT
+            FLOOR(sa.date_submitted / %s) AS bucket,
+            SUM(sa.score) AS score_sum,
+            MIN(sa.score) AS min_score,
+            MAX(sa.score) AS max_score,
+            COUNT(DISTINCT sa.id_student) AS total_students,
+            COUNT(*) AS total_assessments
+        FROM studentassessment sa
+        WHERE sa.score IS NOT NULL AND sa.date_submitted IS NOT NULL{conditions}
+        GROUP BY bucket
+    """
+    # KPI 5 per bucket: total clicks per mahasiswa di bucket itu dibandingkan rata-rata bucket yang sama
+    LOW_ACTIVITY_QUERY = """
+        SELECT
+            bucket,
+            COUNT(CASE WHEN total_clicks < avg_clicks * 0.5 THEN 1 END) AS low_activity_students,
+            COUNT(*) AS total_students,
+            ROUND(AVG(total_clicks), 2) AS avg_clicks
+        FROM (
+            SELECT
+                bucket,
+                total_clicks,
+                AVG(total_clicks) OVER (PARTITION BY bucket) AS avg_clicks
+            FROM (
+                SELECT FLOOR(sv.date / %s) AS bucket, sv.id_student, SUM(sv.sum_click) AS total_clicks
+                FROM studentvle sv
+                WHERE sv.date IS NOT NULL{conditions}
+                GROUP BY bucket, sv.id_student
+            ) per_student
+        ) student_activity
+        GROUP BY bucket
+    """
+    # KPI 2-4 dari kpi_rollup_activity (incremental engine), tanpa distinct count mahasiswa
+    ROLLUP_QUERY = """
+        SELECT
+            FLOOR(day / %s) AS bucket,
+            SUM(completed) AS completed_tasks,
+            SUM(scored) AS total_submissions,
+            SUM(on_time) AS on_time_submissions,
+            SUM(timed) AS timed_submissions,
+            SUM(score_sum) AS score_sum,
+            MIN(score_min) AS min_score,
+            MAX(score_max) AS max_score,
+            SUM(scored) AS total_assessments
+        FROM kpi_rollup_activity
+        WHERE day <> {no_day}{conditions}
+        GROUP BY bucket
+    """
+
+    # kpi_id -> (nama, unit, query raw, jenis filter, builder point)
+    KPI_SPECS: Dict[int, Tuple[str, str, str, str, Callable[[Dict[str, Any]], Dict[str, Any]]]] = {
+        1: ("Forum Participation Score", "clicks", FORUM_QUERY, "vle", _forum_point),
+        2: ("Task Completion Ratio", "percent", COMPLETION_QUERY, "assessment", _completion_point),
+        3: ("Assignment Timeliness", "percent", TIMELINESS_QUERY, "assessment_join", _timeliness_point),
+        4: ("Grade Performance Index", "score", GRADE_QUERY, "assessment", _grade_point),
+        5: ("Low Activity Alert Index", "percent", LOW_ACTIVITY_QUERY, "vle", _low_activity_point),
+    }
+    ROLLUP_KPIS = (2, 3, 4)
+
+    def __init__(self, cache_ttl_seconds: int = 300, closed_ttl_seconds: Optional[int] = None,
+                 kpi_engine: Optional[KPIAggregationEngine] = None):
+        """
+        Args:
+            cache_ttl_seconds: TTL bucket terbuka (default: sama dengan cache KPI)
+            closed_ttl_seconds: TTL bucket tertutup (default: settings.KPI_TIMESERIES_CLOSED_TTL_SECONDS)
+            kpi_engine: KPIAggregationEngine, KPI 2-4 dibaca dari rollup kalau siap (optional)
+        """
+        self._cache_ttl = cache_ttl_seconds
+        self._closed_ttl = settings.KPI_TIMESERIES_CLOSED_TTL_SECONDS if closed_ttl_seconds is None else closed_ttl_seconds
+        self.kpi_engine = kpi_engine
+
+    @classmethod
+    def supports(cls, kpi_id: int) -> bool:
+        return kpi_id in cls.KPI_SPECS
+
+    def clear_cache(self) -> int:
+        """Hapus semua bucket timeseries (termasuk bucket tertutup)"""
+        return cache.delete_pattern(f"{self.CACHE_KEY_PREFIX}:*")
+
+    def _use_rollup(self, kpi_id: int) -> bool:
+        return (kpi_id in self.ROLLUP_KPIS and self.kpi_engine is not None
+                and self.kpi_engine.enabled and self.kpi_engine.ready)
+
+    def _query_buckets(self, kpi_id: int, kpi_filter: KPIFilter, bucket_size: int,
+                       from_bucket: Optional[int] = None) -> Dict[int, Dict[str, Any]]:
+        """
+        Satu query GROUP BY bucket untuk KPI, hanya bucket >= from_bucket
+
+        Returns:
+            Dict index bucket -> point (tanpa metadata bucket)
+        """
+        _, _, query, filter_kind, build_point = self.KPI_SPECS[kpi_id]
+        if self._use_rollup(kpi_id):
+            query = self.ROLLUP_QUERY.replace("{no_day}", str(KPIAggregationEngine.NO_DAY))
+            conditions, params = kpi_filter.sql_conditions("code_module", "code_presentation", "day")
+            day_column = "day"
+        elif filter_kind == "vle":
+            conditions, params = kpi_filter.sql_conditions("sv.code_module", "sv.code_presentation", "sv.date")
+            day_column = "sv.date"
+        elif filter_kind == "assessment_join":
+            conditions, params = kpi_filter.sql_conditions("a.code_module", "a.code_presentation", "sa.date_submitted")
+            day_column = "sa.date_submitted"
+        else:
+            conditions, params = kpi_filter.assessment_conditions("sa")
+            day_column = "sa.date_submitted"
+        if from_bucket is not None:
+            conditions += f" AND {day_column} >= %s"
+            params += (from_bucket * bucket_size,)
+
+        rows = db.execute_query(query.format(conditions=conditions), (bucket_size, *params))
+        return {int(row["bucket"]): build_point(row) for row in rows if row.get("bucket") is not None}
+
+    def get_timeseries(self, kpi_id: int, kpi_filter: KPIFilter, bucket: str = BUCKET_WEEK,
+                       force_refresh: bool = False) -> Dict[str, Any]:
+        """
+        Timeseries KPI per bucket
+
+        Bucket terakhir yang punya data adalah bucket terbuka (data presentasi masih bertambah) dan
+        di-cache dengan TTL biasa. Bucket sebelumnya tertutup: disimpan per bucket dengan TTL panjang dan
+        tidak pernah dihitung ulang, jadi refresh hanya query hari >= awal bucket terbuka.
+
+        Args:
+            kpi_id: ID KPI (1-5)
+            kpi_filter: Slice module/presentation/tanggal
+            bucket: "day" atau "week"
+            force_refresh: Abaikan cache bucket terbuka (bucket tertutup tetap dipakai)
+
+        Returns:
+            Dict dengan metadata KPI dan list points terurut per bucket
+        """
+        if not self.supports(kpi_id):
+            raise ValueError(f"Timeseries not available for KPI {kpi_id}")
+        if bucket not in BUCKET_SIZES:
+            raise ValueError(f"Unknown bucket '{bucket}', expected one of {sorted(BUCKET_SIZES)}")
+        bucket_size = BUCKET_SIZES[bucket]
+        prefix = kpi_filter.cache_key(f"{self.CACHE_KEY_PREFIX}:{kpi_id}:{bucket}")
+        manifest_key, open_key = f"{prefix}:manifest", f"{prefix}:open"
+
+        # Manifest: index bucket tertutup terakhir dan daftar bucket tertutup yang punya data
+        manifest = cache.get(manifest_key) or {"closed_through": None, "closed": []}
+        closed_through = manifest["closed_through"]
+        cached = cache.get_many([f"{prefix}:{index}" for index in manifest["closed"]] + [open_key])
+        closed_points = {index: cached[f"{prefix}:{index}"] for index in manifest["closed"] if f"{prefix}:{index}" in cached}
+        if len(closed_points) < len(manifest["closed"]):
+            # Sebagian bucket tertutup hilang (evicted/expired): hitung ulang semua
+            closed_through, closed_points = None, {}
+        open_point = cached.get(open_key) if not force_refresh else None
+
+        if closed_through is None or open_point is None:
+            from_bucket = None if closed_through is None else closed_through + 1
+            computed = self._query_buckets(kpi_id, kpi_filter, bucket_size, from_bucket)
+            logger.info(f"Timeseries KPI {kpi_id} ({bucket}): computed {len(computed)} buckets from {from_bucket}")
+            if computed:
+                open_index = max(computed)
+                open_point = {"index": open_index, **computed.pop(open_index)}
+                cache.set_many({f"{prefix}:{index}": point for index, point in computed.items()}, self._closed_ttl)
+                closed_points.update(computed)
+                closed_through = open_index - 1
+            else:
+                open_point = {"index": None}
+            cache.set(manifest_key, {"closed_through": closed_through, "closed": sorted(closed_points)}, self._closed_ttl)
+            cache.set(open_key, open_point, self._cache_ttl)
+
+        points = [{**point, "bucket": index, "closed": True} for index, point in sorted(closed_points.items())]
+        if open_point.get("index") is not None:
+            point = {key: value for key, value in open_point.items() if key != "index"}
+            points.append({**point, "bucket": open_point["index"], "closed": False})
+        for point in points:
+            point["start_day"] = point["bucket"] * bucket_size
+            point["end_day"] = point["start_day"] + bucket_size - 1
+
+        name, unit, _, _, _ = self.KPI_SPECS[kpi_id]
+        return {
+            "kpi_id": kpi_id,
+            "name": name,
+            "unit": unit,
+            "bucket": bucket,
+            "bucket_days": bucket_size,
+            "source": "rollup" if self._use_rollup(kpi_id) else "raw",
+            "points": points,
+        }
@@ -1,6 +1,7 @@
 """
 Model service buat loading model dan encoding
 """
+import hashlib
 import pickle
 from pathlib import Path
 from config import settings
@@ -15,6 +16,7 @@ class ModelService:
         self.final_grade_model = None
         self.label_encoder_dropout = None
         self.label_encoder_finalgrade = None
+        self.model_version = None
         
     def load_models(self):
         """Load semua ML models"""
@@ -29,11 +31,26 @@ class ModelService:
                 self.label_encoder_dropout = pickle.load(f)
             with open(settings.LABEL_ENCODER_FINALGRADE_PATH, 'rb') as f:
                 self.label_encoder_finalgrade = pickle.load(f)
+            
+            self.model_version = self._compute_model_version()
+            logger.info(f"Model version: {self.model_version}")
                 
         except Exception as e:
             logger.exception("error loading models")
             raise
     
+    def _compute_model_version(self) -> str:
+        """Versi model = hash dari isi semua pickle (berubah kalau model di-retrain)"""
+        digest = hashlib.sha256()
+        for path in (
+            settings.DROPOUT_MODEL_PATH,
+            settings.FINAL_GRADE_MODEL_PATH,
+            settings.LABEL_ENCODER_DROPOUT_PATH,
+            settings.LABEL_ENCODER_FINALGRADE_PATH,
+        ):
+            digest.update(Path(path).read_bytes())
+        return digest.hexdigest()[:12]
+    
     def is_ready(self):
         """Check apakah models sudah di-load"""
         return self.dropout_model is not None and self.final_grade_model is not None and self.label_encoder_dropout is not None and self.label_encoder_finalgrade is not None 
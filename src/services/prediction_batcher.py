@@ -0,0 +1,271 @@
+"""
+Micro-batching untuk single-item predictions
+Request yang datang dalam window pendek digabung jadi satu matrix lalu di-predict sekaligus
+"""
+import asyncio
+import contextvars
+import inspect
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from config import settings
+from core import deadline
+from core.logging import logger
+from services.inference_executor import InferenceExecutor
+
+# Batas atas bucket histogram ukuran batch
+_HISTOGRAM_BOUNDS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+# Error input per item (fitur/shape tidak valid dari model atau encoder): batch dibelah untuk mencari item penyebabnya.
+# Error lain (DeadlineExceeded, model belum loaded, process pool rusak, ...) sama untuk semua item: batch langsung gagal.
+_ITEM_ERRORS = (ValueError, TypeError, KeyError, IndexError)
+
+
+class MicroBatcher:
+    """Coalescer async: kumpulkan item sampai max_batch_size atau max_wait_ms, lalu predict bareng"""
+
+    def __init__(
+        self,
+        name: str,
+        predict_batch: Callable[[Sequence[Any]], Any],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 3.0,
+        max_concurrent_batches: int = 1,
+    ):
+        """
+        Args:
+            name: Nama batcher (untuk logging dan metrics)
+            predict_batch: Function (sync atau async) yang menerima list item dan return list hasil dengan urutan sama
+            max_batch_size: Jumlah item maksimum per batch
+            max_wait_ms: Waktu tunggu maksimum sejak item pertama masuk batch
+            max_concurrent_batches: Jumlah batch yang boleh di-predict paralel
+        """
+        self.name = name
+        self._predict_batch = predict_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+
+        # Metrics
+        self._batches = 0
+        self._items = 0
+        self._max_observed = 0
+        # errors = item yang gagal, split_batches = batch gagal yang dibelah dan diulang
+        self._errors = 0
+        self._split_batches = 0
+        self._histogram: Dict[str, int] = {self._bucket_label(b): 0 for b in _HISTOGRAM_BOUNDS}
+        self._histogram[f">{_HISTOGRAM_BOUNDS[-1]}"] = 0
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Masukkan satu item ke batch berikutnya dan tunggu hasilnya
+
+        Args:
+            item: Encoded features untuk satu mahasiswa
+
+        Returns:
+            Hasil prediksi untuk item tersebut
+
+        Raises:
+            DeadlineExceeded: Deadline request habis sebelum hasil keluar (item dibuang dari batch kalau belum jalan)
+        """
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        if deadline.remaining() is None:
+            return await future
+        return await deadline.wait_for(future, f"{self.name} prediction")
+
+    def _ensure_worker(self):
+        """Start worker task di event loop yang sedang berjalan (lazy)"""
+        loop = asyncio.get_running_loop()
+        if self._worker is not None and not self._worker.done() and self._worker.get_loop() is loop:
+            return
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+        self._inflight = set()
+        # Context kosong: worker dipakai semua request, jangan ikut deadline request yang kebetulan memulainya
+        self._worker = loop.create_task(self._run(), name=f"batcher-{self.name}", context=contextvars.Context())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Tunggu slot dulu: selama semua slot sibuk, item menumpuk jadi batch berikutnya
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            flush_at = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = flush_at - loop.time()
+                if remaining <= 0:
+                    # Ambil yang sudah antri tanpa menunggu lagi
+                    if self._queue.empty():
+                        break
+                    batch.append(self._queue.get_nowait())
+                    continue
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            task = loop.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._on_dispatched)
+
+    def _on_dispatched(self, task: asyncio.Task):
+        self._inflight.discard(task)
+        self._slots.release()
+
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        # Item yang request-nya sudah kena deadline (future di-cancel) tidak perlu di-predict
+        batch = [(item, future) for item, future in batch if not future.done()]
+        if not batch:
+            return
+        self._record(len(batch))
+        await self._predict(batch)
+
+    async def _predict(self, batch: List[Tuple[Any, asyncio.Future]]):
+        """
+        Predict satu batch
+
+        Kalau gagal karena error input (_ITEM_ERRORS), batch dibelah dua dan diulang supaya hanya item penyebab
+        error yang gagal. Error sistemik langsung diteruskan ke semua caller tanpa mengulang predict.
+        """
+        batch = [(item, future) for item, future in batch if not future.done()]
+        if not batch:
+            return
+        try:
+            results = self._predict_batch([item for item, _ in batch])
+            if inspect.isawaitable(results):
+                results = await results
+            if len(results) != len(batch):
+                raise RuntimeError(f"predict_batch returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            if len(batch) == 1 or not isinstance(e, _ITEM_ERRORS):
+                self._fail(batch, e)
+                return
+            self._split_batches += 1
+            logger.warning(f"Batch prediction failed ({self.name}, size {len(batch)}), retrying in halves: {e}")
+            middle = len(batch) // 2
+            await self._predict(batch[:middle])
+            await self._predict(batch[middle:])
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _fail(self, batch: List[Tuple[Any, asyncio.Future]], error: Exception):
+        """Teruskan error ke semua caller yang masih menunggu"""
+        self._errors += len(batch)
+        logger.warning(f"Prediction failed ({self.name}, size {len(batch)}): {error}")
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def _record(self, size: int):
+        self._batches += 1
+        self._items += size
+        self._max_observed = max(self._max_observed, size)
+        for bound in _HISTOGRAM_BOUNDS:
+            if size <= bound:
+                self._histogram[self._bucket_label(bound)] += 1
+                return
+        self._histogram[f">{_HISTOGRAM_BOUNDS[-1]}"] += 1
+
+    @staticmethod
+    def _bucket_label(bound: int) -> str:
+        return f"<={bound}"
+
+    async def stop(self):
+        """Stop worker dan gagalkan item yang masih antri"""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except (asyncio.CancelledError, RuntimeError):
+            pass
+        self._worker = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError(f"Batcher {self.name} stopped"))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Metrics ukuran batch yang tercapai"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "max_concurrent_batches": self.max_concurrent_batches,
+            "batches": self._batches,
+            "items": self._items,
+            "errors": self._errors,
+            "split_batches": self._split_batches,
+            "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0,
+            "max_observed_batch_size": self._max_observed,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batch_size_histogram": dict(self._histogram),
+        }
+
+
+class PredictionBatcher:
+    """Micro-batcher di depan PredictorService untuk dropout dan final result"""
+
+    def __init__(
+        self,
+        inference_executor: InferenceExecutor,
+        enabled: Optional[bool] = None,
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+    ):
+        """
+        Args:
+            inference_executor: InferenceExecutor yang menjalankan batch
+            enabled: Aktifkan batching (default: settings.PREDICT_BATCH_ENABLED)
+            max_batch_size: Default settings.PREDICT_BATCH_MAX_SIZE
+            max_wait_ms: Default settings.PREDICT_BATCH_MAX_WAIT_MS
+        """
+        self.inference_executor = inference_executor
+        self.enabled = settings.PREDICT_BATCH_ENABLED if enabled is None else enabled
+        max_batch_size = max_batch_size or settings.PREDICT_BATCH_MAX_SIZE
+        max_wait_ms = settings.PREDICT_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms
+        concurrency = inference_executor.concurrency
+
+        self.dropout = MicroBatcher(
+            "dropout", inference_executor.predict_dropout_batch_async, max_batch_size, max_wait_ms, concurrency
+        )
+        self.final_grade = MicroBatcher(
+            "final_grade", inference_executor.predict_final_grade_batch_async, max_batch_size, max_wait_ms, concurrency
+        )
+        logger.info(
+            f"PredictionBatcher initialized: enabled={self.enabled}, "
+            f"max_batch_size={max_batch_size}, max_wait_ms={max_wait_ms}, concurrency={concurrency}"
+        )
+
+    async def predict_dropout(self, features: Any) -> int:
+        """Predict dropout untuk satu mahasiswa lewat micro-batch"""
+        if not self.enabled:
+            return (await self.inference_executor.predict_dropout_batch_async([features]))[0]
+        return await self.dropout.submit(features)
+
+    async def predict_final_grade(self, features: Any) -> Any:
+        """Predict final result untuk satu mahasiswa lewat micro-batch"""
+        if not self.enabled:
+            return (await self.inference_executor.predict_final_grade_batch_async([features]))[0]
+        return await self.final_grade.submit(features)
+
+    async def stop(self):
+        """Stop semua worker batcher"""
+        await self.dropout.stop()
+        await self.final_grade.stop()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Metrics batching per model"""
+        return {
+            "enabled": self.enabled,
+            "dropout": self.dropout.get_stats(),
+            "final_grade": self.final_grade.get_stats(),
+        }
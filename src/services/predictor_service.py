@@ -2,51 +2,176 @@
 Docstring for services.predictor_service
 predictor service untuk handling prediksi ML models
 """
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+import numpy as np
 from services.model_service import model_service
+from services.compiled_forest import CompiledForest
 from schemas.types import DropoutFeaturesEncoded, FinalResultFeaturesEncoded
 from core.logging import logger
+from config import settings
+
+FINAL_GRADE_MODEL = "final_grade_model"
+DROPOUT_MODEL = "dropout_model"
+
+# Urutan fitur sesuai training masing-masing model
+FINAL_GRADE_FEATURES = (
+    'gender',
+    'age_band',
+    'studied_credits',
+    'num_of_prev_attempts',
+    'total_clicks',
+    'avg_assessment_score',
+)
+DROPOUT_FEATURES = (
+    'avg_assessment_score',
+    'total_clicks',
+    'studied_credits',
+    'num_of_prev_attempts',
+    'gender',
+    'age_band',
+)
+
+# Dtype kolom fitur mentah saat dibaca dari database (db.fetch_columns / iter_chunks)
+RAW_FEATURE_DTYPES = {
+    'gender': object,
+    'age_band': object,
+    'studied_credits': np.float64,
+    'num_of_prev_attempts': np.float64,
+    'total_clicks': np.float64,
+    'avg_assessment_score': np.float64,
+}
+
 
 class PredictorService:
-    def __init__(self):
+    BACKEND_SKLEARN = "sklearn"
+    BACKEND_NUMPY = "numpy"
+
+    def __init__(self, backend: Optional[str] = None):
         # Use global model_service instance
         models = model_service.get_models()
-        self.final_grade_model = models.get("final_grade_model")
-        self.dropout_model = models.get("dropout_model")
-        
+        self.final_grade_model = models.get(FINAL_GRADE_MODEL)
+        self.dropout_model = models.get(DROPOUT_MODEL)
+        self.backend = self.BACKEND_SKLEARN
+        self._compiled: Dict[str, CompiledForest] = {}
+
+        backend = backend or settings.INFERENCE_BACKEND
+        if backend == self.BACKEND_NUMPY:
+            self._compile_models()
+        elif backend != self.BACKEND_SKLEARN:
+            logger.warning(f"Unknown inference backend '{backend}', using sklearn")
+
+    def _compile_models(self):
+        """Compile forest models ke NumPy engine, fallback ke sklearn kalau gagal"""
+        try:
+            compiled = {
+                FINAL_GRADE_MODEL: CompiledForest(self.final_grade_model),
+                DROPOUT_MODEL: CompiledForest(self.dropout_model),
+            }
+        except Exception as e:
+            logger.warning(f"Failed to compile models for numpy backend: {e}. Using sklearn backend.")
+            return
+        self._compiled = compiled
+        self.backend = self.BACKEND_NUMPY
+        logger.info(
+            "Inference backend: numpy "
+            f"({compiled[FINAL_GRADE_MODEL].n_trees} + {compiled[DROPOUT_MODEL].n_trees} trees compiled)"
+        )
+
+    def final_grade_matrix(self, features: Sequence[FinalResultFeaturesEncoded]) -> np.ndarray:
+        """Convert features dict ke matrix dengan urutan fitur final result"""
+        return np.array([[row[name] for name in FINAL_GRADE_FEATURES] for row in features], dtype=np.float64)
+
+    def dropout_matrix(self, features: Sequence[DropoutFeaturesEncoded]) -> np.ndarray:
+        """Convert features dict ke matrix dengan urutan fitur dropout (beda dengan final_grade)"""
+        return np.array([[row[name] for name in DROPOUT_FEATURES] for row in features], dtype=np.float64)
+
+    def feature_matrix(self, model_name: str, columns: Mapping[str, np.ndarray]) -> np.ndarray:
+        """Susun encoded feature columns jadi matrix dengan urutan fitur model"""
+        order = FINAL_GRADE_FEATURES if model_name == FINAL_GRADE_MODEL else DROPOUT_FEATURES
+        return np.column_stack([np.asarray(columns[name], dtype=np.float64) for name in order])
+
+    def _get_model(self, model_name: str) -> Any:
+        if model_name == FINAL_GRADE_MODEL:
+            if not self.final_grade_model:
+                logger.exception("Final Result model is not loaded")
+                raise Exception("Final Result model is not loaded")
+            return self.final_grade_model
+        if model_name == DROPOUT_MODEL:
+            if not self.dropout_model:
+                logger.exception("Dropout model is not loaded")
+                raise Exception("Dropout model is not loaded")
+            return self.dropout_model
+        raise ValueError(f"Unknown model: {model_name}")
+
+    def predict_matrix(self, model_name: str, X: Any) -> np.ndarray:
+        """
+        Jalankan predict pada feature matrix dengan backend yang aktif
+
+        Args:
+            model_name: FINAL_GRADE_MODEL atau DROPOUT_MODEL
+            X: Feature matrix dengan urutan fitur model tersebut
+
+        Returns:
+            Array hasil prediksi per baris
+        """
+        model = self._get_model(model_name)
+        compiled = self._compiled.get(model_name)
+        # Batch besar lebih cepat di sklearn (Cython per tree), hasilnya identik
+        if compiled is not None and len(X) <= settings.INFERENCE_NUMPY_MAX_BATCH:
+            return compiled.predict(X)
+        return model.predict(X)
+
+    def predict_proba_matrix(self, model_name: str, X: Any) -> np.ndarray:
+        """
+        Probabilitas per kelas pada feature matrix dengan backend yang aktif
+
+        Returns:
+            Array (n_samples, n_classes), urutan kolom sesuai classes_ model
+        """
+        model = self._get_model(model_name)
+        compiled = self._compiled.get(model_name)
+        if compiled is not None and len(X) <= settings.INFERENCE_NUMPY_MAX_BATCH:
+            return compiled.predict_proba(X)
+        return model.predict_proba(X)
+
+    def classes(self, model_name: str) -> np.ndarray:
+        """Label kelas model (urutan kolom predict_proba)"""
+        return self._get_model(model_name).classes_
+
+    def labels_from_proba(self, model_name: str, proba: np.ndarray) -> np.ndarray:
+        """Label hasil predict dari matrix probabilitas (sama dengan model.predict, tanpa pass kedua)"""
+        return self.classes(model_name).take(np.argmax(proba, axis=1), axis=0)
+
+    def dropout_probability(self, proba: np.ndarray) -> np.ndarray:
+        """Kolom probabilitas dropout (kelas 1) dari predict_proba model dropout"""
+        positive = np.flatnonzero(self.classes(DROPOUT_MODEL) == 1)
+        if len(positive) == 0:
+            return np.zeros(len(proba), dtype=np.float64)
+        return np.asarray(proba[:, positive[0]], dtype=np.float64)
+
     def predict_final_grade(self, features: FinalResultFeaturesEncoded):
         """Predict Final Result berdasarkan input data"""
-        if not self.final_grade_model:
-            logger.exception("Final Result model is not loaded")
-            raise Exception("Final Result model is not loaded")
-        
-        # Convert features dict to list with correct order
-        feature_list = [
-            features['gender'],
-            features['age_band'],
-            features['studied_credits'],
-            features['num_of_prev_attempts'],
-            features['total_clicks'],
-            features['avg_assessment_score']
-        ]
-        
-        prediction = self.final_grade_model.predict([feature_list])
-        return prediction[0]
-    
+        return self.predict_final_grade_batch([features])[0]
+
     def predict_dropout(self, features: DropoutFeaturesEncoded):
         """Predict dropout berdasarkan input data"""
-        if not self.dropout_model:
-            logger.exception("Dropout model is not loaded")
-            raise Exception("Dropout model is not loaded")
-        
-        # Convert features dict to list with correct order (same as final_grade)
-        feature_list = [
-            features['avg_assessment_score'],
-            features['total_clicks'],
-            features['studied_credits'],
-            features['num_of_prev_attempts'],
-            features['gender'],
-            features['age_band']
-        ]
-        
-        prediction = self.dropout_model.predict([feature_list])
-        return int(prediction[0])
\ No newline at end of file
+        return self.predict_dropout_batch([features])[0]
+
+    def predict_final_grade_batch(self, features: Sequence[FinalResultFeaturesEncoded]) -> List[Any]:
+        """Predict Final Result untuk banyak mahasiswa sekaligus"""
+        predictions = self.predict_matrix(FINAL_GRADE_MODEL, self.final_grade_matrix(features))
+        return list(predictions)
+
+    def predict_dropout_batch(self, features: Sequence[DropoutFeaturesEncoded]) -> List[int]:
+        """Predict dropout untuk banyak mahasiswa sekaligus"""
+        predictions = self.predict_matrix(DROPOUT_MODEL, self.dropout_matrix(features))
+        return [int(p) for p in predictions]
+
+    def predict_dropout_proba(self, features: DropoutFeaturesEncoded) -> float:
+        """Probabilitas dropout (0-1) berdasarkan input data"""
+        return self.predict_dropout_proba_batch([features])[0]
+
+    def predict_dropout_proba_batch(self, features: Sequence[DropoutFeaturesEncoded]) -> List[float]:
+        """Probabilitas dropout untuk banyak mahasiswa sekaligus"""
+        proba = self.predict_proba_matrix(DROPOUT_MODEL, self.dropout_matrix(features))
+        return self.dropout_probability(proba).tolist()
@@ -0,0 +1,104 @@
+"""
+Sampling mahasiswa untuk KPI berbasis ML
+Hash-based deterministic sampling pada id_student (stabil antar refresh) dan stratified per module/presentation
+"""
+from typing import Optional, Tuple
+from config import settings
+from core.logging import logger
+
+# Resolusi hash untuk threshold fraction (CRC32 dimodulo ke range ini)
+_HASH_BUCKETS = 1_000_000
+
+# Kolom studentinfo yang dibawa ke hasil sample
+_STUDENT_COLUMNS = """
+    si.id_student,
+    si.code_module,
+    si.code_presentation,
+    si.gender,
+    si.age_band,
+    si.studied_credits,
+    si.num_of_prev_attempts
+"""
+
+
+class StudentSampler:
+    """Builder SQL untuk memilih sample baris studentinfo"""
+
+    METHOD_HASH = "hash"
+    METHOD_STRATIFIED = "stratified"
+    METHOD_RANDOM = "random"
+
+    def __init__(self, fraction: Optional[float] = None, method: Optional[str] = None, seed: Optional[str] = None):
+        """
+        Args:
+            fraction: Fraksi mahasiswa yang di-sample, 0-1 (default: settings.SAMPLE_SIZE)
+            method: "hash", "stratified" atau "random" (default: settings.SAMPLING_METHOD)
+            seed: Seed hash, ganti seed untuk dapat sample lain yang tetap stabil (default: settings.SAMPLING_SEED)
+        """
+        self.fraction = min(1.0, max(0.0, settings.SAMPLE_SIZE if fraction is None else fraction))
+        self.method = method or settings.SAMPLING_METHOD
+        if self.method not in (self.METHOD_HASH, self.METHOD_STRATIFIED, self.METHOD_RANDOM):
+            logger.warning(f"Unknown sampling method '{self.method}', using hash")
+            self.method = self.METHOD_HASH
+        self.seed = settings.SAMPLING_SEED if seed is None else seed
+
+    @property
+    def is_deterministic(self) -> bool:
+        return self.method != self.METHOD_RANDOM
+
+    def sample_cte(self, total_students: int, conditions: str = "", params: tuple = ()) -> Tuple[str, tuple]:
+        """
+        SQL yang memilih baris studentinfo yang masuk sample (dipakai sebagai CTE `sampled`)
+
+        Args:
+            total_students: Jumlah baris studentinfo (hanya dipakai untuk metode random)
+            conditions: Kondisi tambahan pada alias `si` (" AND ..."), misal dari KPIFilter
+            params: Parameter untuk conditions
+
+        Returns:
+            Tuple (sql, params)
+        """
+        if self.method == self.METHOD_STRATIFIED:
+            # Ambil floor(fraction * ukuran stratum) mahasiswa dengan hash terkecil per module/presentation
+            sql = f"""
+                SELECT {_STUDENT_COLUMNS.replace('si.', 'ranked.')}
+                FROM (
+                    SELECT {_STUDENT_COLUMNS},
+                        ROW_NUMBER() OVER (
+                            PARTITION BY si.code_module, si.code_presentation
+                            ORDER BY CRC32(CONCAT(%s, ':', si.id_student)), si.id_student
+                        ) AS stratum_rank,
+                        COUNT(*) OVER (PARTITION BY si.code_module, si.code_presentation) AS stratum_size
+                    FROM studentinfo si
+                    WHERE 1 = 1{conditions}
+                ) ranked
+                WHERE ranked.stratum_rank <= GREATEST(1, FLOOR(ranked.stratum_size * %s))
+            """
+            return sql, (self.seed, *params, self.fraction)
+
+        if self.method == self.METHOD_RANDOM:
+            sample_size = max(1, int(total_students * self.fraction))
+            sql = f"""
+                SELECT {_STUDENT_COLUMNS}
+                FROM studentinfo si
+                WHERE 1 = 1{conditions}
+                ORDER BY RAND()
+                LIMIT %s
+            """
+            return sql, (*params, sample_size)
+
+        # Hash: mahasiswa masuk sample kalau hash(seed, id_student) di bawah threshold
+        sql = f"""
+            SELECT {_STUDENT_COLUMNS}
+            FROM studentinfo si
+            WHERE MOD(CRC32(CONCAT(%s, ':', si.id_student)), {_HASH_BUCKETS}) < %s{conditions}
+        """
+        return sql, (self.seed, int(self.fraction * _HASH_BUCKETS), *params)
+
+    def describe(self) -> dict:
+        """Info sampling untuk output KPI"""
+        return {
+            "sampling_method": self.method,
+            "sampling_seed": self.seed if self.is_deterministic else None,
+            "sampling_fraction": self.fraction,
+        }
@@ -0,0 +1,108 @@
+"""
+Export prediksi satu cohort (module/presentation) sebagai file NDJSON atau CSV
+studentinfo + agregat di-stream lewat server-side cursor per chunk, setiap chunk di-score vectorized
+"""
+import csv
+import io
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from core.database import db
+from core.logging import logger
+from core.responses import dumps
+from config import settings
+from services.predictor_service import RAW_FEATURE_DTYPES
+from services.scoring_job import StudentScoringJob
+from services.student_features import features_query
+from schemas.requests.kpi_requests import KPIFilter
+
+FORMAT_NDJSON = "ndjson"
+FORMAT_CSV = "csv"
+MEDIA_TYPES = {FORMAT_NDJSON: "application/x-ndjson", FORMAT_CSV: "text/csv; charset=utf-8"}
+EXPORT_COLUMNS = (
+    "id_student", "code_module", "code_presentation", "dropout_prediction", "dropout_probability", "final_result_prediction",
+)
+
+
+class ScoringExportService:
+    """Generator baris export: memory konstan (satu chunk), baris pertama keluar sebelum query selesai di-stream"""
+
+    def __init__(self, scoring_job: StudentScoringJob, chunk_size: Optional[int] = None, first_chunk_size: Optional[int] = None):
+        """
+        Args:
+            scoring_job: StudentScoringJob (encode + predict per chunk)
+            chunk_size: Jumlah baris per chunk (default: settings.SCORING_JOB_CHUNK_SIZE)
+            first_chunk_size: Jumlah baris chunk pertama (default: settings.PREDICT_EXPORT_FIRST_CHUNK_SIZE)
+        """
+        self.scoring_job = scoring_job
+        self.chunk_size = chunk_size or settings.SCORING_JOB_CHUNK_SIZE
+        self.first_chunk_size = first_chunk_size or settings.PREDICT_EXPORT_FIRST_CHUNK_SIZE
+
+    def build_query(self, kpi_filter: KPIFilter) -> Tuple[str, tuple]:
+        """Query fitur cohort (hanya code_module/code_presentation dari filter yang dipakai)"""
+        conditions, params = kpi_filter.sql_conditions("si.code_module", "si.code_presentation")
+        return features_query(conditions), params
+
+    @staticmethod
+    def header(fmt: str) -> bytes:
+        """Baris header CSV (NDJSON tanpa header)"""
+        return (",".join(EXPORT_COLUMNS) + "\r\n").encode() if fmt == FORMAT_CSV else b""
+
+    def score_rows(self, columns: Dict[str, np.ndarray]) -> List[Tuple[Any, ...]]:
+        """Score satu chunk; baris dengan fitur yang tidak bisa di-encode tetap ada dengan prediksi kosong"""
+        valid, dropout, dropout_probability, final_result = self.scoring_job.score_columns(columns)
+        dropout_out = np.full(len(valid), None, dtype=object)
+        probability_out = np.full(len(valid), None, dtype=object)
+        final_out = np.full(len(valid), None, dtype=object)
+        dropout_out[valid] = [int(value) for value in dropout]
+        probability_out[valid] = [round(float(value), 4) for value in dropout_probability]
+        final_out[valid] = [str(value) for value in final_result]
+        return list(zip(
+            (int(value) for value in columns["id_student"]),
+            columns["code_module"].tolist(),
+            columns["code_presentation"].tolist(),
+            dropout_out.tolist(),
+            probability_out.tolist(),
+            final_out.tolist(),
+        ))
+
+    @staticmethod
+    def render(rows: List[Tuple[Any, ...]], fmt: str) -> bytes:
+        """Render baris ke NDJSON (satu objek per baris) atau CSV"""
+        if fmt == FORMAT_NDJSON:
+            return b"".join(dumps(dict(zip(EXPORT_COLUMNS, row))) + b"\n" for row in rows)
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode()
+
+    def iter_export(self, kpi_filter: KPIFilter, fmt: str = FORMAT_NDJSON) -> Iterator[bytes]:
+        """
+        Stream hasil export per chunk
+
+        Args:
+            kpi_filter: Cohort (code_module / code_presentation), kosong = seluruh mahasiswa
+            fmt: "ndjson" atau "csv"
+
+        Yields:
+            Bytes untuk satu chunk baris (CSV: header dulu, sebelum query dijalankan). Query fitur tanpa GROUP BY/ORDER BY
+            keluar per baris dari server-side cursor, jadi chunk pertama (first_chunk_size baris) dikirim tanpa menunggu
+            seluruh cohort.
+        """
+        if fmt not in MEDIA_TYPES:
+            raise ValueError(f"Unknown export format: {fmt}")
+        header = self.header(fmt)
+        if header:
+            yield header
+        query, params = self.build_query(kpi_filter)
+        chunks = db.iter_chunks(
+            query, params, chunk_size=self.chunk_size, row_format=db.ROW_FORMAT_COLUMNS, dtypes=RAW_FEATURE_DTYPES,
+            first_chunk_size=self.first_chunk_size,
+        )
+        total = 0
+        try:
+            for columns in chunks:
+                rows = self.score_rows(columns)
+                total += len(rows)
+                yield self.render(rows, fmt)
+        finally:
+            chunks.close()
+        logger.info(f"Prediction export ({fmt}) streamed {total} rows for {kpi_filter.cache_key('cohort')}")
@@ -0,0 +1,380 @@
+"""
+Scoring job untuk seluruh populasi mahasiswa
+Score semua baris studentinfo dengan model dropout dan final result, simpan ke student_predictions
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+import numpy as np
+from core.database import db
+from core.logging import logger
+from core.threads import to_thread_joined
+from config import settings
+from services.model_service import model_service
+from services.encoder_service import EncoderService
+from services.inference_executor import InferenceExecutor
+from services.predictor_service import DROPOUT_MODEL, FINAL_GRADE_MODEL, RAW_FEATURE_DTYPES
+from services.student_features import features_query
+from schemas.requests.kpi_requests import KPIFilter
+
+
+class StudentScoringJob:
+    """Batch job: stream fitur seluruh studentinfo per chunk, predict vectorized, tulis ke student_predictions"""
+
+    LOCK_NAME = "capstone_student_scoring"
+
+    CREATE_PREDICTIONS_TABLE = """
+        CREATE TABLE IF NOT EXISTS student_predictions (
+            model_version VARCHAR(16) NOT NULL,
+            id_student BIGINT NOT NULL,
+            code_module VARCHAR(3) NOT NULL,
+            code_presentation VARCHAR(5) NOT NULL,
+            dropout_prediction TINYINT NOT NULL,
+            dropout_probability DOUBLE NULL,
+            final_result_prediction VARCHAR(11) NOT NULL,
+            scored_at DATETIME NOT NULL,
+            PRIMARY KEY (model_version, id_student, code_module, code_presentation),
+            KEY idx_student_predictions_student (id_student)
+        )
+    """
+    CREATE_RUNS_TABLE = """
+        CREATE TABLE IF NOT EXISTS student_prediction_runs (
+            model_version VARCHAR(16) NOT NULL PRIMARY KEY,
+            status VARCHAR(16) NOT NULL,
+            started_at DATETIME NOT NULL,
+            finished_at DATETIME NULL,
+            scored_rows BIGINT NOT NULL DEFAULT 0,
+            skipped_rows BIGINT NOT NULL DEFAULT 0
+        )
+    """
+
+    # Fitur per enrollment, sama dengan export, prediksi bulk dan prediksi by ID
+    FEATURES_QUERY = features_query()
+
+    # Tabel dari versi sebelum ada kolom probabilitas di-upgrade saat startup (baris lama NULL sampai run berikutnya)
+    PROBABILITY_COLUMN_EXISTS = """
+        SELECT COUNT(*) AS found
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'student_predictions' AND COLUMN_NAME = 'dropout_probability'
+    """
+    ADD_PROBABILITY_COLUMN = """
+        ALTER TABLE student_predictions
+        ADD COLUMN dropout_probability DOUBLE NULL AFTER dropout_prediction
+    """
+
+    INSERT_PREDICTIONS = """
+        REPLACE INTO student_predictions
+            (model_version, id_student, code_module, code_presentation,
+             dropout_prediction, dropout_probability, final_result_prediction, scored_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """
+
+    def __init__(self, encoder_service: EncoderService, inference_executor: InferenceExecutor, chunk_size: Optional[int] = None):
+        """
+        Args:
+            encoder_service: EncoderService instance
+            inference_executor: InferenceExecutor untuk batch prediction
+            chunk_size: Jumlah baris per chunk (default: settings.SCORING_JOB_CHUNK_SIZE)
+        """
+        self.encoder_service = encoder_service
+        self.inference_executor = inference_executor
+        self.chunk_size = chunk_size or settings.SCORING_JOB_CHUNK_SIZE
+        self._run_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    @property
+    def model_version(self) -> Optional[str]:
+        return model_service.model_version
+
+    @property
+    def is_running(self) -> bool:
+        return self._run_lock.locked()
+
+    def ensure_schema(self) -> None:
+        """Buat tabel student_predictions dan student_prediction_runs kalau belum ada"""
+        db.execute_write(self.CREATE_PREDICTIONS_TABLE)
+        db.execute_write(self.CREATE_RUNS_TABLE)
+        found = db.execute_one(self.PROBABILITY_COLUMN_EXISTS)
+        if not found or not found.get("found"):
+            logger.info("Adding dropout_probability column to student_predictions")
+            db.execute_write(self.ADD_PROBABILITY_COLUMN)
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Score semua mahasiswa di studentinfo
+
+        Returns:
+            Ringkasan run (status, jumlah baris, durasi)
+        """
+        if not self._run_lock.acquire(blocking=False):
+            logger.info("Scoring job already running in this process, skipping")
+            return {"status": "skipped", "reason": "already running"}
+        try:
+            # Advisory lock MySQL supaya hanya satu worker/replica yang jalan
+            with db.get_connection() as lock_conn:
+                with lock_conn.cursor() as cursor:
+                    cursor.execute("SELECT GET_LOCK(%s, 0) AS acquired", (self.LOCK_NAME,))
+                    row = cursor.fetchone()
+                if not row or not row.get("acquired"):
+                    logger.info("Scoring job is running on another worker, skipping")
+                    return {"status": "skipped", "reason": "running elsewhere"}
+                self.last_run = self._run_locked()
+                return self.last_run
+        finally:
+            self._run_lock.release()
+
+    def _run_locked(self) -> Dict[str, Any]:
+        model_version = self.model_version
+        if model_version is None:
+            raise Exception("Models are not loaded")
+
+        started = time.perf_counter()
+        started_at = datetime.now().replace(microsecond=0)
+        self.ensure_schema()
+        # Re-run untuk versi yang sama tetap 'completed' supaya hasil lama tetap bisa dipakai
+        db.execute_write(
+            "INSERT INTO student_prediction_runs (model_version, status, started_at) VALUES (%s, 'running', %s) "
+            "ON DUPLICATE KEY UPDATE started_at = VALUES(started_at)",
+            (model_version, started_at),
+        )
+        logger.info(f"Scoring job started for model version {model_version}")
+
+        scored = skipped = 0
+        try:
+            # Satu query di-stream lewat server-side cursor, memory tetap flat berapapun jumlah baris
+            chunks = db.iter_chunks(
+                self.FEATURES_QUERY, chunk_size=self.chunk_size, row_format=db.ROW_FORMAT_COLUMNS, dtypes=RAW_FEATURE_DTYPES
+            )
+            try:
+                for columns in chunks:
+                    if self._stop_event.is_set():
+                        raise Exception("Scoring job stopped before completion")
+                    chunk_scored, chunk_skipped = self._score_chunk(columns, model_version)
+                    scored += chunk_scored
+                    skipped += chunk_skipped
+                    logger.debug(f"Scoring job progress: {scored + skipped} rows")
+            finally:
+                chunks.close()
+
+            # Prediksi dari model lama dan mahasiswa yang sudah tidak ada tidak dipakai lagi
+            db.execute_write("DELETE FROM student_predictions WHERE model_version <> %s", (model_version,))
+            db.execute_write(
+                "DELETE FROM student_predictions WHERE model_version = %s AND scored_at < %s",
+                (model_version, started_at),
+            )
+            db.execute_write("DELETE FROM student_prediction_runs WHERE model_version <> %s", (model_version,))
+            db.execute_write(
+                "UPDATE student_prediction_runs SET status = 'completed', finished_at = %s, scored_rows = %s, skipped_rows = %s "
+                "WHERE model_version = %s",
+                (datetime.now(), scored, skipped, model_version),
+            )
+        except Exception:
+            logger.exception("Scoring job failed")
+            db.execute_write(
+                "UPDATE student_prediction_runs SET status = 'failed', finished_at = %s, scored_rows = %s "
+                "WHERE model_version = %s AND status <> 'completed'",
+                (datetime.now(), scored, model_version),
+            )
+            raise
+
+        duration = round(time.perf_counter() - started, 2)
+        logger.success(f"Scoring job completed: {scored} rows scored, {skipped} skipped in {duration}s")
+        return {
+            "status": "completed",
+            "model_version": model_version,
+            "scored_rows": scored,
+            "skipped_rows": skipped,
+            "started_at": started_at.isoformat(),
+            "duration_seconds": duration,
+        }
+
+    def score_columns(self, columns: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Encode dan predict satu chunk (kolom NumPy) dengan kedua model secara vectorized
+
+        Args:
+            columns: Kolom fitur mentah (FEATURES_QUERY, dtype RAW_FEATURE_DTYPES)
+
+        Returns:
+            Tuple (mask baris valid, prediksi dropout, probabilitas dropout, prediksi final result);
+            prediksi hanya untuk baris valid
+        """
+        valid = self.encoder_service.valid_rows(columns)
+        if not valid.any():
+            return valid, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64), np.empty(0, dtype=object)
+        if not valid.all():
+            columns = {name: values[valid] for name, values in columns.items()}
+
+        encoded = self.encoder_service.encode_columns(columns)
+        predictor = self.inference_executor.predictor_service
+        # Satu pass predict_proba: label dropout diturunkan dari argmax (sama dengan predict)
+        dropout_proba = self.inference_executor.run(DROPOUT_MODEL, predictor.feature_matrix(DROPOUT_MODEL, encoded), proba=True)
+        dropout = predictor.labels_from_proba(DROPOUT_MODEL, dropout_proba)
+        final_result = self.inference_executor.run(FINAL_GRADE_MODEL, predictor.feature_matrix(FINAL_GRADE_MODEL, encoded))
+        return valid, dropout, predictor.dropout_probability(dropout_proba), final_result
+
+    def _score_chunk(self, columns: Dict[str, np.ndarray], model_version: str):
+        """Encode dan predict satu chunk (kolom NumPy) secara vectorized, lalu tulis hasilnya"""
+        total = len(columns["id_student"])
+        if total == 0:
+            return 0, 0
+
+        valid, dropout, dropout_probability, final_result = self.score_columns(columns)
+        if not valid.any():
+            return 0, total
+        if not valid.all():
+            columns = {name: values[valid] for name, values in columns.items()}
+
+        scored_at = datetime.now()
+        params = [
+            (model_version, int(id_student), code_module, code_presentation, int(d), float(p), str(f), scored_at)
+            for id_student, code_module, code_presentation, d, p, f in zip(
+                columns["id_student"], columns["code_module"], columns["code_presentation"], dropout, dropout_probability, final_result
+            )
+        ]
+        db.execute_many(self.INSERT_PREDICTIONS, params)
+        return len(params), total - len(params)
+
+    async def run_periodically(self, interval_seconds: int, on_complete: Optional[Callable[[], None]] = None):
+        """
+        Loop background: jalankan job di thread terpisah setiap interval_seconds
+        
+        Berhenti setelah stop(); task yang di-cancel menunggu run yang sedang jalan berhenti di batas chunk.
+
+        Args:
+            interval_seconds: Jeda antar run
+            on_complete: Callback setelah run selesai (misal invalidasi KPI cache)
+        """
+        while not self._stop_event.is_set():
+            try:
+                result = await to_thread_joined(self.run)
+                if result.get("status") == "completed" and on_complete:
+                    on_complete()
+            except Exception as e:
+                logger.error(f"Scheduled scoring job failed: {e}")
+            await asyncio.sleep(interval_seconds)
+
+    def stop(self) -> None:
+        """Minta run yang sedang jalan berhenti di batas chunk berikutnya"""
+        self._stop_event.set()
+
+    def get_completed_run(self) -> Optional[Dict[str, Any]]:
+        """Run yang sudah selesai untuk model version saat ini (None kalau belum ada)"""
+        if self.model_version is None:
+            return None
+        try:
+            return db.execute_one(
+                "SELECT model_version, finished_at, scored_rows FROM student_prediction_runs "
+                "WHERE model_version = %s AND status = 'completed'",
+                (self.model_version,),
+            )
+        except Exception as e:
+            logger.warning(f"Failed to read scoring runs: {e}")
+            return None
+
+    def get_dropout_summary(self, kpi_filter: Optional[KPIFilter] = None) -> Optional[Dict[str, Any]]:
+        """
+        Agregat prediksi dropout tersimpan untuk model version saat ini (opsional per module/presentation)
+
+        Satu baris prediksi per enrollment; mahasiswa yang ikut beberapa presentasi dihitung sekali
+        (predicted dropout kalau salah satu enrollment-nya diprediksi dropout).
+        """
+        if self.model_version is None:
+            return None
+        conditions, params = (kpi_filter or KPIFilter()).sql_conditions("sp.code_module", "sp.code_presentation")
+        summary = db.execute_one(
+            f"""
+            SELECT
+                COUNT(DISTINCT sp.id_student) AS scored_students,
+                COUNT(DISTINCT CASE WHEN sp.dropout_prediction = 1 THEN sp.id_student END) AS predicted_dropouts,
+                AVG(sp.dropout_probability) AS avg_dropout_probability,
+                MAX(r.finished_at) AS scored_at
+            FROM student_predictions sp
+            JOIN student_prediction_runs r
+                ON r.model_version = sp.model_version AND r.status = 'completed'
+            WHERE sp.model_version = %s{conditions}
+            """,
+            (self.model_version, *params),
+        )
+        if not summary or not summary.get("scored_students"):
+            return None
+        return {**summary, "model_version": self.model_version}
+
+    def get_dropout_probabilities(self, kpi_filter: Optional[KPIFilter] = None) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Probabilitas dropout tersimpan per mahasiswa (opsional per module/presentation)
+
+        Returns:
+            Kolom id_student, code_module, code_presentation, dropout_probability;
+            None kalau belum ada run selesai dengan probabilitas untuk model version saat ini
+        """
+        if self.model_version is None:
+            return None
+        conditions, params = (kpi_filter or KPIFilter()).sql_conditions("sp.code_module", "sp.code_presentation")
+        columns = db.fetch_columns(
+            f"""
+            SELECT sp.id_student, sp.code_module, sp.code_presentation, sp.dropout_probability
+            FROM student_predictions sp
+            JOIN student_prediction_runs r
+                ON r.model_version = sp.model_version AND r.status = 'completed'
+            WHERE sp.model_version = %s AND sp.dropout_probability IS NOT NULL{conditions}
+            """,
+            (self.model_version, *params),
+            dtypes={"id_student": np.int64, "dropout_probability": np.float64},
+        )
+        if len(columns["id_student"]) == 0:
+            return None
+        return columns
+
+    def get_stored_prediction(self, id_student: int) -> Optional[Dict[str, Any]]:
+        """Prediksi tersimpan untuk satu mahasiswa (presentasi terbaru), None kalau belum ada"""
+        if self.model_version is None:
+            return None
+        return db.execute_one(
+            """
+            SELECT sp.id_student, sp.code_module, sp.code_presentation, sp.dropout_prediction,
+                   sp.final_result_prediction, sp.model_version, sp.scored_at
+            FROM student_predictions sp
+            JOIN student_prediction_runs r
+                ON r.model_version = sp.model_version AND r.status = 'completed'
+            WHERE sp.model_version = %s AND sp.id_student = %s
+            ORDER BY sp.code_presentation DESC, sp.code_module
+            LIMIT 1
+            """,
+            (self.model_version, id_student),
+        )
+
+    def get_stored_predictions(self, ids: Sequence[int]) -> Dict[int, Dict[str, Any]]:
+        """Prediksi tersimpan untuk banyak mahasiswa (satu query IN), id -> baris presentasi terbaru"""
+        if self.model_version is None or not ids:
+            return {}
+        rows = db.execute_query(
+            f"""
+            SELECT sp.id_student, sp.code_module, sp.code_presentation, sp.dropout_prediction,
+                   sp.final_result_prediction, sp.model_version, sp.scored_at
+            FROM student_predictions sp
+            JOIN student_prediction_runs r
+                ON r.model_version = sp.model_version AND r.status = 'completed'
+            WHERE sp.model_version = %s AND sp.id_student IN ({", ".join(["%s"] * len(ids))})
+            ORDER BY sp.id_student, sp.code_presentation DESC, sp.code_module
+            """,
+            (self.model_version, *ids),
+        )
+        stored: Dict[int, Dict[str, Any]] = {}
+        for row in rows:
+            stored.setdefault(int(row["id_student"]), row)
+        return stored
+
+    def get_status(self) -> Dict[str, Any]:
+        """Status job untuk endpoint"""
+        run = self.get_completed_run()
+        return {
+            "running": self.is_running,
+            "model_version": self.model_version,
+            "completed_run": run,
+            "last_run": self.last_run,
+            "interval_seconds": settings.SCORING_JOB_INTERVAL_SECONDS,
+        }
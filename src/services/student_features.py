@@ -0,0 +1,87 @@
+"""
+Fitur model per enrollment (id_student, code_module, code_presentation)
+Satu definisi query untuk scoring job, export, at-risk, prediksi bulk dan prediksi by ID supaya hasilnya sama
+"""
+from typing import List
+from core.database import db
+from core.logging import logger
+
+# Urutan baris untuk memilih enrollment terbaru per mahasiswa (kode presentasi YYYYB/YYYYJ urut kronologis)
+LATEST_ENROLLMENT_ORDER = "si.id_student, si.code_presentation DESC, si.code_module"
+
+# Agregat clicks/score dibatasi ke enrollment baris studentinfo (bukan seluruh modul mahasiswa).
+# Subquery berkorelasi per baris: baris keluar bertahap lewat server-side cursor, tanpa menunggu GROUP BY
+# seluruh studentvle/studentassessment.
+_FEATURES_QUERY = """
+    SELECT
+        si.id_student,
+        si.code_module,
+        si.code_presentation,
+        si.gender,
+        si.age_band,
+        si.studied_credits,
+        si.num_of_prev_attempts,
+        COALESCE((
+            SELECT SUM(sv.sum_click)
+            FROM studentvle sv
+            WHERE sv.id_student = si.id_student
+                AND sv.code_module = si.code_module
+                AND sv.code_presentation = si.code_presentation
+        ), 0) as total_clicks,
+        COALESCE((
+            SELECT AVG(sa.score)
+            FROM studentassessment sa
+            JOIN assessments a ON a.id_assessment = sa.id_assessment
+            WHERE sa.id_student = si.id_student
+                AND a.code_module = si.code_module
+                AND a.code_presentation = si.code_presentation
+                AND sa.score IS NOT NULL
+        ), 0) as avg_assessment_score
+    FROM studentinfo si
+    WHERE si.id_student IS NOT NULL{conditions}{order_by}
+"""
+
+
+def features_query(conditions: str = "", order_by: str = "") -> str:
+    """
+    Query fitur mentah (kolom RAW_FEATURE_DTYPES + id_student, code_module, code_presentation)
+
+    Args:
+        conditions: Kondisi tambahan pada alias `si` (" AND ..."), misal dari KPIFilter
+        order_by: Urutan baris (misal LATEST_ENROLLMENT_ORDER), kosong = urutan scan (streaming)
+
+    Returns:
+        SQL terparameterisasi (params hanya dari conditions)
+    """
+    return _FEATURES_QUERY.format(conditions=conditions, order_by=f"\n    ORDER BY {order_by}" if order_by else "")
+
+
+# Index untuk subquery berkorelasi di atas (lookup per enrollment, bukan scan tabel fakta per baris)
+FEATURE_INDEXES = (
+    ("studentvle", "idx_studentvle_enrollment", "id_student, code_module, code_presentation"),
+    ("studentassessment", "idx_studentassessment_student", "id_student, id_assessment"),
+)
+INDEX_EXISTS = """
+    SELECT COUNT(*) AS found
+    FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+"""
+
+
+def ensure_feature_indexes() -> List[str]:
+    """
+    Buat index FEATURE_INDEXES yang belum ada (CREATE INDEX me-rebuild index tabel fakta, jalankan lewat
+    scripts/migrate_feature_indexes.py, bukan saat startup)
+
+    Returns:
+        Nama index yang baru dibuat
+    """
+    created = []
+    for table, name, columns in FEATURE_INDEXES:
+        row = db.execute_one(INDEX_EXISTS, (table, name))
+        if row and row["found"]:
+            continue
+        logger.info(f"Creating index {name} on {table} ({columns})")
+        db.execute_write(f"CREATE INDEX {name} ON {table} ({columns})")
+        created.append(name)
+    return created
@@ -0,0 +1,126 @@
+"""
+Benchmark serialisasi response per request (ASGI langsung, tanpa HTTP):
+- default   : FastAPI bawaan (response_model lewat Pydantic dump_json, dict lewat jsonable_encoder + json.dumps)
+- class     : default_response_class=FastJSONResponse saja (jsonable_encoder tetap jalan, lalu orjson)
+- returned  : route mengembalikan FastJSONResponse langsung (tanpa validasi ulang/jsonable_encoder), seperti route di repo
+
+Payload mengikuti route di router.py dan kpi_router.py:
+- /predict/dropout          PredictionResponse (response_model), prediction scalar NumPy
+- /metrics (miss path)      KPIListResponse (response_model), 6 KPI
+- /modules/assessment-summary  AssessmentSummaryResponse (response_model), 22 module/presentation
+- /metrics/{id}/timeseries  dict tanpa response_model, 270 bucket harian
+- /cache/info               dict tanpa response_model, berisi Decimal (route kecil, tetap lewat default_response_class)
+
+Bukan test pytest (nama file tidak match test_*.py). Jalankan:
+    python src/tests/bench_json_responses.py --iterations 5000
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+import argparse
+import asyncio
+import time
+from decimal import Decimal
+from typing import Any, Dict
+
+import numpy as np
+from fastapi import FastAPI
+
+from core.responses import FastJSONResponse
+from schemas.responses import AssessmentSummaryResponse, KPIListResponse, PredictionResponse
+from bench_kpi_metrics import KPIS
+
+SUMMARY = [
+    {"code_module": module, "code_presentation": presentation, "total_students": 380 + i,
+     "avg_score": 71.25 + i / 10, "min_score": 0.0, "max_score": 100.0}
+    for i, (module, presentation) in enumerate(
+        (m, p) for m in "ABCDEFG" for p in ("2013B", "2013J", "2014B", "2014J"))
+][:22]
+TIMESERIES = {
+    "success": True,
+    "data": {
+        "kpi_id": 1, "bucket": "day", "code_presentation": "2013J",
+        "points": [{"bucket": day, "closed": True, "start_day": day, "end_day": day, "value": 1532.0 + day,
+                    "active_students": 311 + day % 17} for day in range(-10, 260)],
+    },
+    "filters": {"code_module": ["AAA"], "code_presentation": "2013J", "date_from": None, "date_to": None},
+}
+CACHE_INFO = {"success": True, "data": {"backend": "redis", "keys": 42, "hit_rate": Decimal("0.9731"),
+                                        "cache_ttl_seconds": 300, "snapshot": None}}
+
+
+def build_app(mode: str) -> FastAPI:
+    app = FastAPI() if mode == "default" else FastAPI(default_response_class=FastJSONResponse)
+    wrap = FastJSONResponse if mode == "returned" else (lambda content: content)
+    # FastAPI bawaan gagal (500) untuk np.int64 di prediction: Any, jadi hanya mode returned yang pakai scalar NumPy
+    prediction = np.int64(1) if mode == "returned" else 1
+
+    @app.get("/predict", response_model=PredictionResponse)
+    async def predict():
+        return wrap(PredictionResponse(success=True, prediction=prediction, message="Dropout predicted successfully"))
+
+    @app.get("/metrics", response_model=KPIListResponse)
+    async def metrics():
+        return wrap(KPIListResponse(success=True, data=KPIS, total_kpis=len(KPIS), filters=None))
+
+    @app.get("/summary", response_model=AssessmentSummaryResponse)
+    async def summary():
+        return wrap(AssessmentSummaryResponse(success=True, data=SUMMARY))
+
+    @app.get("/timeseries")
+    async def timeseries():
+        return wrap(TIMESERIES)
+
+    @app.get("/cache-info")
+    async def cache_info():
+        return CACHE_INFO
+
+    return app
+
+
+async def call(app: FastAPI, path: str) -> bytes:
+    """Satu request ASGI langsung ke app (tanpa server/HTTP client)"""
+    body = []
+
+    async def receive() -> Dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Dict[str, Any]) -> None:
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+             "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "", "headers": [],
+             "server": ("bench", 80), "client": ("bench", 1234)}
+    await app(scope, receive, send)
+    return b"".join(body)
+
+
+async def measure(app: FastAPI, path: str, iterations: int) -> float:
+    """CPU time per request dalam mikrodetik"""
+    await call(app, path)
+    start = time.process_time()
+    for _ in range(iterations):
+        await call(app, path)
+    return (time.process_time() - start) / iterations * 1_000_000
+
+
+async def main(iterations: int):
+    apps = {mode: build_app(mode) for mode in ("default", "class", "returned")}
+    print(f"iterations: {iterations}, CPU us/request")
+    print(f"{'route':<12} {'bytes':>7} {'default':>10} {'class':>10} {'returned':>10} {'speedup':>8}")
+    for path in ("/predict", "/metrics", "/summary", "/timeseries", "/cache-info"):
+        size = len(await call(apps["returned"], path))
+        results = {mode: await measure(app, path, iterations) for mode, app in apps.items()}
+        print(f"{path:<12} {size:>7} {results['default']:>10.1f} {results['class']:>10.1f} {results['returned']:>10.1f} "
+              f"{results['default'] / results['returned']:>7.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5000)
+    asyncio.run(main(parser.parse_args().iterations))
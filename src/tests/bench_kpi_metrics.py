@@ -0,0 +1,89 @@
+"""
+Benchmark CPU per cache hit /api/kpi/metrics: jalur lama vs body pre-serialized
+
+Jalur lama: JSON dari Redis -> dict -> KPIListResponse (response_model) -> jsonable_encoder -> JSONResponse
+Jalur baru: body final dari Redis langsung jadi Response
+
+Bukan test pytest (nama file tidak match test_*.py). Jalankan:
+    python src/tests/bench_kpi_metrics.py --iterations 20000
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+import argparse
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+from schemas.responses.kpi_responses import KPIListResponse
+
+# Payload mirip hasil 6 KPI dashboard
+KPIS = [
+    {"kpi_id": 1, "name": "Forum Participation Score", "definition": "Skor aktivitas diskusi", "value": 1843211,
+     "active_students": 24127, "avg_clicks_per_activity": 3.41, "unit": "clicks", "category": "engagement"},
+    {"kpi_id": 2, "name": "Task Completion Ratio", "definition": "Persentase assessment yang diselesaikan (>50)",
+     "value": 81.27, "completed_tasks": 140012, "total_submissions": 172277, "participating_students": 23351,
+     "unit": "percent", "category": "academic"},
+    {"kpi_id": 3, "name": "Assignment Timeliness", "definition": "Persentase tugas tepat waktu", "value": 72.9,
+     "on_time_submissions": 118342, "total_submissions": 162300, "unit": "percent", "category": "academic"},
+    {"kpi_id": 4, "name": "Grade Performance Index", "definition": "Rata-rata nilai tugas & kuis", "value": 75.8,
+     "min_score": 0.0, "max_score": 100.0, "total_students": 23351, "total_assessments": 172277,
+     "unit": "score", "category": "academic"},
+    {"kpi_id": 5, "name": "Low Activity Alert Index", "definition": "Indeks risiko aktivitas rendah", "value": 38.12,
+     "low_activity_students": 10108, "total_students": 26074, "avg_clicks_threshold": 1163.4,
+     "unit": "percent", "category": "risk"},
+    {"kpi_id": 6, "name": "Predicted Dropout Risk", "definition": "Prediksi risiko dropout (ML)", "value": 31.05,
+     "predicted_dropouts": 8990, "sample_size": 28955, "model_version": "3f2a9c0d1b7e4a65", "source": "stored_predictions",
+     "unit": "percent", "category": "risk"},
+]
+META = json.dumps({"etag": '"3f2a9c0d1b7e4a65"', "expires_at": time.time() + 300})
+
+
+def old_hit(raw_kpis: str) -> bytes:
+    kpis = json.loads(raw_kpis)
+    json.loads(META)
+    model = KPIListResponse(success=True, data=kpis, total_kpis=len(kpis), filters=None)
+    # response_model: validasi ulang lalu encode
+    validated = KPIListResponse.model_validate(model.model_dump())
+    return JSONResponse(content=jsonable_encoder(validated)).body
+
+
+def new_hit(raw_body: str) -> bytes:
+    json.loads(META)
+    return Response(content=raw_body, media_type="application/json").body
+
+
+def measure(func, arg, iterations: int) -> float:
+    """CPU time per panggilan dalam mikrodetik"""
+    func(arg)
+    start = time.process_time()
+    for _ in range(iterations):
+        func(arg)
+    return (time.process_time() - start) / iterations * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    raw_kpis = json.dumps(KPIS)
+    raw_body = KPIListResponse(success=True, data=KPIS, total_kpis=len(KPIS), filters=None).model_dump_json()
+    assert json.loads(old_hit(raw_kpis)) == json.loads(new_hit(raw_body))
+
+    old_us = measure(old_hit, raw_kpis, args.iterations)
+    new_us = measure(new_hit, raw_body, args.iterations)
+    print(f"payload: {len(raw_body)} bytes, iterations: {args.iterations}")
+    print(f"decode + validate + encode : {old_us:8.1f} us/hit")
+    print(f"pre-serialized body        : {new_us:8.1f} us/hit")
+    print(f"speedup                    : {old_us / new_us:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Test admission control: slot concurrency, antrian terbatas (503), token bucket force-refresh (429)
+State per worker (tanpa Redis), logika yang sama dipakai saat Redis tidak tersedia
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+import asyncio
+
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from core.admission import AdmissionController, admit_kpi_refresh
+from core.circuit_breaker import CircuitBreaker
+
+
+def controller(**kwargs):
+    options = {"limits": {"kpi_refresh": (1, 1)}, "queue_timeout": 0.3, "poll_interval": 0.01}
+    options.update(kwargs)
+    return AdmissionController(**options)
+
+
+@pytest.mark.unit
+def test_queued_request_gets_slot_and_full_queue_is_shed():
+    async def scenario():
+        admission = controller()
+        release = asyncio.Event()
+        order = []
+
+        async def hold(name):
+            async with admission.slot("kpi_refresh"):
+                order.append(name)
+                await release.wait()
+
+        first = asyncio.create_task(hold("first"))
+        await asyncio.sleep(0.02)
+        second = asyncio.create_task(hold("second"))  # masuk antrian (1 tempat)
+        await asyncio.sleep(0.02)
+        with pytest.raises(HTTPException) as shed:
+            async with admission.slot("kpi_refresh"):
+                pass
+        release.set()
+        await asyncio.gather(first, second)
+        return order, shed.value, await admission.get_stats()
+
+    order, shed, stats = asyncio.run(scenario())
+    assert order == ["first", "second"]
+    assert shed.status_code == 503
+    assert int(shed.headers["Retry-After"]) >= 1
+    route = stats["routes"]["kpi_refresh"]
+    assert (route["admitted"], route["queued"], route["shed"], route["in_flight"]) == (2, 1, 1, 0)
+    assert stats["backend"] == "local"
+
+
+@pytest.mark.unit
+def test_queue_timeout_returns_503():
+    async def scenario():
+        admission = controller(queue_timeout=0.05)
+        async with admission.slot("kpi_refresh"):
+            with pytest.raises(HTTPException) as timed_out:
+                async with admission.slot("kpi_refresh"):
+                    pass
+        return timed_out.value, (await admission.get_stats())["routes"]["kpi_refresh"]
+
+    error, route = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert route["timed_out"] == 1
+    assert route["waiting"] == 0
+
+
+@pytest.mark.unit
+def test_force_refresh_rate_limited_per_client():
+    app = FastAPI()
+    app.state.admission = controller(refresh_rate_per_minute=1, refresh_burst=2)
+
+    @app.get("/metrics", dependencies=[Depends(admit_kpi_refresh)])
+    async def metrics(refresh: bool = False):
+        return {"refresh": refresh}
+
+    client = TestClient(app)
+    assert [client.get("/metrics?refresh=true").status_code for _ in range(2)] == [200, 200]
+    limited = client.get("/metrics?refresh=true")
+    assert limited.status_code == 429
+    assert 1 <= int(limited.headers["retry-after"]) <= 60
+    # Request tanpa refresh (cache) tidak dibatasi
+    assert client.get("/metrics").status_code == 200
+
+
+@pytest.mark.unit
+def test_stats_do_not_consume_half_open_probe():
+    now = [0.0]
+    breaker = CircuitBreaker("redis", failure_threshold=1, reset_timeout=5, clock=lambda: now[0])
+    admission = controller(redis_client=object(), breaker=breaker)
+    breaker.trip()
+    now[0] = 10
+
+    stats = asyncio.run(admission.get_stats())
+    assert stats["backend"] == "local"
+    assert stats["routes"]["kpi_refresh"]["cluster_in_flight"] is None
+    # Probe masih tersedia untuk request berikutnya
+    assert breaker.allow_request()
@@ -0,0 +1,168 @@
+"""
+Test untuk async cache (redis.asyncio) dan circuit breaker
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+import asyncio
+
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from core.async_cache import AsyncRedisCache
+from core.circuit_breaker import CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def setex(self, key, ttl, value):
+        self.commands.append((key, value))
+
+    async def execute(self):
+        self.client.round_trips += 1
+        self.client._check()
+        self.client.store.update(self.commands)
+
+
+class FakeAsyncRedis:
+    """Subset redis.asyncio client; down=True mensimulasikan Redis mati"""
+
+    def __init__(self):
+        self.store = {}
+        self.down = False
+        self.round_trips = 0
+
+    def _check(self):
+        if self.down:
+            raise RedisConnectionError("Connection refused")
+
+    async def get(self, key):
+        self.round_trips += 1
+        self._check()
+        return self.store.get(key)
+
+    async def mget(self, keys):
+        self.round_trips += 1
+        self._check()
+        return [self.store.get(key) for key in keys]
+
+    async def delete(self, *keys):
+        self.round_trips += 1
+        self._check()
+        return sum(self.store.pop(key, None) is not None for key in keys)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+@pytest.mark.unit
+def test_circuit_breaker_state_machine():
+    clock = FakeClock()
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=5, clock=clock)
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.STATE_CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.STATE_OPEN
+    assert not breaker.allow_request()
+
+    # Setelah reset timeout hanya satu probe yang lolos
+    clock.now = 5
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.STATE_HALF_OPEN
+    assert not breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.STATE_OPEN
+
+    clock.now = 10
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.describe()["state"] == CircuitBreaker.STATE_CLOSED
+    assert breaker.describe()["times_opened"] == 2
+
+
+@pytest.mark.unit
+def test_async_cache_fails_over_to_local_tier():
+    clock = FakeClock()
+    client = FakeAsyncRedis()
+    cache = AsyncRedisCache(redis_client=client, breaker=CircuitBreaker("redis", 2, 5, clock=clock))
+
+    async def scenario():
+        await cache.set_many({"kpi:a": [1], "kpi:b": {"value": 2}}, ttl=60)
+        assert client.round_trips == 1
+        assert await cache.mget(["kpi:a", "kpi:b", "kpi:c"]) == {"kpi:a": [1], "kpi:b": {"value": 2}}
+
+        # Redis mati: dua kegagalan membuka circuit, request berikutnya tidak menyentuh Redis
+        client.down = True
+        assert await cache.get("kpi:a") == [1]
+        assert await cache.get("kpi:b") == {"value": 2}
+        trips = client.round_trips
+        assert await cache.get("kpi:a") == [1]
+        assert client.round_trips == trips
+        assert cache.get_stats()["circuit"]["state"] == CircuitBreaker.STATE_OPEN
+
+        # Redis pulih: probe half-open menutup circuit lagi
+        client.down = False
+        clock.now = 5
+        assert await cache.delete("kpi:a") == 1
+        assert cache.breaker.state == CircuitBreaker.STATE_CLOSED
+        assert await cache.get("kpi:a") is None
+
+    asyncio.run(scenario())
+
+
+class FakePool:
+    def __init__(self):
+        self.disconnected = False
+
+    async def disconnect(self):
+        self.disconnected = True
+
+
+class LegacyAsyncRedis(FakeAsyncRedis):
+    """Client redis-py < 5.0.1: hanya close(), belum ada aclose()"""
+
+    def __init__(self):
+        super().__init__()
+        self.connection_pool = FakePool()
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class ModernAsyncRedis(LegacyAsyncRedis):
+    async def aclose(self):
+        self.closed = "aclose"
+
+    async def close(self):
+        raise AssertionError("close() is deprecated when aclose() exists")
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("client_class, expected", [(LegacyAsyncRedis, True), (ModernAsyncRedis, "aclose")])
+def test_close_supports_redis_without_aclose(client_class, expected):
+    client = client_class()
+    asyncio.run(AsyncRedisCache(redis_client=client).close())
+    assert client.closed == expected and client.connection_pool.disconnected
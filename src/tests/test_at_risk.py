@@ -0,0 +1,138 @@
+"""
+Test top-K at-risk list: seleksi parsial sama dengan sort penuh, merge per chunk, cache per filter di-slice per request
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder
+
+from api.kpi_router import router
+from core.admission import AdmissionController
+from core.database import db
+from services.at_risk import SOURCE_COMPUTED, SOURCE_STORED, AtRiskService, top_k
+from services.encoder_service import EncoderService
+from services.inference_executor import InferenceExecutor
+from services.model_service import model_service
+from services.predictor_service import PredictorService
+from services.scoring_export import ScoringExportService
+from services.scoring_job import StudentScoringJob
+from schemas.requests import KPIFilter
+
+NAMES = ["id_student", "code_module", "code_presentation", "gender", "age_band",
+         "studied_credits", "num_of_prev_attempts", "total_clicks", "avg_assessment_score"]
+
+
+def make_rows(n=40):
+    rng = np.random.default_rng(1)
+    return [
+        (100 + i, "AAA", "2013J", ["F", "M"][i % 2], ["0-35", "35-55", "90+"][i % 3] if i % 7 == 0 else "0-35",
+         float(rng.integers(30, 120)), 0.0, float(rng.uniform(0, 100)), float(rng.uniform(0, 100)))
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def at_risk(monkeypatch):
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 100, (300, 6))
+    monkeypatch.setattr(model_service, "dropout_model", RandomForestClassifier(n_estimators=15, random_state=0).fit(X, (X[:, 4] < 50).astype(int)))
+    monkeypatch.setattr(model_service, "final_grade_model", RandomForestClassifier(n_estimators=5, random_state=0).fit(
+        X, np.array(["Fail", "Pass"])[(X[:, 5] < 50).astype(int)]
+    ))
+    encoders = {"gender": LabelEncoder().fit(["F", "M"]), "age_band": LabelEncoder().fit(["0-35", "35-55", "55<="])}
+    monkeypatch.setattr(model_service, "label_encoder_finalgrade", encoders)
+
+    rows = make_rows()
+    calls = []
+
+    def iter_chunks(query, params=None, chunk_size=None, row_format=None, dtypes=None):
+        calls.append(params)
+        for start in range(0, len(rows), chunk_size):
+            yield db._rows_to_columns(rows[start:start + chunk_size], NAMES, dtypes)
+
+    monkeypatch.setattr(db, "iter_chunks", iter_chunks)
+    scoring_job = StudentScoringJob(EncoderService(), InferenceExecutor(PredictorService(backend="sklearn"), mode="inline"))
+    monkeypatch.setattr(scoring_job, "get_dropout_probabilities", lambda kpi_filter=None: None)
+    service = AtRiskService(scoring_job, ScoringExportService(scoring_job, chunk_size=7), cache_ttl_seconds=60, max_top=5)
+    service.clear_cache()
+    yield service, rows, calls
+    service.clear_cache()
+
+
+@pytest.mark.unit
+def test_top_k_matches_full_sort_with_ties():
+    rng = np.random.default_rng(3)
+    scores = rng.integers(0, 20, 500) / 20.0
+    ids = rng.permutation(500) + 1000
+    expected = np.lexsort((ids, -scores))[:25]
+    np.testing.assert_array_equal(top_k(scores, 25, ids), expected)
+    assert len(top_k(scores, 1000, ids)) == 500
+    assert len(top_k(scores[:0], 5)) == 0
+
+
+@pytest.mark.unit
+def test_computed_top_k_merges_chunks_and_slices_cache(at_risk):
+    service, rows, calls = at_risk
+    result = service.get_at_risk(KPIFilter(code_module=["AAA"], date_from=3), top=3)
+
+    # Sama dengan score seluruh cohort sekaligus lalu sort penuh
+    columns = db._rows_to_columns(rows, NAMES, None)
+    valid, _, probability, _ = service.scoring_job.score_columns(columns)
+    ids = columns["id_student"][valid]
+    expected = [int(ids[i]) for i in np.lexsort((ids, -probability))[:3]]
+    assert [s["id_student"] for s in result["students"]] == expected
+    assert [s["rank"] for s in result["students"]] == [1, 2, 3]
+    assert result["source"] == SOURCE_COMPUTED and result["total_students"] == int(valid.sum())
+    assert result["filters"]["date_from"] is None and len(calls) == 1
+
+    # Filter sama (date range diabaikan): dari cache, hanya di-slice
+    more = service.get_at_risk(KPIFilter(code_module=["aaa"]), top=5)
+    assert len(calls) == 1
+    assert [s["id_student"] for s in more["students"][:3]] == expected and more["top"] == 5
+
+
+@pytest.mark.unit
+def test_stored_probabilities_preferred(at_risk, monkeypatch):
+    service, _, calls = at_risk
+    stored = {
+        "id_student": np.array([1, 2, 3, 4], dtype=np.int64),
+        "code_module": np.array(["AAA", "AAA", "BBB", "BBB"], dtype=object),
+        "code_presentation": np.array(["2013J"] * 4, dtype=object),
+        "dropout_probability": np.array([0.2, 0.9, 0.9, 0.5]),
+    }
+    monkeypatch.setattr(service.scoring_job, "get_dropout_probabilities", lambda kpi_filter=None: stored)
+    result = service.get_at_risk(top=2)
+    assert result["source"] == SOURCE_STORED and calls == []
+    assert [(s["id_student"], s["dropout_probability"]) for s in result["students"]] == [(2, 0.9), (3, 0.9)]
+
+
+@pytest.mark.unit
+def test_cache_miss_needs_kpi_refresh_slot(at_risk):
+    service, _, calls = at_risk
+    app = FastAPI()
+    app.include_router(router)
+    app.state.at_risk = service
+    app.state.admission = AdmissionController(limits={"kpi_refresh": (1, 0)}, queue_timeout=0)
+    client = TestClient(app)
+
+    # Miss: di-score di dalam slot kpi_refresh
+    response = client.get("/api/kpi/at-risk?top=3&code_module=AAA")
+    assert response.status_code == 200 and response.json()["data"]["source"] == SOURCE_COMPUTED
+    assert app.state.admission._counters["kpi_refresh"]["admitted"] == 1 and len(calls) == 1
+
+    # Slot penuh: filter yang sudah di-cache tetap dilayani, filter baru ditolak 503 tanpa scoring
+    app.state.admission.limits["kpi_refresh"] = (0, 0)
+    hit = client.get("/api/kpi/at-risk?top=2&code_module=aaa")
+    assert hit.status_code == 200 and len(hit.json()["data"]["students"]) == 2
+    busy = client.get("/api/kpi/at-risk?code_module=BBB")
+    assert busy.status_code == 503 and "Retry-After" in busy.headers
+    assert len(calls) == 1 and app.state.admission._counters["kpi_refresh"]["shed"] == 1
@@ -0,0 +1,142 @@
+"""
+Test prediksi by-ids: query IN (...) per chunk, satu baris per mahasiswa, not_found/invalid, prediksi tersimpan,
+dan prediksi by ID yang memakai enrollment dan fitur yang sama
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+import sqlite3
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder
+
+from core.database import db
+from services.bulk_prediction import BulkPredictionService
+from services.encoder_service import EncoderService
+from services.inference_executor import InferenceExecutor
+from services.model_service import model_service
+from services.predictor_service import DROPOUT_MODEL, FINAL_GRADE_MODEL, PredictorService
+from services.student_features import LATEST_ENROLLMENT_ORDER, features_query
+
+# id_student -> baris studentinfo (presentation, gender, age_band); 3 terdaftar dua kali, 4 punya age_band tak dikenal
+STUDENTS = {
+    1: [("2014J", "F", "0-35")],
+    2: [("2013J", "M", "35-55")],
+    3: [("2013B", "F", "0-35"), ("2014B", "M", "55<=")],
+    4: [("2014J", "M", "90+")],
+}
+
+
+class FakeStoredPredictions:
+    def get_stored_predictions(self, ids):
+        return {2: {"dropout_prediction": 1, "final_result_prediction": "Withdrawn"}} if 2 in ids else {}
+
+
+@pytest.fixture
+def service(monkeypatch):
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 100, (200, 6))
+    monkeypatch.setattr(model_service, "dropout_model", RandomForestClassifier(n_estimators=5, random_state=0).fit(X, (X[:, 0] < 50).astype(int)))
+    monkeypatch.setattr(model_service, "final_grade_model", RandomForestClassifier(n_estimators=5, random_state=0).fit(
+        X, np.array(["Fail", "Pass"])[(X[:, 1] < 50).astype(int)]
+    ))
+    encoders = {"gender": LabelEncoder().fit(["F", "M"]), "age_band": LabelEncoder().fit(["0-35", "35-55", "55<="])}
+    monkeypatch.setattr(model_service, "label_encoder_finalgrade", encoders)
+
+    queries = []
+
+    def fetch_columns(query, params=None, dtypes=None, chunk_size=None):
+        assert query == features_query(f" AND si.id_student IN ({', '.join(['%s'] * len(params))})", LATEST_ENROLLMENT_ORDER)
+        ids = params
+        queries.append(ids)
+        rows = [
+            (id_student, "AAA", presentation, gender, age_band, 60.0, 0.0, 100.0 * id_student, 70.0)
+            for id_student in sorted(ids) if id_student in STUDENTS
+            for presentation, gender, age_band in sorted(STUDENTS[id_student], reverse=True)
+        ]
+        names = ["id_student", "code_module", "code_presentation", "gender", "age_band",
+                 "studied_credits", "num_of_prev_attempts", "total_clicks", "avg_assessment_score"]
+        return db._rows_to_columns(rows, names, dtypes)
+
+    monkeypatch.setattr(db, "fetch_columns", fetch_columns)
+    predictor = PredictorService(backend="sklearn")
+    bulk = BulkPredictionService(
+        EncoderService(), InferenceExecutor(predictor, mode="inline"), FakeStoredPredictions(), chunk_size=2
+    )
+    return bulk, predictor, queries
+
+
+@pytest.mark.unit
+def test_bulk_prediction_is_set_based_and_keyed_by_id(service):
+    bulk, predictor, queries = service
+    predictions, not_found, invalid, stored = bulk.predict(FINAL_GRADE_MODEL, [3, 1, 99, 2, 4, 3])
+
+    # Id tersimpan (2) tidak di-query; sisanya dua query IN (chunk_size=2), bukan satu per mahasiswa
+    assert queries == [(3, 1), (99, 4)]
+    assert list(predictions) == [3, 1, 2]
+    assert predictions[2] == "Withdrawn" and stored == 1
+    assert not_found == [99]
+    assert invalid == [4]
+    # Mahasiswa 3 dipredict dari presentation terbaru (2014B: M, 55<=)
+    encoders = model_service.label_encoder_finalgrade
+    expected = predictor.predict_matrix(FINAL_GRADE_MODEL, np.array([[
+        encoders["gender"].transform(["M"])[0], encoders["age_band"].transform(["55<="])[0], 60.0, 0.0, 300.0, 70.0
+    ]]))[0]
+    assert predictions[3] == expected
+
+
+@pytest.mark.unit
+def test_bulk_dropout_returns_ints(service):
+    bulk, _, _ = service
+    predictions, not_found, _, _ = bulk.predict(DROPOUT_MODEL, [1, 2])
+    assert not_found == []
+    assert all(type(value) is int for value in predictions.values())
+
+
+@pytest.mark.unit
+def test_single_id_features_match_bulk(service, monkeypatch):
+    """Prediksi by ID dan by-ids memakai query fitur dan enrollment terbaru yang sama"""
+    bulk, predictor, _ = service
+    conn = sqlite3.connect(":memory:")
+    conn.executescript("""
+        CREATE TABLE studentinfo (id_student INT, code_module TEXT, code_presentation TEXT, gender TEXT,
+                                  age_band TEXT, studied_credits INT, num_of_prev_attempts INT);
+        CREATE TABLE studentvle (id_student INT, code_module TEXT, code_presentation TEXT, sum_click INT);
+        CREATE TABLE assessments (id_assessment INT, code_module TEXT, code_presentation TEXT);
+        CREATE TABLE studentassessment (id_assessment INT, id_student INT, score REAL);
+
+        INSERT INTO studentinfo VALUES (7, 'AAA', '2013J', 'F', '0-35', 60, 0), (7, 'BBB', '2014B', 'M', '35-55', 30, 1);
+        INSERT INTO studentvle VALUES (7, 'AAA', '2013J', 500), (7, 'BBB', '2014B', 40), (7, 'BBB', '2014B', 2);
+        INSERT INTO assessments VALUES (1, 'AAA', '2013J'), (2, 'BBB', '2014B');
+        INSERT INTO studentassessment VALUES (1, 7, 10.0), (2, 7, 80.0);
+    """)
+
+    def execute(query, params):
+        cursor = conn.execute(query.replace("%s", "?"), params)
+        return [d[0] for d in cursor.description], cursor.fetchall()
+
+    def execute_one(query, params=None):
+        names, rows = execute(query, params)
+        return dict(zip(names, rows[0])) if rows else None
+
+    def fetch_columns(query, params=None, dtypes=None, chunk_size=None):
+        return db._rows_to_columns(*reversed(execute(query, params)), dtypes)
+
+    monkeypatch.setattr(db, "execute_one", execute_one)
+    monkeypatch.setattr(db, "fetch_columns", fetch_columns)
+
+    features = bulk.get_student_features(7)
+    assert features == {"gender": "M", "age_band": "35-55", "studied_credits": 30.0, "num_of_prev_attempts": 1.0,
+                        "total_clicks": 42.0, "avg_assessment_score": 80.0}
+    assert bulk.get_student_features(8) is None
+
+    encoded = bulk.encoder_service.encode_finalgrade(features)
+    single = predictor.predict_matrix(FINAL_GRADE_MODEL, np.array([[encoded[name] for name in encoded]], dtype=np.float64))[0]
+    predictions, _, _, _ = bulk.predict(FINAL_GRADE_MODEL, [7])
+    assert predictions[7] == single
@@ -0,0 +1,113 @@
+"""
+Test circuit breaker RedisCache (sync): fail fast saat Redis bermasalah dan reconnect setelah pulih
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+import time
+
+import pytest
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+from core.cache import RedisCache
+from core.circuit_breaker import CircuitBreaker
+
+
+class FlakyRedis:
+    """Client Redis palsu; down=True membuat setiap command timeout"""
+
+    def __init__(self):
+        self.store = {}
+        self.down = False
+        self.calls = 0
+
+    def _check(self):
+        self.calls += 1
+        if self.down:
+            raise RedisTimeoutError("Timeout reading from socket")
+
+    def ping(self):
+        self._check()
+        return True
+
+    def get(self, key):
+        self._check()
+        return self.store.get(key)
+
+    def setex(self, key, ttl, value):
+        self._check()
+        self.store[key] = value
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.unit
+def test_open_circuit_fails_fast_then_half_open_recovers():
+    clock = FakeClock()
+    redis = FlakyRedis()
+    cache = RedisCache(redis_client=redis, instance_id="test", breaker=CircuitBreaker("redis", 2, 5, clock=clock))
+    cache._start_probe = lambda: None  # probe background dites terpisah
+
+    redis.down = True
+    cache.set("kpi:a", 1)
+    cache.set("kpi:b", 2)
+    assert cache.get_stats()["circuit"]["state"] == CircuitBreaker.STATE_OPEN
+
+    # Circuit open: tidak ada panggilan ke Redis, langsung dari in-memory fallback
+    calls = redis.calls
+    assert cache.get("kpi:a") == 1
+    assert redis.calls == calls
+    assert cache.get_stats()["backend"] == "memory"
+
+    # Redis pulih: setelah reset timeout satu request jadi probe dan menutup circuit
+    redis.down = False
+    clock.now = 5
+    assert cache.set("kpi:a", 3)
+    assert cache.breaker.state == CircuitBreaker.STATE_CLOSED
+    assert cache.get("kpi:a") == 3
+
+
+@pytest.mark.unit
+def test_background_probe_reconnects_without_traffic():
+    redis = FlakyRedis()
+    cache = RedisCache(redis_client=redis, instance_id="test", breaker=CircuitBreaker("redis", 1, 0.01))
+
+    redis.down = True
+    cache.get("kpi:a")
+    assert cache.breaker.state == CircuitBreaker.STATE_OPEN
+
+    redis.down = False
+    deadline = time.monotonic() + 2
+    while cache.breaker.state != CircuitBreaker.STATE_CLOSED and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.breaker.state == CircuitBreaker.STATE_CLOSED
+
+
+@pytest.mark.unit
+def test_unreported_half_open_probe_expires():
+    clock = FakeClock()
+    breaker = CircuitBreaker("redis", 1, 5, clock=clock)
+    breaker.trip()
+    clock.now = 5
+    # Probe diberikan tapi pemanggil tidak pernah melapor (dibatalkan / exception lain)
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    clock.now = 9
+    assert not breaker.allow_request()
+
+    # Setelah reset_timeout sejak probe terakhir, probe baru boleh lewat dan bisa menutup circuit
+    clock.now = 10
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.STATE_CLOSED
@@ -0,0 +1,125 @@
+"""
+Test lifecycle cache: restart satu worker tidak menghapus cache shared worker lain
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+import fnmatch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.kpi_router import router as kpi_router
+from config import settings
+from core.cache import RedisCache
+
+
+class FakeRedis:
+    """Subset client Redis (decode_responses=True) yang dibagi beberapa worker"""
+
+    def __init__(self):
+        self.store = {}
+
+    def ping(self):
+        return True
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def setex(self, key, ttl, value):
+        self.store[key] = value
+        return True
+
+    def delete(self, *keys):
+        return sum(self.store.pop(key, None) is not None for key in keys)
+
+    def keys(self, pattern):
+        return [key for key in self.store if fnmatch.fnmatchcase(key, pattern)]
+
+    def scan_iter(self, match="*", count=None):
+        return iter(self.keys(match))
+
+    def info(self):
+        return {}
+
+
+@pytest.mark.unit
+def test_worker_restart_keeps_shared_keys():
+    redis = FakeRedis()
+    worker_a = RedisCache(redis_client=redis, instance_id="host:1")
+    worker_b = RedisCache(redis_client=redis, instance_id="host:2")
+
+    worker_a.set("kpi:all_metrics", [{"kpi_id": 1, "value": 10}])
+    worker_a.register_instance()
+    worker_b.register_instance()
+    assert worker_b.get_stats()["active_instances"] == 2
+
+    # Worker A shutdown (rolling restart): hanya key miliknya yang hilang
+    assert worker_a.clear_instance() == 1
+    assert worker_b.get("kpi:all_metrics") == [{"kpi_id": 1, "value": 10}]
+    assert worker_b.get(worker_b.instance_key("info"))["instance_id"] == "host:2"
+    assert worker_a.get(worker_a.instance_key("info")) is None
+
+    # Worker A start lagi: cache shared langsung hit
+    restarted_a = RedisCache(redis_client=redis, instance_id="host:3")
+    assert restarted_a.get("kpi:all_metrics") == [{"kpi_id": 1, "value": 10}]
+
+    # Flush admin menghapus semua key kpi:*
+    assert restarted_a.clear()
+    assert redis.keys("kpi:*") == []
+
+
+@pytest.mark.unit
+def test_flush_requires_configured_admin_token(monkeypatch):
+    app = FastAPI()
+    app.include_router(kpi_router)
+    client = TestClient(app)
+
+    # Token tidak di-set: endpoint tertutup, bukan terbuka untuk semua
+    monkeypatch.setattr(settings, "CACHE_ADMIN_TOKEN", "")
+    assert client.post("/api/kpi/cache/flush").status_code == 403
+    assert client.post("/api/kpi/cache/flush", headers={"X-Admin-Token": ""}).status_code == 403
+
+    monkeypatch.setattr(settings, "CACHE_ADMIN_TOKEN", "s3cret")
+    assert client.post("/api/kpi/cache/flush").status_code == 403
+    assert client.post("/api/kpi/cache/flush", headers={"X-Admin-Token": "wrong"}).status_code == 403
+
+
+@pytest.mark.unit
+def test_engine_recompute_requires_admin_token(monkeypatch):
+    calls = []
+
+    class Engine:
+        enabled = ready = True
+
+        def recompute(self):
+            calls.append("recompute")
+            return {"status": "recomputed"}
+
+    class Clearable:
+        def __init__(self, name):
+            self.name = name
+
+        def clear_cache(self):
+            calls.append(self.name)
+
+    app = FastAPI()
+    app.include_router(kpi_router)
+    app.state.kpi_engine = Engine()
+    app.state.kpi_service = Clearable("kpi")
+    app.state.kpi_timeseries = Clearable("timeseries")
+    client = TestClient(app)
+
+    monkeypatch.setattr(settings, "CACHE_ADMIN_TOKEN", "")
+    assert client.post("/api/kpi/engine/recompute", headers={"X-Admin-Token": "s3cret"}).status_code == 403
+    monkeypatch.setattr(settings, "CACHE_ADMIN_TOKEN", "s3cret")
+    assert client.post("/api/kpi/engine/recompute").status_code == 403
+    assert calls == []
+
+    response = client.post("/api/kpi/engine/recompute", headers={"X-Admin-Token": "s3cret"})
+    assert response.status_code == 200 and calls == ["recompute", "kpi", "timeseries"]
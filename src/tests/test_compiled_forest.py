@@ -0,0 +1,104 @@
+"""
+Test untuk compiled forest inference engine
+Hasil harus identik dengan sklearn RandomForestClassifier
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from services.compiled_forest import CompiledForest
+from services.model_service import model_service
+from services.predictor_service import PredictorService
+
+
+def _make_dataset(n_samples: int, seed: int = 0):
+    """Dataset sintetis dengan 6 fitur seperti input model"""
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([
+        rng.integers(0, 2, n_samples),           # gender
+        rng.integers(0, 3, n_samples),           # age_band
+        rng.integers(30, 360, n_samples),        # studied_credits
+        rng.integers(0, 4, n_samples),           # num_of_prev_attempts
+        rng.integers(0, 20000, n_samples),       # total_clicks
+        rng.uniform(0, 100, n_samples).round(2), # avg_assessment_score
+    ]).astype(np.float64)
+    return X, rng
+
+
+@pytest.fixture(scope="module")
+def final_grade_model():
+    X, rng = _make_dataset(600, seed=1)
+    y = np.array(["Distinction", "Fail", "Pass", "Withdrawn"])[rng.integers(0, 4, len(X))]
+    return RandomForestClassifier(n_estimators=25, random_state=0).fit(X, y)
+
+
+@pytest.fixture(scope="module")
+def dropout_model():
+    X, rng = _make_dataset(600, seed=2)
+    y = (X[:, 4] < 3000).astype(int) ^ (rng.random(len(X)) < 0.1)
+    return RandomForestClassifier(n_estimators=25, max_depth=8, random_state=0).fit(X, y)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("n_samples", [1, 7, 500])
+def test_compiled_forest_matches_sklearn(final_grade_model, dropout_model, n_samples):
+    """predict dan predict_proba harus sama persis dengan sklearn"""
+    X, _ = _make_dataset(n_samples, seed=42)
+    for model in (final_grade_model, dropout_model):
+        compiled = CompiledForest(model)
+        np.testing.assert_array_equal(compiled.predict_proba(X), model.predict_proba(X))
+        np.testing.assert_array_equal(compiled.predict(X), model.predict(X))
+
+
+@pytest.mark.unit
+def test_compiled_forest_matches_sklearn_on_thresholds(dropout_model):
+    """Nilai tepat di threshold harus belok ke arah yang sama dengan sklearn"""
+    compiled = CompiledForest(dropout_model)
+    thresholds = compiled.threshold[compiled.children_left != np.arange(len(compiled.threshold))]
+    X = np.tile(thresholds[:300, np.newaxis], (1, compiled.n_features_in_))
+    np.testing.assert_array_equal(compiled.predict_proba(X), dropout_model.predict_proba(X))
+
+
+@pytest.mark.unit
+def test_compiled_forest_rejects_invalid_input(dropout_model):
+    """Jumlah fitur yang salah harus error seperti sklearn"""
+    compiled = CompiledForest(dropout_model)
+    with pytest.raises(ValueError):
+        compiled.predict(np.zeros((2, 5)))
+    with pytest.raises(TypeError):
+        CompiledForest(object())
+
+
+@pytest.mark.unit
+def test_predictor_service_numpy_backend(monkeypatch, final_grade_model, dropout_model):
+    """PredictorService dengan backend numpy harus sama dengan backend sklearn"""
+    monkeypatch.setattr(model_service, "final_grade_model", final_grade_model)
+    monkeypatch.setattr(model_service, "dropout_model", dropout_model)
+
+    sklearn_predictor = PredictorService(backend="sklearn")
+    numpy_predictor = PredictorService(backend="numpy")
+    assert sklearn_predictor.backend == "sklearn"
+    assert numpy_predictor.backend == "numpy"
+
+    X, _ = _make_dataset(50, seed=7)
+    features = [
+        {
+            "gender": int(row[0]),
+            "age_band": int(row[1]),
+            "studied_credits": int(row[2]),
+            "num_of_prev_attempts": int(row[3]),
+            "total_clicks": int(row[4]),
+            "avg_assessment_score": float(row[5]),
+        }
+        for row in X
+    ]
+    assert numpy_predictor.predict_final_grade_batch(features) == sklearn_predictor.predict_final_grade_batch(features)
+    assert numpy_predictor.predict_dropout_batch(features) == sklearn_predictor.predict_dropout_batch(features)
+    assert numpy_predictor.predict_dropout(features[0]) == sklearn_predictor.predict_dropout(features[0])
@@ -0,0 +1,107 @@
+"""
+Test kompresi response: negosiasi Accept-Encoding, minimum size, streaming, varian KPI pre-compressed
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+import gzip
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+import core.compression as compression
+from api.kpi_router import router
+from core.compression import CompressionMiddleware, negotiate_encoding
+from services.kpi_service import KPIService
+from test_http_cache import SyncBackedAsyncCache
+
+ROWS = [{"id_student": i, "prediction": "Pass", "confidence": 0.87} for i in range(200)]
+
+
+@pytest.fixture
+def app():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+
+    @app.get("/large")
+    async def large():
+        return {"data": ROWS}
+
+    @app.get("/small")
+    async def small():
+        return {"ok": True}
+
+    @app.get("/export")
+    async def export():
+        return StreamingResponse((json.dumps(row) + "\n" for row in ROWS), media_type="application/x-ndjson")
+
+    return app
+
+
+@pytest.mark.unit
+def test_negotiate_encoding():
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+    assert negotiate_encoding("gzip;q=0, deflate") is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("*") == compression.supported_encodings()[0]
+    assert negotiate_encoding(None) is None
+
+
+@pytest.mark.unit
+def test_middleware_compresses_above_minimum_size(app):
+    client = TestClient(app)
+    large = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert large.headers["content-encoding"] == "gzip"
+    assert large.headers["vary"] == "Accept-Encoding"
+    assert int(large.headers["content-length"]) < len(json.dumps({"data": ROWS}))
+    assert large.json() == {"data": ROWS}
+
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/large", headers={"Accept-Encoding": "identity"}).headers
+
+
+@pytest.mark.unit
+def test_middleware_compresses_streaming_responses(app):
+    with TestClient(app).stream("GET", "/export", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        raw = b"".join(response.iter_raw())
+    lines = gzip.decompress(raw).decode().splitlines()
+    assert [json.loads(line) for line in lines] == ROWS
+
+
+@pytest.mark.unit
+def test_kpi_cache_hit_serves_precompressed_body(monkeypatch):
+    service = KPIService(cache_ttl_seconds=120)
+    kpis = [{"kpi_id": i, "name": f"KPI {i}", "definition": "x" * 300, "value": i} for i in range(1, 7)]
+    monkeypatch.setattr(service, "_calculate_activity_kpis", lambda kpi_filter=None: kpis[:5])
+    monkeypatch.setattr(service, "_calculate_predicted_dropout_risk", lambda kpi_filter=None: kpis[5])
+    service.clear_cache()
+
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+    app.include_router(router)
+    app.state.kpi_service = service
+    app.state.async_cache = SyncBackedAsyncCache()
+    client = TestClient(app)
+    try:
+        first = client.get("/api/kpi/metrics", headers={"Accept-Encoding": "gzip"})
+
+        def fail(*args, **kwargs):
+            raise AssertionError("cached KPI body should not be compressed per request")
+
+        monkeypatch.setattr(compression, "compress", fail)
+        hit = client.get("/api/kpi/metrics", headers={"Accept-Encoding": "gzip"})
+    finally:
+        service.clear_cache()
+    assert hit.status_code == 200
+    assert hit.headers["content-encoding"] == "gzip"
+    assert hit.headers["etag"] == first.headers["etag"]
+    assert hit.json() == first.json()
@@ -0,0 +1,125 @@
+"""
+Test untuk streaming query (server-side cursor) di DatabaseConnection
+"""
+import sys
+from pathlib import Path
+from contextlib import contextmanager
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from core.database import DatabaseConnection
+
+
+class FakeCursor:
+    """Cursor unbuffered palsu: fetchmany membaca dari list baris"""
+
+    def __init__(self, rows, as_dict):
+        self.rows = rows
+        self.as_dict = as_dict
+        self.description = None
+        self.position = 0
+        self.closed = False
+        self.queries = []
+
+    def execute(self, query, params=()):
+        self.queries.append(query)
+        self.description = [("id_student",), ("score",)]
+
+    def fetchmany(self, size):
+        batch = self.rows[self.position:self.position + size]
+        self.position += len(batch)
+        if self.as_dict:
+            return [dict(zip(("id_student", "score"), row)) for row in batch]
+        return list(batch)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def streaming_db(monkeypatch):
+    rows = [(i, float(i) * 1.5) for i in range(10)]
+    database = DatabaseConnection()
+    cursors = []
+
+    class FakeConnection:
+        def cursor(self, cursor_class=None):
+            cursor = FakeCursor(rows, as_dict="Dict" in cursor_class.__name__)
+            cursors.append(cursor)
+            return cursor
+
+    @contextmanager
+    def get_connection():
+        yield FakeConnection()
+
+    monkeypatch.setattr(database, "get_connection", get_connection)
+    database.rows = rows
+    return database, cursors
+
+
+@pytest.mark.unit
+def test_iter_chunks_yields_fixed_size_chunks(streaming_db):
+    database, _ = streaming_db
+    chunks = list(database.iter_chunks("SELECT", chunk_size=4, row_format="tuple"))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert chunks[0][1] == (1, 1.5)
+
+
+@pytest.mark.unit
+def test_iter_chunks_small_first_chunk(streaming_db):
+    """Chunk pertama lebih kecil supaya consumer streaming dapat baris lebih awal, sisanya chunk_size"""
+    database, cursors = streaming_db
+    stream = database.iter_chunks("SELECT", chunk_size=4, row_format="tuple", first_chunk_size=1)
+    assert next(stream) == [(0, 0.0)]
+    assert cursors[0].position == 1
+    assert [len(chunk) for chunk in stream] == [4, 4, 1]
+
+
+@pytest.mark.unit
+def test_iter_chunks_columns_format(streaming_db):
+    database, _ = streaming_db
+    chunks = list(database.iter_chunks("SELECT", chunk_size=6, row_format="columns"))
+    assert list(chunks[0]["id_student"]) == [0, 1, 2, 3, 4, 5]
+    assert list(chunks[1]["score"]) == [9.0, 10.5, 12.0, 13.5]
+
+
+@pytest.mark.unit
+def test_iter_query_dict_rows_and_early_close(streaming_db):
+    database, cursors = streaming_db
+    rows = database.iter_query("SELECT", chunk_size=3)
+    assert next(rows) == {"id_student": 0, "score": 0.0}
+    rows.close()
+    # Berhenti di tengah: sisa result tidak di-drain lewat cursor.close()
+    assert cursors[0].closed is False
+    assert list(database.iter_query("SELECT", chunk_size=3))[-1]["id_student"] == 9
+    assert cursors[1].closed is True
+
+
+@pytest.mark.unit
+def test_fetch_columns_applies_dtypes(streaming_db):
+    """Decimal dan NULL dikonversi per kolom, NULL jadi NaN untuk float"""
+    database, _ = streaming_db
+    database.rows[:] = [(1, Decimal("2.5")), (2, None), (3, Decimal("4"))]
+    columns = database.fetch_columns("SELECT", dtypes={"id_student": np.int64, "score": np.float64}, chunk_size=2)
+    assert columns["id_student"].dtype == np.int64
+    np.testing.assert_array_equal(columns["score"], [2.5, np.nan, 4.0])
+
+    frame = database.fetch_frame("SELECT", dtypes={"score": np.float64})
+    assert list(frame.columns) == ["id_student", "score"]
+    assert frame["score"].dtype == np.float64
+
+
+@pytest.mark.unit
+def test_fetch_columns_empty_result(streaming_db):
+    database, _ = streaming_db
+    database.rows.clear()
+    columns = database.fetch_columns("SELECT", dtypes={"score": np.float64})
+    assert len(columns["id_student"]) == 0
+    assert columns["score"].dtype == np.float64
@@ -0,0 +1,100 @@
+"""
+Test deadline per request: hint MAX_EXECUTION_TIME, propagasi ke thread pool, item batch yang kadaluarsa, 504
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+import asyncio
+import time
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from core import deadline
+from core.database import DatabaseConnection
+from core.deadline import DeadlineExceeded, deadline_exceeded_handler, deadline_scope, request_deadline
+from services.prediction_batcher import MicroBatcher
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, query, params=()):
+        self.statements.append((query, params))
+
+
+@pytest.mark.unit
+def test_select_gets_max_execution_time_hint_only_under_deadline():
+    cursor = RecordingCursor()
+    DatabaseConnection._execute(cursor, "SELECT 1", None)
+    with deadline_scope(2):
+        DatabaseConnection._execute(cursor, "\n  select id_student FROM studentInfo WHERE id_student = %s", (7,))
+        DatabaseConnection._execute(cursor, "WITH sampled AS (SELECT 1) SELECT * FROM sampled", None)
+
+    assert cursor.statements[0] == ("SELECT 1", ())
+    query, params = cursor.statements[1]
+    assert query.startswith("\n  select /*+ MAX_EXECUTION_TIME(")
+    assert 1900 <= int(query.split("(")[1].split(")")[0]) <= 2000
+    assert params == (7,)
+    # CTE: hint tidak berlaku, batas dipasang lewat session variable
+    assert cursor.statements[2][0] == "SET SESSION max_execution_time = %s"
+    assert cursor.statements[3][0].startswith("WITH sampled")
+
+
+@pytest.mark.unit
+def test_scope_propagates_to_threads_and_keeps_tighter_deadline():
+    async def scenario():
+        with deadline_scope(5):
+            with deadline_scope(60):
+                inner = await asyncio.to_thread(deadline.remaining)
+            return inner, deadline.remaining()
+
+    inner, outer = asyncio.run(scenario())
+    assert 4 < inner <= 5
+    assert 4 < outer <= 5
+    assert deadline.remaining() is None
+
+
+@pytest.mark.unit
+def test_expired_batch_item_is_not_predicted():
+    predicted = []
+
+    def predict_batch(items):
+        predicted.extend(items)
+        return [item * 10 for item in items]
+
+    async def scenario():
+        batcher = MicroBatcher("test", predict_batch, max_batch_size=8, max_wait_ms=100)
+        with deadline_scope(0.01):
+            expired = asyncio.create_task(batcher.submit(1))
+        kept = asyncio.create_task(batcher.submit(2))
+        results = await asyncio.gather(expired, kept, return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    expired, kept = asyncio.run(scenario())
+    assert isinstance(expired, DeadlineExceeded)
+    assert kept == 20
+    assert predicted == [2]
+
+
+@pytest.mark.unit
+def test_exceeded_deadline_returns_504():
+    app = FastAPI()
+    app.add_exception_handler(DeadlineExceeded, deadline_exceeded_handler)
+
+    @app.get("/slow", dependencies=[Depends(request_deadline(0.05))])
+    def slow():
+        time.sleep(0.1)
+        deadline.check("database")
+        return {"ok": True}
+
+    response = TestClient(app).get("/slow")
+    assert response.status_code == 504
+    assert "deadline" in response.json()["detail"]
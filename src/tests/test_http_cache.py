@@ -0,0 +1,156 @@
+"""
+Test HTTP conditional caching KPI (ETag, If-None-Match, Cache-Control)
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.kpi_router import router
+from core.admission import AdmissionController
+from core.cache import RedisCache, cache
+from core.compression import supported_encodings
+from core.http_cache import compute_etag, etag_matches
+from services import kpi_service as kpi_service_module
+from services.kpi_service import KPIService
+
+
+class SyncBackedAsyncCache:
+    """Async cache yang membaca cache sync (in-memory di test) seperti Redis: value sebagai teks JSON"""
+
+    async def mget_raw(self, keys):
+        raw = {key: cache.get_raw(key) for key in keys}
+        return {key: value if isinstance(value, str) else json.dumps(value) for key, value in raw.items() if value is not None}
+
+    def remember(self, key, value, ttl=None):
+        pass
+
+
+class TransactionalRedis:
+    """Subset client Redis: perintah pipeline(transaction=True) diterapkan sekaligus saat execute (MULTI/EXEC)"""
+
+    def __init__(self):
+        self.store = {}
+        self.transactions = []
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def pipeline(self, transaction=True):
+        redis = self
+        commands = []
+
+        class Pipeline:
+            def setex(self, key, ttl, value):
+                commands.append(("set", key, value))
+
+            def delete(self, *keys):
+                commands.extend(("del", key, None) for key in keys)
+
+            def execute(self):
+                assert transaction
+                redis.transactions.append(list(commands))
+                for op, key, value in commands:
+                    if op == "set":
+                        redis.store[key] = value
+                    else:
+                        redis.store.pop(key, None)
+
+        return Pipeline()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    service = KPIService(cache_ttl_seconds=120)
+    values = {"value": 10}
+    monkeypatch.setattr(service, "_calculate_activity_kpis", lambda kpi_filter=None: [{"kpi_id": 1, "value": values["value"]}])
+    monkeypatch.setattr(service, "_calculate_predicted_dropout_risk", lambda kpi_filter=None: {"kpi_id": 6, "value": 0})
+    service.clear_cache()
+
+    app = FastAPI()
+    app.include_router(router)
+    app.state.kpi_service = service
+    app.state.async_cache = SyncBackedAsyncCache()
+    app.state.admission = AdmissionController()
+    yield TestClient(app), values, service
+    service.clear_cache()
+
+
+@pytest.mark.unit
+def test_etag_helpers():
+    assert compute_etag({"a": 1, "b": 2}) == compute_etag({"b": 2, "a": 1})
+    etag = compute_etag([1])
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+
+
+@pytest.mark.unit
+def test_metrics_not_modified_until_content_changes(client):
+    client, values, _ = client
+    first = client.get("/api/kpi/metrics")
+    etag = first.headers["etag"]
+    assert first.status_code == 200
+    assert 0 < int(first.headers["cache-control"].split("max-age=")[1]) <= 120
+
+    cached = client.get("/api/kpi/metrics", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+
+    # Refresh dengan isi baru menghasilkan ETag baru
+    values["value"] = 11
+    refreshed = client.get("/api/kpi/metrics?refresh=true", headers={"If-None-Match": etag})
+    assert refreshed.status_code == 200
+    assert refreshed.headers["etag"] != etag
+    assert refreshed.json()["data"][0]["value"] == 11
+
+
+@pytest.mark.unit
+def test_cache_hit_serves_prerendered_body(client, monkeypatch):
+    client, _, service = client
+    first = client.get("/api/kpi/metrics?code_module=aaa")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("cache hit should not go through KPIService")
+
+    monkeypatch.setattr(service, "get_kpis_with_meta", fail)
+    hit = client.get("/api/kpi/metrics?code_module=AAA")
+    assert hit.status_code == 200
+    assert hit.headers["content-type"] == "application/json"
+    assert hit.headers["etag"] == first.headers["etag"]
+    assert hit.json() == first.json()
+    assert hit.json()["filters"]["code_module"] == ["AAA"]
+
+
+@pytest.mark.unit
+def test_cache_write_is_one_transaction(monkeypatch):
+    redis = TransactionalRedis()
+    monkeypatch.setattr(kpi_service_module, "cache", RedisCache(redis_client=redis, instance_id="test"))
+    service = KPIService(cache_ttl_seconds=60)
+    key = service.CACHE_KEY_ALL_KPIS
+    variants = [service.body_key(key, encoding) for encoding in supported_encodings()]
+
+    # Body besar: hasil, meta, body dan semua varian dalam satu MULTI/EXEC
+    large = [{"kpi_id": i, "name": "x" * 200, "value": i} for i in range(20)]
+    meta = service._cache_kpis(key, large)
+    assert len(redis.transactions) == 1
+    assert {k for _, k, _ in redis.transactions[0]} == {key, service.meta_key(key), service.body_key(key), *variants}
+    assert json.loads(redis.store[service.meta_key(key)])["etag"] == meta["etag"]
+
+    # Body kecil tanpa varian: varian lama dihapus di transaksi yang sama, tidak tersaji dengan ETag baru
+    small = [{"kpi_id": 1, "value": 1}]
+    meta = service._cache_kpis(key, small)
+    assert len(redis.transactions) == 2
+    assert {(op, k) for op, k, _ in redis.transactions[1] if op == "del"} == {("del", k) for k in variants}
+    assert all(k not in redis.store for k in variants)
+    assert json.loads(redis.store[service.meta_key(key)])["etag"] == meta["etag"]
+    assert json.loads(redis.store[service.body_key(key)])["data"] == small
@@ -0,0 +1,164 @@
+"""
+Test untuk inference executor (inline dan process pool)
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+import asyncio
+import pickle
+import threading
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder
+
+from core.deadline import DeadlineExceeded, deadline_scope
+from services.model_service import model_service
+from services.predictor_service import PredictorService, DROPOUT_MODEL, FINAL_GRADE_MODEL
+from services.inference_executor import InferenceExecutor
+
+
+@pytest.fixture(scope="module")
+def models():
+    """Model sintetis dengan 6 fitur"""
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 100, (400, 6))
+    final_grade = RandomForestClassifier(n_estimators=10, random_state=0).fit(
+        X, np.array(["Fail", "Pass", "Withdrawn"])[rng.integers(0, 3, len(X))]
+    )
+    dropout = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, (X[:, 1] < 40).astype(int))
+    return {"final_grade_model": final_grade, "dropout_model": dropout}
+
+
+@pytest.fixture
+def model_dir(tmp_path, monkeypatch, models):
+    """Tulis pickle ke folder sementara dan arahkan ML_DIR ke sana (dibaca worker process)"""
+    encoders = {
+        "gender": LabelEncoder().fit(["F", "M"]),
+        "age_band": LabelEncoder().fit(["0-35", "35-55", "55<="]),
+    }
+    files = {
+        "dropout_model.pkl": models["dropout_model"],
+        "final_grade_model.pkl": models["final_grade_model"],
+        "label_encoder_dropout.pkl": encoders,
+        "label_encoder_finalgrade.pkl": encoders,
+    }
+    for name, obj in files.items():
+        with open(tmp_path / name, "wb") as f:
+            pickle.dump(obj, f)
+    monkeypatch.setenv("ML_DIR", str(tmp_path))
+    for name in ("DROPOUT_MODEL_PATH", "FINAL_GRADE_MODEL_PATH", "LABEL_ENCODER_DROPOUT_PATH", "LABEL_ENCODER_FINALGRADE_PATH"):
+        monkeypatch.delenv(name, raising=False)
+    return tmp_path
+
+
+@pytest.fixture
+def predictor(monkeypatch, models):
+    monkeypatch.setattr(model_service, "final_grade_model", models["final_grade_model"])
+    monkeypatch.setattr(model_service, "dropout_model", models["dropout_model"])
+    return PredictorService(backend="sklearn")
+
+
+@pytest.mark.unit
+def test_inline_executor_matches_predictor(predictor):
+    """Mode inline langsung memanggil PredictorService"""
+    executor = InferenceExecutor(predictor, mode="inline")
+    X = np.random.default_rng(1).uniform(0, 100, (20, 6))
+    np.testing.assert_array_equal(executor.run(DROPOUT_MODEL, X), predictor.predict_matrix(DROPOUT_MODEL, X))
+    assert executor.concurrency == 1
+    assert executor.get_stats()["rows"] == 20
+
+
+@pytest.mark.slow
+def test_process_executor_matches_inline(model_dir, predictor):
+    """Worker process load model sendiri dan hasilnya sama dengan inline, termasuk via shared memory"""
+    executor = InferenceExecutor(predictor, mode="process", max_workers=2, shm_min_rows=100)
+    rng = np.random.default_rng(2)
+    small = rng.uniform(0, 100, (10, 6))
+    large = rng.uniform(0, 100, (500, 6))
+    try:
+        executor.start()
+        for model_name in (DROPOUT_MODEL, FINAL_GRADE_MODEL):
+            np.testing.assert_array_equal(executor.run(model_name, small), predictor.predict_matrix(model_name, small))
+            np.testing.assert_array_equal(executor.run(model_name, large), predictor.predict_matrix(model_name, large))
+
+        async def concurrent():
+            return await asyncio.gather(*(executor.run_async(DROPOUT_MODEL, large) for _ in range(4)))
+
+        for result in asyncio.run(concurrent()):
+            np.testing.assert_array_equal(result, predictor.predict_matrix(DROPOUT_MODEL, large))
+
+        stats = executor.get_stats()
+        assert stats["running"] is True
+        assert stats["shared_memory_batches"] == 6
+    finally:
+        executor.shutdown()
+
+
+class ManualPool:
+    """Pool palsu: future tidak selesai sampai test memanggil set_result (worker masih memegang segment)"""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_running_or_notify_cancel()  # sudah diambil worker, cancel() tidak berhasil
+        self.futures.append((future, args))
+        return future
+
+
+def segment_exists(name):
+    try:
+        shared_memory.SharedMemory(name=name).close()
+        return True
+    except FileNotFoundError:
+        return False
+
+
+@pytest.mark.unit
+def test_process_executor_requires_started_pool(predictor):
+    executor = InferenceExecutor(predictor, mode="process", max_workers=1)
+    with pytest.raises(RuntimeError, match="not started"):
+        asyncio.run(executor.run_async(DROPOUT_MODEL, np.zeros((2, 6))))
+    assert executor.get_stats()["running"] is False
+
+
+@pytest.mark.unit
+def test_shared_memory_outlives_deadline_until_worker_finishes(predictor):
+    """Deadline habis saat worker sudah jalan: segment baru di-unlink setelah future pool selesai"""
+    executor = InferenceExecutor(predictor, mode="process", max_workers=1, shm_min_rows=1)
+    executor._pool = pool = ManualPool()
+
+    async def scenario():
+        with deadline_scope(0.05):
+            return await executor.run_async(DROPOUT_MODEL, np.ones((4, 6)))
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(scenario())
+    future, (model_name, (shm_name, shape, dtype), proba) = pool.futures[0]
+    assert segment_exists(shm_name)
+
+    future.set_result(np.zeros(4))
+    assert not segment_exists(shm_name)
+
+
+@pytest.mark.unit
+def test_inline_run_async_does_not_block_event_loop(predictor, monkeypatch):
+    executor = InferenceExecutor(predictor, mode="inline")
+    threads = []
+    predict = predictor.predict_matrix
+    monkeypatch.setattr(predictor, "predict_matrix", lambda *args: threads.append(threading.get_ident()) or predict(*args))
+
+    async def scenario():
+        return threading.get_ident(), await executor.run_async(DROPOUT_MODEL, np.ones((3, 6)))
+
+    loop_thread, result = asyncio.run(scenario())
+    assert len(result) == 3 and threads and threads[0] != loop_thread
@@ -0,0 +1,352 @@
+"""
+Test untuk incremental engine: penyusunan KPI 1-5 dari rollup dan refresh per high-water mark
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+import re
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+
+from core.database import db
+from services.kpi_engine import KPIAggregationEngine
+from services.kpi_service import KPIService
+
+NO_DAY = KPIAggregationEngine.NO_DAY
+FORUM_SITES = {10}
+# id_assessment -> (code_module, code_presentation, deadline)
+ASSESSMENTS = {1: ("AAA", "2013J", 20), 2: ("BBB", "2014B", 30)}
+
+
+class FakeEngineDB:
+    """
+    Tabel fakta + rollup in-memory untuk cursor di db.transaction()
+
+    Baris fakta punya flag committed: baris yang belum commit tidak terlihat oleh query engine (MAX, gap, delta).
+    Query delta dikenali dari tabel target/sumber dan diagregasi di Python sesuai GROUP BY query.
+    """
+
+    def __init__(self):
+        self.facts = {"studentvle": {}, "studentassessment": {}}
+        self.activity = {}
+        self.student = {}
+        self.watermarks = {}
+        self.gaps = {}
+        self._result = []
+
+    def insert(self, table, row_id, committed=True, **row):
+        self.facts[table][row_id] = dict(row, row_id=row_id, committed=committed)
+
+    def visible(self, table):
+        return {row_id: row for row_id, row in self.facts[table].items() if row["committed"]}
+
+    # Cursor API
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def fetchall(self):
+        return list(self._result)
+
+    def executemany(self, query, rows):
+        for params in rows:
+            self.execute(query, params)
+
+    def execute(self, query, params=()):
+        engine = KPIAggregationEngine
+        self._result = []
+        table = next((name for name in self.facts if f"FROM {name}" in query or f"JOIN {name}" in query), None)
+        if "GET_LOCK" in query:
+            self._result = [{"acquired": 1}]
+        elif "RELEASE_LOCK" in query:
+            pass
+        elif query.startswith("DELETE FROM kpi_") and "WHERE" not in query:
+            name = query.split()[2]
+            {"kpi_rollup_activity": self.activity, "kpi_rollup_student": self.student,
+             "kpi_watermarks": self.watermarks, "kpi_watermark_gaps": self.gaps}[name].clear()
+        elif query == engine.SELECT_WATERMARKS:
+            self._result = [{"source": source, "last_row_id": value} for source, value in self.watermarks.items()]
+        elif query == engine.UPSERT_WATERMARK:
+            self.watermarks[params[0]] = params[1]
+        elif query == engine.EXPIRE_GAPS:
+            source, cutoff = params
+            self.gaps[source] = [gap for gap in self.gaps.get(source, []) if gap[2] >= cutoff]
+        elif query == engine.SELECT_GAPS:
+            self._result = [{"gap_start": a, "gap_end": b, "first_seen": seen} for a, b, seen in sorted(self.gaps.get(params[0], []))]
+        elif query == engine.DELETE_GAPS:
+            self.gaps[params[0]] = []
+        elif query == engine.INSERT_GAP:
+            self.gaps.setdefault(params[0], []).append(tuple(params[1:]))
+        elif query == engine.LATE_ROWS.format(table=table):
+            ids = sorted(self.visible(table))
+            self._result = [
+                {"row_id": row_id} for row_id in ids
+                if any(a <= row_id <= b for a, b, _ in self.gaps.get(params[0], []))
+            ]
+        elif query == engine.MAX_ROW_ID.format(table=table):
+            self._result = [{"high": max(self.visible(table), default=0)}]
+        elif query == engine.FIND_GAPS.format(table=table):
+            default, low, high = params
+            previous = default
+            for row_id in sorted(i for i in self.visible(table) if low < i <= high):
+                if row_id > previous + 1:
+                    self._result.append({"gap_start": previous + 1, "gap_end": row_id - 1})
+                previous = row_id
+        elif query.lstrip().startswith("INSERT INTO kpi_rollup_"):
+            self._apply_delta(query, table, self._select_rows(query, table, params))
+        else:
+            raise AssertionError(f"Unexpected query: {query}")
+
+    def _select_rows(self, query, table, params):
+        visible = self.visible(table)
+        if "row_id IN (" in query:
+            ids = set(params)
+        else:
+            # Segmen (row_id BETWEEN %s AND %s OR ...)
+            assert len(re.findall(r"row_id BETWEEN %s AND %s", query)) * 2 == len(params)
+            ids = {i for start, end in zip(params[::2], params[1::2]) for i in range(start, end + 1)}
+        return [visible[i] for i in sorted(ids) if i in visible]
+
+    def _apply_delta(self, query, table, rows):
+        target = self.activity if "INSERT INTO kpi_rollup_activity" in query else self.student
+        for row in rows:
+            if table == "studentvle":
+                key = (row["code_module"] or "", row["code_presentation"] or "")
+                forum = row["id_site"] in FORUM_SITES
+                if target is self.activity:
+                    assert f"COALESCE(sv.date, {NO_DAY})" in query
+                    bucket = target.setdefault(key + (NO_DAY if row["date"] is None else row["date"],), {})
+                    self._add(bucket, clicks=row["sum_click"] or 0, vle_rows=1,
+                              forum_clicks=(row["sum_click"] or 0) if forum else 0,
+                              forum_click_rows=int(forum and row["sum_click"] is not None))
+                elif row["id_student"] is not None:
+                    assert "COUNT(sv.sum_click)" in query
+                    self._add(target.setdefault(key + (row["id_student"],), {}), clicks=row["sum_click"] or 0,
+                              click_rows=int(row["sum_click"] is not None), vle_rows=1, forum_rows=int(forum))
+            else:
+                module, presentation, deadline = ASSESSMENTS.get(row["id_assessment"], ("", "", None))
+                score, submitted = row["score"], row["date_submitted"]
+                if target is self.activity:
+                    assert f"COALESCE(sa.date_submitted, {NO_DAY})" in query
+                    bucket = target.setdefault((module, presentation, NO_DAY if submitted is None else submitted), {})
+                    self._add(bucket, submissions=1, scored=int(score is not None), score_sum=score or 0,
+                              completed=int(score is not None and score > 50),
+                              on_time=int(submitted is not None and deadline is not None and submitted <= deadline),
+                              timed=int(submitted is not None and deadline is not None))
+                    if score is not None:
+                        bucket["score_min"] = min(bucket.get("score_min", score), score)
+                        bucket["score_max"] = max(bucket.get("score_max", score), score)
+                elif score is not None and row["id_student"] is not None:
+                    self._add(target.setdefault((module, presentation, row["id_student"]), {}), scored=1)
+
+    @staticmethod
+    def _add(bucket, **values):
+        for name, value in values.items():
+            bucket[name] = bucket.get(name, 0) + value
+
+    def rollups(self):
+        return {"activity": {k: dict(v) for k, v in self.activity.items()},
+                "student": {k: dict(v) for k, v in self.student.items()}}
+
+
+@pytest.fixture
+def engine_db(monkeypatch):
+    fake = FakeEngineDB()
+
+    @contextmanager
+    def transaction():
+        yield fake
+
+    monkeypatch.setattr(db, "transaction", transaction)
+    return fake
+
+
+def vle(fake, row_id, committed=True, module="AAA", presentation="2013J", student=1, site=10, date=5, clicks=10):
+    fake.insert("studentvle", row_id, committed, code_module=module, code_presentation=presentation,
+                id_student=student, id_site=site, date=date, sum_click=clicks)
+
+
+def assessment(fake, row_id, committed=True, id_assessment=1, student=1, submitted=10, score=70.0):
+    fake.insert("studentassessment", row_id, committed, id_assessment=id_assessment, id_student=student,
+                date_submitted=submitted, score=score)
+
+
+@pytest.mark.unit
+def test_build_kpis_from_rollups():
+    activity = {
+        "forum_clicks": 300, "forum_click_rows": 40, "scored": 20, "score_sum": 1500.0,
+        "score_min": 10.0, "score_max": 100.0, "completed": 15, "on_time": 9, "timed": 12,
+    }
+    students = {"forum_students": 7, "scored_students": 5}
+    low_activity = {"low_activity_students": 2, "active_students": 8, "avg_clicks": 100}
+    kpis = KPIAggregationEngine.build_kpis(activity, students, low_activity)
+
+    assert [kpi["kpi_id"] for kpi in kpis] == [1, 2, 3, 4, 5]
+    assert kpis[0]["value"] == 300 and kpis[0]["avg_clicks_per_activity"] == 7.5
+    assert kpis[1]["value"] == 75.0 and kpis[1]["participating_students"] == 5
+    assert kpis[2]["value"] == 75.0
+    assert kpis[3]["value"] == 75.0 and kpis[3]["min_score"] == 10.0
+    assert kpis[4]["value"] == 25.0 and kpis[4]["avg_clicks_threshold"] == 100.0
+
+
+@pytest.mark.unit
+def test_build_kpis_with_empty_rollups():
+    kpis = KPIAggregationEngine.build_kpis({}, {}, {})
+    assert all(kpi["value"] == 0 for kpi in kpis)
+
+
+@pytest.mark.unit
+def test_unknown_engine_mode_falls_back_to_full():
+    engine = KPIAggregationEngine(mode="bogus")
+    assert engine.mode == KPIAggregationEngine.ENGINE_FULL
+    assert not engine.enabled
+
+
+@pytest.mark.unit
+def test_split_gaps_and_segments():
+    gaps = [(3, 5, "a"), (8, 8, "b"), (10, 20, "c")]
+    assert KPIAggregationEngine.split_gaps(gaps, [3, 4, 8, 12, 20]) == [(5, 5, "a"), (10, 11, "c"), (13, 19, "c")]
+    assert KPIAggregationEngine.segments(0, 12, [(1, 1, None), (4, 6, None)]) == [(2, 3), (7, 12)]
+    assert KPIAggregationEngine.segments(2, 5, []) == [(3, 5)]
+
+
+@pytest.mark.unit
+def test_out_of_order_commits_match_recompute(engine_db):
+    fake = engine_db
+    engine = KPIAggregationEngine(mode="incremental", gap_settle_seconds=600)
+    vle(fake, 1, clicks=5)
+    vle(fake, 2, student=2, site=11, date=None, clicks=7)
+    vle(fake, 3, committed=False, student=3, date=6, clicks=100)  # row_id diambil, commit belakangan
+    vle(fake, 4, module="BBB", presentation="2014B", date=6, clicks=1)
+    assessment(fake, 1, score=40.0)
+    assessment(fake, 2, committed=False, student=2, score=90.0)
+    assessment(fake, 3, id_assessment=2, student=3, submitted=None, score=None)
+
+    result = engine.refresh()
+    assert result["row_ids_applied"] == {"studentvle": 4, "studentassessment": 3}
+    assert fake.watermarks == {"studentvle": 4, "studentassessment": 3}
+    assert [gap[:2] for gap in fake.gaps["studentvle"]] == [(3, 3)]
+    assert ("AAA", "2013J", 6) not in fake.activity
+
+    # Transaksi row_id 3 commit setelah watermark melewatinya: diterapkan sebagai baris terlambat
+    fake.facts["studentvle"][3]["committed"] = True
+    fake.facts["studentassessment"][2]["committed"] = True
+    vle(fake, 5, student=1, date=6, clicks=2)
+    result = engine.refresh()
+    assert result["late_rows_applied"] == {"studentvle": 1, "studentassessment": 1}
+    assert fake.activity[("AAA", "2013J", 6)]["clicks"] == 102
+    assert fake.gaps["studentvle"] == [] and fake.gaps["studentassessment"] == []
+
+    # Refresh tanpa baris baru tidak menerapkan apa pun dua kali
+    engine.refresh()
+    incremental = fake.rollups()
+    engine.recompute()
+    assert fake.rollups() == incremental
+
+
+@pytest.mark.unit
+def test_rolled_back_gap_expires(engine_db):
+    fake = engine_db
+    engine = KPIAggregationEngine(mode="incremental", gap_settle_seconds=600)
+    vle(fake, 1)
+    vle(fake, 2, committed=False)
+    vle(fake, 3)
+    engine.refresh()
+    assert [gap[:2] for gap in fake.gaps["studentvle"]] == [(2, 2)]
+
+    # Gap lebih tua dari settle window dianggap rollback dan dibuang
+    fake.gaps["studentvle"] = [(2, 2, datetime.now() - timedelta(seconds=601))]
+    del fake.facts["studentvle"][2]
+    engine.refresh()
+    assert fake.gaps["studentvle"] == []
+
+
+@pytest.mark.unit
+def test_ensure_schema_only_creates_engine_tables(monkeypatch):
+    engine = KPIAggregationEngine(mode="incremental")
+    statements = []
+    monkeypatch.setattr(db, "execute_one", lambda query, params=None: {"found": 1})
+    monkeypatch.setattr(db, "execute_write", lambda query, params=None: statements.append(query) or 0)
+    engine.ensure_schema()
+
+    assert engine.ready and statements == list(KPIAggregationEngine.SCHEMA)
+    assert all(query.lstrip().startswith("CREATE TABLE IF NOT EXISTS") for query in statements)
+
+
+@pytest.mark.unit
+def test_refresh_applies_delta_per_module_presentation_day(engine_db):
+    fake = engine_db
+    engine = KPIAggregationEngine(mode="incremental", gap_settle_seconds=600)
+    vle(fake, 1, date=5, clicks=10)
+    vle(fake, 2, module="BBB", presentation="2014B", student=2, site=11, date=5, clicks=4)
+    assessment(fake, 1, submitted=10, score=70.0)
+    engine.refresh()
+    before = fake.rollups()
+
+    vle(fake, 3, student=2, date=5, clicks=6)
+    vle(fake, 4, student=3, site=11, date=None, clicks=3)
+    vle(fake, 5, student=3, site=10, date=None, clicks=None)
+    assessment(fake, 2, student=2, submitted=25, score=30.0)
+    assessment(fake, 3, id_assessment=2, student=3, submitted=None, score=None)
+    result = engine.refresh()
+    after = fake.rollups()
+
+    assert result["row_ids_applied"] == {"studentvle": 3, "studentassessment": 2}
+    # Bucket yang tidak tersentuh delta tetap sama
+    assert after["activity"][("BBB", "2014B", 5)] == before["activity"][("BBB", "2014B", 5)]
+    assert after["activity"][("AAA", "2013J", 10)] == before["activity"][("AAA", "2013J", 10)]
+    # Bucket (AAA, 2013J, hari 5) bertambah tepat sebesar delta
+    assert after["activity"][("AAA", "2013J", 5)] == {"clicks": 16, "vle_rows": 2, "forum_clicks": 16, "forum_click_rows": 2}
+    assert after["activity"][("AAA", "2013J", 25)] == {
+        "submissions": 1, "scored": 1, "score_sum": 30.0, "completed": 0, "on_time": 0, "timed": 1,
+        "score_min": 30.0, "score_max": 30.0,
+    }
+    # Baris tanpa tanggal masuk bucket NO_DAY (bukan hilang dari rollup)
+    assert after["activity"][("AAA", "2013J", NO_DAY)] == {"clicks": 3, "vle_rows": 2, "forum_clicks": 0, "forum_click_rows": 0}
+    assert after["activity"][("BBB", "2014B", NO_DAY)] == {
+        "submissions": 1, "scored": 0, "score_sum": 0, "completed": 0, "on_time": 0, "timed": 0,
+    }
+    # Rollup per mahasiswa
+    assert after["student"][("AAA", "2013J", 1)] == before["student"][("AAA", "2013J", 1)]
+    assert after["student"][("AAA", "2013J", 2)]["clicks"] == 6 and after["student"][("AAA", "2013J", 2)]["scored"] == 1
+    assert after["student"][("AAA", "2013J", 3)] == {"clicks": 3, "click_rows": 1, "vle_rows": 2, "forum_rows": 1}
+    assert ("BBB", "2014B", 3) not in after["student"]
+
+
+@pytest.mark.unit
+def test_low_activity_rollup_matches_full_query_with_null_clicks(engine_db, monkeypatch):
+    fake = engine_db
+    engine = KPIAggregationEngine(mode="incremental", gap_settle_seconds=600)
+    facts = [
+        (1, "AAA", "2013J", 1, 100), (2, "BBB", "2014B", 1, 20), (3, "AAA", "2013J", 2, 90),
+        (4, "AAA", "2013J", 3, 10), (5, "AAA", "2013J", 3, None),
+        # Mahasiswa 4 dan 5 hanya punya sum_click NULL: bukan 0 clicks, jadi bukan low activity
+        (6, "AAA", "2013J", 4, None), (7, "BBB", "2014B", 4, None), (8, "AAA", "2013J", 5, None),
+    ]
+    for row_id, module, presentation, student, clicks in facts:
+        vle(fake, row_id, module=module, presentation=presentation, student=student, clicks=clicks)
+    engine.refresh()
+
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.execute("CREATE TABLE studentvle (code_module TEXT, code_presentation TEXT, id_student INTEGER, sum_click INTEGER)")
+    conn.executemany("INSERT INTO studentvle VALUES (?, ?, ?, ?)", [row[1:] for row in facts])
+    conn.execute("CREATE TABLE kpi_rollup_student (code_module TEXT, code_presentation TEXT, id_student INTEGER, "
+                 "clicks INTEGER, click_rows INTEGER, vle_rows INTEGER)")
+    conn.executemany("INSERT INTO kpi_rollup_student VALUES (?, ?, ?, ?, ?, ?)", [
+        key + (values["clicks"], values["click_rows"], values["vle_rows"]) for key, values in fake.student.items()
+    ])
+
+    rollup = dict(conn.execute(KPIAggregationEngine.LOW_ACTIVITY_QUERY.format(conditions="")).fetchone())
+    monkeypatch.setattr(db, "execute_one", lambda query, params=None: dict(conn.execute(query, params or ()).fetchone()))
+    full = KPIService(cache_ttl_seconds=60)._calculate_low_activity_alert_index()
+
+    assert rollup["low_activity_students"] == full["low_activity_students"] == 1
+    assert rollup["active_students"] == full["total_students"] == 5
+    assert round(rollup["avg_clicks"], 2) == full["avg_clicks_threshold"] == pytest.approx(73.33)
@@ -0,0 +1,59 @@
+"""
+Test untuk filter slice KPI (cache key kanonik dan SQL terparameterisasi)
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+import pytest
+from pydantic import ValidationError
+
+from config import settings
+from schemas.requests.kpi_requests import KPIFilter
+
+
+@pytest.mark.unit
+def test_equivalent_filters_share_cache_key():
+    """Urutan, duplikat dan huruf kecil tidak menghasilkan cache key baru"""
+    a = KPIFilter(code_module=["bbb", "AAA"], code_presentation="2013j", date_to=100)
+    b = KPIFilter(code_module=["AAA,BBB", "aaa"], code_presentation=["2013J"], date_to=100)
+    assert a.cache_key("kpi:metrics") == b.cache_key("kpi:metrics")
+    assert a.cache_key("kpi:metrics") == "kpi:metrics:module=AAA,BBB;presentation=2013J;date=:100"
+    assert KPIFilter().is_empty
+    assert KPIFilter().cache_key("kpi:metrics") == "kpi:metrics"
+
+
+@pytest.mark.unit
+def test_sql_conditions_are_parameterized():
+    kpi_filter = KPIFilter(code_module=["AAA", "BBB"], date_from=0, date_to=30)
+    sql, params = kpi_filter.sql_conditions("sv.code_module", "sv.code_presentation", "sv.date")
+    assert sql == " AND sv.code_module IN (%s, %s) AND sv.date >= %s AND sv.date <= %s"
+    assert params == ("AAA", "BBB", 0, 30)
+
+    sql, params = kpi_filter.assessment_conditions("sa")
+    assert "sa.id_assessment IN (SELECT id_assessment FROM assessments WHERE 1 = 1 AND code_module IN (%s, %s))" in sql
+    assert sql.endswith("sa.date_submitted >= %s AND sa.date_submitted <= %s")
+    assert params == ("AAA", "BBB", 0, 30)
+
+
+@pytest.mark.unit
+def test_invalid_date_range_is_rejected():
+    with pytest.raises(ValidationError):
+        KPIFilter(date_from=10, date_to=5)
+
+
+@pytest.mark.unit
+def test_codes_are_validated_and_capped(monkeypatch):
+    assert KPIFilter(code_module="aaa, ggg", code_presentation="2014b").code_presentation == ["2014B"]
+    for kwargs in ({"code_module": ["AA"]}, {"code_module": ["AAA1"]}, {"code_module": ["A%A"]},
+                   {"code_presentation": ["2013"]}, {"code_presentation": ["2013X"]}, {"code_presentation": ["13J"]}):
+        with pytest.raises(ValidationError):
+            KPIFilter(**kwargs)
+
+    monkeypatch.setattr(settings, "KPI_FILTER_MAX_CODES", 3)
+    assert len(KPIFilter(code_module="AAA,BBB,CCC,aaa").code_module) == 3
+    with pytest.raises(ValidationError, match="at most 3 codes"):
+        KPIFilter(code_module="AAA,BBB,CCC,DDD")
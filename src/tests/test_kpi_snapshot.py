@@ -0,0 +1,89 @@
+"""
+Test untuk snapshot KPI persisten (restore saat startup, validasi oleh refresh)
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from core.cache import cache
+from core.database import db
+from services.kpi_service import KPIService
+from services.kpi_snapshot import KPISnapshotStore
+from services.model_service import model_service
+
+
+class FakeSnapshotTable:
+    """Tabel kpi_snapshots in-memory untuk execute_write/execute_one"""
+
+    def __init__(self):
+        self.rows = {}
+
+    def execute_write(self, query, params=None):
+        if "INSERT INTO kpi_snapshots" in query:
+            key, format_version, model_version, payload, created_at = params
+            version = self.rows[key]["version"] + 1 if key in self.rows else 1
+            self.rows[key] = {
+                "format_version": format_version, "version": version, "model_version": model_version,
+                "payload": payload, "created_at": created_at,
+            }
+        return 1
+
+    def execute_one(self, query, params=None):
+        row = self.rows.get(params[0])
+        return dict(row) if row else None
+
+
+@pytest.fixture
+def snapshot_table(monkeypatch):
+    table = FakeSnapshotTable()
+    monkeypatch.setattr(db, "execute_write", table.execute_write)
+    monkeypatch.setattr(db, "execute_one", table.execute_one)
+    monkeypatch.setattr(model_service, "model_version", "v1")
+    cache.delete(KPIService.CACHE_KEY_ALL_KPIS)
+    yield table
+    cache.delete(KPIService.CACHE_KEY_ALL_KPIS)
+
+
+@pytest.mark.unit
+def test_snapshot_roundtrip_and_invalidation(snapshot_table):
+    store = KPISnapshotStore(enabled=True, max_age_seconds=3600)
+    assert store.load("kpi:all_metrics") is None
+
+    store.save("kpi:all_metrics", [{"kpi_id": 4, "value": Decimal("71.25")}])
+    store.save("kpi:all_metrics", [{"kpi_id": 4, "value": Decimal("72.5")}])
+    snapshot = store.load("kpi:all_metrics")
+    assert snapshot["data"] == [{"kpi_id": 4, "value": 72.5}]
+    assert snapshot["version"] == 2 and snapshot["model_version"] == "v1"
+
+    # Model baru atau snapshot terlalu tua: tidak dipakai
+    model_service.model_version = "v2"
+    assert store.load("kpi:all_metrics") is None
+    model_service.model_version = "v1"
+    snapshot_table.rows["kpi:all_metrics"]["created_at"] = datetime.now() - timedelta(hours=2)
+    assert store.load("kpi:all_metrics") is None
+
+
+@pytest.mark.unit
+def test_restore_serves_snapshot_until_refresh_validates(snapshot_table, monkeypatch):
+    store = KPISnapshotStore(enabled=True, max_age_seconds=0)
+    store.save(KPIService.CACHE_KEY_ALL_KPIS, [{"kpi_id": 1, "value": 10}])
+    service = KPIService(cache_ttl_seconds=60, snapshot_store=store)
+
+    assert service.restore_snapshot()
+    assert service.get_all_kpis() == [{"kpi_id": 1, "value": 10}]
+    assert service.get_cache_info()["snapshot"]["validated"] is False
+
+    monkeypatch.setattr(service, "_calculate_activity_kpis", lambda kpi_filter=None: [{"kpi_id": 1, "value": 12}])
+    monkeypatch.setattr(service, "_calculate_predicted_dropout_risk", lambda kpi_filter=None: {"kpi_id": 6, "value": 0})
+    service.get_all_kpis(force_refresh=True)
+
+    assert service.get_cache_info()["snapshot"]["validated"] is True
+    assert store.load(KPIService.CACHE_KEY_ALL_KPIS)["data"][0]["value"] == 12
@@ -0,0 +1,155 @@
+"""
+Test push KPI lewat SSE: fan-out per slice, fallback lokal tanpa Redis, publish hanya saat KPI berubah
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+import asyncio
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.kpi_router import router
+from services.kpi_broadcaster import KPIBroadcaster
+from schemas.requests.kpi_requests import KPIFilter
+from services.kpi_service import KPIService
+
+
+class NoRedisCache:
+    """Cache sync tanpa Redis: publish gagal, lock selalu didapat"""
+
+    instance_id = "test"
+
+    def __init__(self):
+        self.locks = set()
+
+    def publish(self, channel, message):
+        return False
+
+    def add(self, key, value, ttl=300):
+        if key in self.locks:
+            return False
+        self.locks.add(key)
+        return True
+
+
+def parse_frame(frame):
+    fields = dict(line.split(": ", 1) for line in frame.strip().splitlines())
+    return fields["event"], fields["id"], json.loads(fields["data"])
+
+
+@pytest.mark.unit
+def test_publish_without_redis_fans_out_to_matching_slice():
+    async def scenario():
+        broadcaster = KPIBroadcaster(sync_cache=NoRedisCache(), max_clients=10)
+        await broadcaster.start()
+        all_queue = broadcaster.subscribe("kpi:all_metrics")
+        other_queue = broadcaster.subscribe("kpi:metrics:m=AAA")
+
+        # Dipanggil dari thread refresh seperti KPIService
+        await asyncio.to_thread(broadcaster.publish, "kpi:all_metrics", '"abc"', [{"kpi_id": 1, "value": 2}], [1])
+        frame = await asyncio.wait_for(all_queue.get(), timeout=1)
+        assert other_queue.empty()
+        await broadcaster.stop()
+        return frame
+
+    event, event_id, data = parse_frame(asyncio.run(scenario()))
+    assert event == "kpis"
+    assert event_id == '"abc"'
+    assert data == {"etag": '"abc"', "changed_kpis": [1], "data": [{"kpi_id": 1, "value": 2}]}
+
+
+@pytest.mark.unit
+def test_slow_client_keeps_latest_events_and_limit_is_enforced():
+    async def scenario():
+        broadcaster = KPIBroadcaster(sync_cache=NoRedisCache(), max_clients=1, queue_size=2)
+        queue = broadcaster.subscribe("kpi:all_metrics")
+        assert broadcaster.subscribe("kpi:all_metrics") is None
+        for version in range(3):
+            broadcaster._dispatch(json.dumps({"cache_key": "kpi:all_metrics", "etag": f"v{version}", "changed_kpis": [], "data": []}))
+        ids = [parse_frame(queue.get_nowait())[1] for _ in range(queue.qsize())]
+        broadcaster.unsubscribe(queue)
+        return ids, broadcaster.get_stats()["clients"]
+
+    ids, clients = asyncio.run(scenario())
+    assert ids == ["v1", "v2"]
+    assert clients == 0
+
+
+@pytest.mark.unit
+def test_refresh_publishes_only_changed_kpis(monkeypatch):
+    published = []
+
+    class RecordingBroadcaster:
+        def publish(self, cache_key, etag, kpis, changed):
+            published.append((cache_key, changed))
+
+    service = KPIService(cache_ttl_seconds=60, broadcaster=RecordingBroadcaster())
+    values = {"forum": 10}
+    monkeypatch.setattr(service, "_calculate_activity_kpis", lambda kpi_filter=None: [
+        {"kpi_id": 1, "value": values["forum"]}, {"kpi_id": 2, "value": 5}])
+    monkeypatch.setattr(service, "_calculate_predicted_dropout_risk", lambda kpi_filter=None: {"kpi_id": 6, "value": 0})
+    service.clear_cache()
+    try:
+        service.get_all_kpis(force_refresh=True)
+        service.get_all_kpis(force_refresh=True)
+        values["forum"] = 11
+        service.get_all_kpis(force_refresh=True)
+    finally:
+        service.clear_cache()
+    assert published == [("kpi:all_metrics", [1, 2, 6]), ("kpi:all_metrics", [1])]
+
+
+@pytest.mark.unit
+def test_refresh_active_skips_slices_locked_by_other_worker():
+    refreshed = []
+
+    class StubKPIService:
+        def get_all_kpis(self, force_refresh=False, kpi_filter=None):
+            refreshed.append(force_refresh)
+
+    async def scenario():
+        broadcaster = KPIBroadcaster(sync_cache=NoRedisCache(), max_clients=10)
+        broadcaster.subscribe("kpi:all_metrics")
+        broadcaster.subscribe("kpi:all_metrics")
+        return broadcaster.refresh_active(StubKPIService(), 30), broadcaster.refresh_active(StubKPIService(), 30)
+
+    assert asyncio.run(scenario()) == (1, 0)
+    assert refreshed == [True]
+
+
+@pytest.mark.unit
+def test_stream_rejects_when_worker_is_full():
+    app = FastAPI()
+    app.include_router(router)
+    app.state.kpi_service = KPIService(cache_ttl_seconds=60)
+    app.state.kpi_broadcaster = KPIBroadcaster(sync_cache=NoRedisCache(), max_clients=0)
+    response = TestClient(app).get("/api/kpi/stream")
+    assert response.status_code == 503
+    assert "retry-after" in response.headers
+
+
+@pytest.mark.unit
+def test_refresh_active_stops_after_stop_refresh():
+    refreshed = []
+
+    async def scenario():
+        broadcaster = KPIBroadcaster(sync_cache=NoRedisCache(), max_clients=10)
+
+        class StubKPIService:
+            def get_all_kpis(self, force_refresh=False, kpi_filter=None):
+                refreshed.append(kpi_filter.code_module)
+                broadcaster.stop_refresh()
+
+        broadcaster.subscribe("kpi:a", KPIFilter(code_module="AAA"))
+        broadcaster.subscribe("kpi:b", KPIFilter(code_module="BBB"))
+        return broadcaster.refresh_active(StubKPIService(), 30)
+
+    assert asyncio.run(scenario()) == 1
+    assert refreshed == [["AAA"]]
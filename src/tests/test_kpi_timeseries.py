@@ -0,0 +1,85 @@
+"""
+Test untuk KPI timeseries (bucket tertutup di-cache, hanya bucket terbuka yang di-query ulang)
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+import pytest
+
+from core.cache import cache
+from schemas.requests.kpi_requests import KPIFilter
+from services import kpi_timeseries as timeseries_module
+from services.kpi_timeseries import KPITimeseriesService
+
+
+class FakeVLE:
+    """studentvle forum clicks per hari, dengan query GROUP BY bucket yang direkam"""
+
+    def __init__(self, clicks_by_day):
+        self.clicks_by_day = clicks_by_day
+        self.calls = []
+
+    def execute_query(self, query, params=None):
+        bucket_size, *rest = params
+        min_day = rest[-1] if "sv.date >= %s" in query else None
+        self.calls.append(min_day)
+        buckets = {}
+        for day, clicks in self.clicks_by_day.items():
+            if min_day is None or day >= min_day:
+                buckets[day // bucket_size] = buckets.get(day // bucket_size, 0) + clicks
+        return [
+            {"bucket": index, "total_forum_clicks": total, "active_students": 1, "avg_clicks_per_activity": total}
+            for index, total in buckets.items()
+        ]
+
+
+@pytest.fixture
+def fake_vle(monkeypatch):
+    fake = FakeVLE({0: 5, 3: 5, 8: 4, 15: 2})
+    monkeypatch.setattr(timeseries_module.db, "execute_query", fake.execute_query)
+    service = KPITimeseriesService(cache_ttl_seconds=60, closed_ttl_seconds=3600)
+    service.clear_cache()
+    yield fake, service
+    service.clear_cache()
+
+
+@pytest.mark.unit
+def test_weekly_buckets_and_open_bucket(fake_vle):
+    fake, service = fake_vle
+    result = service.get_timeseries(1, KPIFilter(code_presentation="2013J"), "week")
+
+    assert [(p["bucket"], p["value"], p["closed"]) for p in result["points"]] == [(0, 10, True), (1, 4, True), (2, 2, False)]
+    assert result["points"][1]["start_day"] == 7 and result["points"][1]["end_day"] == 13
+    assert fake.calls == [None]
+
+    # Bucket terbuka masih di cache: tidak ada query
+    service.get_timeseries(1, KPIFilter(code_presentation="2013J"), "week")
+    assert fake.calls == [None]
+
+
+@pytest.mark.unit
+def test_refresh_only_recomputes_open_bucket(fake_vle):
+    fake, service = fake_vle
+    kpi_filter = KPIFilter(code_presentation="2013J")
+    service.get_timeseries(1, kpi_filter, "week")
+
+    # Data baru di bucket terbuka dan bucket berikutnya; data historis berubah tapi bucket tertutup tidak dihitung ulang
+    fake.clicks_by_day.update({16: 3, 22: 7, 1: 100})
+    result = service.get_timeseries(1, kpi_filter, "week", force_refresh=True)
+
+    assert fake.calls == [None, 14]
+    assert [(p["bucket"], p["value"], p["closed"]) for p in result["points"]] == [
+        (0, 10, True), (1, 4, True), (2, 5, True), (3, 7, False)
+    ]
+
+
+@pytest.mark.unit
+def test_unsupported_kpi_is_rejected():
+    service = KPITimeseriesService()
+    assert not service.supports(6)
+    with pytest.raises(ValueError):
+        service.get_timeseries(6, KPIFilter(code_presentation="2013J"))
@@ -0,0 +1,124 @@
+"""
+Test untuk micro-batching prediction coalescer
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+import asyncio
+import pytest
+
+from core.deadline import DeadlineExceeded
+from services.prediction_batcher import MicroBatcher
+
+
+class RecordingPredictor:
+    """Fake predict_batch yang mencatat ukuran setiap batch (poison: item yang membuat seluruh batch gagal)"""
+
+    def __init__(self, fail: bool = False, poison=(), error=ValueError):
+        self.batch_sizes = []
+        self.fail = fail
+        self.poison = set(poison)
+        self.error = error
+
+    def __call__(self, items):
+        self.batch_sizes.append(len(items))
+        if self.fail or self.poison.intersection(items):
+            raise self.error("model error")
+        return [item * 10 for item in items]
+
+
+@pytest.mark.unit
+def test_concurrent_requests_are_coalesced():
+    """Request yang datang bersamaan harus di-predict dalam satu batch"""
+    predictor = RecordingPredictor()
+    batcher = MicroBatcher("test", predictor, max_batch_size=64, max_wait_ms=50)
+
+    async def scenario():
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(scenario())
+    assert results == [i * 10 for i in range(10)]
+    assert predictor.batch_sizes == [10]
+
+    stats = batcher.get_stats()
+    assert stats["batches"] == 1
+    assert stats["items"] == 10
+    assert stats["avg_batch_size"] == 10
+    assert stats["batch_size_histogram"]["<=16"] == 1
+
+
+@pytest.mark.unit
+def test_batch_size_is_capped():
+    """Batch tidak boleh melebihi max_batch_size"""
+    predictor = RecordingPredictor()
+    batcher = MicroBatcher("test", predictor, max_batch_size=4, max_wait_ms=50)
+
+    async def scenario():
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(scenario())
+    assert results == [i * 10 for i in range(10)]
+    assert predictor.batch_sizes == [4, 4, 2]
+    assert batcher.get_stats()["max_observed_batch_size"] == 4
+
+
+@pytest.mark.unit
+def test_batch_error_is_propagated_to_all_callers():
+    """Error di setiap item diterima semua caller di batch tersebut"""
+    batcher = MicroBatcher("test", RecordingPredictor(fail=True), max_batch_size=8, max_wait_ms=20)
+
+    async def scenario():
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert batcher.get_stats()["errors"] == 3
+
+
+@pytest.mark.unit
+def test_failed_batch_is_bisected_to_the_bad_item():
+    """Satu item buruk tidak menggagalkan caller lain di batch yang sama"""
+    predictor = RecordingPredictor(poison={5})
+    batcher = MicroBatcher("test", predictor, max_batch_size=8, max_wait_ms=50)
+
+    async def scenario():
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(8)), return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(scenario())
+    assert isinstance(results[5], ValueError)
+    assert [r for i, r in enumerate(results) if i != 5] == [i * 10 for i in range(8) if i != 5]
+    # 8 -> 4+4 -> 2+2 -> 1+1: log2(n) pembelahan, bukan n panggilan
+    assert predictor.batch_sizes == [8, 4, 4, 2, 1, 1, 2]
+    stats = batcher.get_stats()
+    assert stats["errors"] == 1 and stats["split_batches"] == 3 and stats["batches"] == 1
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("error", [DeadlineExceeded, RuntimeError, Exception])
+def test_systemic_error_fails_batch_without_bisecting(error):
+    """Deadline, executor atau model state: sama untuk semua item, jadi tidak di-predict ulang per belahan"""
+    predictor = RecordingPredictor(poison={5}, error=error)
+    batcher = MicroBatcher("test", predictor, max_batch_size=8, max_wait_ms=50)
+
+    async def scenario():
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(8)), return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(scenario())
+    assert all(type(r) is error for r in results)
+    assert predictor.batch_sizes == [8]
+    stats = batcher.get_stats()
+    assert stats["errors"] == 8 and stats["split_batches"] == 0
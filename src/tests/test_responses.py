@@ -0,0 +1,55 @@
+"""
+Test FastJSONResponse (orjson): tipe NumPy dan Decimal, dipakai sebagai default_response_class
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+import json
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from core.responses import FastJSONResponse, dumps
+from schemas.responses import PredictionResponse
+
+
+@pytest.mark.unit
+def test_dumps_handles_numpy_and_decimal():
+    payload = {
+        "int": np.int64(3),
+        "float": np.float32(0.5),
+        "label": np.str_("Pass"),
+        "array": np.array([[1, 2], [3, 4]]),
+        "decimal": Decimal("81.27"),
+        1: "non-string key",
+    }
+    assert json.loads(dumps(payload)) == {
+        "int": 3, "float": 0.5, "label": "Pass", "array": [[1, 2], [3, 4]], "decimal": 81.27, "1": "non-string key",
+    }
+
+
+@pytest.mark.unit
+def test_prediction_with_numpy_scalar_is_served():
+    app = FastAPI(default_response_class=FastJSONResponse)
+
+    @app.get("/predict", response_model=PredictionResponse)
+    async def predict():
+        # Hasil model.predict (misal label final result numerik) tanpa konversi manual
+        return FastJSONResponse(PredictionResponse(success=True, prediction=np.int64(2), message="ok"))
+
+    @app.get("/info")
+    async def info():
+        return {"hit_rate": Decimal("0.75")}
+
+    client = TestClient(app)
+    response = client.get("/predict")
+    assert response.status_code == 200
+    assert response.json() == {"success": True, "prediction": 2, "message": "ok"}
+    assert client.get("/info").json() == {"hit_rate": 0.75}
@@ -0,0 +1,91 @@
+"""
+Test untuk builder SQL sampling KPI 6
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+import math
+import zlib
+from collections import Counter
+
+import pytest
+
+from services.sampling import StudentSampler
+
+
+def crc32(seed, id_student):
+    """CRC32(CONCAT(seed, ':', id_student)) seperti MySQL (utf8)"""
+    return zlib.crc32(f"{seed}:{id_student}".encode("utf-8"))
+
+
+def hash_sample(sampler, ids):
+    """Evaluasi predikat WHERE hash sampling di Python"""
+    sql, (seed, threshold) = sampler.sample_cte(total_students=len(ids))
+    assert "MOD(CRC32(CONCAT(%s, ':', si.id_student)), 1000000) < %s" in sql
+    return {i for i in ids if crc32(seed, i) % 1_000_000 < threshold}
+
+
+@pytest.mark.unit
+def test_hash_sampling_is_seeded_threshold():
+    """Hash sampling memakai seed dan threshold dari fraction, tanpa ORDER BY RAND"""
+    sql, params = StudentSampler(fraction=0.2, method="hash", seed="abc").sample_cte(total_students=1000)
+    assert "RAND()" not in sql
+    assert "CRC32" in sql
+    assert params == ("abc", 200_000)
+
+
+@pytest.mark.unit
+def test_stratified_sampling_partitions_by_presentation():
+    """Stratified sampling ranking per module/presentation"""
+    sampler = StudentSampler(fraction=0.1, method="stratified", seed="abc")
+    sql, params = sampler.sample_cte(total_students=1000)
+    assert "PARTITION BY si.code_module, si.code_presentation" in sql
+    assert params == ("abc", 0.1)
+    assert sampler.describe()["sampling_method"] == "stratified"
+
+
+@pytest.mark.unit
+def test_unknown_method_falls_back_to_hash():
+    sampler = StudentSampler(fraction=0.5, method="bogus")
+    assert sampler.method == StudentSampler.METHOD_HASH
+    assert sampler.is_deterministic
+
+
+@pytest.mark.unit
+def test_hash_sample_is_stable_and_proportional():
+    ids = range(10_000, 40_000)
+    sample = hash_sample(StudentSampler(fraction=0.2, method="hash", seed="abc"), ids)
+
+    # ~fraction * n (binomial, std ~69 untuk n=30000): toleransi 5 std
+    assert abs(len(sample) - 6000) < 350
+    # Deterministik: refresh berikutnya dapat sample yang sama
+    assert hash_sample(StudentSampler(fraction=0.2, method="hash", seed="abc"), ids) == sample
+    # Stabil saat fraction naik (sample lama tetap ikut) dan saat populasi bertambah
+    assert sample < hash_sample(StudentSampler(fraction=0.3, method="hash", seed="abc"), ids)
+    assert hash_sample(StudentSampler(fraction=0.2, method="hash", seed="abc"), range(10_000, 50_000)) >= sample
+    # Seed lain: sample lain dengan ukuran serupa
+    other = hash_sample(StudentSampler(fraction=0.2, method="hash", seed="xyz"), ids)
+    assert other != sample and abs(len(other) - 6000) < 350
+
+
+@pytest.mark.unit
+def test_stratified_sample_size_per_stratum():
+    """Emulasi ROW_NUMBER() per module/presentation: floor(fraction * ukuran stratum), minimal 1"""
+    sampler = StudentSampler(fraction=0.1, method="stratified", seed="abc")
+    sql, (seed, fraction) = sampler.sample_cte(total_students=0)
+    assert "ORDER BY CRC32(CONCAT(%s, ':', si.id_student)), si.id_student" in sql
+
+    rows = [(i, module) for module, size in (("AAA", 1234), ("BBB", 57), ("CCC", 5)) for i in range(size)]
+    strata = {}
+    for id_student, module in rows:
+        strata.setdefault(module, []).append(id_student)
+    sample = []
+    for module, members in strata.items():
+        ranked = sorted(members, key=lambda i: (crc32(seed, i), i))
+        sample += [(i, module) for i in ranked[:max(1, math.floor(len(members) * fraction))]]
+
+    assert Counter(module for _, module in sample) == {"AAA": 123, "BBB": 5, "CCC": 1}
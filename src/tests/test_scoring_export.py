@@ -0,0 +1,140 @@
+"""
+Test export prediksi cohort: query per cohort, header CSV sebelum query, NDJSON/CSV per chunk, slot admission
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+import csv
+import io
+import json
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder
+
+from core.database import db
+from services.encoder_service import EncoderService
+from services.inference_executor import InferenceExecutor
+from services.model_service import model_service
+from services.predictor_service import PredictorService
+from services.scoring_export import ScoringExportService
+from services.scoring_job import StudentScoringJob
+from schemas.requests import KPIFilter
+
+NAMES = ["id_student", "code_module", "code_presentation", "gender", "age_band",
+         "studied_credits", "num_of_prev_attempts", "total_clicks", "avg_assessment_score"]
+ROWS = [
+    (1, "AAA", "2013J", "F", "0-35", 60, 0, 120, 71.5),
+    (2, "AAA", "2013J", "M", "35-55", 120, 1, 15, 40.0),
+    (3, "AAA", "2013J", "M", "90+", 60, 0, 300, 80.0),  # age_band tidak dikenal encoder
+]
+
+
+@pytest.fixture
+def export(monkeypatch):
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 100, (200, 6))
+    monkeypatch.setattr(model_service, "dropout_model", RandomForestClassifier(n_estimators=5, random_state=0).fit(X, (X[:, 0] < 50).astype(int)))
+    monkeypatch.setattr(model_service, "final_grade_model", RandomForestClassifier(n_estimators=5, random_state=0).fit(
+        X, np.array(["Fail", "Pass"])[(X[:, 1] < 50).astype(int)]
+    ))
+    encoders = {"gender": LabelEncoder().fit(["F", "M"]), "age_band": LabelEncoder().fit(["0-35", "35-55", "55<="])}
+    monkeypatch.setattr(model_service, "label_encoder_finalgrade", encoders)
+
+    calls = []
+
+    def iter_chunks(query, params=None, chunk_size=None, row_format=None, dtypes=None, first_chunk_size=None):
+        calls.append((query, params, chunk_size, first_chunk_size))
+        start, size = 0, min(first_chunk_size, chunk_size)
+        while start < len(ROWS):
+            yield db._rows_to_columns(ROWS[start:start + size], NAMES, dtypes)
+            start, size = start + size, chunk_size
+
+    monkeypatch.setattr(db, "iter_chunks", iter_chunks)
+    scoring_job = StudentScoringJob(EncoderService(), InferenceExecutor(PredictorService(backend="sklearn"), mode="inline"))
+    return ScoringExportService(scoring_job, chunk_size=2, first_chunk_size=1), calls
+
+
+@pytest.mark.unit
+def test_cohort_query_scopes_aggregates_per_enrollment():
+    service = ScoringExportService(scoring_job=None)
+    query, params = service.build_query(KPIFilter(code_module=["aaa"], code_presentation=["2013J"]))
+    assert params == ("AAA", "2013J")
+    assert "si.code_module IN (%s) AND si.code_presentation IN (%s)" in query
+    # Agregat per baris studentinfo (enrollment), bukan GROUP BY seluruh tabel fakta
+    assert "sv.code_presentation = si.code_presentation" in query and "GROUP BY" not in query
+    # Tanpa filter: query yang sama dengan scoring job (prediksi tersimpan dan export tidak berbeda)
+    assert service.build_query(KPIFilter()) == (StudentScoringJob.FEATURES_QUERY, ())
+
+
+@pytest.mark.unit
+def test_csv_export_streams_header_first_then_scored_chunks(export):
+    service, calls = export
+    stream = service.iter_export(KPIFilter(code_module=["AAA"]), "csv")
+    assert next(stream) == b"id_student,code_module,code_presentation,dropout_prediction,dropout_probability,final_result_prediction\r\n"
+    assert calls == []  # header keluar sebelum query dijalankan
+    # Chunk pertama kecil (1 baris) lalu chunk_size: baris pertama tidak menunggu chunk penuh
+    first = next(stream)
+    assert calls[0][2:] == (2, 1) and first.startswith(b"1,AAA,2013J,")
+    chunks = [first, *stream]
+    assert len(chunks) == 2
+
+    rows = list(csv.reader(io.StringIO(b"".join(chunks).decode())))
+    assert [row[0] for row in rows] == ["1", "2", "3"]
+    assert rows[0][3] in ("0", "1") and 0 <= float(rows[0][4]) <= 1 and rows[0][5] in ("Fail", "Pass")
+    assert rows[2][3:] == ["", "", ""]
+
+
+@pytest.mark.unit
+def test_ndjson_export_matches_scoring_job(export):
+    service, _ = export
+    lines = b"".join(service.iter_export(KPIFilter(), "ndjson")).decode().splitlines()
+    records = [json.loads(line) for line in lines]
+    valid, dropout, probability, final_result = service.scoring_job.score_columns(db._rows_to_columns(ROWS[:2], NAMES, None))
+    assert [r["dropout_prediction"] for r in records[:2]] == [int(d) for d in dropout]
+    assert [r["dropout_probability"] for r in records[:2]] == [round(float(p), 4) for p in probability]
+    assert [r["final_result_prediction"] for r in records[:2]] == list(final_result)
+    assert records[2] == {"id_student": 3, "code_module": "AAA", "code_presentation": "2013J",
+                          "dropout_prediction": None, "dropout_probability": None, "final_result_prediction": None}
+
+
+@pytest.mark.unit
+def test_export_route_holds_admission_slot_while_streaming(export, monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from api.router import router
+    from core.admission import AdmissionController
+
+    service, _ = export
+    admission = AdmissionController(limits={"predict_export": (1, 0)}, queue_timeout=0)
+    in_flight = []
+    render = service.render
+
+    def recording_render(rows, fmt):
+        in_flight.append(admission._in_flight["predict_export"])
+        return render(rows, fmt)
+
+    monkeypatch.setattr(service, "render", recording_render)
+    monkeypatch.setattr(model_service, "label_encoder_dropout", model_service.label_encoder_finalgrade)
+    app = FastAPI()
+    app.include_router(router)
+    app.state.scoring_export = service
+    app.state.admission = admission
+    app.state.model_service = model_service
+    client = TestClient(app)
+
+    response = client.get("/api/predict/export?format=ndjson")
+    assert response.status_code == 200 and len(response.content.splitlines()) == 3
+    # Slot baru dilepas setelah seluruh body terkirim
+    assert in_flight == [1, 1] and admission._in_flight["predict_export"] == 0
+
+    admission._local_in_flight["predict_export"] = 1  # slot dipakai export lain
+    busy = client.get("/api/predict/export")
+    assert busy.status_code == 503 and "Retry-After" in busy.headers
+    assert admission._counters["predict_export"]["shed"] == 1
@@ -0,0 +1,344 @@
+"""
+Test scoring job: status run per model version, purge prediksi lama, dan query prediksi tersimpan
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder
+
+from core.database import db
+from services.encoder_service import EncoderService
+from services.inference_executor import InferenceExecutor
+from services.model_service import model_service
+from services.predictor_service import PredictorService
+from services.scoring_job import StudentScoringJob
+
+NAMES = ["id_student", "code_module", "code_presentation", "gender", "age_band",
+         "studied_credits", "num_of_prev_attempts", "total_clicks", "avg_assessment_score"]
+
+
+class FakePredictionTables:
+    """Tabel student_predictions + student_prediction_runs in-memory untuk execute_*/iter_chunks/get_connection"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.predictions = {}
+        self.runs = {}
+        self.fail_after_chunks = None
+        self.on_chunk = None
+
+    def execute_write(self, query, params=None):
+        if query.lstrip().startswith(("CREATE TABLE", "ALTER TABLE")):
+            return 0
+        if "INSERT INTO student_prediction_runs" in query:
+            version, started_at = params
+            run = self.runs.setdefault(version, {"model_version": version, "status": "running", "scored_rows": 0})
+            run.update(started_at=started_at, finished_at=None)
+        elif "DELETE FROM student_predictions WHERE model_version <> %s" in query:
+            self.predictions = {k: v for k, v in self.predictions.items() if k[0] == params[0]}
+        elif "DELETE FROM student_predictions WHERE model_version = %s AND scored_at < %s" in query:
+            self.predictions = {k: v for k, v in self.predictions.items() if k[0] != params[0] or v["scored_at"] >= params[1]}
+        elif "DELETE FROM student_prediction_runs WHERE model_version <> %s" in query:
+            self.runs = {k: v for k, v in self.runs.items() if k == params[0]}
+        elif "SET status = 'completed'" in query:
+            finished_at, scored, skipped, version = params
+            self.runs[version].update(status="completed", finished_at=finished_at, scored_rows=scored, skipped_rows=skipped)
+        elif "SET status = 'failed'" in query:
+            finished_at, scored, version = params
+            if self.runs[version]["status"] != "completed":
+                self.runs[version].update(status="failed", finished_at=finished_at, scored_rows=scored)
+        else:
+            raise AssertionError(f"Unexpected write: {query}")
+        return 1
+
+    def execute_many(self, query, params_list):
+        assert query == StudentScoringJob.INSERT_PREDICTIONS
+        for version, id_student, module, presentation, dropout, probability, final_result, scored_at in params_list:
+            self.predictions[(version, id_student, module, presentation)] = {
+                "model_version": version, "id_student": id_student, "code_module": module,
+                "code_presentation": presentation, "dropout_prediction": dropout,
+                "dropout_probability": probability, "final_result_prediction": final_result, "scored_at": scored_at,
+            }
+        return len(params_list)
+
+    def completed(self, version):
+        run = self.runs.get(version)
+        if not run or run["status"] != "completed":
+            return []
+        return [row for key, row in self.predictions.items() if key[0] == version]
+
+    def execute_one(self, query, params=None):
+        if query == StudentScoringJob.PROBABILITY_COLUMN_EXISTS:
+            return {"found": 1}
+        if "FROM student_prediction_runs" in query:
+            run = self.runs.get(params[0])
+            return dict(run) if run and run["status"] == "completed" else None
+        if "AS scored_students" in query:
+            assert "COUNT(DISTINCT sp.id_student) AS scored_students" in query
+            rows = self.completed(params[0])
+            return {
+                "scored_students": len({row["id_student"] for row in rows}),
+                "predicted_dropouts": len({row["id_student"] for row in rows if row["dropout_prediction"] == 1}),
+                "avg_dropout_probability": float(np.mean([row["dropout_probability"] for row in rows])) if rows else None,
+                "scored_at": self.runs[params[0]]["finished_at"] if rows else None,
+            }
+        if "sp.id_student = %s" in query:
+            version, id_student = params
+            # ORDER BY code_presentation DESC, code_module
+            rows = sorted((row for row in self.completed(version) if row["id_student"] == id_student),
+                          key=lambda row: row["code_module"])
+            rows.sort(key=lambda row: row["code_presentation"], reverse=True)
+            return dict(rows[0]) if rows else None
+        raise AssertionError(f"Unexpected query: {query}")
+
+    def iter_chunks(self, query, params=None, chunk_size=None, row_format=None, dtypes=None):
+        assert query == StudentScoringJob.FEATURES_QUERY
+        for index, start in enumerate(range(0, len(self.rows), chunk_size)):
+            if self.fail_after_chunks is not None and index >= self.fail_after_chunks:
+                raise Exception("connection lost")
+            if self.on_chunk:
+                self.on_chunk()
+            yield db._rows_to_columns(self.rows[start:start + chunk_size], NAMES, dtypes)
+
+    @contextmanager
+    def get_connection(self):
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, query, params=None):
+                assert "GET_LOCK" in query
+
+            def fetchone(self):
+                return {"acquired": 1}
+
+        class Connection:
+            def cursor(self):
+                return Cursor()
+
+        yield Connection()
+
+
+def make_rows():
+    rng = np.random.default_rng(2)
+    rows = [
+        (100 + i, "AAA", "2013J", ["F", "M"][i % 2], "0-35",
+         float(rng.integers(30, 120)), 0.0, float(rng.uniform(0, 100)), float(rng.uniform(0, 100)))
+        for i in range(12)
+    ]
+    # Mahasiswa 100 juga ikut presentasi lain; age_band tak dikenal di-skip
+    rows.append((100, "BBB", "2014B", "F", "0-35", 60.0, 1.0, 5.0, 10.0))
+    rows.append((999, "AAA", "2013J", "F", "unknown", 60.0, 0.0, 5.0, 10.0))
+    return rows
+
+
+@pytest.fixture
+def scoring(monkeypatch):
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 100, (300, 6))
+    monkeypatch.setattr(model_service, "dropout_model", RandomForestClassifier(n_estimators=10, random_state=0).fit(X, (X[:, 4] < 50).astype(int)))
+    monkeypatch.setattr(model_service, "final_grade_model", RandomForestClassifier(n_estimators=5, random_state=0).fit(
+        X, np.array(["Fail", "Pass"])[(X[:, 5] < 50).astype(int)]
+    ))
+    encoders = {"gender": LabelEncoder().fit(["F", "M"]), "age_band": LabelEncoder().fit(["0-35", "35-55", "55<="])}
+    monkeypatch.setattr(model_service, "label_encoder_finalgrade", encoders)
+    monkeypatch.setattr(model_service, "model_version", "v1")
+
+    tables = FakePredictionTables(make_rows())
+    for name in ("execute_write", "execute_many", "execute_one", "iter_chunks", "get_connection"):
+        monkeypatch.setattr(db, name, getattr(tables, name))
+    job = StudentScoringJob(EncoderService(), InferenceExecutor(PredictorService(backend="sklearn"), mode="inline"), chunk_size=5)
+    return job, tables
+
+
+@pytest.mark.unit
+def test_completed_run_stores_predictions(scoring):
+    job, tables = scoring
+    result = job.run()
+
+    assert result["status"] == "completed" and result["model_version"] == "v1"
+    assert result["scored_rows"] == 13 and result["skipped_rows"] == 1
+    assert tables.runs["v1"]["status"] == "completed" and tables.runs["v1"]["scored_rows"] == 13
+    assert len(tables.predictions) == 13
+    assert all(0.0 <= row["dropout_probability"] <= 1.0 for row in tables.predictions.values())
+    assert job.get_completed_run()["scored_rows"] == 13
+
+
+@pytest.mark.unit
+def test_same_version_rerun_stays_completed(scoring):
+    job, tables = scoring
+    job.run()
+
+    # Selama re-run (dan kalau re-run gagal) prediksi run sebelumnya tetap dipakai
+    seen = []
+    tables.on_chunk = lambda: seen.append(tables.runs["v1"]["status"])
+    tables.fail_after_chunks = 2
+    with pytest.raises(Exception, match="connection lost"):
+        job.run()
+
+    assert seen == ["completed", "completed"]
+    assert tables.runs["v1"]["status"] == "completed"
+    assert job.get_completed_run() is not None and job.get_dropout_summary() is not None
+
+
+@pytest.mark.unit
+def test_failed_run_for_new_version(scoring, monkeypatch):
+    job, tables = scoring
+    job.run()
+    monkeypatch.setattr(model_service, "model_version", "v2")
+    tables.fail_after_chunks = 1
+    with pytest.raises(Exception, match="connection lost"):
+        job.run()
+
+    assert tables.runs["v2"]["status"] == "failed" and tables.runs["v2"]["scored_rows"] == 5
+    # Versi baru belum punya run selesai: tidak ada prediksi tersimpan yang dipakai
+    assert job.get_completed_run() is None
+    assert job.get_dropout_summary() is None and job.get_stored_prediction(100) is None
+
+
+@pytest.mark.unit
+def test_run_purges_old_versions_and_stale_rows(scoring, monkeypatch):
+    job, tables = scoring
+    job.run()
+    stale_at = datetime.now() - timedelta(days=1)
+    tables.predictions[("v1", 5000, "AAA", "2013J")] = dict(
+        tables.predictions[("v1", 100, "AAA", "2013J")], id_student=5000, scored_at=stale_at
+    )
+
+    monkeypatch.setattr(model_service, "model_version", "v2")
+    job.run()
+    assert {key[0] for key in tables.predictions} == {"v2"} and set(tables.runs) == {"v2"}
+
+    # Mahasiswa yang sudah tidak ada di studentinfo dibuang saat re-run versi yang sama
+    tables.predictions[("v2", 5000, "AAA", "2013J")] = dict(
+        tables.predictions[("v2", 100, "AAA", "2013J")], id_student=5000, scored_at=stale_at
+    )
+    job.run()
+    assert ("v2", 5000, "AAA", "2013J") not in tables.predictions
+    assert len(tables.predictions) == 13
+
+
+@pytest.mark.unit
+def test_get_stored_prediction_latest_presentation(scoring):
+    job, tables = scoring
+    assert job.get_stored_prediction(100) is None
+
+    job.run()
+    stored = job.get_stored_prediction(100)
+    assert (stored["code_module"], stored["code_presentation"]) == ("BBB", "2014B")
+    assert stored["model_version"] == "v1"
+    assert job.get_stored_prediction(999) is None
+
+
+@pytest.mark.unit
+def test_dropout_summary_counts_distinct_students(scoring):
+    job, tables = scoring
+    job.run()
+    for key in tables.predictions:
+        tables.predictions[key]["dropout_prediction"] = int(key[1] == 100)
+
+    summary = job.get_dropout_summary()
+    assert summary["scored_students"] == 12 and summary["predicted_dropouts"] == 1
+    assert summary["model_version"] == "v1" and summary["scored_at"] == tables.runs["v1"]["finished_at"]
+
+
+@pytest.mark.unit
+def test_sampling_fallback_counts_distinct_students(scoring, monkeypatch):
+    """Fallback sampling KPI 6 memakai satuan mahasiswa unik seperti ringkasan prediksi tersimpan"""
+    from services.kpi_service import KPIService
+    from services.predictor_service import RAW_FEATURE_DTYPES
+
+    job, tables = scoring
+    job.run()
+    # Mahasiswa 100 dropout hanya di salah satu dari dua enrollment-nya
+    for key in tables.predictions:
+        tables.predictions[key]["dropout_prediction"] = int(key[1:] == (100, "BBB", "2014B") or key[1] == 101)
+    summary = job.get_dropout_summary()
+
+    def execute_one(query, params=None):
+        assert "COUNT(DISTINCT si.id_student) as total" in query
+        return {"total_rows": len(tables.rows), "total": len({row[0] for row in tables.rows})}
+
+    sample = db._rows_to_columns(tables.rows, NAMES, RAW_FEATURE_DTYPES)
+    monkeypatch.setattr(db, "execute_one", execute_one)
+    monkeypatch.setattr(db, "fetch_columns", lambda query, params=None, dtypes=None: dict(sample))
+    service = KPIService(encoder_service=job.encoder_service, predictor_service=job.inference_executor.predictor_service,
+                         inference_executor=job.inference_executor)
+    dropout = {(100, "BBB", "2014B"), (101, "AAA", "2013J")}
+    monkeypatch.setattr(service.predictor_service, "labels_from_proba", lambda model, proba: np.array(
+        [int((int(i), m, p) in dropout) for i, m, p in zip(sample["id_student"], sample["code_module"], sample["code_presentation"])
+         if i != 999]
+    ))
+
+    result = service._calculate_predicted_dropout_risk()
+    assert result["sampled_students"] == summary["scored_students"] == 12
+    assert result["predicted_dropouts"] == summary["predicted_dropouts"] == 2
+    assert result["total_students"] == 13 and result["sample_percentage"] == 100.0
+
+
+@pytest.mark.unit
+def test_scoring_job_endpoint_requires_admin_token(scoring, monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from api.router import router
+    from config import settings
+
+    job, tables = scoring
+    app = FastAPI()
+    app.include_router(router)
+    app.state.scoring_job = job
+    client = TestClient(app)
+
+    monkeypatch.setattr(settings, "CACHE_ADMIN_TOKEN", "")
+    assert client.post("/api/predict/scoring-job", headers={"X-Admin-Token": ""}).status_code == 403
+    monkeypatch.setattr(settings, "CACHE_ADMIN_TOKEN", "s3cret")
+    assert client.post("/api/predict/scoring-job").status_code == 403
+    assert client.post("/api/predict/scoring-job", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert "v1" not in tables.runs
+
+    assert client.post("/api/predict/scoring-job", headers={"X-Admin-Token": "s3cret"}).status_code == 202
+    assert tables.runs["v1"]["status"] == "completed"
+
+
+@pytest.mark.unit
+def test_cancelled_schedule_waits_for_running_job(scoring, monkeypatch):
+    job, _ = scoring
+    started = threading.Event()
+    finished = []
+
+    def run():
+        started.set()
+        # Run berhenti di batas chunk setelah stop(), bukan langsung saat task di-cancel
+        job._stop_event.wait(5)
+        time.sleep(0.05)
+        finished.append(True)
+        return {"status": "failed"}
+
+    monkeypatch.setattr(job, "run", run)
+
+    async def scenario():
+        task = asyncio.create_task(job.run_periodically(3600))
+        await asyncio.to_thread(started.wait, 5)
+        job.stop()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return task.cancelled(), list(finished)
+
+    assert asyncio.run(scenario()) == (True, [True])
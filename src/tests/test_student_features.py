@@ -0,0 +1,72 @@
+"""
+Test query fitur per enrollment (dijalankan di SQLite in-memory, SQL standar tanpa fungsi MySQL)
+"""
+import sys
+from pathlib import Path
+
+# Add src to path
+src_path = Path(__file__).parent.parent
+sys.path.insert(0, str(src_path))
+
+import sqlite3
+
+import pytest
+
+from services.student_features import LATEST_ENROLLMENT_ORDER, features_query
+
+
+@pytest.fixture
+def oulad():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.executescript("""
+        CREATE TABLE studentinfo (id_student INT, code_module TEXT, code_presentation TEXT, gender TEXT,
+                                  age_band TEXT, studied_credits INT, num_of_prev_attempts INT);
+        CREATE TABLE studentvle (id_student INT, code_module TEXT, code_presentation TEXT, id_site INT, date INT, sum_click INT);
+        CREATE TABLE assessments (id_assessment INT, code_module TEXT, code_presentation TEXT);
+        CREATE TABLE studentassessment (id_assessment INT, id_student INT, date_submitted INT, score REAL);
+
+        INSERT INTO studentinfo VALUES (1, 'AAA', '2013J', 'F', '0-35', 60, 0), (1, 'BBB', '2014B', 'F', '0-35', 30, 1),
+                                       (2, 'AAA', '2013J', 'M', '35-55', 120, 0);
+        INSERT INTO studentvle VALUES (1, 'AAA', '2013J', 10, 1, 5), (1, 'AAA', '2013J', 10, 2, 7),
+                                      (1, 'BBB', '2014B', 11, 1, 100), (2, 'AAA', '2013J', 10, 1, NULL);
+        INSERT INTO assessments VALUES (1, 'AAA', '2013J'), (2, 'BBB', '2014B');
+        INSERT INTO studentassessment VALUES (1, 1, 10, 40.0), (1, 1, 12, 60.0), (2, 1, 20, 90.0), (2, 1, 25, NULL);
+    """)
+    yield conn
+    conn.close()
+
+
+def run(conn, query, params=()):
+    return [dict(row) for row in conn.execute(query.replace("%s", "?"), params)]
+
+
+@pytest.mark.unit
+def test_aggregates_are_scoped_per_enrollment(oulad):
+    rows = {(r["id_student"], r["code_module"]): r for r in run(oulad, features_query())}
+    assert len(rows) == 3
+    # Mahasiswa 1 di dua modul: clicks dan rata-rata score tidak tercampur antar enrollment
+    assert (rows[(1, "AAA")]["total_clicks"], rows[(1, "AAA")]["avg_assessment_score"]) == (12, 50.0)
+    assert (rows[(1, "BBB")]["total_clicks"], rows[(1, "BBB")]["avg_assessment_score"]) == (100, 90.0)
+    # Tanpa aktivitas / score: 0, seperti query lama
+    assert (rows[(2, "AAA")]["total_clicks"], rows[(2, "AAA")]["avg_assessment_score"]) == (0, 0)
+
+
+@pytest.mark.unit
+def test_conditions_and_latest_enrollment_order(oulad):
+    rows = run(oulad, features_query(" AND si.id_student IN (%s, %s)", LATEST_ENROLLMENT_ORDER), (2, 1))
+    assert [(r["id_student"], r["code_presentation"]) for r in rows] == [(1, "2014B"), (1, "2013J"), (2, "2013J")]
+
+
+@pytest.mark.unit
+def test_ensure_feature_indexes_creates_missing_only(monkeypatch):
+    from core.database import db
+    from services.student_features import ensure_feature_indexes
+
+    existing = {("studentvle", "idx_studentvle_enrollment")}
+    writes = []
+    monkeypatch.setattr(db, "execute_one", lambda query, params: {"found": int(params in existing)})
+    monkeypatch.setattr(db, "execute_write", lambda query, params=None: writes.append(query) or 0)
+
+    assert ensure_feature_indexes() == ["idx_studentassessment_student"]
+    assert writes == ["CREATE INDEX idx_studentassessment_student ON studentassessment (id_student, id_assessment)"]